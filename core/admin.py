@@ -1,7 +1,16 @@
+import os
+
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
 from .models import Pais, Provincia, Genero, Nivel_Educativo, Tipo_Documento, Sede, Localidad, Rol, AreaProfesional, Profesion
-from .models import ClienteLog
+from .models import ClienteLog, ClienteLogDiario
+from .importar import carpeta_informes, estado_importacion, programar
 # Register your models here.
 
 admin.site.register(Provincia)
@@ -23,12 +32,36 @@ admin.site.empty_value_display = 'N/A'
 
 @admin.register(ClienteLog)
 class ClienteLogAdmin(admin.ModelAdmin):
-    list_display = ('fecha', 'usuario', 'ip', 'navegador', 'sistema_operativo', 'url')
-    search_fields = ('ip', 'usuario__username', 'user_agent', 'url', 'referer')
-    list_filter = ('fecha', 'sistema_operativo', 'navegador')
-    readonly_fields = [f.name for f in ClienteLog._meta.fields]
+    list_display = ('fecha', 'usuario', 'ip', 'navegador', 'sistema_operativo', 'url_completa')
+    search_fields = ('ip', 'usuario__username', 'user_agent__user_agent', 'url__url', 'referer__url')
+    list_filter = ('fecha', 'user_agent__sistema_operativo', 'user_agent__navegador')
+    list_select_related = ('usuario', 'user_agent', 'url')
+    readonly_fields = ('fecha', 'usuario', 'ip', 'navegador', 'sistema_operativo', 'user_agent_completo', 'url_completa', 'referer_completo')
+    exclude = ('user_agent', 'url', 'referer')
     ordering = ['-fecha']
 
+    # user agent y urls están en tablas aparte (UserAgent / UrlPath): se muestra el texto
+
+    @admin.display(description='Navegador', ordering='user_agent__navegador')
+    def navegador(self, obj):
+        return obj.user_agent.navegador
+
+    @admin.display(description='Sistema operativo', ordering='user_agent__sistema_operativo')
+    def sistema_operativo(self, obj):
+        return obj.user_agent.sistema_operativo
+
+    @admin.display(description='User agent')
+    def user_agent_completo(self, obj):
+        return obj.user_agent.user_agent
+
+    @admin.display(description='Url')
+    def url_completa(self, obj):
+        return obj.url.url
+
+    @admin.display(description='Referer')
+    def referer_completo(self, obj):
+        return obj.referer.url if obj.referer_id else None
+
     def has_add_permission(self, request):
         return False  # solo lectura
 
@@ -36,4 +69,100 @@ class ClienteLogAdmin(admin.ModelAdmin):
         return False  # evitar edición
 
     def has_delete_permission(self, request, obj=None):
-        return False  # evitar eliminación
\ No newline at end of file
+        return False  # evitar eliminación
+
+
+@admin.register(ClienteLogDiario)
+class ClienteLogDiarioAdmin(admin.ModelAdmin):
+    list_display = ('dia', 'usuario', 'ip', 'url_completa', 'visitas')
+    search_fields = ('ip', 'usuario__username', 'url__url')
+    list_filter = ('dia',)
+    list_select_related = ('usuario', 'url')
+    ordering = ['-dia']
+
+    @admin.display(description='Url')
+    def url_completa(self, obj):
+        return obj.url.url
+
+    def has_add_permission(self, request):
+        return False  # lo completa depurar_cliente_log
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivoImportacionForm(forms.Form):
+    archivo = forms.FileField(label='Archivo', help_text='CSV o XLSX; la primera fila tiene los nombres de las columnas.')
+    encoding = forms.ChoiceField(
+        label='Codificación del CSV',
+        choices=[('utf-8-sig', 'UTF-8'), ('cp1252', 'Windows (Excel)')],
+    )
+
+
+class ImportacionAdminMixin:
+    """
+    Página "Importar" en el listado del admin (core.importar). La subclase define
+    `importacion` y `comando` (el de manage.py equivalente). El archivo llega por el upload de Django (a disco si es grande)
+    y se importa en segundo plano (core.importar.programar); la página de la importación
+    se recarga hasta que termina y las filas rechazadas se descargan como CSV.
+    """
+    importacion = None
+    comando = None
+    change_list_template = 'admin/importar_change_list.html'
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='%s_%s_importar' % info),
+            path('importar/errores/<str:nombre>/', self.admin_site.admin_view(self.informe_view),
+                 name='%s_%s_importar_errores' % info),
+            path('importar/<str:identificador>/', self.admin_site.admin_view(self.estado_view),
+                 name='%s_%s_importar_estado' % info),
+        ] + super().get_urls()
+
+    def _verificar_permisos(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+    def _respuesta(self, request, form, estado=None):
+        estado = estado or {}
+        resumen = estado.get('resumen')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Importar {self.model._meta.verbose_name_plural.lower()}',
+            'form': form,
+            'en_curso': estado.get('estado') == 'en curso',
+            'error': estado.get('error'),
+            'resumen': resumen,
+            'informe': resumen['informe'] if resumen else None,
+            'comando': self.comando,
+        }
+        return TemplateResponse(request, 'admin/importar.html', context)
+
+    def importar_view(self, request):
+        self._verificar_permisos(request)
+        form = ArchivoImportacionForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            identificador = programar(self.importacion, form.cleaned_data['archivo'], form.cleaned_data['encoding'])
+            info = self.model._meta.app_label, self.model._meta.model_name
+            return redirect('admin:%s_%s_importar_estado' % info, identificador)
+        return self._respuesta(request, form)
+
+    def estado_view(self, request, identificador):
+        self._verificar_permisos(request)
+        estado = estado_importacion(identificador)
+        if estado is None:
+            raise Http404
+        return self._respuesta(request, ArchivoImportacionForm(), estado)
+
+    def informe_view(self, request, nombre):
+        self._verificar_permisos(request)
+        ruta = os.path.join(carpeta_informes(), os.path.basename(nombre))
+        if not nombre.endswith('.csv') or not os.path.isfile(ruta):
+            raise Http404
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename='errores_importacion.csv',
+                            content_type='text/csv; charset=utf-8')
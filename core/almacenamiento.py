@@ -0,0 +1,169 @@
+"""
+Almacenamiento de archivos por contenido (content-addressed).
+
+Cada archivo se guarda con el SHA-256 de su contenido como nombre, en
+subcarpetas por los primeros caracteres del hash:
+
+    documentos/expedientes/ab/cd/abcd...<64 hex>.pdf
+
+- El hash se calcula mientras el archivo se copia a disco (en bloques, sin
+  cargarlo entero en memoria) y el archivo se mueve a su lugar definitivo con
+  os.replace cuando ya está completo.
+- El mismo contenido subido varias veces se guarda una sola vez: todas las filas
+  apuntan al mismo nombre. Las referencias se cuentan sobre la columna del
+  FileField, así que el archivo se borra recién cuando deja de usarlo la última
+  fila (liberar()).
+- Ninguna carpeta junta más de unas pocas decenas de archivos, así que listarlas
+  y respaldarlas no depende de cuántos documentos haya en total.
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+
+TAMANIO_BLOQUE = 1024 * 1024
+CARPETA_TEMPORAL = '.tmp'
+TIPO_MIME_POR_DEFECTO = 'application/octet-stream'
+
+
+def _extension(nombre):
+    extension = os.path.splitext(nombre)[1].lower()
+    # Solo extensiones "normales": el resto del nombre lo decide el contenido
+    return extension if len(extension) <= 10 and extension[1:].isalnum() else ''
+
+
+def nombre_por_contenido(prefijo, sha256, nombre_original=''):
+    """'<prefijo>/ab/cd/<sha256><extensión>' para un contenido y el nombre con el que se subió."""
+    return posixpath.join(prefijo, sha256[:2], sha256[2:4], sha256 + _extension(nombre_original))
+
+
+def _prefijo(nombre):
+    """Carpeta base de un nombre, sin las subcarpetas ab/cd si ya es un nombre por contenido."""
+    carpeta, archivo = posixpath.split(nombre)
+    sha256 = posixpath.splitext(archivo)[0]
+    if len(sha256) == 64 and carpeta.endswith(posixpath.join(sha256[:2], sha256[2:4])):
+        return posixpath.dirname(posixpath.dirname(carpeta))
+    return carpeta
+
+
+def datos_archivo(contenido, nombre=''):
+    """
+    (sha256, tamaño, tipo mime) de un archivo subido, leyéndolo en bloques.
+    El tipo mime sale de la extensión y, si no se reconoce, del que informó el navegador.
+    """
+    sha256 = hashlib.sha256()
+    tamanio = 0
+    for bloque in contenido.chunks(TAMANIO_BLOQUE):
+        sha256.update(bloque)
+        tamanio += len(bloque)
+    tipo_mime = (
+        mimetypes.guess_type(nombre or getattr(contenido, 'name', '') or '')[0]
+        or getattr(contenido, 'content_type', None)
+        or TIPO_MIME_POR_DEFECTO
+    )
+    return sha256.hexdigest(), tamanio, tipo_mime
+
+
+def sha256_de_ruta(ruta):
+    """SHA-256 de un archivo en disco, leído en bloques."""
+    sha256 = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANIO_BLOQUE), b''):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+
+@contextmanager
+def bloqueo(nombre):
+    """
+    Serializa la escritura y el borrado de un mismo archivo entre procesos
+    (advisory lock de PostgreSQL hasta el fin de la transacción). Si se usa
+    fuera de una transacción, el bloqueo termina al salir del bloque.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', ['almacenamiento:' + nombre])
+        yield
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """FileSystemStorage que nombra cada archivo por el SHA-256 de su contenido."""
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre final lo decide _save(); dos archivos con el mismo nombre tienen el mismo contenido
+        return name
+
+    def carpeta_temporal(self, *partes):
+        """Carpeta para archivos a medio escribir: en el mismo disco, así os.replace es atómico."""
+        carpeta = os.path.join(self.location, CARPETA_TEMPORAL, *partes)
+        os.makedirs(carpeta, exist_ok=True)
+        return carpeta
+
+    def mover(self, ruta_temporal, name, sha256):
+        """
+        Pone en su lugar un archivo ya completo de carpeta_temporal() cuyo contenido
+        tiene ese sha256 y devuelve su nombre. Si el contenido ya estaba guardado,
+        el temporal se descarta.
+        """
+        # name puede ser el nombre subido o uno ya calculado por contenido (expediente.servicios)
+        nombre = nombre_por_contenido(_prefijo(name), sha256, name)
+        ruta = self.path(nombre)
+        with bloqueo(nombre):
+            if os.path.exists(ruta):
+                os.remove(ruta_temporal)
+            else:
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                if self.directory_permissions_mode is not None:
+                    os.chmod(os.path.dirname(ruta), self.directory_permissions_mode)
+                os.replace(ruta_temporal, ruta)
+                if self.file_permissions_mode is not None:
+                    os.chmod(ruta, self.file_permissions_mode)
+        return nombre
+
+    def _save(self, name, content):
+        sha256 = hashlib.sha256()
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=self.carpeta_temporal())
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                for bloque in content.chunks(TAMANIO_BLOQUE):
+                    sha256.update(bloque)
+                    destino.write(bloque)
+            return self.mover(ruta_temporal, name, sha256.hexdigest())
+        except BaseException:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+            raise
+
+
+def liberar(storage, nombre, en_uso):
+    """
+    Después del commit borra `nombre` del storage si en_uso(nombre) devuelve False
+    (ninguna fila lo referencia). Con el bloqueo, un guardado simultáneo del mismo
+    contenido no puede encontrar el archivo y perderlo justo antes del borrado,
+    siempre que ese guardado escriba el archivo y la fila en la misma transacción
+    (ExpedienteDocumento.save() abre una): en autocommit el bloqueo se soltaría
+    antes del INSERT.
+    """
+    if not nombre:
+        return
+
+    def borrar():
+        with bloqueo(nombre):
+            if not en_uso(nombre) and storage.exists(nombre):
+                storage.delete(nombre)
+
+    transaction.on_commit(borrar)
+
+
+documentos = AlmacenamientoPorContenido()
+
+
+def almacenamiento_documentos():
+    """Storage de ExpedienteDocumento.archivo (callable para que no quede fijo en las migraciones)."""
+    return documentos
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Mantiene DocumentoBusqueda al día con las entidades buscables
+        # e invalida la cache de catálogos de los formularios
+        from . import busqueda, catalogos
+        busqueda.conectar_senales()
+        catalogos.conectar_senales()
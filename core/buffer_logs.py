@@ -0,0 +1,111 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .models import ClienteLog
+from .utils import construir_clientes_log
+
+logger = logging.getLogger(__name__)
+
+
+class BufferClienteLog:
+    """
+    Cola en memoria para los registros de ClienteLog.
+
+    El request sólo encola un diccionario (ver utils.datos_cliente); un hilo de
+    fondo resuelve user agents y urls (UserAgent / UrlPath) y guarda los registros con bulk_create cuando
+    se juntan `tamanio_lote` registros o pasan `intervalo` segundos.
+    Al terminar el proceso (por ejemplo cuando gunicorn recicla el worker) se
+    vuelca lo que quede pendiente.
+    """
+
+    def __init__(self, tamanio_lote=200, intervalo=5, capacidad=10000):
+        self.tamanio_lote = tamanio_lote
+        self.intervalo = intervalo
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._despertar = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+
+    def agregar(self, datos):
+        self._asegurar_hilo()
+        try:
+            self._cola.put_nowait(datos)
+        except queue.Full:
+            # Si la base no da abasto no se frena el request: se descarta el registro
+            logger.warning("Cola de ClienteLog llena; se descarta el registro de %s", datos.get('url'))
+            return
+        if self._cola.qsize() >= self.tamanio_lote:
+            self._despertar.set()
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def descartar(self):
+        """Vacía la cola sin guardar (usado por el benchmark)."""
+        while True:
+            try:
+                self._cola.get_nowait()
+            except queue.Empty:
+                return
+
+    def vaciar(self):
+        """Guarda en la base todo lo encolado hasta ahora. Devuelve la cantidad guardada."""
+        guardados = 0
+        try:
+            while True:
+                lote = []
+                while len(lote) < self.tamanio_lote:
+                    try:
+                        lote.append(self._cola.get_nowait())
+                    except queue.Empty:
+                        break
+                if not lote:
+                    break
+                try:
+                    ClienteLog.objects.bulk_create(construir_clientes_log(lote))
+                    guardados += len(lote)
+                except Exception:
+                    logger.exception("No se pudieron guardar %d registros de ClienteLog", len(lote))
+        finally:
+            # El hilo no atiende requests: nadie más cierra su conexión
+            connection.close()
+        return guardados
+
+    def _asegurar_hilo(self):
+        # Después de un fork (gunicorn --preload) el hilo del proceso padre no existe
+        # en el hijo: se crea uno por proceso.
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name='buffer-cliente-log', daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            if self._cola.qsize():
+                self.vaciar()
+
+
+buffer_cliente_log = BufferClienteLog(
+    tamanio_lote=getattr(settings, 'CLIENTE_LOG_LOTE', 200),
+    intervalo=getattr(settings, 'CLIENTE_LOG_INTERVALO', 5),
+    capacidad=getattr(settings, 'CLIENTE_LOG_CAPACIDAD', 10000),
+)
+
+
+@atexit.register
+def _vaciar_al_salir():
+    if buffer_cliente_log.pendientes():
+        buffer_cliente_log.vaciar()
@@ -0,0 +1,192 @@
+"""
+Búsqueda unificada (/api/buscar/) sobre la tabla DocumentoBusqueda.
+
+Cada entidad buscable se declara en INDEXADOS: de qué modelo sale, qué permiso
+hace falta para verla, qué texto se indexa y cómo se muestra. Las señales
+post_save / post_delete de esos modelos mantienen DocumentoBusqueda al día y
+`manage.py indexar_busqueda` la reconstruye completa.
+"""
+from django.apps import apps
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+
+from .models import DocumentoBusqueda
+from .utils import normalizar_texto, pagina_sin_contar
+
+
+class Indexado:
+    """
+    modelo: 'app_label.Modelo'; permiso: el que hace falta para ver este tipo.
+    texto(obj): partes del texto buscable; titulo(obj): lo que se muestra.
+    url: nombre de la url de detalle (recibe pk); sede(obj): sede_id si el
+    resultado depende de la sede; select_related: lo que usan texto/titulo.
+    """
+
+    def __init__(self, modelo, permiso, texto, titulo, url=None, sede=None, select_related=()):
+        self.modelo = modelo
+        self.permiso = permiso
+        self.texto = texto
+        self.titulo = titulo
+        self.url = url
+        self.sede = sede
+        self.select_related = select_related
+
+
+def _unir(*partes):
+    return ' '.join(str(parte) for parte in partes if parte)
+
+
+INDEXADOS = {
+    DocumentoBusqueda.PERSONA: Indexado(
+        modelo='persona.Persona',
+        permiso='persona.puede_ver_persona',
+        texto=lambda p: (p.apellido, p.nombre, p.numero_documento),
+        titulo=lambda p: _unir(p.apellido, p.nombre, f"({p.numero_documento})"),
+        url='persona:persona_detail',
+    ),
+    DocumentoBusqueda.INSTITUCION: Indexado(
+        modelo='institucion.Institucion',
+        permiso='institucion.view_institucion',
+        texto=lambda i: (i.institucion, i.cuit, i.localidad),
+        titulo=lambda i: _unir(i.institucion, f"- {i.localidad}" if i.localidad_id else ''),
+        url='institucion:institucion_detail',
+        select_related=('localidad',),
+    ),
+    DocumentoBusqueda.EXPEDIENTE: Indexado(
+        modelo='expediente.Expediente',
+        permiso='expediente.view_expediente',
+        texto=lambda e: (e.identificador, e.cuij, e.clave_sisfe, e.sede),
+        titulo=lambda e: _unir(e.identificador, f"- {e.sede}"),
+        url='expediente:expediente_detail',
+        sede=lambda e: e.sede_id,
+        select_related=('sede',),
+    ),
+    DocumentoBusqueda.LOCALIDAD: Indexado(
+        modelo='core.Localidad',
+        permiso='core.view_localidad',
+        texto=lambda l: (l.localidad, l.codigo_postal, l.provincia),
+        titulo=lambda l: _unir(l.localidad, f"({l.provincia})" if l.provincia_id else ''),
+        select_related=('provincia',),
+    ),
+}
+
+
+def documento_para(tipo, obj):
+    """Arma (sin guardar) el DocumentoBusqueda de un objeto."""
+    indexado = INDEXADOS[tipo]
+    return DocumentoBusqueda(
+        tipo=tipo,
+        objeto_id=obj.pk,
+        texto=normalizar_texto(_unir(*indexado.texto(obj))),
+        titulo=indexado.titulo(obj)[:255],
+        sede_id=indexado.sede(obj) if indexado.sede else None,
+    )
+
+
+def indexar(tipo, obj):
+    documento = documento_para(tipo, obj)
+    DocumentoBusqueda.objects.update_or_create(
+        tipo=tipo,
+        objeto_id=obj.pk,
+        defaults={'texto': documento.texto, 'titulo': documento.titulo, 'sede_id': documento.sede_id},
+    )
+
+
+def indexar_lote(tipo, pks):
+    """Indexa de una vez los objetos con esos pk (altas y cambios con bulk_create, que no emiten señales)."""
+    indexado = INDEXADOS[tipo]
+    modelo = apps.get_model(indexado.modelo)
+    objetos = modelo._default_manager.select_related(*indexado.select_related).filter(pk__in=pks)
+    DocumentoBusqueda.objects.bulk_create(
+        [documento_para(tipo, obj) for obj in objetos],
+        update_conflicts=True,
+        unique_fields=['tipo', 'objeto_id'],
+        update_fields=['texto', 'titulo', 'sede'],
+    )
+
+
+def desindexar(tipo, pk):
+    DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id=pk).delete()
+
+
+def reindexar(tipo, tamanio_lote=2000):
+    """Reconstruye todos los documentos de un tipo. Devuelve la cantidad indexada."""
+    indexado = INDEXADOS[tipo]
+    modelo = apps.get_model(indexado.modelo)
+    DocumentoBusqueda.objects.filter(tipo=tipo).delete()
+    lote, total = [], 0
+    for obj in modelo._default_manager.select_related(*indexado.select_related).order_by('pk').iterator(chunk_size=tamanio_lote):
+        lote.append(documento_para(tipo, obj))
+        if len(lote) >= tamanio_lote:
+            DocumentoBusqueda.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    DocumentoBusqueda.objects.bulk_create(lote)
+    return total + len(lote)
+
+
+def conectar_senales():
+    """Se llama desde CoreConfig.ready()."""
+    for tipo, indexado in INDEXADOS.items():
+        modelo = apps.get_model(indexado.modelo)
+
+        def guardado(sender, instance, raw=False, _tipo=tipo, **kwargs):
+            if not raw:  # loaddata
+                indexar(_tipo, instance)
+
+        def borrado(sender, instance, _tipo=tipo, **kwargs):
+            desindexar(_tipo, instance.pk)
+
+        post_save.connect(guardado, sender=modelo, weak=False, dispatch_uid=f'busqueda_guardado_{tipo}')
+        post_delete.connect(borrado, sender=modelo, weak=False, dispatch_uid=f'busqueda_borrado_{tipo}')
+
+
+def tipos_permitidos(usuario, tipos=None):
+    return [
+        tipo for tipo, indexado in INDEXADOS.items()
+        if (not tipos or tipo in tipos) and usuario.has_perm(indexado.permiso)
+    ]
+
+
+def buscar(usuario, termino, tipos=None, pagina=1, por_pagina=20):
+    """
+    Devuelve (resultados, hay_mas) para la página pedida. Sólo incluye los tipos
+    que el usuario puede ver y, para los tipos con sede, los de su sede.
+    """
+    palabras = normalizar_texto(termino).split()
+    permitidos = tipos_permitidos(usuario, tipos)
+    if not palabras or not permitidos:
+        return [], False
+
+    documentos = DocumentoBusqueda.objects.filter(tipo__in=permitidos)
+    if not usuario.is_superuser:
+        documentos = documentos.filter(Q(sede__isnull=True) | Q(sede_id=usuario.sede_id))
+
+    postgres = connection.vendor == 'postgresql'
+    for palabra in palabras:
+        condicion = Q(texto__contains=palabra)
+        if postgres and len(palabra) >= 3 and not palabra.isdigit():
+            condicion |= Q(texto__trigram_word_similar=palabra)  # errores de tipeo
+        documentos = documentos.filter(condicion)
+
+    if postgres:
+        documentos = documentos.annotate(similitud=TrigramSimilarity('texto', ' '.join(palabras)))
+        documentos = documentos.order_by('-similitud', 'titulo', 'id')
+    else:
+        documentos = documentos.order_by('titulo', 'id')
+
+    filas, hay_mas = pagina_sin_contar(documentos.values('tipo', 'objeto_id', 'titulo'), pagina, por_pagina)
+    return [_resultado(fila) for fila in filas], hay_mas
+
+
+def _resultado(fila):
+    indexado = INDEXADOS[fila['tipo']]
+    return {
+        'id': fila['objeto_id'],
+        'tipo': fila['tipo'],
+        'text': fila['titulo'],
+        'url': reverse(indexado.url, args=[fila['objeto_id']]) if indexado.url else None,
+    }
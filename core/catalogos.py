@@ -0,0 +1,94 @@
+"""
+Cache de catálogos (tablas chicas que casi no cambian: Sede, Rol, MedioIngreso,
+TipoSolicitud, ...) para los ModelChoiceField de los formularios.
+
+Los objetos de cada queryset se guardan en CACHES['default'] (LocMem en
+desarrollo, Redis en producción) bajo una clave que incluye la versión del
+catálogo. Guardar o borrar un registro del catálogo incrementa la versión
+(señales post_save / post_delete) y las entradas anteriores dejan de usarse.
+"""
+import hashlib
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+# Modelos cuyos querysets se pueden cachear con core.fields.CachedModelChoiceField
+CATALOGOS = [
+    'core.Sede',
+    'core.Rol',
+    'expediente.MedioIngreso',
+    'expediente.TipoSolicitud',
+    'expediente.EstadoExpediente',
+    'expediente.GrupoEtario',
+    'expediente.TipoPatrocinio',
+    'expediente.ResumenIntervencion',
+    'internacion.MotivoInternacion',
+    'internacion.MotivoAlta',
+    'internacion.ModalidadSuicidio',
+    'internacion.TipoAdiccion',
+    'internacion.TipoInternacion',
+    'intervencion.TipoIntervencion',
+]
+
+# Las versiones no vencen; las listas sí, por si un catálogo deja de usarse
+TIMEOUT = 60 * 60 * 24
+
+
+def _clave_version(modelo):
+    return f'catalogo:version:{modelo._meta.label_lower}'
+
+
+def version(modelo):
+    clave = _clave_version(modelo)
+    valor = cache.get(clave)
+    if valor is None:
+        # Si la versión se perdió (reinicio o desalojo de la cache) se arranca de un
+        # valor nuevo, nunca de 1, para no reutilizar listas guardadas con una versión vieja
+        cache.add(clave, int(time.time() * 1000), None)
+        valor = cache.get(clave)
+    return valor
+
+
+def invalidar(modelo):
+    clave = _clave_version(modelo)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # No existía: version() creará una nueva la próxima vez
+        pass
+
+
+def es_catalogo(modelo):
+    return modelo._meta.label in CATALOGOS
+
+
+def objetos(queryset):
+    """Lista (cacheada) de los objetos del queryset de un catálogo."""
+    if queryset.query.is_empty():
+        return []
+    modelo = queryset.model
+    consulta = hashlib.sha1(str(queryset.query).encode('utf-8')).hexdigest()
+    clave = f'catalogo:{modelo._meta.label_lower}:{version(modelo)}:{consulta}'
+    lista = cache.get(clave)
+    if lista is None:
+        lista = list(queryset)
+        cache.set(clave, lista, TIMEOUT)
+    return lista
+
+
+def conectar_senales():
+    """Se llama desde CoreConfig.ready()."""
+    for etiqueta in CATALOGOS:
+        modelo = apps.get_model(etiqueta)
+
+        def cambio(sender, **kwargs):
+            invalidar(sender)
+            # Y otra vez después del commit: mientras la transacción está abierta otro
+            # proceso puede volver a cachear los datos viejos con la versión nueva
+            transaction.on_commit(lambda: invalidar(sender))
+
+        post_save.connect(cambio, sender=modelo, weak=False, dispatch_uid=f'catalogo_{etiqueta}_guardado')
+        post_delete.connect(cambio, sender=modelo, weak=False, dispatch_uid=f'catalogo_{etiqueta}_borrado')
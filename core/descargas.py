@@ -0,0 +1,215 @@
+"""
+Entrega de archivos protegidos (documentos de expedientes, ...).
+
+La vista controla permisos y después, según settings.DESCARGAS_MODO:
+
+- 'nginx': responde solo con X-Accel-Redirect y nginx envía el archivo desde
+  una location `internal` (soporta Range y caché por su cuenta).
+- 'apache': lo mismo con X-Sendfile (mod_xsendfile) y la ruta absoluta.
+- 'django' (desarrollo / sin servidor delante): Django lo envía en bloques,
+  con ETag, If-None-Match / If-Modified-Since y un rango de bytes (Range).
+
+En los dos primeros modos el worker de gunicorn queda libre apenas arma los
+encabezados, en lugar de quedar ocupado mientras dura la descarga.
+
+zip_en_streaming() arma un ZIP a medida que se envía (StreamingHttpResponse),
+sin juntar el archivo completo en memoria ni en disco.
+"""
+import csv
+import hashlib
+import io
+import os
+import re
+import zipfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .almacenamiento import TAMANIO_BLOQUE, TIPO_MIME_POR_DEFECTO
+
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Tipos que se pueden abrir en el navegador: el resto (html, svg, ...) podría
+# ejecutar scripts con la sesión del usuario, así que siempre se descargan
+TIPOS_EN_LINEA = {'application/pdf', 'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp'}
+
+
+def _rango(encabezado, tamanio):
+    """
+    (inicio, fin) inclusive de un encabezado Range de un solo rango; None si no
+    hay que usarlo (ausente o con varios rangos) y False si no se puede satisfacer.
+    """
+    coincidencia = RANGO.match(encabezado.strip()) if encabezado else None
+    if not coincidencia:
+        return None
+    desde, hasta = coincidencia.groups()
+    if not desde and not hasta:
+        return None
+    if not desde:
+        # bytes=-N: los últimos N bytes
+        largo = int(hasta)
+        if largo == 0:
+            return False
+        return max(tamanio - largo, 0), tamanio - 1
+    inicio = int(desde)
+    fin = min(int(hasta), tamanio - 1) if hasta else tamanio - 1
+    if inicio >= tamanio or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def _bloques(archivo, inicio, largo):
+    try:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(TAMANIO_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+    finally:
+        archivo.close()
+
+
+def se_muestra_en_linea(tipo_mime):
+    return (tipo_mime or '').split(';')[0].strip().lower() in TIPOS_EN_LINEA
+
+
+def _encabezados(respuesta, nombre_descarga, tipo_mime, etag, adjunto):
+    respuesta['Content-Type'] = tipo_mime or TIPO_MIME_POR_DEFECTO
+    respuesta['Content-Disposition'] = content_disposition_header(adjunto, nombre_descarga)
+    respuesta['ETag'] = etag
+    respuesta['Accept-Ranges'] = 'bytes'
+    # Documentos con datos personales: que no los guarde ningún proxy intermedio
+    respuesta['Cache-Control'] = 'private, no-cache'
+    respuesta['X-Content-Type-Options'] = 'nosniff'
+    return respuesta
+
+
+def respuesta_archivo(request, storage, nombre, nombre_descarga, tipo_mime=None, sha256=None, adjunto=False):
+    """
+    Respuesta para descargar `nombre` de `storage` (un FileSystemStorage).
+    sha256: si se conoce, es el ETag (si no, se usa tamaño + fecha de modificación).
+    adjunto=False solo vale para los TIPOS_EN_LINEA; los demás van siempre como adjunto.
+    """
+    adjunto = adjunto or not se_muestra_en_linea(tipo_mime)
+    ruta = storage.path(nombre)
+    estado = os.stat(ruta)  # FileNotFoundError si no existe: la vista decide qué responder
+    etag = quote_etag(sha256 or f'{estado.st_size:x}-{int(estado.st_mtime):x}')
+
+    modo = settings.DESCARGAS_MODO
+    if modo == 'nginx':
+        respuesta = HttpResponse()
+        respuesta['X-Accel-Redirect'] = quote(settings.DESCARGAS_URL_INTERNA + nombre)
+        return _encabezados(respuesta, nombre_descarga, tipo_mime, etag, adjunto)
+    if modo == 'apache':
+        respuesta = HttpResponse()
+        respuesta['X-Sendfile'] = ruta
+        return _encabezados(respuesta, nombre_descarga, tipo_mime, etag, adjunto)
+
+    # If-None-Match / If-Modified-Since -> 304
+    condicional = get_conditional_response(request, etag=etag, last_modified=int(estado.st_mtime))
+    if condicional is not None:
+        return _encabezados(condicional, nombre_descarga, tipo_mime, etag, adjunto)
+
+    rango = _rango(request.headers.get('Range'), estado.st_size)
+    if_range = request.headers.get('If-Range')
+    if rango is not None and if_range and if_range != etag:
+        # El archivo cambió desde que el cliente pidió la primera parte: se manda entero
+        rango = None
+
+    if rango is False:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{estado.st_size}'
+        return respuesta
+
+    archivo = open(ruta, 'rb')
+    if rango is None:
+        respuesta = FileResponse(archivo)
+    else:
+        inicio, fin = rango
+        respuesta = StreamingHttpResponse(_bloques(archivo, inicio, fin - inicio + 1), status=206)
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+        respuesta['Content-Length'] = str(fin - inicio + 1)
+    respuesta['Last-Modified'] = http_date(estado.st_mtime)
+    return _encabezados(respuesta, nombre_descarga, tipo_mime, etag, adjunto)
+
+
+# Formatos que ya vienen comprimidos: se guardan sin volver a comprimir
+SIN_COMPRIMIR = ('image/', 'video/', 'audio/', 'application/pdf', 'application/zip', 'application/vnd.openxmlformats')
+
+
+class SalidaEnBloques(io.RawIOBase):
+    """Destino del ZipFile sin seek: junta lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _nombre_unico(nombre, usados):
+    nombre = nombre.replace('/', '_').replace('\\', '_').strip() or 'documento'
+    base, extension = os.path.splitext(nombre)
+    candidato, numero = nombre, 1
+    while candidato.lower() in usados:
+        numero += 1
+        candidato = f'{base} ({numero}){extension}'
+    usados.add(candidato.lower())
+    return candidato
+
+
+def zip_en_streaming(entradas, manifiesto='manifiesto.csv'):
+    """
+    Genera los bytes de un ZIP a medida que lee cada archivo, de a TAMANIO_BLOQUE.
+
+    entradas: iterable de diccionarios con 'ruta' (en disco), 'nombre' (dentro del
+    ZIP), 'fecha' (date/datetime), 'tipo_mime' y 'sha256' (opcional). Al final se
+    agrega `manifiesto` (CSV) con nombre, fecha, tamaño y sha256 de cada entrada;
+    el sha256 se calcula mientras se comprime si no venía. Las entradas cuyo archivo
+    no existe figuran en el manifiesto como faltantes.
+    """
+    salida = SalidaEnBloques()
+    filas = [['nombre', 'fecha', 'bytes', 'sha256', 'estado']]
+    usados = set()
+    with zipfile.ZipFile(salida, 'w') as archivo_zip:
+        for entrada in entradas:
+            nombre = _nombre_unico(entrada['nombre'], usados)
+            fecha = entrada['fecha']
+            try:
+                origen = open(entrada['ruta'], 'rb')
+            except OSError:
+                filas.append([nombre, fecha.isoformat(), '', entrada.get('sha256') or '', 'faltante'])
+                continue
+            with origen:
+                info = zipfile.ZipInfo(nombre, date_time=(fecha.year, fecha.month, fecha.day, 0, 0, 0))
+                info.file_size = os.fstat(origen.fileno()).st_size  # decide si hace falta ZIP64
+                comprimido = not (entrada.get('tipo_mime') or '').startswith(SIN_COMPRIMIR)
+                info.compress_type = zipfile.ZIP_DEFLATED if comprimido else zipfile.ZIP_STORED
+                sha256 = hashlib.sha256()
+                with archivo_zip.open(info, 'w') as destino:
+                    for bloque in iter(lambda: origen.read(TAMANIO_BLOQUE), b''):
+                        sha256.update(bloque)
+                        destino.write(bloque)
+                        yield salida.vaciar()
+                estado = 'ok' if not entrada.get('sha256') or entrada['sha256'] == sha256.hexdigest() else 'sha256 distinto'
+                filas.append([nombre, fecha.isoformat(), info.file_size, sha256.hexdigest(), estado])
+            yield salida.vaciar()
+
+        texto = io.StringIO()
+        csv.writer(texto).writerows(filas)
+        archivo_zip.writestr(_nombre_unico(manifiesto, usados), texto.getvalue().encode('utf-8'), zipfile.ZIP_DEFLATED)
+    # Al cerrar se escribe el directorio central
+    yield salida.vaciar()
@@ -0,0 +1,109 @@
+"""
+Borrado de filas duplicadas según las restricciones de unicidad del modelo.
+
+Pensado para tablas de vínculo (ExpedientePersona, ExpedienteInstitucion, ...)
+que acumularon repetidos antes de tener su UniqueConstraint: dentro de cada
+grupo con los mismos valores se conserva la fila de menor id y el resto se
+borra con un solo DELETE, numerando las filas con
+
+    ROW_NUMBER() OVER (PARTITION BY <campos> ORDER BY id)
+
+Antes, las filas de otros modelos que apuntan a un duplicado (por ejemplo
+Internacion -> ExpedienteInstitucion) pasan a apuntar a la que se conserva,
+con un UPDATE por relación. Todo va directo a la base: no se emiten señales
+(lo que ellas invalidan queda a cargo de quien llama, ver borrar_duplicados).
+"""
+from django.db import connections, router
+from django.db.models import Count, F, UniqueConstraint, Window
+from django.db.models.functions import FirstValue, RowNumber
+
+
+class ErrorDuplicados(Exception):
+    pass
+
+
+def campos_unicos(modelo):
+    """Listas de campos de las UniqueConstraint (sin condición ni expresiones) y unique_together."""
+    grupos = [
+        list(restriccion.fields) for restriccion in modelo._meta.constraints
+        if isinstance(restriccion, UniqueConstraint) and restriccion.fields
+        and restriccion.condition is None and not restriccion.expressions
+    ]
+    grupos += [list(campos) for campos in modelo._meta.unique_together]
+    return grupos
+
+
+def relaciones(modelo):
+    """Los FK de otros modelos que apuntan a `modelo`."""
+    return [relacion for relacion in modelo._meta.related_objects if not relacion.many_to_many]
+
+
+def verificar(modelo):
+    """Lanza ErrorDuplicados si el modelo no se puede limpiar con borrar()."""
+    if not campos_unicos(modelo):
+        raise ErrorDuplicados(f"{modelo._meta.label} no tiene restricciones de unicidad por campos.")
+    muchos_a_muchos = [relacion.related_model._meta.label for relacion in modelo._meta.related_objects if relacion.many_to_many]
+    if muchos_a_muchos:
+        raise ErrorDuplicados(
+            f"{modelo._meta.label} está en relaciones muchos a muchos de {', '.join(muchos_a_muchos)}: "
+            "no se pueden reasignar con este comando."
+        )
+
+
+def duplicados(modelo, campos):
+    """Queryset de los pk a borrar: todos los del grupo menos el de menor id."""
+    return modelo._base_manager.annotate(
+        orden=Window(RowNumber(), partition_by=[F(campo) for campo in campos], order_by=F('pk').asc()),
+    ).filter(orden__gt=1).values('pk')
+
+
+def contar(modelo, campos):
+    """(grupos con duplicados, filas que se borrarían, {modelo: filas que apuntan a duplicados})."""
+    grupos = modelo._base_manager.values(*campos).annotate(filas=Count('pk')).filter(filas__gt=1)
+    referencias = {
+        relacion.related_model._meta.label: relacion.related_model._base_manager.filter(
+            **{f'{relacion.field.name}__in': duplicados(modelo, campos)}
+        ).count()
+        for relacion in relaciones(modelo)
+    }
+    return grupos.count(), duplicados(modelo, campos).count(), referencias
+
+
+def _conexion(modelo):
+    return connections[router.db_for_write(modelo)]
+
+
+def reasignar(modelo, campos):
+    """
+    Pasa las referencias a duplicados a la fila que se conserva, un UPDATE por
+    relación. Devuelve {modelo: filas actualizadas}.
+    """
+    conexion = _conexion(modelo)
+    quote = conexion.ops.quote_name
+    # id de cada fila -> id de la primera de su grupo
+    mapa, params = modelo._base_manager.annotate(
+        original=F('pk'),
+        conservado=Window(FirstValue('pk'), partition_by=[F(campo) for campo in campos], order_by=F('pk').asc()),
+    ).values('original', 'conservado').query.sql_with_params()
+    resultado = {}
+    with conexion.cursor() as cursor:
+        for relacion in relaciones(modelo):
+            tabla, columna = quote(relacion.related_model._meta.db_table), quote(relacion.field.column)
+            cursor.execute(
+                f'UPDATE {tabla} SET {columna} = mapa.conservado FROM ({mapa}) AS mapa '
+                f'WHERE {tabla}.{columna} = mapa.original AND mapa.original <> mapa.conservado',
+                params,
+            )
+            resultado[relacion.related_model._meta.label] = cursor.rowcount
+    return resultado
+
+
+def borrar(modelo, campos):
+    """Borra los duplicados con un solo DELETE. Devuelve la cantidad de filas borradas."""
+    conexion = _conexion(modelo)
+    sql, params = duplicados(modelo, campos).query.sql_with_params()
+    tabla = conexion.ops.quote_name(modelo._meta.db_table)
+    pk = conexion.ops.quote_name(modelo._meta.pk.column)
+    with conexion.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tabla} WHERE {pk} IN ({sql})', params)
+        return cursor.rowcount
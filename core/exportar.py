@@ -0,0 +1,235 @@
+"""
+Exportación de listados a CSV y XLSX armada en el servidor, mientras se envía.
+
+Las filas salen de queryset.values_list(...).iterator() (cursor del lado del
+servidor en PostgreSQL) y se escriben de a lotes en una StreamingHttpResponse:
+la memoria no depende de cuántas filas haya, y el navegador no tiene que
+recibir ni dibujar la tabla completa.
+
+El XLSX se escribe a mano (es un ZIP con unos pocos XML) con las celdas de
+texto en línea (inlineStr), así no hace falta la tabla de strings compartidos
+que obligaría a tener todos los textos en memoria. Las fechas se guardan como
+fechas de Excel. En el CSV los textos que empiezan con =, +, - o @ llevan un
+apóstrofo adelante para que Excel no los tome como fórmulas.
+"""
+import csv
+import datetime
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .descargas import SalidaEnBloques
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Filas por lote: cada lote es una lectura del cursor y un bloque de la respuesta
+TAMANIO_LOTE = 2000
+# Límite de Excel (1.048.576 filas, una es el encabezado)
+XLSX_FILAS_MAXIMAS = 1048575
+XLSX_TEXTO_MAXIMO = 32767
+
+_CONTROL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Un texto que empieza así Excel lo toma como fórmula (inyección de fórmulas en CSV)
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+_EPOCA_EXCEL = datetime.datetime(1899, 12, 30)
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_CONTENT_TYPES = _XML + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = _XML + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_WORKBOOK = _XML + (
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_WORKBOOK_RELS = _XML + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '<Relationship Id="rId2" Target="styles.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+    '</Relationships>'
+)
+# Estilos (cellXfs): 0 general, 1 fecha, 2 fecha y hora, 3 encabezado en negrita
+_ESTILO_FECHA, _ESTILO_FECHA_HORA, _ESTILO_ENCABEZADO = 1, 2, 3
+_STYLES = _XML + (
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+_HOJA_INICIO = _XML + (
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews><sheetData>'
+)
+_HOJA_FIN = '</sheetData></worksheet>'
+
+
+def _texto_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    if isinstance(valor, datetime.datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).isoformat(sep=' ', timespec='seconds')
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def filas_csv(encabezados, filas):
+    """Genera el CSV (UTF-8 con BOM, para que Excel respete los acentos) de a TAMANIO_LOTE filas."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow(encabezados)
+    pendientes = 0
+    for fila in filas:
+        escritor.writerow([_texto_csv(valor) for valor in fila])
+        pendientes += 1
+        if pendientes == TAMANIO_LOTE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _columna(indice):
+    """0 -> 'A', 25 -> 'Z', 26 -> 'AA'."""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+
+def _celda(referencia, valor, estilo=0):
+    if valor is None or valor == '':
+        return ''
+    if isinstance(valor, bool):
+        return f'<c r="{referencia}" t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c r="{referencia}"><v>{valor}</v></c>'
+    if isinstance(valor, datetime.datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.make_naive(valor)
+        serie = (valor - _EPOCA_EXCEL).total_seconds() / 86400
+        return f'<c r="{referencia}" s="{_ESTILO_FECHA_HORA}"><v>{serie}</v></c>'
+    if isinstance(valor, datetime.date):
+        serie = (valor - _EPOCA_EXCEL.date()).days
+        return f'<c r="{referencia}" s="{_ESTILO_FECHA}"><v>{serie}</v></c>'
+    texto = escape(_CONTROL.sub('', str(valor))[:XLSX_TEXTO_MAXIMO])
+    estilo = f' s="{estilo}"' if estilo else ''
+    return f'<c r="{referencia}" t="inlineStr"{estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xlsx(numero, letras, valores, estilo=0):
+    celdas = ''.join(_celda(f'{letra}{numero}', valor, estilo) for letra, valor in zip(letras, valores))
+    return f'<row r="{numero}">{celdas}</row>'
+
+
+def filas_xlsx(encabezados, filas, hoja='Datos'):
+    """
+    Genera un XLSX de una hoja de a TAMANIO_LOTE filas. Pasadas XLSX_FILAS_MAXIMAS
+    filas se corta (Excel no abriría el archivo).
+    """
+    salida = SalidaEnBloques()
+    letras = [_columna(i) for i in range(len(encabezados))]
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, contenido in (
+            ('[Content_Types].xml', _CONTENT_TYPES),
+            ('_rels/.rels', _RELS),
+            ('xl/workbook.xml', _WORKBOOK.format(hoja=escape(hoja[:31], {'"': '&quot;'}))),
+            ('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS),
+            ('xl/styles.xml', _STYLES),
+        ):
+            archivo.writestr(nombre, contenido)
+
+        with archivo.open('xl/worksheets/sheet1.xml', 'w') as destino:
+            lote = [_HOJA_INICIO, _fila_xlsx(1, letras, encabezados, _ESTILO_ENCABEZADO)]
+            for numero, fila in enumerate(filas, start=2):
+                if numero > XLSX_FILAS_MAXIMAS + 1:
+                    break
+                lote.append(_fila_xlsx(numero, letras, fila))
+                if len(lote) >= TAMANIO_LOTE:
+                    destino.write(''.join(lote).encode('utf-8'))
+                    lote = []
+                    yield salida.vaciar()
+            lote.append(_HOJA_FIN)
+            destino.write(''.join(lote).encode('utf-8'))
+    yield salida.vaciar()
+
+
+def filas_de_queryset(queryset, columnas):
+    """
+    Tuplas de valores de `columnas` ((encabezado, campo) o (encabezado, campo, formato))
+    leídas con values_list().iterator(); `formato` es una función que recibe el valor.
+    """
+    filas = queryset.values_list(*(columna[1] for columna in columnas)).iterator(chunk_size=TAMANIO_LOTE)
+    formatos = [(i, columna[2]) for i, columna in enumerate(columnas) if len(columna) > 2]
+    if not formatos:
+        return filas
+    return (_formatear(fila, formatos) for fila in filas)
+
+
+def _formatear(fila, formatos):
+    fila = list(fila)
+    for indice, formato in formatos:
+        fila[indice] = formato(fila[indice])
+    return fila
+
+
+def exportar_queryset(formato, nombre, queryset, columnas):
+    """
+    StreamingHttpResponse con `queryset` en `formato` ('csv' o 'xlsx'; 404 con otro).
+    El archivo se llama <nombre>_<fecha>.<formato>.
+    """
+    if formato not in FORMATOS:
+        raise Http404("Formato de exportación desconocido.")
+    encabezados = [columna[0] for columna in columnas]
+    filas = filas_de_queryset(queryset, columnas)
+    contenido = filas_csv(encabezados, filas) if formato == 'csv' else filas_xlsx(encabezados, filas, nombre)
+    respuesta = StreamingHttpResponse(contenido, content_type=FORMATOS[formato])
+    archivo = f"{nombre}_{timezone.localdate():%Y%m%d}.{formato}"
+    respuesta['Content-Disposition'] = content_disposition_header(True, archivo)
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
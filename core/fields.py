@@ -0,0 +1,129 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from django.urls import reverse
+
+from . import catalogos
+
+
+class CatalogoChoiceIterator(ModelChoiceIterator):
+    """Itera las opciones desde la cache del catálogo en lugar de consultar la base."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in catalogos.objetos(self.queryset):
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(catalogos.objetos(self.queryset)) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(catalogos.objetos(self.queryset))
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField para catálogos (ver core.catalogos.CATALOGOS): las opciones
+    y la validación del valor elegido salen de la cache, así que renderizar y
+    validar el campo no consulta la base mientras el catálogo no cambie.
+    """
+    iterator = CatalogoChoiceIterator
+
+    def __init__(self, queryset, **kwargs):
+        if queryset is not None and not catalogos.es_catalogo(queryset.model):
+            raise ValueError(
+                f"{queryset.model._meta.label} no está en core.catalogos.CATALOGOS: "
+                "sin señales que invaliden la cache, las opciones quedarían desactualizadas"
+            )
+        super().__init__(queryset, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        clave = self.to_field_name or 'pk'
+        if isinstance(value, self.queryset.model):
+            value = getattr(value, clave)
+        for obj in catalogos.objetos(self.queryset):
+            if str(getattr(obj, clave)) == str(value):
+                return obj
+        # No está en la cache: se deja que ModelChoiceField lo consulte y lo rechace
+        return super().to_python(value)
+
+
+class RemoteSelect(forms.Select):
+    """
+    Select que sólo renderiza la opción elegida: el resto las trae select2 por
+    AJAX desde `url` (nombre de una url que responde {'results': [{id, text}]}),
+    que se publica en el atributo data-url.
+    """
+
+    def __init__(self, attrs=None, url=None):
+        super().__init__(attrs)
+        self.url = url
+        self.seleccionados = {}  # {valor: objeto} ya resueltos por el campo
+
+    def __deepcopy__(self, memo):
+        obj = super().__deepcopy__(memo)
+        obj.seleccionados = {}
+        return obj
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        if self.url:
+            context['widget']['attrs']['data-url'] = reverse(self.url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # self.choices es el ModelChoiceIterator del campo: no se itera (sería
+        # leer la tabla entera), sólo se usan su queryset y su field
+        field = self.choices.field
+        valores = [str(v) for v in value if v not in (None, '')]
+        opciones = []
+        if field.empty_label is not None:
+            opciones.append(self.create_option(name, '', field.empty_label, not valores, 0))
+        for obj in self._objetos(field, valores):
+            valor, etiqueta = self.choices.choice(obj)
+            opciones.append(self.create_option(name, valor, etiqueta, True, len(opciones)))
+        return [(None, opciones, 0)] if opciones else []
+
+    def _objetos(self, field, valores):
+        faltan = [v for v in valores if v not in self.seleccionados]
+        if faltan:
+            clave = field.to_field_name or 'pk'
+            try:
+                for obj in field.queryset.filter(**{f'{clave}__in': faltan}):
+                    self.seleccionados[str(getattr(obj, clave))] = obj
+            except (ValueError, TypeError, ValidationError):
+                pass  # valor mal formado: el campo ya lo informa como error
+        return [self.seleccionados[v] for v in valores if v in self.seleccionados]
+
+
+class RemoteModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField para tablas grandes (personas, instituciones, expedientes):
+    valida el valor recibido con una sola consulta por clave primaria y el
+    widget (RemoteSelect) renderiza sólo la opción elegida, en lugar de volcar
+    la tabla completa en el HTML.
+    """
+    widget = RemoteSelect
+
+    def __init__(self, queryset, url=None, **kwargs):
+        super().__init__(queryset, **kwargs)
+        if url:
+            self.widget.url = url
+
+    def _recordar(self, obj):
+        if isinstance(self.widget, RemoteSelect):
+            self.widget.seleccionados[str(getattr(obj, self.to_field_name or 'pk'))] = obj
+
+    def prepare_value(self, value):
+        if isinstance(value, self.queryset.model):
+            self._recordar(value)
+        return super().prepare_value(value)
+
+    def to_python(self, value):
+        obj = super().to_python(value)
+        if obj is not None:
+            self._recordar(obj)
+        return obj
@@ -0,0 +1,600 @@
+"""
+Importación masiva de CSV y XLSX (personas, instituciones) de a lotes.
+
+El archivo se lee de a una fila (el CSV línea por línea, el XLSX con iterparse
+sobre la hoja dentro del ZIP) y las filas se procesan de a TAMANIO_LOTE:
+
+1. Los FK (tipo de documento, género, localidad, ...) se resuelven con
+   diccionarios {texto normalizado: pk} armados una sola vez al empezar.
+2. El resto de la fila se valida con las reglas de la app, sin los campos FK ni
+   las consultas por fila: el clean() de cada campo del formulario (armado una
+   sola vez) y las reglas de su clean() (Importacion.reglas()), sin instanciar
+   un formulario por fila.
+3. Las filas válidas del lote se guardan juntas (bulk_create / bulk_update)
+   en una transacción; las rechazadas van al informe de errores (un CSV con el
+   número de fila, los errores y los valores originales).
+
+Si una clave (el documento, en personas) se repite en el archivo queda la
+última fila. Las columnas que no vienen en el archivo no se tocan en los
+registros que ya existían.
+
+Desde el admin el archivo se guarda y se importa en un hilo aparte
+(programar()): el request termina enseguida y la página de la importación
+consulta su estado (un JSON junto al informe de errores) hasta que termina.
+"""
+import codecs
+import csv
+import datetime
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import iterparse
+
+from django import forms
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from .almacenamiento import CARPETA_TEMPORAL
+from .exportar import _EPOCA_EXCEL
+from .models import Localidad
+from .utils import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'xlsx')
+TAMANIO_LOTE = 1000
+CARPETA_INFORMES = 'importaciones'
+# Los informes de la página de admin se borran pasado este tiempo
+INFORMES_VENCIMIENTO_HORAS = 24
+
+# Valor de los diccionarios de catálogo cuando el texto corresponde a más de un registro
+AMBIGUO = object()
+
+_BOOLEANOS = {
+    **dict.fromkeys(('si', 's', 'true', 'verdadero', '1', 'x', 'activo'), True),
+    **dict.fromkeys(('no', 'n', 'false', 'falso', '0', 'inactivo'), False),
+}
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# Formatos de número de Excel que son fechas (los propios del archivo se miran en el código)
+_FORMATOS_FECHA = set(range(14, 23)) | set(range(45, 48))
+
+
+class ErrorImportacion(Exception):
+    """El archivo no se puede importar (formato, columnas obligatorias, codificación)."""
+
+
+# Lectura
+
+def filas_csv(archivo, encoding='utf-8-sig'):
+    """Listas de valores de un CSV binario; el separador (, ; o tabulación) sale del encabezado."""
+    lineas = codecs.iterdecode(archivo, encoding)
+    try:
+        primera = next(lineas, '')
+        separador = max(',;\t', key=primera.count)
+        yield from csv.reader(itertools.chain([primera], lineas), delimiter=separador)
+    except UnicodeDecodeError as error:
+        raise ErrorImportacion(f"El archivo no está en {encoding}: {error}.")
+
+
+def _texto_xml(elemento):
+    return ''.join(t.text or '' for t in elemento.iter(f'{_NS}t'))
+
+
+def _estilos_fecha(libro):
+    """Índices de cellXfs cuyo formato de número es una fecha."""
+    try:
+        contenido = libro.open('xl/styles.xml')
+    except KeyError:
+        return set()
+    propios, estilos = {}, []
+    with contenido:
+        for _, elemento in iterparse(contenido):
+            if elemento.tag == f'{_NS}numFmt':
+                codigo = elemento.get('formatCode', '').lower()
+                # Sin lo que va entre comillas o corchetes ("texto", [Red], [$-409])
+                codigo = ''.join(parte for i, parte in enumerate(codigo.replace('[', '"').replace(']', '"').split('"')) if i % 2 == 0)
+                propios[int(elemento.get('numFmtId'))] = any(letra in codigo for letra in 'dy')
+            elif elemento.tag == f'{_NS}cellXfs':
+                estilos = [int(xf.get('numFmtId', 0)) for xf in elemento.iter(f'{_NS}xf')]
+    return {i for i, formato in enumerate(estilos) if propios.get(formato, formato in _FORMATOS_FECHA)}
+
+
+def _hoja_principal(libro):
+    """Ruta dentro del ZIP de la primera hoja del libro."""
+    try:
+        with libro.open('xl/workbook.xml') as contenido:
+            hoja = next(e for _, e in iterparse(contenido) if e.tag == f'{_NS}sheet')
+        with libro.open('xl/_rels/workbook.xml.rels') as contenido:
+            for _, relacion in iterparse(contenido):
+                if relacion.get('Id') == hoja.get(f'{_NS_REL}id'):
+                    destino = relacion.get('Target').lstrip('/')
+                    return destino if destino.startswith('xl/') else f'xl/{destino}'
+    except (KeyError, StopIteration):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _columna(referencia):
+    """'B7' -> 1, 'AA3' -> 26."""
+    indice = 0
+    for letra in referencia:
+        if letra.isdigit():
+            break
+        indice = indice * 26 + ord(letra) - ord('A') + 1
+    return indice - 1
+
+
+def _valor_celda(celda, textos, fechas):
+    tipo = celda.get('t', 'n')
+    if tipo == 'inlineStr':
+        return _texto_xml(celda)
+    valor = celda.findtext(f'{_NS}v')
+    if valor is None or tipo == 'e':
+        return None
+    if tipo == 's':
+        return textos[int(valor)]
+    if tipo == 'b':
+        return valor == '1'
+    if tipo != 'n':
+        return valor
+    numero = float(valor)
+    if int(celda.get('s', 0)) in fechas:
+        fecha = _EPOCA_EXCEL + datetime.timedelta(days=numero)
+        return fecha.date() if numero.is_integer() else fecha
+    return int(numero) if numero.is_integer() else numero
+
+
+def filas_xlsx(archivo):
+    """
+    Listas de valores de la primera hoja de un XLSX. La hoja se recorre con
+    iterparse descartando cada fila ya leída; en memoria quedan solo los textos
+    compartidos (sharedStrings).
+    """
+    try:
+        libro = zipfile.ZipFile(archivo)
+    except zipfile.BadZipFile:
+        raise ErrorImportacion("El archivo no es un XLSX válido.")
+    with libro:
+        textos = []
+        if 'xl/sharedStrings.xml' in libro.namelist():
+            with libro.open('xl/sharedStrings.xml') as contenido:
+                for _, elemento in iterparse(contenido):
+                    if elemento.tag == f'{_NS}si':
+                        textos.append(_texto_xml(elemento))
+                        elemento.clear()
+        fechas = _estilos_fecha(libro)
+        try:
+            hoja = libro.open(_hoja_principal(libro))
+        except KeyError:
+            raise ErrorImportacion("El XLSX no tiene hojas.")
+        with hoja:
+            datos = None
+            for evento, elemento in iterparse(hoja, events=('start', 'end')):
+                if evento == 'start':
+                    if elemento.tag == f'{_NS}sheetData':
+                        datos = elemento
+                    continue
+                if elemento.tag != f'{_NS}row':
+                    continue
+                valores = {}
+                for posicion, celda in enumerate(elemento.iter(f'{_NS}c')):
+                    referencia = celda.get('r')
+                    valores[_columna(referencia) if referencia else posicion] = _valor_celda(celda, textos, fechas)
+                # Suelta las filas ya leídas (iterparse las sigue colgando de sheetData)
+                datos.clear()
+                yield [valores.get(i) for i in range(max(valores, default=-1) + 1)]
+
+
+def leer_archivo(archivo, nombre, encoding='utf-8-sig'):
+    """Filas (la primera es el encabezado) del CSV o XLSX según la extensión de `nombre`."""
+    extension = os.path.splitext(nombre)[1].lower().lstrip('.')
+    if extension == 'csv':
+        return filas_csv(archivo, encoding)
+    if extension == 'xlsx':
+        return filas_xlsx(archivo)
+    raise ErrorImportacion(f"Formato no soportado: se importan archivos {' o '.join(FORMATOS).upper()}.")
+
+
+# Catálogos
+
+def catalogo(pares):
+    """{texto normalizado: pk} de pares (texto, pk); un texto de varios registros queda AMBIGUO."""
+    resultado = {}
+    for texto, pk in pares:
+        clave = normalizar_texto(str(texto)) if texto is not None else ''
+        if clave:
+            resultado[clave] = pk if resultado.get(clave, pk) == pk else AMBIGUO
+    return resultado
+
+
+def catalogo_localidades():
+    """Localidades por nombre y por 'nombre, provincia' (para los nombres repetidos)."""
+    filas = list(Localidad.objects.values_list('pk', 'localidad', 'provincia__provincia'))
+    return catalogo(itertools.chain(
+        ((localidad, pk) for pk, localidad, _ in filas),
+        ((f'{localidad}, {provincia}', pk) for pk, localidad, provincia in filas if provincia),
+    ))
+
+
+# Informe de errores
+
+class InformeErrores:
+    """CSV con las filas rechazadas: número de fila, errores y los valores originales."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.cantidad = 0
+        self._encabezado = []
+        self._archivo = None
+        self._escritor = None
+
+    def encabezado(self, encabezado):
+        self._encabezado = encabezado
+
+    def agregar(self, numero, valores, errores):
+        if self._archivo is None:
+            # Se crea con el primer error: una importación sin errores no deja archivo
+            self._archivo = open(self.ruta, 'w', encoding='utf-8-sig', newline='')
+            self._escritor = csv.writer(self._archivo)
+            self._escritor.writerow(['fila', 'errores', *self._encabezado])
+        self._escritor.writerow([numero, ' | '.join(errores), *('' if v is None else v for v in valores)])
+        self.cantidad += 1
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+def carpeta_informes():
+    carpeta = os.path.join(settings.MEDIA_ROOT, CARPETA_TEMPORAL, CARPETA_INFORMES)
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def nuevo_informe():
+    """
+    (nombre, ruta) para el informe de errores de una importación desde el admin.
+    De paso borra lo vencido de importaciones anteriores (informes, estados, archivos).
+    """
+    limite = time.time() - INFORMES_VENCIMIENTO_HORAS * 3600
+    with os.scandir(carpeta_informes()) as entradas:
+        for entrada in entradas:
+            try:
+                if entrada.stat().st_mtime >= limite:
+                    continue
+                # Lo de una importación larga que sigue en curso (archivo subido y estado) no se toca
+                identificador = entrada.name.split('.', 1)[0]
+                if (estado_importacion(identificador) or {}).get('estado') == 'en curso':
+                    continue
+                os.remove(entrada.path)
+            except FileNotFoundError:
+                pass  # Lo borró otro proceso (otra limpieza o la importación que terminó)
+    nombre = f'{uuid.uuid4().hex}.csv'
+    return nombre, os.path.join(carpeta_informes(), nombre)
+
+
+# Importación
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def _booleano(valor):
+    return _BOOLEANOS.get(normalizar_texto(valor))
+
+
+class Importacion:
+    """
+    Base de las importaciones. La subclase define:
+
+    - form_class: el formulario de la app sin los FK (de él salen los campos).
+    - reglas(datos): las reglas del clean() del formulario.
+    - catalogos(): {campo FK: diccionario de catalogo()}.
+    - clave(instancia): lo que identifica al registro dentro del archivo.
+    - guardar(instancias, campos): guarda un lote; devuelve (creadas, actualizadas).
+    """
+    form_class = None
+    # Columnas que tiene que traer el archivo
+    columnas_obligatorias = ()
+
+    def __init__(self, informe, tamanio_lote=TAMANIO_LOTE):
+        self.informe = informe
+        self.tamanio_lote = tamanio_lote
+        self.modelo = self.form_class._meta.model
+        self.resumen = {'filas': 0, 'creadas': 0, 'actualizadas': 0, 'rechazadas': 0, 'repetidas': 0}
+
+    def reglas(self, datos):
+        """
+        Las reglas del formulario que miran más de un campo (su clean()) sobre los
+        datos ya limpios de una fila: puede cambiarlos y devuelve [(campo, mensaje)].
+        """
+        return []
+
+    def catalogos(self):
+        return {}
+
+    def clave(self, instancia):
+        raise NotImplementedError
+
+    def guardar(self, instancias, campos):
+        raise NotImplementedError
+
+    def _etiqueta(self, campo):
+        # Las del formulario de la app (Meta.labels también tiene las de los FK)
+        etiqueta = (self.form_class._meta.labels or {}).get(campo)
+        return str(etiqueta or self.modelo._meta.get_field(campo).verbose_name)
+
+    def _nombres_de_columna(self):
+        """{nombre normalizado: campo}: se acepta el nombre del campo o su etiqueta."""
+        nombres = {}
+        for campo in [*self.form_class.base_fields, *self._catalogos]:
+            for nombre in (campo, campo.replace('_', ' '), self._etiqueta(campo)):
+                nombres[normalizar_texto(nombre)] = campo
+        return nombres
+
+    def importar(self, filas):
+        """filas: listas de valores, la primera con el encabezado. Devuelve el resumen."""
+        self._catalogos = self.catalogos()
+        filas = iter(filas)
+        encabezado = [_texto(valor) for valor in next(filas, [])]
+        nombres = self._nombres_de_columna()
+        columnas = [nombres.get(normalizar_texto(nombre)) for nombre in encabezado]
+        faltan = [self._etiqueta(campo) for campo in self.columnas_obligatorias if campo not in columnas]
+        if faltan:
+            raise ErrorImportacion(f"Faltan columnas obligatorias: {', '.join(faltan)}.")
+        self._columnas = columnas
+        self._campos = [campo for campo in dict.fromkeys(columnas) if campo]
+        self._booleanos = {
+            campo: self.modelo._meta.get_field(campo).get_default()
+            for campo, field in self.form_class.base_fields.items() if isinstance(field, forms.BooleanField)
+        }
+        self._obligatorios = [campo for campo in self._catalogos if not self.modelo._meta.get_field(campo).blank]
+        # Los campos del formulario se copian una sola vez; cada fila solo llama a su clean()
+        self._campos_formulario = self.form_class().fields
+        self._con_defecto = {campo for campo in self._campos_formulario if self.modelo._meta.get_field(campo).has_default()}
+        self.informe.encabezado(encabezado)
+
+        lote = []
+        for numero, valores in enumerate(filas, start=2):
+            if all(_texto(valor) == '' for valor in valores):
+                continue
+            lote.append((numero, valores))
+            if len(lote) >= self.tamanio_lote:
+                self._procesar(lote)
+                lote = []
+        if lote:
+            self._procesar(lote)
+        return self.resumen
+
+    def _procesar(self, lote):
+        instancias = {}
+        for numero, valores in lote:
+            instancia, errores = self._validar(valores)
+            if errores:
+                self.informe.agregar(numero, valores, errores)
+                self.resumen['rechazadas'] += 1
+                continue
+            clave = self.clave(instancia)
+            if clave in instancias:
+                self.resumen['repetidas'] += 1
+            instancias[clave] = instancia
+        self.resumen['filas'] += len(lote)
+        if instancias:
+            with transaction.atomic():
+                creadas, actualizadas = self.guardar(list(instancias.values()), self._campos)
+            self.resumen['creadas'] += creadas
+            self.resumen['actualizadas'] += actualizadas
+
+    def _limpiar(self, datos, errores):
+        """
+        Los datos limpios de una fila: el clean() de cada campo del formulario y
+        después reglas(). Los mensajes van a `errores` con la etiqueta del campo.
+        """
+        limpios = {}
+        for campo, field in self._campos_formulario.items():
+            try:
+                limpios[campo] = field.clean(field.widget.value_from_datadict(datos, {}, campo))
+            except forms.ValidationError as error:
+                errores.extend(f"{self._etiqueta(campo)}: {mensaje}" for mensaje in error.messages)
+        for campo, mensaje in self.reglas(limpios):
+            limpios.pop(campo, None)
+            errores.append(f"{self._etiqueta(campo)}: {mensaje}" if campo else mensaje)
+        return limpios
+
+    def _validar(self, valores):
+        """(instancia sin guardar, []) o (None, errores) para una fila."""
+        # Los booleanos que no vienen en el archivo (o vienen vacíos) toman el valor por
+        # defecto del modelo: sin el dato, el CheckboxInput del formulario daría False
+        datos, relacionados, errores, con_error = dict(self._booleanos), {}, [], set()
+        for campo, valor in zip(self._columnas, valores):
+            if campo is None:
+                continue
+            if isinstance(valor, (datetime.date, bool)):
+                datos[campo] = valor
+                continue
+            texto = _texto(valor)
+            if campo in self._catalogos:
+                pk = self._catalogos[campo].get(normalizar_texto(texto)) if texto else None
+                if pk is AMBIGUO:
+                    errores.append(f"{self._etiqueta(campo)}: «{texto}» corresponde a más de un registro.")
+                    con_error.add(campo)
+                elif texto and pk is None:
+                    errores.append(f"{self._etiqueta(campo)}: «{texto}» no existe.")
+                    con_error.add(campo)
+                elif pk is not None:
+                    relacionados[campo] = pk
+            elif campo in self._booleanos:
+                if texto:
+                    datos[campo] = _booleano(texto)
+                    if datos[campo] is None:
+                        errores.append(f"{self._etiqueta(campo)}: «{texto}» no es Sí o No.")
+            else:
+                datos[campo] = texto
+        for campo in self._obligatorios:
+            if campo not in relacionados and campo not in con_error:
+                errores.append(f"{self._etiqueta(campo)}: este campo es obligatorio.")
+
+        limpios = self._limpiar(datos, errores)
+        if errores:
+            return None, errores
+        # Como un ModelForm: los campos con valor por defecto que no vienen quedan con el del modelo
+        instancia = self.modelo(**{
+            campo: valor for campo, valor in limpios.items() if campo in datos or campo not in self._con_defecto
+        })
+        for campo, pk in relacionados.items():
+            setattr(instancia, self.modelo._meta.get_field(campo).attname, pk)
+        return instancia, []
+
+
+def importar_archivo(importacion, archivo, nombre, ruta_informe, encoding='utf-8-sig', tamanio_lote=TAMANIO_LOTE):
+    """
+    Importa `archivo` (binario, abierto) con la clase `importacion`. Devuelve el
+    resumen con 'informe': la ruta del CSV de errores, o None si no hubo.
+    """
+    informe = InformeErrores(ruta_informe)
+    try:
+        resumen = importacion(informe, tamanio_lote).importar(leer_archivo(archivo, nombre, encoding))
+    finally:
+        informe.cerrar()
+    return {**resumen, 'informe': ruta_informe if informe.cantidad else None}
+
+
+# Importación en segundo plano (página del admin)
+
+_pool = None
+_pid = None
+_lock = threading.Lock()
+_pendientes = set()
+
+
+def _obtener_pool():
+    global _pool, _pid
+    with _lock:
+        # Después de un fork (gunicorn) los hilos del padre no existen en el hijo
+        if _pool is None or _pid != os.getpid():
+            # Un solo hilo: dos importaciones a la vez solo competirían por la base
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='importar')
+            _pid = os.getpid()
+            _pendientes.clear()
+        return _pool
+
+
+def _ruta_estado(identificador):
+    return os.path.join(carpeta_informes(), f'{identificador}.json')
+
+
+def _guardar_estado(identificador, estado):
+    # Temporal y os.replace: la página nunca lee un JSON a medio escribir
+    ruta = _ruta_estado(identificador)
+    with open(f'{ruta}.tmp', 'w', encoding='utf-8') as archivo:
+        json.dump(estado, archivo)
+    os.replace(f'{ruta}.tmp', ruta)
+
+
+def estado_importacion(identificador):
+    """{'estado': 'en curso' | 'terminada' | 'error', ...} de una importación de programar(), o None."""
+    try:
+        with open(_ruta_estado(os.path.basename(identificador)), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def _importar_en_segundo_plano(importacion, identificador, ruta_archivo, nombre, encoding):
+    ruta_informe = os.path.join(carpeta_informes(), f'{identificador}.csv')
+    try:
+        with open(ruta_archivo, 'rb') as archivo:
+            resumen = importar_archivo(importacion, archivo, nombre, ruta_informe, encoding)
+        resumen['informe'] = os.path.basename(resumen['informe']) if resumen['informe'] else None
+        estado = {'estado': 'terminada', 'resumen': resumen}
+    except ErrorImportacion as error:
+        estado = {'estado': 'error', 'error': str(error)}
+    except Exception:
+        logger.exception("Falló la importación %s (%s)", identificador, nombre)
+        estado = {'estado': 'error', 'error': "Error inesperado al importar el archivo."}
+    finally:
+        try:
+            os.remove(ruta_archivo)
+        except FileNotFoundError:
+            pass  # Ya lo borró la limpieza de nuevo_informe()
+        connection.close()
+    _guardar_estado(identificador, estado)
+
+
+def programar(importacion, archivo, encoding='utf-8-sig'):
+    """
+    Guarda `archivo` (un UploadedFile) en carpeta_informes() y lo importa en un
+    hilo aparte. Devuelve el identificador para estado_importacion().
+    """
+    informe, _ = nuevo_informe()
+    identificador = os.path.splitext(informe)[0]
+    ruta_archivo = os.path.join(carpeta_informes(), f'{identificador}.subida')
+    with open(ruta_archivo, 'wb') as destino:
+        for bloque in archivo.chunks():
+            destino.write(bloque)
+    _guardar_estado(identificador, {'estado': 'en curso'})
+    futuro = _obtener_pool().submit(
+        _importar_en_segundo_plano, importacion, identificador, ruta_archivo, archivo.name, encoding,
+    )
+    with _lock:
+        _pendientes.add(futuro)
+    futuro.add_done_callback(_terminado)
+    return identificador
+
+
+def _terminado(futuro):
+    with _lock:
+        _pendientes.discard(futuro)
+
+
+def esperar():
+    """Espera a que terminen las importaciones programadas (tests)."""
+    with _lock:
+        pendientes = list(_pendientes)
+    for futuro in pendientes:
+        futuro.result()
+
+
+class ComandoImportacion(BaseCommand):
+    """Base de los comandos importar_*: la subclase define `importacion` y `help`."""
+    importacion = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="CSV o XLSX; la primera fila tiene los nombres de las columnas")
+        parser.add_argument('--errores', default=None,
+                            help="CSV con las filas rechazadas (por defecto <archivo>.errores.csv)")
+        parser.add_argument('--encoding', default='utf-8-sig',
+                            help="Codificación del CSV (cp1252 si lo guardó Excel en Windows)")
+        parser.add_argument('--lote', type=int, default=TAMANIO_LOTE, help="Filas por lote")
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        inicio = time.perf_counter()
+        try:
+            with open(ruta, 'rb') as archivo:
+                resumen = importar_archivo(
+                    self.importacion, archivo, ruta, options['errores'] or f'{ruta}.errores.csv',
+                    options['encoding'], options['lote'],
+                )
+        except (ErrorImportacion, OSError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Filas: {resumen['filas']}. Creadas: {resumen['creadas']}, actualizadas: {resumen['actualizadas']}, "
+            f"rechazadas: {resumen['rechazadas']}, repetidas: {resumen['repetidas']} "
+            f"({time.perf_counter() - inicio:.1f} s)."
+        ))
+        if resumen['informe']:
+            self.stdout.write(self.style.WARNING(f"Filas rechazadas en {resumen['informe']}"))
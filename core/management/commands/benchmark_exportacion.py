@@ -0,0 +1,73 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.exportar import exportar_queryset
+from core.models import Tipo_Documento
+from persona.models import Persona
+from persona.views import PERSONA_EXPORTAR
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta personas sintéticas a CSV y XLSX con core.exportar y mide tiempo y pico de "
+        "memoria con un 10% y con el total de las filas; los datos se descartan al terminar"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=1000000)
+
+    def handle(self, *args, **options):
+        cantidad = options['cantidad']
+        try:
+            with transaction.atomic():
+                self._crear_personas(cantidad)
+                personas = Persona.objects.filter(numero_documento__startswith='BENCH').order_by('id')
+                for formato in ('csv', 'xlsx'):
+                    for filas in (cantidad // 10, cantidad):
+                        self._medir(formato, personas[:filas], filas)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _crear_personas(self, cantidad):
+        tipo, _ = Tipo_Documento.objects.get_or_create(tipo_documento='DNI')
+        lote = []
+        for i in range(cantidad):
+            lote.append(Persona(
+                tipo_documento=tipo,
+                numero_documento=f'BENCH{10000000 + i}',
+                nombre=f'Nombre {i % 997}',
+                apellido=f'Apellido {i % 7919}',
+                email=f'persona{i}@ejemplo.com',
+                telefono=f'342{i:07d}',
+                estado=i % 10 != 0,
+            ))
+            if len(lote) == 5000:
+                Persona.objects.bulk_create(lote)
+                lote = []
+        Persona.objects.bulk_create(lote)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE persona_persona')
+        self.stdout.write(f"{cantidad} personas creadas.")
+
+    def _medir(self, formato, queryset, filas):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        total = 0
+        for bloque in exportar_queryset(formato, 'personas', queryset, PERSONA_EXPORTAR).streaming_content:
+            total += len(bloque)
+        segundos = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{formato:<5} {filas:>9} filas   {total / 2**20:8.1f} MB   {segundos:7.2f} s   "
+            f"pico de memoria {pico / 2**20:6.2f} MB"
+        )
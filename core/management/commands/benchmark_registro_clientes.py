@@ -0,0 +1,74 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from core import buffer_logs
+from core.middleware import RegistrarClienteMiddleware
+
+UA_EJEMPLO = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide cuánto agrega RegistrarClienteMiddleware a cada request según CLIENTE_LOG_MODO"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cantidad = options['requests']
+        factory = RequestFactory()
+        middleware = RegistrarClienteMiddleware(lambda request: HttpResponse())
+
+        for modo in ('sincronico', 'buffer', 'archivo'):
+            # Buffer propio que nunca llega a volcarse: el hilo de fondo usa su
+            # propia conexión y sus INSERT no se desharían con el rollback
+            original = buffer_logs.buffer_cliente_log
+            buffer_logs.buffer_cliente_log = buffer_logs.BufferClienteLog(
+                tamanio_lote=cantidad + 1, intervalo=3600, capacidad=cantidad + 1,
+            )
+            try:
+                with tempfile.TemporaryDirectory() as directorio, override_settings(
+                    CLIENTE_LOG_MODO=modo,
+                    CLIENTE_LOG_ARCHIVO=os.path.join(directorio, 'spool.jsonl'),
+                ):
+                    tiempos = self._medir(factory, middleware, cantidad)
+            finally:
+                buffer_logs.buffer_cliente_log.descartar()
+                buffer_logs.buffer_cliente_log = original
+            self.stdout.write(
+                f"{modo:<11} media {statistics.mean(tiempos):7.3f} ms   "
+                f"p95 {self._p95(tiempos):7.3f} ms"
+            )
+
+    def _medir(self, factory, middleware, cantidad):
+        tiempos = []
+        try:
+            # Lo insertado en modo sincrónico se descarta al final
+            with transaction.atomic():
+                for i in range(cantidad):
+                    request = factory.get(f'/expediente/{i}/', HTTP_USER_AGENT=UA_EJEMPLO)
+                    inicio = time.perf_counter()
+                    middleware(request)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                raise _Rollback
+        except _Rollback:
+            pass
+        return tiempos
+
+    @staticmethod
+    def _p95(tiempos):
+        ordenados = sorted(tiempos)
+        return ordenados[int(len(ordenados) * 0.95) - 1]
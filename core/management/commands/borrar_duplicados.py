@@ -0,0 +1,61 @@
+from functools import partial
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.duplicados import ErrorDuplicados, borrar, campos_unicos, contar, duplicados, reasignar, verificar
+from expediente import detalle
+
+# Las tablas de vínculo que limpiaban scripts/cleanup_dup_*.py
+MODELOS_POR_DEFECTO = ['expediente.ExpedientePersona', 'expediente.ExpedienteInstitucion']
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las filas repetidas según las UniqueConstraint del modelo (core.duplicados), "
+        "conservando la de menor id de cada grupo, con un solo DELETE por restricción; "
+        "lo que apuntaba a un duplicado pasa a apuntar a la fila conservada"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('modelos', nargs='*',
+                            help=f"app_label.Modelo (por defecto {', '.join(MODELOS_POR_DEFECTO)})")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa cuántos duplicados hay")
+
+    def handle(self, *args, **options):
+        try:
+            modelos = [apps.get_model(nombre) for nombre in options['modelos'] or MODELOS_POR_DEFECTO]
+            for modelo in modelos:
+                verificar(modelo)
+        except (LookupError, ValueError, ErrorDuplicados) as error:
+            raise CommandError(str(error))
+
+        referencia = "apuntan a duplicados" if options['dry_run'] else "reasignadas a la fila conservada"
+        total = 0
+        for modelo in modelos:
+            con_expediente = any(campo.name == 'expediente' for campo in modelo._meta.concrete_fields)
+            # Todo el modelo en una transacción: o quedan todas sus restricciones limpias o ninguna
+            with transaction.atomic():
+                borradas, expedientes = 0, set()
+                for campos in campos_unicos(modelo):
+                    grupos, filas, referencias = contar(modelo, campos)
+                    if filas and not options['dry_run']:
+                        if con_expediente:
+                            expedientes.update(duplicados(modelo, campos).values_list('expediente_id', flat=True))
+                        referencias = reasignar(modelo, campos)
+                        filas = borrar(modelo, campos)
+                        borradas += filas
+                    total += filas
+                    self.stdout.write(f"{modelo._meta.label} ({', '.join(campos)}): {grupos} grupos, {filas} filas duplicadas")
+                    for etiqueta, cantidad in referencias.items():
+                        if cantidad:
+                            self.stdout.write(f"    {etiqueta}: {cantidad} filas {referencia}")
+                # El SQL directo no emite las señales que invalidan el detalle cacheado de los
+                # expedientes: los de las filas borradas (las reasignadas son de los mismos) o todos
+                if expedientes:
+                    transaction.on_commit(partial(detalle.invalidar, *expedientes))
+                elif borradas and not con_expediente:
+                    transaction.on_commit(detalle.invalidar_todos)
+        accion = "a borrar" if options['dry_run'] else "borradas"
+        self.stdout.write(self.style.SUCCESS(f"Filas duplicadas {accion}: {total}."))
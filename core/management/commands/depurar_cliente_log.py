@@ -0,0 +1,156 @@
+import gzip
+import json
+import os
+import shutil
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import ClienteLog, ClienteLogDiario
+from core.utils import _resolver_urls, url_sin_query
+
+# Pensado para correr todas las noches desde cron, por ejemplo:
+#   30 3 * * * cd /var/www/salud_mental && venv/bin/python manage.py depurar_cliente_log
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume en ClienteLogDiario los ClienteLog más viejos que la retención, "
+        "los archiva en JSONL comprimido (un archivo por día) y los borra"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.CLIENTE_LOG_RETENCION_DIAS,
+                            help="Días de registros detallados que se conservan")
+        parser.add_argument('--lote', type=int, default=5000, help="Registros por lote al archivar y borrar")
+        parser.add_argument('--directorio', default=settings.CLIENTE_LOG_ARCHIVO_DIR,
+                            help="Carpeta de los archivos .jsonl.gz")
+        parser.add_argument('--sin-archivo', action='store_true',
+                            help="Borra los registros sin archivarlos (el resumen diario se genera igual)")
+        parser.add_argument('--dry-run', action='store_true', help="Sólo informa qué días se procesarían")
+
+    def handle(self, *args, **options):
+        limite = timezone.localdate() - timedelta(days=options['dias'])
+        viejos = ClienteLog.objects.filter(fecha__lt=self._inicio(limite))
+        dias = list(
+            viejos.annotate(dia=TruncDate('fecha'))
+            .values_list('dia', flat=True)
+            .distinct()
+            .order_by('dia')
+        )
+        if not dias:
+            self.stdout.write("No hay registros para depurar.")
+            return
+
+        if not options['sin_archivo']:
+            os.makedirs(options['directorio'], exist_ok=True)
+
+        total = 0
+        for dia in dias:
+            registros = ClienteLog.objects.filter(fecha__gte=self._inicio(dia), fecha__lt=self._inicio(dia + timedelta(days=1)))
+            if options['dry_run']:
+                self.stdout.write(f"{dia}: {registros.count()} registros")
+                continue
+
+            ruta = None if options['sin_archivo'] else os.path.join(
+                options['directorio'], f"cliente_log_{dia.isoformat()}.jsonl.gz"
+            )
+            # Un día por transacción: el resumen, el archivo y el borrado quedan consistentes
+            try:
+                with transaction.atomic():
+                    self._resumir(dia, registros)
+                    cantidad = self._archivar_y_borrar(registros, ruta, options['lote'])
+            except Exception:
+                if ruta and os.path.exists(ruta + '.tmp'):
+                    os.remove(ruta + '.tmp')
+                raise
+            total += cantidad
+            self.stdout.write(f"{dia}: {cantidad} registros depurados")
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Registros depurados: {total}."))
+
+    @staticmethod
+    def _inicio(dia):
+        return timezone.make_aware(datetime.combine(dia, time.min))
+
+    def _resumir(self, dia, registros):
+        """
+        Suma las visitas del día a ClienteLogDiario (si el día ya se había resumido, acumula).
+        Se agrupa por la url sin query string: '/personas/?page=2' cuenta como '/personas/'.
+        """
+        visitas = Counter()
+        for fila in registros.values('usuario_id', 'url__url', 'ip').annotate(visitas=Count('id')).order_by():
+            visitas[fila['usuario_id'], url_sin_query(fila['url__url']), fila['ip']] += fila['visitas']
+        urls = _resolver_urls({url for _, url, _ in visitas})
+
+        existentes = {
+            (resumen.usuario_id, resumen.url_id, resumen.ip): resumen
+            for resumen in ClienteLogDiario.objects.select_for_update().filter(dia=dia)
+        }
+        nuevos, actualizados = [], []
+        for (usuario_id, url, ip), cantidad in visitas.items():
+            clave = (usuario_id, urls[url], ip)
+            if clave in existentes:
+                existentes[clave].visitas += cantidad
+                actualizados.append(existentes[clave])
+            else:
+                nuevos.append(ClienteLogDiario(dia=dia, usuario_id=usuario_id, url_id=urls[url], ip=ip, visitas=cantidad))
+        ClienteLogDiario.objects.bulk_create(nuevos, batch_size=1000)
+        ClienteLogDiario.objects.bulk_update(actualizados, ['visitas'], batch_size=1000)
+
+    def _archivar_y_borrar(self, registros, ruta, lote):
+        archivo = gzip.open(ruta + '.tmp', 'wt', encoding='utf-8') if ruta else None
+        cantidad = 0
+        ultimo_id = 0
+        try:
+            while True:
+                bloque = list(
+                    registros.filter(id__gt=ultimo_id)
+                    .select_related('user_agent', 'url', 'referer')
+                    .order_by('id')[:lote]
+                )
+                if not bloque:
+                    break
+                if archivo:
+                    for log in bloque:
+                        archivo.write(json.dumps({
+                            'id': log.id,
+                            'fecha': log.fecha.isoformat(),
+                            'usuario_id': log.usuario_id,
+                            'ip': log.ip,
+                            'user_agent': log.user_agent.user_agent,
+                            'navegador': log.user_agent.navegador,
+                            'sistema_operativo': log.user_agent.sistema_operativo,
+                            'url': log.url.url,
+                            'referer': log.referer.url if log.referer_id else None,
+                        }, ensure_ascii=False) + '\n')
+                ultimo_id = bloque[-1].id
+                ClienteLog.objects.filter(id__in=[log.id for log in bloque]).delete()
+                cantidad += len(bloque)
+        finally:
+            if archivo:
+                archivo.close()
+
+        if ruta:
+            # El archivo definitivo se escribe recién cuando se confirma el borrado
+            transaction.on_commit(lambda: self._publicar(ruta))
+        return cantidad
+
+    @staticmethod
+    def _publicar(ruta):
+        temporal = ruta + '.tmp'
+        if not os.path.exists(ruta):
+            os.replace(temporal, ruta)
+            return
+        # Registros que llegaron tarde para un día ya archivado: gzip admite
+        # concatenar miembros, así que se agregan al final del mismo archivo
+        with open(ruta, 'ab') as destino, open(temporal, 'rb') as origen:
+            shutil.copyfileobj(origen, destino)
+        os.remove(temporal)
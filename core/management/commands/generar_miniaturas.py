@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from core import miniaturas
+from core.almacenamiento import datos_archivo
+from expediente.models import ExpedienteDocumento
+from usuario.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las miniaturas que falten de los documentos de imagen y de las fotos de perfil "
+        "(las cargadas antes de core.miniaturas o si se borró la carpeta)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Hilos para generar las miniaturas")
+        parser.add_argument('--lote', type=int, default=500, help="Filas por consulta")
+
+    def handle(self, *args, **options):
+        self.options = options
+        documentos = (
+            ExpedienteDocumento.objects.filter(tipo_mime__startswith='image/').exclude(sha256='')
+            .exclude(tipo_mime__in=miniaturas.TIPOS_SIN_MINIATURA)
+            .order_by('sha256').values_list('archivo', 'sha256').distinct()
+            .iterator(chunk_size=options['lote'])
+        )
+        storage = ExpedienteDocumento._meta.get_field('archivo').storage
+        total = self._generar(
+            ((storage, nombre, sha256, ExpedienteDocumento.CARPETA_MINIATURAS) for nombre, sha256 in documentos)
+        )
+        self.stdout.write(f"Documentos: {total} miniaturas generadas.")
+
+        total = self._generar(self._fotos_de_perfil())
+        self.stdout.write(self.style.SUCCESS(f"Fotos de perfil: {total} miniaturas generadas."))
+
+    def _fotos_de_perfil(self):
+        usuarios = CustomUser.objects.exclude(foto_perfil='').exclude(foto_perfil__isnull=True)
+        for usuario in usuarios.only('pk', 'foto_perfil', 'foto_perfil_sha256').iterator(chunk_size=self.options['lote']):
+            storage = usuario.foto_perfil.storage
+            if not storage.exists(usuario.foto_perfil.name):
+                self.stdout.write(self.style.WARNING(f"Usuario {usuario.pk}: no existe {usuario.foto_perfil.name}"))
+                continue
+            if not usuario.foto_perfil_sha256:
+                with storage.open(usuario.foto_perfil.name, 'rb') as contenido:
+                    usuario.foto_perfil_sha256 = datos_archivo(File(contenido))[0]
+                CustomUser.objects.filter(pk=usuario.pk).update(foto_perfil_sha256=usuario.foto_perfil_sha256)
+            yield storage, usuario.foto_perfil.name, usuario.foto_perfil_sha256, CustomUser.CARPETA_MINIATURAS
+
+    def _generar(self, trabajos):
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.options['workers']) as pool:
+            # Por lotes, para no encolar de golpe una tarea por cada fila
+            while lote := list(islice(trabajos, self.options['lote'])):
+                for trabajo, resultado in zip(lote, pool.map(self._generar_uno, lote)):
+                    if resultado is None:
+                        self.stdout.write(self.style.ERROR(f"No se pudo procesar {trabajo[1]}"))
+                    else:
+                        total += len(resultado)
+        return total
+
+    @staticmethod
+    def _generar_uno(trabajo):
+        try:
+            return miniaturas.generar(*trabajo)
+        except Exception:
+            return None
@@ -0,0 +1,56 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import ClienteLog
+from core.utils import construir_clientes_log
+
+# Claves que escribe core.utils.datos_cliente en cada línea del spool
+CAMPOS = ('usuario_id', 'ip', 'user_agent', 'url', 'referer')
+
+
+class Command(BaseCommand):
+    help = "Importa en bloque el archivo de spool de ClienteLog (CLIENTE_LOG_MODO='archivo')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', default=None, help="Ruta del spool (por defecto settings.CLIENTE_LOG_ARCHIVO)")
+        parser.add_argument('--lote', type=int, default=1000, help="Registros por bulk_create")
+
+    def handle(self, *args, **options):
+        ruta = options['archivo'] or settings.CLIENTE_LOG_ARCHIVO
+        procesando = ruta + '.procesando'
+
+        # Si quedó un archivo de una corrida anterior interrumpida se importa primero.
+        # Si no, se renombra el spool: los workers siguen escribiendo en uno nuevo.
+        if not os.path.exists(procesando):
+            if not os.path.exists(ruta):
+                self.stdout.write("No hay registros para importar.")
+                return
+            os.replace(ruta, procesando)
+
+        importados = invalidas = 0
+        lote = []
+        with open(procesando, encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    datos = json.loads(linea)
+                except ValueError:
+                    datos = None
+                if not isinstance(datos, dict) or any(campo not in datos for campo in CAMPOS):
+                    invalidas += 1
+                    continue
+                lote.append(datos)
+                if len(lote) >= options['lote']:
+                    ClienteLog.objects.bulk_create(construir_clientes_log(lote))
+                    importados += len(lote)
+                    lote = []
+        if lote:
+            ClienteLog.objects.bulk_create(construir_clientes_log(lote))
+            importados += len(lote)
+
+        os.remove(procesando)
+        self.stdout.write(self.style.SUCCESS(
+            f"Registros importados: {importados}, líneas inválidas: {invalidas}."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.busqueda import INDEXADOS, reindexar
+
+
+class Command(BaseCommand):
+    help = "Reconstruye DocumentoBusqueda (búsqueda unificada) a partir de las entidades buscables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipos', nargs='*', help=f"Tipos a reindexar: {', '.join(INDEXADOS)} (por defecto todos)")
+
+    def handle(self, *args, **options):
+        desconocidos = set(options['tipos']) - set(INDEXADOS)
+        if desconocidos:
+            raise CommandError(f"Tipos desconocidos: {', '.join(sorted(desconocidos))}")
+        for tipo in options['tipos'] or INDEXADOS:
+            # Cada tipo en una transacción: mientras se reconstruye, la búsqueda ve el índice anterior
+            with transaction.atomic():
+                cantidad = reindexar(tipo)
+            self.stdout.write(f"{tipo}: {cantidad} documentos")
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda actualizado."))
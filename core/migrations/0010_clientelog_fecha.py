@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_auto_20250820_2030'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clientelog',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,76 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_clientelog_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UrlPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=40, unique=True)),
+                ('url', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'URL',
+                'verbose_name_plural': 'URLs',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=40, unique=True)),
+                ('user_agent', models.TextField()),
+                ('navegador', models.CharField(max_length=255)),
+                ('sistema_operativo', models.CharField(max_length=255)),
+            ],
+            options={
+                'verbose_name': 'User agent',
+                'verbose_name_plural': 'User agents',
+            },
+        ),
+        # Las columnas de texto se vuelven nulas (0013 las quita); así al revertir
+        # 0013 se pueden volver a agregar y 0012 las completa
+        migrations.AlterField(
+            model_name='clientelog',
+            name='navegador',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='clientelog',
+            name='sistema_operativo',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='clientelog',
+            name='user_agent',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='clientelog',
+            name='url',
+            field=models.URLField(max_length=500, null=True),
+        ),
+        # Columnas nuevas, nulas hasta que 0012 copie los datos
+        migrations.AddField(
+            model_name='clientelog',
+            name='user_agent_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='logs', to='core.useragent'),
+        ),
+        migrations.AddField(
+            model_name='clientelog',
+            name='url_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='logs', to='core.urlpath'),
+        ),
+        migrations.AddField(
+            model_name='clientelog',
+            name='referer_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='logs_referer', to='core.urlpath'),
+        ),
+    ]
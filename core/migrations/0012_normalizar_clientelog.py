@@ -0,0 +1,95 @@
+import hashlib
+
+from django.db import migrations, transaction
+
+# Filas de ClienteLog por transacción
+TAMANIO_LOTE = 5000
+
+
+def _hash(texto):
+    return hashlib.sha1(texto.encode('utf-8', 'replace')).hexdigest()
+
+
+def _resolver(modelo, valores, crear):
+    """{valor: id} para los valores dados, creando las filas que falten."""
+    por_hash = {_hash(valor): valor for valor in valores}
+    ids = dict(modelo.objects.filter(hash__in=por_hash).values_list('hash', 'id'))
+    nuevos = [crear(clave, valor) for clave, valor in por_hash.items() if clave not in ids]
+    if nuevos:
+        modelo.objects.bulk_create(nuevos, ignore_conflicts=True)
+        ids.update(modelo.objects.filter(hash__in=[n.hash for n in nuevos]).values_list('hash', 'id'))
+    return {valor: ids[clave] for clave, valor in por_hash.items()}
+
+
+def normalizar(apps, schema_editor):
+    ClienteLog = apps.get_model('core', 'ClienteLog')
+    UserAgent = apps.get_model('core', 'UserAgent')
+    UrlPath = apps.get_model('core', 'UrlPath')
+
+    ultimo_id = 0
+    while True:
+        # Cada lote en su propia transacción: la tabla puede tener millones de filas
+        with transaction.atomic():
+            lote = list(
+                ClienteLog.objects
+                .filter(id__gt=ultimo_id)
+                .order_by('id')
+                .only('id', 'user_agent', 'navegador', 'sistema_operativo', 'url', 'referer')[:TAMANIO_LOTE]
+            )
+            if not lote:
+                break
+
+            # navegador y sistema operativo ya estaban parseados en cada fila: se toman de ahí
+            parseados = {log.user_agent: (log.navegador, log.sistema_operativo) for log in lote}
+            user_agents = _resolver(UserAgent, parseados, lambda clave, ua: UserAgent(
+                hash=clave, user_agent=ua, navegador=parseados[ua][0], sistema_operativo=parseados[ua][1],
+            ))
+            urls = _resolver(
+                UrlPath,
+                {log.url for log in lote} | {log.referer for log in lote if log.referer},
+                lambda clave, url: UrlPath(hash=clave, url=url),
+            )
+
+            for log in lote:
+                log.user_agent_ref_id = user_agents[log.user_agent]
+                log.url_ref_id = urls[log.url]
+                log.referer_ref_id = urls[log.referer] if log.referer else None
+            ClienteLog.objects.bulk_update(lote, ['user_agent_ref', 'url_ref', 'referer_ref'])
+            ultimo_id = lote[-1].id
+
+
+def desnormalizar(apps, schema_editor):
+    ClienteLog = apps.get_model('core', 'ClienteLog')
+
+    ultimo_id = 0
+    while True:
+        with transaction.atomic():
+            lote = list(
+                ClienteLog.objects
+                .filter(id__gt=ultimo_id)
+                .order_by('id')
+                .select_related('user_agent_ref', 'url_ref', 'referer_ref')[:TAMANIO_LOTE]
+            )
+            if not lote:
+                break
+            for log in lote:
+                log.user_agent = log.user_agent_ref.user_agent
+                log.navegador = log.user_agent_ref.navegador
+                log.sistema_operativo = log.user_agent_ref.sistema_operativo
+                log.url = log.url_ref.url
+                log.referer = log.referer_ref.url if log.referer_ref_id else None
+            ClienteLog.objects.bulk_update(lote, ['user_agent', 'navegador', 'sistema_operativo', 'url', 'referer'])
+            ultimo_id = lote[-1].id
+
+
+class Migration(migrations.Migration):
+    # Sin transacción global: cada lote se confirma por separado
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_useragent_urlpath'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar, desnormalizar),
+    ]
@@ -0,0 +1,57 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_normalizar_clientelog'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='clientelog',
+            name='navegador',
+        ),
+        migrations.RemoveField(
+            model_name='clientelog',
+            name='sistema_operativo',
+        ),
+        migrations.RemoveField(
+            model_name='clientelog',
+            name='user_agent',
+        ),
+        migrations.RemoveField(
+            model_name='clientelog',
+            name='url',
+        ),
+        migrations.RemoveField(
+            model_name='clientelog',
+            name='referer',
+        ),
+        migrations.RenameField(
+            model_name='clientelog',
+            old_name='user_agent_ref',
+            new_name='user_agent',
+        ),
+        migrations.RenameField(
+            model_name='clientelog',
+            old_name='url_ref',
+            new_name='url',
+        ),
+        migrations.RenameField(
+            model_name='clientelog',
+            old_name='referer_ref',
+            new_name='referer',
+        ),
+        migrations.AlterField(
+            model_name='clientelog',
+            name='user_agent',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='logs', to='core.useragent'),
+        ),
+        migrations.AlterField(
+            model_name='clientelog',
+            name='url',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='logs', to='core.urlpath'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_clientelog_quitar_textos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClienteLogDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('ip', models.GenericIPAddressField()),
+                ('visitas', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de accesos',
+                'verbose_name_plural': 'Resúmenes diarios de accesos',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='clientelog',
+            index=models.Index(fields=['fecha'], name='clientelog_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientelog',
+            index=models.Index(fields=['usuario', 'fecha'], name='clientelog_usuario_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='clientelogdiario',
+            name='url',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes_diarios', to='core.urlpath'),
+        ),
+        migrations.AddField(
+            model_name='clientelogdiario',
+            name='usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='clientelogdiario',
+            index=models.Index(fields=['dia'], name='clientelogdiario_dia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientelogdiario',
+            index=models.Index(fields=['usuario', 'dia'], name='clientelogdiario_usuario_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# El texto ya se guarda normalizado (core.utils.normalizar_texto): alcanza con un
+# índice GIN de pg_trgm sobre la columna para LIKE '%palabra%' y similitud.
+# En otras bases no se crea y la búsqueda recorre la tabla.
+def crear_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS documentobusqueda_texto_trgm ON core_documentobusqueda USING gin (texto gin_trgm_ops);"
+        )
+
+
+def borrar_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS documentobusqueda_texto_trgm;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_clientelog_retencion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('persona', 'Persona'), ('institucion', 'Institución'), ('expediente', 'Expediente'), ('localidad', 'Localidad')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('texto', models.TextField()),
+                ('titulo', models.CharField(max_length=255)),
+                ('sede', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documentos_busqueda', to='core.sede')),
+            ],
+            options={
+                'verbose_name': 'Documento de búsqueda',
+                'verbose_name_plural': 'Documentos de búsqueda',
+                'indexes': [models.Index(fields=['tipo', 'sede'], name='documentobusqueda_tipo_sede')],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='unique_documento_busqueda')],
+            },
+        ),
+        migrations.RunPython(crear_indice_trigram, borrar_indice_trigram),
+    ]
@@ -0,0 +1,146 @@
+"""
+Miniaturas de imágenes subidas (documentos de expedientes, fotos de perfil).
+
+Después del commit del upload, programar() encola la generación en un pool de
+hilos (settings.MINIATURAS_HILOS): el request no espera a Pillow. Cada derivado
+se guarda en disco con el SHA-256 del original como nombre,
+
+    <carpeta>/<tamaño>/ab/<sha256>.webp
+
+así que el mismo contenido se procesa una sola vez y una imagen nueva nunca
+reutiliza la miniatura de otra. Para imágenes con varias páginas (TIFF
+escaneados) la vista previa es la primera.
+
+Pillow no rasteriza PDF: los documentos PDF siguen mostrándose con su ícono.
+"""
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Nombre -> (ancho, alto, recortar): 'chica' es un cuadrado exacto (avatares,
+# listados); 'vista' entra en el recuadro conservando la proporción.
+TAMANIOS = {
+    'chica': (160, 160, True),
+    'vista': (800, 800, False),
+}
+
+if features.check('webp'):
+    FORMATO, EXTENSION, TIPO_MIME = 'WEBP', '.webp', 'image/webp'
+else:
+    FORMATO, EXTENSION, TIPO_MIME = 'JPEG', '.jpg', 'image/jpeg'
+
+_pool = None
+_pid = None
+_pendientes = set()
+_lock = threading.Lock()
+
+
+# Imágenes vectoriales: Pillow no las abre, no llevan miniatura
+TIPOS_SIN_MINIATURA = {'image/svg+xml'}
+
+
+def es_imagen(tipo_mime):
+    return bool(tipo_mime) and tipo_mime.startswith('image/') and tipo_mime not in TIPOS_SIN_MINIATURA
+
+
+def nombre_miniatura(carpeta, sha256, tamanio):
+    return f'{carpeta}/{tamanio}/{sha256[:2]}/{sha256}{EXTENSION}'
+
+
+def _reducir(imagen, ancho, alto, recortar):
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'transparency' in imagen.info or imagen.mode in ('LA', 'PA') else 'RGB')
+    if FORMATO == 'JPEG' and imagen.mode == 'RGBA':
+        imagen = imagen.convert('RGB')
+    if recortar:
+        return ImageOps.fit(imagen, (ancho, alto), Image.Resampling.LANCZOS)
+    imagen = imagen.copy()
+    imagen.thumbnail((ancho, alto), Image.Resampling.LANCZOS)
+    return imagen
+
+
+def generar(storage, nombre, sha256, carpeta):
+    """
+    Genera (si faltan) las miniaturas de `nombre` en `storage` (un FileSystemStorage).
+    Devuelve los nombres de las miniaturas generadas.
+    """
+    faltantes = {
+        tamanio: nombre_miniatura(carpeta, sha256, tamanio)
+        for tamanio in TAMANIOS
+        if not os.path.exists(storage.path(nombre_miniatura(carpeta, sha256, tamanio)))
+    }
+    if not faltantes:
+        return []
+
+    generadas = []
+    with Image.open(storage.path(nombre)) as imagen:
+        imagen.seek(0)  # primera página / cuadro
+        for tamanio, destino in faltantes.items():
+            ancho, alto, recortar = TAMANIOS[tamanio]
+            ruta = storage.path(destino)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            # Se escribe en un temporal y se mueve: nunca queda una miniatura a medias
+            descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=EXTENSION)
+            try:
+                with os.fdopen(descriptor, 'wb') as salida:
+                    _reducir(imagen, ancho, alto, recortar).save(salida, FORMATO, quality=80)
+                os.replace(temporal, ruta)
+            except BaseException:
+                os.remove(temporal)
+                raise
+            generadas.append(destino)
+    return generadas
+
+
+def _generar_en_segundo_plano(storage, nombre, sha256, carpeta):
+    try:
+        generar(storage, nombre, sha256, carpeta)
+    except Exception:
+        logger.exception("No se pudieron generar las miniaturas de %s", nombre)
+
+
+def _obtener_pool():
+    global _pool, _pid
+    with _lock:
+        # Después de un fork (gunicorn) los hilos del padre no existen en el hijo
+        if _pool is None or _pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=settings.MINIATURAS_HILOS, thread_name_prefix='miniaturas')
+            _pid = os.getpid()
+            _pendientes.clear()
+        return _pool
+
+
+def programar(storage, nombre, sha256, carpeta):
+    """Encola la generación de las miniaturas para después del commit."""
+    if not (nombre and sha256):
+        return
+
+    def encolar():
+        futuro = _obtener_pool().submit(_generar_en_segundo_plano, storage, nombre, sha256, carpeta)
+        with _lock:
+            _pendientes.add(futuro)
+        futuro.add_done_callback(_terminado)
+
+    transaction.on_commit(encolar)
+
+
+def _terminado(futuro):
+    with _lock:
+        _pendientes.discard(futuro)
+
+
+def esperar():
+    """Espera a que terminen las miniaturas encoladas (comandos y tests)."""
+    with _lock:
+        pendientes = list(_pendientes)
+    for futuro in pendientes:
+        futuro.result()
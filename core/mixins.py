@@ -0,0 +1,33 @@
+def optimizar_queryset(queryset, select_related=(), prefetch_related=()):
+    """
+    Agrega al queryset las relaciones que la plantilla va a mostrar, para que
+    cada fila no dispare una consulta extra al imprimir un FK (N+1).
+    Se usa desde ListadoOptimizadoMixin y desde las vistas basadas en función.
+    """
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class ListadoOptimizadoMixin:
+    """
+    Mixin para vistas de listado: cada vista declara las relaciones que usa su
+    plantilla y el mixin las aplica sobre el queryset de la vista.
+
+        class InternacionListView(ListadoOptimizadoMixin, ..., ListView):
+            list_select_related = ('expediente_institucion__expediente',)
+
+    list_select_related: FKs / OneToOne que se muestran en cada fila.
+    list_prefetch_related: relaciones inversas o ManyToMany que se muestran en cada fila.
+    """
+    list_select_related = ()
+    list_prefetch_related = ()
+
+    def get_queryset(self):
+        return optimizar_queryset(
+            super().get_queryset(),
+            self.list_select_related,
+            self.list_prefetch_related,
+        )
@@ -3,23 +3,79 @@ from django.db import models
 #Para nuestro modelo de usuario personalizado debemos
 #importar setings y reemplaza el uso de User por settings.AUTH_USER_MODEL
 from django.conf import settings
+from django.utils import timezone
+
+#tablas de valores únicos para ClienteLog: cada user agent y cada url se guarda una sola vez
+#y se identifica por el sha1 del texto (hash), así el índice único no depende del largo de la cadena
+class UserAgent(models.Model):
+    hash = models.CharField(max_length=40, unique=True)
+    user_agent = models.TextField()
+    navegador = models.CharField(max_length=255)
+    sistema_operativo = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.user_agent
+
+    class Meta:
+        verbose_name = 'User agent'
+        verbose_name_plural = 'User agents'
+
+
+class UrlPath(models.Model):
+    hash = models.CharField(max_length=40, unique=True)
+    url = models.TextField()
+
+    def __str__(self):
+        return self.url
+
+    class Meta:
+        verbose_name = 'URL'
+        verbose_name_plural = 'URLs'
+
 
 #genera una tabla para registrar los logs de acceso de los clientes
-#se registra el usuario, ip, navegador, sistema operativo, user agent, url y referer
-#la fecha se registra automaticamente al crear el registro
+#se registra el usuario, ip, user agent (con navegador y sistema operativo), url y referer
+#la fecha se toma en el request (default=timezone.now) porque el registro puede guardarse más tarde en lote
 class ClienteLog(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     ip = models.GenericIPAddressField()
-    navegador = models.CharField(max_length=255)
-    sistema_operativo = models.CharField(max_length=255)
-    user_agent = models.TextField()
-    url = models.URLField(max_length=500)
-    referer = models.URLField(max_length=500, blank=True, null=True)
-    fecha = models.DateTimeField(auto_now_add=True)
+    user_agent = models.ForeignKey(UserAgent, on_delete=models.PROTECT, related_name='logs')
+    url = models.ForeignKey(UrlPath, on_delete=models.PROTECT, related_name='logs')
+    referer = models.ForeignKey(UrlPath, on_delete=models.PROTECT, blank=True, null=True, related_name='logs_referer')
+    fecha = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.usuario or self.ip} visitó {self.url} el {self.fecha}"
 
+    class Meta:
+        indexes = [
+            # depurar_cliente_log y el admin filtran / ordenan por fecha
+            models.Index(fields=['fecha'], name='clientelog_fecha_idx'),
+            # auditoría: accesos de un usuario en un rango de fechas
+            models.Index(fields=['usuario', 'fecha'], name='clientelog_usuario_fecha_idx'),
+        ]
+
+
+#resumen diario de ClienteLog: cantidad de visitas por día, usuario, url (sin query string) e ip
+#lo completa el comando depurar_cliente_log antes de borrar los registros viejos
+class ClienteLogDiario(models.Model):
+    dia = models.DateField()
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    url = models.ForeignKey(UrlPath, on_delete=models.PROTECT, related_name='resumenes_diarios')
+    ip = models.GenericIPAddressField()
+    visitas = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.dia}: {self.usuario or self.ip} visitó {self.url} {self.visitas} veces"
+
+    class Meta:
+        verbose_name = 'Resumen diario de accesos'
+        verbose_name_plural = 'Resúmenes diarios de accesos'
+        indexes = [
+            models.Index(fields=['dia'], name='clientelogdiario_dia_idx'),
+            models.Index(fields=['usuario', 'dia'], name='clientelogdiario_usuario_idx'),
+        ]
+
 
 
 # Modelos para gestionar información de países, provincias, géneros, niveles educativos, tipos de documentos, sedes, localidades, áreas profesionales y profesiones.
@@ -153,4 +209,41 @@ class Rol (models.Model):
     
     class Meta:
         verbose_name = 'Rol'
-        verbose_name_plural = 'Roles'
\ No newline at end of file
+        verbose_name_plural = 'Roles'
+
+
+
+#índice de búsqueda unificada (/api/buscar/): un registro por persona, institución,
+#expediente o localidad con su texto normalizado (sin tildes, en minúsculas).
+#Lo mantienen las señales de core/busqueda.py; manage.py indexar_busqueda lo reconstruye
+class DocumentoBusqueda(models.Model):
+    PERSONA = 'persona'
+    INSTITUCION = 'institucion'
+    EXPEDIENTE = 'expediente'
+    LOCALIDAD = 'localidad'
+    TIPOS = [
+        (PERSONA, 'Persona'),
+        (INSTITUCION, 'Institución'),
+        (EXPEDIENTE, 'Expediente'),
+        (LOCALIDAD, 'Localidad'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    objeto_id = models.PositiveBigIntegerField()
+    texto = models.TextField()
+    titulo = models.CharField(max_length=255)
+    # Sólo para los tipos que dependen de la sede (expedientes); vacío = visible en todas
+    sede = models.ForeignKey(Sede, on_delete=models.CASCADE, blank=True, null=True, related_name='documentos_busqueda')
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.titulo}"
+
+    class Meta:
+        verbose_name = 'Documento de búsqueda'
+        verbose_name_plural = 'Documentos de búsqueda'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='unique_documento_busqueda'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'sede'], name='documentobusqueda_tipo_sede'),
+        ]
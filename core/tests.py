@@ -1,3 +1,487 @@
-from django.test import TestCase
+import datetime
+import gzip
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from usuario.models import CustomUser
+from . import busqueda
+from .buffer_logs import BufferClienteLog, buffer_cliente_log
+from .models import ClienteLog, ClienteLogDiario, Pais, Provincia, Localidad, UrlPath
+from .utils import (CacheUserAgent, cache_user_agent, construir_cliente_log, construir_clientes_log, escribir_spool,
+                    hash_texto, pagina_sin_contar, parametros_pagina, registrar_cliente)
+
+
+# Utilidades compartidas por los tests de las demás apps
+
+class ConsultasConstantesMixin:
+    """
+    Verifica que una página de listado ejecute la misma cantidad de consultas
+    sin importar cuántas filas muestre (sin N+1 por cada FK de la plantilla).
+
+    La clase de test debe definir crear_filas(cantidad).
+    """
+
+    def assertConsultasConstantes(self, url, filas_iniciales=2, filas_extra=5):
+        self.crear_filas(filas_iniciales)
+        # Primer request sin medir: crea las filas de UserAgent / UrlPath que usa ClienteLog
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+
+        self.crear_filas(filas_extra)
+        with self.assertNumQueries(len(consultas)):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+
+def crear_usuario_admin(sede=None, username='admin'):
+    return CustomUser.objects.create_superuser(
+        username=username, password='admin', email=f'{username}@example.com', sede=sede,
+    )
+
+
+def crear_localidad(nombre='SANTA FE'):
+    pais, _ = Pais.objects.get_or_create(pais='ARGENTINA')
+    provincia, _ = Provincia.objects.get_or_create(provincia='SANTA FE', pais=pais)
+    return Localidad.objects.create(localidad=nombre, provincia=provincia)
+
+
+def datos_acceso(url='http://testserver/expedientes/', user_agent='Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0', **kwargs):
+    """Un diccionario como el de utils.datos_cliente, sin request."""
+    datos = {'usuario_id': None, 'ip': '10.0.0.1', 'user_agent': user_agent, 'url': url, 'referer': '',
+             'fecha': timezone.now().isoformat()}
+    datos.update(kwargs)
+    return datos
+
+
+def esperar(condicion, segundos=10):
+    """Espera a que `condicion()` sea verdadera (lo que escribe un hilo de fondo)."""
+    limite = time.monotonic() + segundos
+    while not condicion():
+        if time.monotonic() > limite:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class SpoolTemporalMixin:
+    """CLIENTE_LOG_ARCHIVO en una carpeta temporal que se borra al terminar cada test."""
+
+    def setUp(self):
+        super().setUp()
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        self.spool = os.path.join(carpeta, 'cliente_log.jsonl')
+        ajuste = override_settings(CLIENTE_LOG_ARCHIVO=self.spool)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+
+class RegistrarClienteTest(SpoolTemporalMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.request = RequestFactory().get('/expedientes/', HTTP_USER_AGENT='Mozilla/5.0 Firefox/128.0')
+        self.request.user = AnonymousUser()
+
+    @override_settings(CLIENTE_LOG_MODO='sincronico')
+    def test_modo_sincronico(self):
+        registrar_cliente(self.request)
+        registro = ClienteLog.objects.select_related('url', 'user_agent').get()
+        self.assertEqual(registro.url.url, 'http://testserver/expedientes/')
+        self.assertEqual(registro.user_agent.navegador, 'Firefox 128.0')
+
+    @override_settings(CLIENTE_LOG_MODO='archivo')
+    def test_modo_archivo(self):
+        registrar_cliente(self.request)
+        registrar_cliente(self.request)
+        self.assertFalse(ClienteLog.objects.exists())
+        with open(self.spool, encoding='utf-8') as archivo:
+            lineas = [json.loads(linea) for linea in archivo]
+        self.assertEqual([datos['url'] for datos in lineas], ['http://testserver/expedientes/'] * 2)
+
+    @override_settings(CLIENTE_LOG_MODO='buffer')
+    def test_modo_buffer(self):
+        registrar_cliente(self.request)
+        # Lo guarda el hilo de fondo (pasado el intervalo) o este vaciar(), lo que llegue primero
+        buffer_cliente_log.vaciar()
+        self.assertTrue(esperar(lambda: ClienteLog.objects.count() == 1))
+
+
+class BufferClienteLogTest(TransactionTestCase):
+
+    def test_lote_completo_lo_guarda_el_hilo(self):
+        buffer = BufferClienteLog(tamanio_lote=3, intervalo=3600)
+        buffer.agregar(datos_acceso())
+        buffer.agregar(datos_acceso())
+        # Sin lote completo ni intervalo cumplido no se guarda nada
+        time.sleep(0.2)
+        self.assertEqual(buffer.pendientes(), 2)
+        self.assertFalse(ClienteLog.objects.exists())
+
+        buffer.agregar(datos_acceso(url='http://testserver/personas/'))
+        self.assertTrue(esperar(lambda: ClienteLog.objects.count() == 3))
+        self.assertEqual(buffer.pendientes(), 0)
+        # Las urls repetidas comparten fila de UrlPath
+        self.assertEqual(UrlPath.objects.count(), 2)
+
+    def test_vaciar_guarda_lo_pendiente(self):
+        buffer = BufferClienteLog(tamanio_lote=2, intervalo=3600)
+        buffer._asegurar_hilo = lambda: None  # sin hilo: el test vacía a mano
+        for _ in range(5):
+            buffer.agregar(datos_acceso())
+        self.assertEqual(buffer.vaciar(), 5)
+        self.assertEqual(ClienteLog.objects.count(), 5)
+        self.assertEqual(buffer.vaciar(), 0)
+
+    def test_cola_llena_descarta(self):
+        buffer = BufferClienteLog(tamanio_lote=10, intervalo=3600, capacidad=1)
+        buffer._asegurar_hilo = lambda: None
+        buffer.agregar(datos_acceso())
+        with self.assertLogs('core.buffer_logs', 'WARNING'):
+            buffer.agregar(datos_acceso())
+        self.assertEqual(buffer.pendientes(), 1)
+
+
+class ImportarClienteLogTest(SpoolTemporalMixin, TestCase):
+
+    def importar(self):
+        salida = io.StringIO()
+        call_command('importar_cliente_log', lote=2, stdout=salida)
+        return salida.getvalue()
+
+    def test_importa_y_borra_el_spool(self):
+        for i in range(3):
+            escribir_spool(datos_acceso(url=f'http://testserver/{i}/'))
+        with open(self.spool, 'a', encoding='utf-8') as archivo:
+            archivo.write('no es json\n')
+            archivo.write(json.dumps({'url': 'faltan campos'}) + '\n')
+        salida = self.importar()
+        self.assertIn('Registros importados: 3, líneas inválidas: 2.', salida)
+        self.assertEqual(ClienteLog.objects.count(), 3)
+        self.assertFalse(os.path.exists(self.spool))
+        self.assertFalse(os.path.exists(self.spool + '.procesando'))
+        self.assertIn('No hay registros para importar.', self.importar())
+
+    def test_retoma_el_archivo_de_una_corrida_interrumpida(self):
+        escribir_spool(datos_acceso(url='http://testserver/anterior/'), ruta=self.spool + '.procesando')
+        escribir_spool(datos_acceso(url='http://testserver/nuevo/'))
+        self.importar()
+        # Primero el que había quedado renombrado; el spool nuevo queda para la próxima corrida
+        self.assertEqual(list(ClienteLog.objects.values_list('url__url', flat=True)), ['http://testserver/anterior/'])
+        self.assertTrue(os.path.exists(self.spool))
+        self.importar()
+        self.assertEqual(ClienteLog.objects.count(), 2)
+
+
+class CacheUserAgentTest(TestCase):
+
+    FIREFOX = 'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0'
+    CHROME = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36'
+    CURL = 'curl/8.5.0'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lru_descarta_el_menos_usado(self):
+        memo = CacheUserAgent(capacidad=2)
+        self.assertEqual(memo.obtener(self.FIREFOX), ('Linux', 'Firefox 128.0'))
+        memo.obtener(self.CHROME)
+        memo.obtener(self.FIREFOX)  # Chrome pasa a ser el menos usado
+        memo.obtener(self.CURL)
+        self.assertEqual(memo.estadisticas()['entradas'], 2)
+        self.assertIn(memo.clave(self.FIREFOX), memo._datos)
+        self.assertNotIn(memo.clave(self.CHROME), memo._datos)
+
+        memo.obtener(self.CHROME)  # se había descartado: se vuelve a parsear
+        self.assertEqual((memo.aciertos, memo.fallos), (1, 4))
+
+    def test_contadores(self):
+        memo = CacheUserAgent(capacidad=10)
+        self.assertIsNone(memo.estadisticas()['tasa_aciertos'])
+        for _ in range(3):
+            memo.obtener(self.FIREFOX)
+        memo.obtener(self.CHROME)
+        estadisticas = memo.estadisticas()
+        self.assertEqual((estadisticas['aciertos'], estadisticas['fallos']), (2, 2))
+        self.assertEqual(estadisticas['tasa_aciertos'], 0.5)
+        memo.limpiar()
+        self.assertEqual(memo.estadisticas()['entradas'], 0)
+        self.assertEqual(memo.estadisticas()['fallos'], 0)
+
+    def test_cache_compartida_entre_workers(self):
+        uno, otro = CacheUserAgent(compartida=True), CacheUserAgent(compartida=True)
+        uno.obtener(self.FIREFOX)
+        self.assertEqual(otro.obtener(self.FIREFOX), ('Linux', 'Firefox 128.0'))
+        self.assertEqual((otro.aciertos_compartida, otro.fallos), (1, 0))
+        # Ya quedó en la cache local del segundo
+        otro.obtener(self.FIREFOX)
+        self.assertEqual(otro.aciertos, 1)
+
+    def test_vista_de_estadisticas(self):
+        url = reverse('core:estadisticas_user_agent')
+        usuario = CustomUser.objects.create_user(username='operador', password='x')
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(crear_usuario_admin())
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['capacidad'], cache_user_agent.capacidad)
+        self.assertIn('tasa_aciertos', respuesta.json())
+
+
+class NormalizarClienteLogMigracionTest(TransactionTestCase):
+    """0011-0013: de las columnas de texto de ClienteLog a UserAgent / UrlPath, de a lotes."""
+
+    antes = [('core', '0010_clientelog_fecha')]
+    despues = [('core', '0013_clientelog_quitar_textos')]
+
+    def setUp(self):
+        self.migracion = importlib.import_module('core.migrations.0012_normalizar_clientelog')
+        lote = self.migracion.TAMANIO_LOTE
+        self.migracion.TAMANIO_LOTE = 2  # varios lotes con pocas filas
+        self.addCleanup(setattr, self.migracion, 'TAMANIO_LOTE', lote)
+        self.addCleanup(self.migrar, None)  # vuelve a la última migración
+        self.apps = self.migrar(self.antes)
+
+    def migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        destino = destino or executor.loader.graph.leaf_nodes()
+        executor.migrate(destino)
+        executor.loader.build_graph()
+        return executor.loader.project_state(destino).apps
+
+    def test_ida_y_vuelta(self):
+        ClienteLogViejo = self.apps.get_model('core', 'ClienteLog')
+        filas = [
+            ('Firefox UA', 'Firefox', 'Linux', 'http://testserver/a/', ''),
+            ('Chrome UA', 'Chrome', 'Windows', 'http://testserver/b/', 'http://testserver/a/'),
+            ('Firefox UA', 'Firefox', 'Linux', 'http://testserver/b/', None),
+            ('Firefox UA', 'Firefox', 'Linux', 'http://testserver/c/', 'http://testserver/b/'),
+            ('Chrome UA', 'Chrome', 'Windows', 'http://testserver/a/', ''),
+        ]
+        for user_agent, navegador, sistema, url, referer in filas:
+            ClienteLogViejo.objects.create(
+                ip='10.0.0.1', user_agent=user_agent, navegador=navegador, sistema_operativo=sistema,
+                url=url, referer=referer,
+            )
+
+        apps = self.migrar(self.despues)
+        ClienteLogNuevo = apps.get_model('core', 'ClienteLog')
+        self.assertEqual(apps.get_model('core', 'UserAgent').objects.count(), 2)
+        self.assertEqual(apps.get_model('core', 'UrlPath').objects.count(), 3)
+        migradas = [
+            (log.user_agent.user_agent, log.user_agent.navegador, log.user_agent.sistema_operativo,
+             log.url.url, log.referer.url if log.referer else None)
+            for log in ClienteLogNuevo.objects.order_by('id').select_related('user_agent', 'url', 'referer')
+        ]
+        # El referer vacío y el nulo quedan sin referencia
+        self.assertEqual(migradas, [fila[:4] + (fila[4] or None,) for fila in filas])
+
+        apps = self.migrar([('core', '0011_useragent_urlpath')])
+        revertidas = apps.get_model('core', 'ClienteLog').objects.order_by('id').values_list(
+            'user_agent', 'navegador', 'sistema_operativo', 'url', 'referer',
+        )
+        self.assertEqual(list(revertidas), [fila[:4] + (fila[4] or None,) for fila in filas])
+
+
+class ConstruirClientesLogTest(TestCase):
+
+    def test_reutiliza_filas_existentes(self):
+        existente = UrlPath.objects.create(hash=hash_texto('http://testserver/a/'), url='http://testserver/a/')
+        registros = construir_clientes_log([
+            datos_acceso(url='http://testserver/a/'),
+            datos_acceso(url='http://testserver/b/', referer='http://testserver/a/'),
+        ])
+        self.assertEqual(registros[0].url_id, existente.pk)
+        self.assertEqual(registros[1].referer_id, existente.pk)
+        self.assertEqual(UrlPath.objects.count(), 2)
+
+    def test_fila_creada_por_otro_worker_entre_select_e_insert(self):
+        url = 'http://testserver/carrera/'
+        creada = {}
+
+        def otro_worker(execute, sql, params, many, context):
+            # Justo antes del INSERT de UrlPath, "otro worker" guarda la misma url
+            if not creada and sql.startswith('INSERT INTO "core_urlpath"'):
+                creada['fila'] = None
+                creada['fila'] = UrlPath.objects.create(hash=hash_texto(url), url=url)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(otro_worker):
+            registro = construir_cliente_log(datos_acceso(url=url))
+        # ignore_conflicts: no falla y usa la fila del otro
+        self.assertEqual(registro.url_id, creada['fila'].pk)
+        self.assertEqual(UrlPath.objects.filter(url=url).count(), 1)
+
+
+class DepurarClienteLogTest(TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        self.dia = timezone.localdate() - datetime.timedelta(days=100)
+        self.usuario = crear_usuario_admin()
+
+    def registrar(self, *urls, dia=None, **kwargs):
+        fecha = timezone.make_aware(datetime.datetime.combine(dia or self.dia, datetime.time(10)))
+        ClienteLog.objects.bulk_create(construir_clientes_log([
+            datos_acceso(url=url, usuario_id=self.usuario.pk, fecha=fecha.isoformat(), **kwargs) for url in urls
+        ]))
+
+    def depurar(self, *args):
+        salida = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('depurar_cliente_log', '--directorio', self.directorio, *args, stdout=salida)
+        return salida.getvalue()
+
+    def archivados(self):
+        with gzip.open(os.path.join(self.directorio, f'cliente_log_{self.dia.isoformat()}.jsonl.gz'), 'rt') as archivo:
+            return [json.loads(linea) for linea in archivo]
+
+    def test_resumen_por_path(self):
+        self.registrar('http://testserver/personas/?page=1', 'http://testserver/personas/?page=2',
+                       'http://testserver/personas/', 'http://testserver/expedientes/')
+        self.registrar('http://testserver/personas/', dia=timezone.localdate())
+        self.depurar()
+        resumen = dict(ClienteLogDiario.objects.filter(dia=self.dia).values_list('url__url', 'visitas'))
+        self.assertEqual(resumen, {'http://testserver/personas/': 3, 'http://testserver/expedientes/': 1})
+        # Lo de hoy queda sin tocar
+        self.assertEqual(ClienteLog.objects.count(), 1)
+
+    def test_archiva_y_borra_de_a_lotes(self):
+        self.registrar(*[f'http://testserver/{i}/' for i in range(5)])
+        self.assertIn('Registros depurados: 5.', self.depurar('--lote', '2'))
+        self.assertFalse(ClienteLog.objects.filter(fecha__date=self.dia).exists())
+        self.assertEqual([fila['url'] for fila in self.archivados()], [f'http://testserver/{i}/' for i in range(5)])
+        self.assertFalse(os.path.exists(os.path.join(self.directorio, f'cliente_log_{self.dia.isoformat()}.jsonl.gz.tmp')))
+
+        # Registros que llegan tarde para el mismo día: se suman al resumen y al archivo
+        self.registrar('http://testserver/0/')
+        self.depurar()
+        self.assertEqual(len(self.archivados()), 6)
+        self.assertEqual(ClienteLogDiario.objects.get(url__url='http://testserver/0/').visitas, 2)
+
+    def test_dry_run_y_sin_archivo(self):
+        self.registrar('http://testserver/a/')
+        self.assertIn(f'{self.dia}: 1 registros', self.depurar('--dry-run'))
+        self.assertEqual(ClienteLog.objects.count(), 1)
+        self.assertFalse(ClienteLogDiario.objects.exists())
+
+        self.depurar('--sin-archivo')
+        self.assertFalse(ClienteLog.objects.exists())
+        self.assertEqual(ClienteLogDiario.objects.get().visitas, 1)
+        self.assertEqual(os.listdir(self.directorio), [])
+
+
+def dar_permisos(usuario, *permisos):
+    for permiso in permisos:
+        app_label, codename = permiso.split('.')
+        usuario.user_permissions.add(Permission.objects.get(content_type__app_label=app_label, codename=codename))
+    return CustomUser.objects.get(pk=usuario.pk)  # sin la cache de permisos
+
+
+class BuscarTest(TestCase):
+
+    def setUp(self):
+        # Importado acá: expediente.tests importa este módulo
+        from expediente.tests import crear_expediente, crear_institucion, crear_persona, crear_sede
+
+        self.santa_fe, self.rosario = crear_sede(), crear_sede('Rosario', 'RO')
+        self.persona = crear_persona(apellido='GARCÍA', nombre='Ana')
+        self.institucion = crear_institucion(institucion='HOSPITAL GARCIA')
+        self.expediente_santa_fe = crear_expediente(sede=self.santa_fe, cuij='GARCIA-1')
+        self.expediente_rosario = crear_expediente(sede=self.rosario, cuij='GARCIA-2')
+
+    def usuario(self, sede, *permisos, username='operador'):
+        return dar_permisos(CustomUser.objects.create_user(username=username, password='x', sede=sede), *permisos)
+
+    def encontrados(self, usuario, termino='garcia', **kwargs):
+        resultados, _ = busqueda.buscar(usuario, termino, **kwargs)
+        return {(resultado['tipo'], resultado['id']) for resultado in resultados}
+
+    def test_sin_permisos_no_encuentra_nada(self):
+        self.assertEqual(self.encontrados(self.usuario(self.santa_fe)), set())
+
+    def test_solo_los_tipos_permitidos(self):
+        usuario = self.usuario(self.santa_fe, 'persona.puede_ver_persona')
+        self.assertEqual(self.encontrados(usuario), {('persona', self.persona.pk)})
+        # El permiso de Django por defecto no alcanza: las vistas de persona piden puede_ver_persona
+        usuario = self.usuario(self.santa_fe, 'persona.view_persona', 'institucion.view_institucion', username='otro')
+        self.assertEqual(self.encontrados(usuario), {('institucion', self.institucion.pk)})
+
+    def test_expedientes_de_la_sede_del_usuario(self):
+        permisos = ('expediente.view_expediente', 'persona.puede_ver_persona')
+        de_rosario = self.usuario(self.rosario, *permisos)
+        self.assertEqual(self.encontrados(de_rosario), {
+            ('persona', self.persona.pk), ('expediente', self.expediente_rosario.pk),
+        })
+        sin_sede = self.usuario(None, *permisos, username='sin_sede')
+        self.assertEqual(self.encontrados(sin_sede), {('persona', self.persona.pk)})
+        self.assertEqual(len(self.encontrados(crear_usuario_admin(), tipos=['expediente'])), 2)
+
+    def test_api(self):
+        self.client.force_login(self.usuario(self.santa_fe, 'expediente.view_expediente'))
+        respuesta = self.client.get(reverse('core:buscar'), {'q': 'garcia', 'por_pagina': 1})
+        self.assertEqual(respuesta.json(), {
+            'results': [{
+                'id': self.expediente_santa_fe.pk, 'tipo': 'expediente', 'text': f'{self.expediente_santa_fe.identificador} - Santa Fe',
+                'url': reverse('expediente:expediente_detail', args=[self.expediente_santa_fe.pk]),
+            }],
+            'pagination': {'more': False},
+        })
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('core:buscar'), {'q': 'garcia'}).status_code, 302)
+
+
+class PaginaSinContarTest(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            crear_localidad(f'LOCALIDAD {i}')
+        self.localidades = Localidad.objects.order_by('localidad')
+
+    def nombres(self, pagina, por_pagina):
+        filas, hay_mas = pagina_sin_contar(self.localidades, pagina, por_pagina)
+        return [localidad.localidad[-1] for localidad in filas], hay_mas
+
+    def test_limites(self):
+        # Exactamente una página: no hay más
+        self.assertEqual(self.nombres(1, 5), (['0', '1', '2', '3', '4'], False))
+        # Una fila más que la página
+        self.assertEqual(self.nombres(1, 4), (['0', '1', '2', '3'], True))
+        self.assertEqual(self.nombres(2, 4), (['4'], False))
+        # Última página justa y una más allá del final
+        self.assertEqual(self.nombres(3, 2), (['4'], False))
+        self.assertEqual(self.nombres(2, 5), ([], False))
+
+    def test_una_sola_consulta_sin_count(self):
+        with CaptureQueriesContext(connection) as consultas:
+            pagina_sin_contar(self.localidades, 2, 2)
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('COUNT', consultas[0]['sql'])
+        self.assertIn('LIMIT 3 OFFSET 2', consultas[0]['sql'])
+
+    def test_parametros_pagina(self):
+        fabrica = RequestFactory()
+        self.assertEqual(parametros_pagina(fabrica.get('/', {'page': 3, 'por_pagina': 10})), (3, 10))
+        self.assertEqual(parametros_pagina(fabrica.get('/', {'page': 0, 'por_pagina': 500})), (1, 50))
+        self.assertEqual(parametros_pagina(fabrica.get('/', {'page': 'x'})), (1, 20))
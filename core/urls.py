@@ -15,6 +15,8 @@ urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='core/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('localidades/', views.localidad_autocomplete, name='localidad-autocomplete'),
+    path('api/buscar/', views.buscar, name='buscar'),
+    path('monitoreo/user-agents/', views.estadisticas_user_agent, name='estadisticas_user_agent'),
 
     # Password reset - nombres estándar de Django (recomendado)
     # Password reset - nombres estándar de Django
@@ -1,40 +1,280 @@
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
 import httpagentparser
-from .models import ClienteLog
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-def registrar_cliente(request):
+from .models import ClienteLog, UrlPath, UserAgent
+
+# Evita que dos hilos del mismo proceso intercalen líneas en el archivo de spool
+_archivo_lock = threading.Lock()
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin tildes ni espacios repetidos: 'José  PÉREZ' -> 'jose perez'."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def parametros_pagina(request, por_pagina=20, maximo=50):
+    """(page, por_pagina) del GET, como los manda Select2; si no son válidos, los por defecto."""
+    try:
+        pagina = max(int(request.GET.get('page', 1)), 1)
+        cantidad = min(max(int(request.GET.get('por_pagina', por_pagina)), 1), maximo)
+    except ValueError:
+        return 1, por_pagina
+    return pagina, cantidad
+
+
+def pagina_sin_contar(queryset, pagina, por_pagina):
+    """
+    (objetos, hay_mas) de la página pedida. Se lee una fila de más para saber si
+    hay otra página, sin el COUNT(*) que haría Paginator sobre la tabla entera.
+    """
+    inicio = (pagina - 1) * por_pagina
+    filas = list(queryset[inicio:inicio + por_pagina + 1])
+    return filas[:por_pagina], len(filas) > por_pagina
+
+
+def datos_cliente(request):
+    """
+    Extrae del request todo lo que se registra en ClienteLog.
+    Se hace dentro del request (después ya no se puede usar el objeto), pero sin
+    parsear el user agent ni tocar la base: eso queda para quien guarde el registro.
+    """
     # IP: se usa HTTP_X_FORWARDED_FOR si existe (caso detrás de proxy),
     # y se toma el primer valor separado por comas; si no existe se usa REMOTE_ADDR.
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     ip = x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
 
-    # User Agent: se obtiene la cabecera HTTP_USER_AGENT; por defecto cadena vacía si no existe.
-    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    # Usuario: si el request tiene user y está autenticado se guarda su id; si no, None
+    usuario = getattr(request, 'user', None)
+    usuario_id = usuario.pk if usuario is not None and usuario.is_authenticated else None
+
+    return {
+        'usuario_id': usuario_id,
+        'ip': ip,
+        # User Agent: cabecera HTTP_USER_AGENT; por defecto cadena vacía si no existe.
+        'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        # URL actual: build_absolute_uri construye la URL completa de la petición
+        'url': request.build_absolute_uri(),
+        # Referer: cabecera HTTP_REFERER si existe, sino cadena vacía
+        'referer': request.META.get('HTTP_REFERER', ''),
+        # La fecha se toma en el request, no cuando se vuelca el lote
+        'fecha': timezone.now().isoformat(),
+    }
+
+
+def url_sin_query(url):
+    """'http://host/personas/?page=2#x' -> 'http://host/personas/'."""
+    return urlunsplit(urlsplit(url)._replace(query='', fragment=''))
+
+
+def hash_texto(texto):
+    """sha1 hexadecimal del texto: clave de UserAgent.hash, UrlPath.hash y de cache_user_agent."""
+    return hashlib.sha1(texto.encode('utf-8', 'replace')).hexdigest()
+
+
+class CacheUserAgent:
+    """
+    Cache LRU acotada de user agents ya parseados: (sistema_operativo, navegador).
+
+    Un despliegue ve unos pocos cientos de user agents distintos, así que casi
+    todos los requests se resuelven sin llamar a httpagentparser. La clave es el
+    sha1 del user agent (la cadena puede ser muy larga). Si `compartida` es True
+    también se consulta la cache de Django (Redis en producción), para que los
+    workers de gunicorn aprovechen lo que ya parseó otro.
+    """
+
+    PREFIJO = 'ua:'
+
+    def __init__(self, capacidad=1000, compartida=False, timeout=60 * 60 * 24):
+        self.capacidad = capacidad
+        self.compartida = compartida
+        self.timeout = timeout
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_compartida = 0
+        self.fallos = 0
+
+    @staticmethod
+    def clave(user_agent):
+        return hash_texto(user_agent)
+
+    def obtener(self, user_agent):
+        clave = self.clave(user_agent)
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return valor
+
+        valor = self._obtener_compartida(clave)
+        if valor is not None:
+            with self._lock:
+                self.aciertos_compartida += 1
+        else:
+            valor = _detectar_user_agent(user_agent)
+            with self._lock:
+                self.fallos += 1
+            self._guardar_compartida(clave, valor)
+
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+        return valor
+
+    def _obtener_compartida(self, clave):
+        if not self.compartida:
+            return None
+        try:
+            valor = caches['default'].get(self.PREFIJO + clave)
+        except Exception:
+            # Si Redis no responde se sigue con la cache local
+            return None
+        return tuple(valor) if valor else None
+
+    def _guardar_compartida(self, clave, valor):
+        if not self.compartida:
+            return
+        try:
+            caches['default'].set(self.PREFIJO + clave, valor, self.timeout)
+        except Exception:
+            pass
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.aciertos_compartida + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'capacidad': self.capacidad,
+                'compartida': self.compartida,
+                'aciertos': self.aciertos,
+                'aciertos_compartida': self.aciertos_compartida,
+                'fallos': self.fallos,
+                'tasa_aciertos': round((consultas - self.fallos) / consultas, 4) if consultas else None,
+            }
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.aciertos = self.aciertos_compartida = self.fallos = 0
+
+
+def _detectar_user_agent(user_agent):
     try:
         # httpagentparser.simple_detect devuelve (os, browser)
         parsed = httpagentparser.simple_detect(user_agent)
-        sistema_operativo = parsed[0]
-        navegador = parsed[1]
-    except:
+        return parsed[0], parsed[1]
+    except Exception:
         # Si el parser lanza cualquier excepción, se marcan como 'Desconocido'
-        sistema_operativo = 'Desconocido'
-        navegador = 'Desconocido'
-
-    # URL actual: build_absolute_uri construye la URL completa de la petición
-    url = request.build_absolute_uri()
-
-    # Referer: cabecera HTTP_REFERER si existe, sino cadena vacía
-    referer = request.META.get('HTTP_REFERER', '')
-
-    # Usuario: si el request tiene user y está autenticado, se guarda el objeto user; si no, None
-    usuario = request.user if request.user.is_authenticated else None
-
-    # Guardar log: crea una fila en la tabla ClienteLog con los campos recogidos
-    ClienteLog.objects.create(
-        usuario=usuario,
-        ip=ip,
-        navegador=navegador,
-        sistema_operativo=sistema_operativo,
-        user_agent=user_agent,
-        url=url,
-        referer=referer or None  # si referer es '' lo convierte a None
-    )
\ No newline at end of file
+        return 'Desconocido', 'Desconocido'
+
+
+cache_user_agent = CacheUserAgent(
+    capacidad=getattr(settings, 'USER_AGENT_CACHE_CAPACIDAD', 1000),
+    compartida=getattr(settings, 'USER_AGENT_CACHE_COMPARTIDA', False),
+)
+
+
+def parsear_user_agent(user_agent):
+    """Devuelve (sistema_operativo, navegador) para un user agent, usando cache_user_agent."""
+    return cache_user_agent.obtener(user_agent or '')
+
+
+def _resolver_user_agents(user_agents):
+    """Devuelve {user_agent: id de UserAgent}, creando las filas que falten."""
+    por_hash = {hash_texto(ua): ua for ua in user_agents}
+    ids = dict(UserAgent.objects.filter(hash__in=por_hash).values_list('hash', 'id'))
+    nuevos = []
+    for clave, ua in por_hash.items():
+        if clave not in ids:
+            sistema_operativo, navegador = parsear_user_agent(ua)
+            nuevos.append(UserAgent(hash=clave, user_agent=ua, navegador=navegador, sistema_operativo=sistema_operativo))
+    if nuevos:
+        # ignore_conflicts: otro worker pudo crear la misma fila entre el SELECT y el INSERT
+        UserAgent.objects.bulk_create(nuevos, ignore_conflicts=True)
+        ids.update(UserAgent.objects.filter(hash__in=[n.hash for n in nuevos]).values_list('hash', 'id'))
+    return {ua: ids[clave] for clave, ua in por_hash.items()}
+
+
+def _resolver_urls(urls):
+    """Devuelve {url: id de UrlPath}, creando las filas que falten."""
+    por_hash = {hash_texto(url): url for url in urls}
+    ids = dict(UrlPath.objects.filter(hash__in=por_hash).values_list('hash', 'id'))
+    nuevos = [UrlPath(hash=clave, url=url) for clave, url in por_hash.items() if clave not in ids]
+    if nuevos:
+        UrlPath.objects.bulk_create(nuevos, ignore_conflicts=True)
+        ids.update(UrlPath.objects.filter(hash__in=[n.hash for n in nuevos]).values_list('hash', 'id'))
+    return {url: ids[clave] for clave, url in por_hash.items()}
+
+
+def construir_clientes_log(lista_datos):
+    """
+    Arma (sin guardar) los ClienteLog de una lista de diccionarios de datos_cliente().
+    Los user agents y las urls se resuelven de a lote: dos consultas por tabla
+    para todo el lote, no por registro.
+    """
+    user_agents = _resolver_user_agents({datos['user_agent'] for datos in lista_datos})
+    urls = _resolver_urls(
+        {datos['url'] for datos in lista_datos} | {datos['referer'] for datos in lista_datos if datos['referer']}
+    )
+    registros = []
+    for datos in lista_datos:
+        fecha = datos.get('fecha')
+        registros.append(ClienteLog(
+            usuario_id=datos['usuario_id'],
+            ip=datos['ip'],
+            user_agent_id=user_agents[datos['user_agent']],
+            url_id=urls[datos['url']],
+            referer_id=urls[datos['referer']] if datos['referer'] else None,  # referer '' queda en None
+            fecha=parse_datetime(fecha) if fecha else timezone.now(),
+        ))
+    return registros
+
+
+def construir_cliente_log(datos):
+    """Arma (sin guardar) un ClienteLog a partir de lo devuelto por datos_cliente()."""
+    return construir_clientes_log([datos])[0]
+
+
+def escribir_spool(datos, ruta=None):
+    """Agrega el registro como una línea JSON al archivo de spool (sólo append)."""
+    ruta = ruta or settings.CLIENTE_LOG_ARCHIVO
+    linea = json.dumps(datos, ensure_ascii=False) + '\n'
+    with _archivo_lock:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write(linea)
+
+
+def registrar_cliente(request):
+    """
+    Registra el acceso según settings.CLIENTE_LOG_MODO:
+    - 'buffer': se encola en memoria y un hilo de fondo lo guarda con bulk_create.
+    - 'archivo': se agrega al archivo de spool; se importa con manage.py importar_cliente_log.
+    - 'sincronico': un INSERT por petición.
+    """
+    datos = datos_cliente(request)
+    modo = getattr(settings, 'CLIENTE_LOG_MODO', 'sincronico')
+
+    if modo == 'buffer':
+        from .buffer_logs import buffer_cliente_log
+        buffer_cliente_log.agregar(datos)
+    elif modo == 'archivo':
+        escribir_spool(datos)
+    else:
+        construir_cliente_log(datos).save()
@@ -7,6 +7,9 @@ from .models import Provincia, Localidad
 
 from django.urls import reverse_lazy
 from .forms import ProvinciaForm
+from .mixins import ListadoOptimizadoMixin
+from .utils import cache_user_agent, parametros_pagina
+from . import busqueda
 from django.http import JsonResponse
 
 
@@ -37,16 +40,15 @@ class ProvinciaCreate(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class ProvinciaListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class ProvinciaListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
     model = Provincia
     template_name = 'provincia_list.html'
     context_object_name = 'provincias'
     login_url = 'core:login'
     permission_required = 'core.view_provincia'
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
-
-    def get_queryset(self):
-        return Provincia.objects.all().order_by('provincia')
+    queryset = Provincia.objects.all().order_by('provincia')
+    list_select_related = ('pais',)
 
 @login_required(login_url='core:login')
 @permission_required('core.view_localidad', raise_exception=True)
@@ -54,4 +56,34 @@ def localidad_autocomplete(request):
     q = request.GET.get('q', '')
     localidades = Localidad.objects.filter(localidad__icontains=q)[:20]
     results = [{'id': loc.id, 'text': loc.localidad} for loc in localidades]
-    return JsonResponse({'results': results})
\ No newline at end of file
+    return JsonResponse({'results': results})
+
+
+@login_required(login_url='core:login')
+@permission_required('core.view_clientelog', raise_exception=True)
+def estadisticas_user_agent(request):
+    # Aciertos/fallos de la cache de user agents de este worker (para monitoreo)
+    return JsonResponse(cache_user_agent.estadisticas())
+
+
+# Cantidad máxima de resultados por página de /api/buscar/
+BUSCAR_POR_PAGINA_MAXIMO = 50
+
+
+@login_required(login_url='core:login')
+def buscar(request):
+    """
+    Búsqueda unificada de personas, instituciones, expedientes y localidades.
+    GET: q (término), tipo (uno o más, opcional), page (desde 1), por_pagina.
+    Devuelve el formato de Select2: {results: [...], pagination: {more: bool}}.
+    Cada usuario ve sólo los tipos para los que tiene permiso y los expedientes de su sede.
+    """
+    pagina, por_pagina = parametros_pagina(request, maximo=BUSCAR_POR_PAGINA_MAXIMO)
+    resultados, hay_mas = busqueda.buscar(
+        request.user,
+        request.GET.get('q', ''),
+        tipos=request.GET.getlist('tipo'),
+        pagina=pagina,
+        por_pagina=por_pagina,
+    )
+    return JsonResponse({'results': resultados, 'pagination': {'more': hay_mas}})
@@ -6,4 +6,7 @@ class ExpedienteConfig(AppConfig):
     name = 'expediente'
 
     def ready(self):
-        import expediente.signals
\ No newline at end of file
+        import expediente.signals
+        # Versiones de la cache de las páginas de detalle
+        from . import detalle
+        detalle.conectar_senales()
@@ -0,0 +1,199 @@
+"""
+Plan de consultas y cache de las páginas de detalle de expedientes.
+
+- expedientes(): el expediente con todos sus catálogos en un solo JOIN.
+- cargar_relaciones(): un Prefetch por cada relación que muestra el detalle
+  (documentos, personas, instituciones, internaciones e intervenciones), así
+  que abrir un expediente hace la misma cantidad de consultas sin importar
+  cuántas filas tenga cada relación.
+- version(): versión del detalle de un expediente, que forma parte de la clave
+  de los fragmentos {% cache %} de las plantillas. Las señales la incrementan
+  cuando cambia el expediente o cualquier fila relacionada, y una versión
+  global cuando cambia algún catálogo.
+"""
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.signals import post_delete, post_save
+
+from core import catalogos
+from .models import Expediente, ExpedienteDocumento, ExpedienteInstitucion, ExpedientePersona
+
+# Lo que dura un fragmento renderizado; las versiones duran más para que al
+# vencer una no se vuelva a un número ya usado mientras queden fragmentos
+TIMEOUT = 60 * 60 * 24
+TIMEOUT_VERSION = TIMEOUT * 7
+
+CLAVE_VERSION_GLOBAL = 'expediente:detalle:version'
+
+# Roles de la persona principal (demanda espontánea) y de la institución principal (oficios)
+ROL_PERSONA_PRINCIPAL = 1
+ROL_INSTITUCION_PRINCIPAL = 2
+
+CATALOGOS = (
+    'sede', 'medio_ingreso', 'tipo_solicitud', 'estado_expediente',
+    'grupo_etario', 'tipo_patrocinio', 'resumen_intervencion',
+)
+
+
+def expedientes():
+    return Expediente.objects.select_related(*CATALOGOS)
+
+
+def _prefetch():
+    Internacion = apps.get_model('internacion', 'Internacion')
+    Intervencion = apps.get_model('intervencion', 'Intervencion')
+    return [
+        Prefetch('documentos', queryset=ExpedienteDocumento.objects.order_by('-fecha_subida', '-id')),
+        Prefetch(
+            'expedientepersona_expediente',
+            queryset=ExpedientePersona.objects.select_related('persona', 'rol').order_by('id'),
+        ),
+        Prefetch(
+            'expedienteinstitucion_expediente',
+            queryset=ExpedienteInstitucion.objects.select_related('institucion', 'rol').order_by('id'),
+        ),
+        Prefetch(
+            'expedienteinstitucion_expediente__internacion_expedienteinstitucion',
+            queryset=Internacion.objects.select_related(
+                'motivo_internacion', 'motivo_alta', 'tipo_internacion',
+            ).order_by('-fecha_internacion', '-id'),
+        ),
+        Prefetch(
+            'intervencion_expediente',
+            queryset=Intervencion.objects.select_related(
+                'tipo_intervencion', 'profesional__user', 'profesional__profesion',
+            ),
+        ),
+    ]
+
+
+def cargar_relaciones(expediente):
+    """Carga de una vez todas las relaciones que muestra el detalle."""
+    prefetch_related_objects([expediente], *_prefetch())
+    return expediente
+
+
+def _principal(relaciones, rol_id):
+    """La primera relación (por id) con ese rol, de la lista ya cargada."""
+    return next((relacion for relacion in relaciones if relacion.rol_id == rol_id), None)
+
+
+def contexto(expediente):
+    """Contexto de las plantillas de detalle (a partir de las relaciones ya cargadas)."""
+    personas = list(expediente.expedientepersona_expediente.all())
+    instituciones = list(expediente.expedienteinstitucion_expediente.all())
+    persona_rel = _principal(personas, ROL_PERSONA_PRINCIPAL)
+    institucion_rel = _principal(instituciones, ROL_INSTITUCION_PRINCIPAL)
+    return {
+        'documentos': expediente.documentos.all(),
+        'personas': personas,
+        'instituciones': instituciones,
+        'persona': persona_rel.persona if persona_rel else None,
+        'institucion': institucion_rel.institucion if institucion_rel else None,
+        'rol': (persona_rel or institucion_rel).rol if (persona_rel or institucion_rel) else None,
+        'intervenciones': list(expediente.intervencion_expediente.all()),
+        'internaciones': [
+            internacion
+            for relacion in instituciones
+            for internacion in relacion.internacion_expedienteinstitucion.all()
+        ],
+    }
+
+
+def _clave_version(pk):
+    return f'expediente:detalle:version:{pk}'
+
+
+def version(pk):
+    """'<versión del expediente>.<versión global>': se lee con un solo get_many."""
+    claves = [_clave_version(pk), CLAVE_VERSION_GLOBAL]
+    valores = cache.get_many(claves)
+    for clave in claves:
+        if clave not in valores:
+            # Nunca se arranca de 1: no reutilizar fragmentos de una versión que se perdió
+            cache.add(clave, int(time.time() * 1000), TIMEOUT_VERSION)
+            valores[clave] = cache.get(clave)
+    return f'{valores[claves[0]]}.{valores[claves[1]]}'
+
+
+def fragmento_cacheado(nombre, pk, version_detalle):
+    """True si el {% cache TIMEOUT nombre pk version %} de la plantilla ya está guardado."""
+    return cache.has_key(make_template_fragment_key(nombre, [pk, version_detalle]))
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # No existía: version() creará una nueva la próxima vez
+        pass
+
+
+def invalidar(*pks):
+    for pk in set(pks):
+        if pk is not None:
+            _incrementar(_clave_version(pk))
+
+
+def invalidar_todos():
+    _incrementar(CLAVE_VERSION_GLOBAL)
+
+
+def _al_cambiar(funcion):
+    # Ahora y otra vez después del commit: mientras la transacción está abierta
+    # otro request puede volver a cachear el detalle viejo con la versión nueva
+    funcion()
+    transaction.on_commit(funcion)
+
+
+def conectar_senales():
+    """Se llama desde ExpedienteConfig.ready()."""
+    # Modelo -> ids de los expedientes afectados por un cambio en `instance`
+    afectados = {
+        Expediente: lambda instance: [instance.pk],
+        ExpedienteDocumento: lambda instance: [instance.expediente_id],
+        ExpedientePersona: lambda instance: [instance.expediente_id],
+        ExpedienteInstitucion: lambda instance: [instance.expediente_id],
+        apps.get_model('intervencion', 'Intervencion'): lambda instance: [instance.expediente_id],
+        apps.get_model('internacion', 'Internacion'): lambda instance: (
+            ExpedienteInstitucion.objects
+            .filter(pk=instance.expediente_institucion_id)
+            .values_list('expediente_id', flat=True)
+        ),
+        apps.get_model('persona', 'Persona'): lambda instance: (
+            ExpedientePersona.objects.filter(persona_id=instance.pk).values_list('expediente_id', flat=True)
+        ),
+        apps.get_model('institucion', 'Institucion'): lambda instance: (
+            ExpedienteInstitucion.objects.filter(institucion_id=instance.pk).values_list('expediente_id', flat=True)
+        ),
+        apps.get_model('profesional', 'Profesional'): lambda instance: (
+            apps.get_model('intervencion', 'Intervencion').objects
+            .filter(profesional_id=instance.pk).values_list('expediente_id', flat=True)
+        ),
+    }
+    for modelo, expedientes_de in afectados.items():
+
+        def cambio(sender, instance, raw=False, _expedientes_de=expedientes_de, **kwargs):
+            if raw:  # loaddata
+                return
+            pks = list(_expedientes_de(instance))
+            _al_cambiar(lambda: invalidar(*pks))
+
+        etiqueta = modelo._meta.label_lower
+        post_save.connect(cambio, sender=modelo, weak=False, dispatch_uid=f'detalle_{etiqueta}_guardado')
+        post_delete.connect(cambio, sender=modelo, weak=False, dispatch_uid=f'detalle_{etiqueta}_borrado')
+
+    for etiqueta in catalogos.CATALOGOS:
+
+        def cambio_catalogo(sender, raw=False, **kwargs):
+            if not raw:
+                _al_cambiar(invalidar_todos)
+
+        modelo = apps.get_model(etiqueta)
+        post_save.connect(cambio_catalogo, sender=modelo, weak=False, dispatch_uid=f'detalle_catalogo_{etiqueta}_guardado')
+        post_delete.connect(cambio_catalogo, sender=modelo, weak=False, dispatch_uid=f'detalle_catalogo_{etiqueta}_borrado')
@@ -19,12 +19,13 @@ from .models import (Expediente,
                      ExpedientePersona)
 
 from core.models import Sede
+from core.fields import CachedModelChoiceField, RemoteModelChoiceField, RemoteSelect
 from django.conf import settings
 
 
 
 class MedioIngresoForm(forms.Form):
-    medio_ingreso = forms.ModelChoiceField(
+    medio_ingreso = CachedModelChoiceField(
         queryset=MedioIngreso.objects.all(),
         label="Medio de Ingreso",
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -46,33 +47,33 @@ class DemandaEspontanea(forms.Form):
         input_formats=['%Y-%m-%d']
     )
 
-    persona = forms.ModelChoiceField(
+    persona = RemoteModelChoiceField(
         queryset=Persona.objects.all(),
-        widget=forms.Select(attrs={"class": "form-select d-none"}),  # oculto en UI
+        widget=RemoteSelect(attrs={"class": "form-select d-none"}),  # oculto en UI
         required=True,
         label="Persona"
     )
-    sede = forms.ModelChoiceField(
+    sede = CachedModelChoiceField(
         queryset=Sede.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    medio_ingreso = forms.ModelChoiceField(
+    medio_ingreso = CachedModelChoiceField(
         queryset=MedioIngreso.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    rol = forms.ModelChoiceField(
+    rol = CachedModelChoiceField(
         queryset=Rol.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    tipo_solicitud = forms.ModelChoiceField(
+    tipo_solicitud = CachedModelChoiceField(
         queryset=TipoSolicitud.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    estado_expediente = forms.ModelChoiceField(
+    estado_expediente = CachedModelChoiceField(
         queryset=EstadoExpediente.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    grupo_etario = forms.ModelChoiceField(
+    grupo_etario = CachedModelChoiceField(
         queryset=GrupoEtario.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
@@ -85,7 +86,7 @@ class DemandaEspontanea(forms.Form):
         required=False,
         widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2})
     )
-    resumen_intervencion = forms.ModelChoiceField(
+    resumen_intervencion = CachedModelChoiceField(
         queryset=ResumenIntervencion.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
@@ -120,17 +121,17 @@ class OficioForm(forms.Form):
         ),
         input_formats=['%Y-%m-%d']
     )
-    sede = forms.ModelChoiceField(
+    sede = CachedModelChoiceField(
         label="Sede",
         queryset=Sede.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    institucion = forms.ModelChoiceField(
+    institucion = RemoteModelChoiceField(
         label="Institución:",
         queryset=Institucion.objects.all(),
-        widget=forms.Select(attrs={'class': 'form-control'})
+        widget=RemoteSelect(attrs={'class': 'form-control'})
     )
-    medio_ingreso = forms.ModelChoiceField(
+    medio_ingreso = CachedModelChoiceField(
         label="Medio de ingreso:",
         queryset=MedioIngreso.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -176,17 +177,17 @@ class OficioForm(forms.Form):
         required=False,
         widget=forms.TextInput(attrs={'class': 'form-control'})
     )
-    tipo_solicitud = forms.ModelChoiceField(
+    tipo_solicitud = CachedModelChoiceField(
         label="Tipo de solicitud:",
         queryset=TipoSolicitud.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    estado_expediente = forms.ModelChoiceField(
+    estado_expediente = CachedModelChoiceField(
         label="Estado del expediente:",
         queryset=EstadoExpediente.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    grupo_etario = forms.ModelChoiceField(
+    grupo_etario = CachedModelChoiceField(
         label="Grupo Etario al que pertenece:",
         queryset=GrupoEtario.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -201,16 +202,16 @@ class OficioForm(forms.Form):
         required=False,
         widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2})
     )
-    rol = forms.ModelChoiceField(
+    rol = CachedModelChoiceField(
         queryset=Rol.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    tipo_patrocinio = forms.ModelChoiceField(
+    tipo_patrocinio = CachedModelChoiceField(
         label="Tipo de patrocinio:",
         queryset=TipoPatrocinio.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    resumen_intervencion = forms.ModelChoiceField(
+    resumen_intervencion = CachedModelChoiceField(
         label="Resumén de intervención:",
         queryset=ResumenIntervencion.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -247,12 +248,12 @@ class SecretariaForm(forms.Form):
         ),
         input_formats=['%Y-%m-%d']
     )
-    sede = forms.ModelChoiceField(
+    sede = CachedModelChoiceField(
         label="Sede",
         queryset=Sede.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    medio_ingreso = forms.ModelChoiceField(
+    medio_ingreso = CachedModelChoiceField(
         label="Medio de ingreso:",
         queryset=MedioIngreso.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -299,17 +300,17 @@ class SecretariaForm(forms.Form):
         required=False,
         widget=forms.TextInput(attrs={'class': 'form-control'})
     )
-    tipo_solicitud = forms.ModelChoiceField(
+    tipo_solicitud = CachedModelChoiceField(
         label="Tipo de solicitud:",
         queryset=TipoSolicitud.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    estado_expediente = forms.ModelChoiceField(
+    estado_expediente = CachedModelChoiceField(
         label="Estado del expediente:",
         queryset=EstadoExpediente.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    grupo_etario = forms.ModelChoiceField(
+    grupo_etario = CachedModelChoiceField(
         label="Grupo Etario al que pertenece:",
         queryset=GrupoEtario.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -324,12 +325,12 @@ class SecretariaForm(forms.Form):
         required=False,
         widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2})
     )
-    resumen_intervencion = forms.ModelChoiceField(
+    resumen_intervencion = CachedModelChoiceField(
         label="Resumén de intervención:",
         queryset=ResumenIntervencion.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    tipo_patrocinio = forms.ModelChoiceField(
+    tipo_patrocinio = CachedModelChoiceField(
         label="Tipo de patrocinio:",
         queryset=TipoPatrocinio.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -375,6 +376,15 @@ ExpedienteDocumentoFormSet = modelformset_factory(
 )
 
 
+# Inicio de una subida por partes (expediente.subidas): datos del archivo que manda el navegador
+class SubidaDocumentoForm(forms.Form):
+    nombre = forms.CharField(max_length=255, required=False)
+    nombre_archivo = forms.CharField(max_length=255)
+    tamanio = forms.IntegerField(min_value=1)
+    tipo_mime = forms.CharField(max_length=100, required=False)
+    sha256 = forms.RegexField(regex=r'^[0-9a-fA-F]{64}$', required=False)
+
+
 # class ExpedienteInstitucionForm(forms.Form):
 #     expediente = forms.ModelChoiceField(
 #         label="Expediente",
@@ -407,9 +417,13 @@ class ExpedienteInstitucionForm(forms.ModelForm):
     class Meta:
         model = ExpedienteInstitucion
         fields = ['expediente', 'institucion', 'rol']
+        field_classes = {
+            'institucion': RemoteModelChoiceField,  # sólo la opción elegida, el resto por AJAX
+            'rol': CachedModelChoiceField,  # catálogo: opciones desde la cache
+        }
         widgets = {
             'expediente': forms.HiddenInput(),  # oculto en UI, pero envía el valor
-            'institucion': forms.Select(attrs={'id': 'id_institucion'}),
+            'institucion': RemoteSelect(attrs={'id': 'id_institucion'}, url='expediente:buscar_instituciones'),
             'rol': forms.Select(attrs={'class': 'form-select'}),
         }
 
@@ -426,9 +440,13 @@ class ExpedientePersonaForm(forms.ModelForm):
     class Meta:
         model = ExpedientePersona
         fields = ['expediente', 'persona', 'rol']
+        field_classes = {
+            'persona': RemoteModelChoiceField,  # sólo la opción elegida, el resto por AJAX
+            'rol': CachedModelChoiceField,  # catálogo: opciones desde la cache
+        }
         widgets = {
             'expediente': forms.HiddenInput(),  # oculto en UI, pero envía el valor
-            'persona': forms.Select(attrs={'id': 'id_persona'}),   # select visible y estilizado
+            'persona': RemoteSelect(attrs={'id': 'id_persona'}, url='expediente:buscar_personas'),   # select visible y estilizado
             'rol': forms.Select(attrs={'class': 'form-select'}),
         }
 
@@ -0,0 +1,82 @@
+import statistics
+import time
+
+from django import forms
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Tipo_Documento
+from persona.models import Persona
+from expediente.forms import DemandaEspontanea
+
+
+class DemandaEspontaneaAnterior(DemandaEspontanea):
+    # Como era el campo antes de core.fields.RemoteModelChoiceField
+    persona = forms.ModelChoiceField(
+        queryset=Persona.objects.all(),
+        widget=forms.Select(attrs={"class": "form-select d-none"}),
+        required=True,
+        label="Persona"
+    )
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo de renderizado del formulario de demanda espontánea con el "
+        "select de personas completo y con RemoteModelChoiceField; los datos se descartan al terminar"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=100000)
+        parser.add_argument('--repeticiones', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                persona = self._crear_personas(options['cantidad'])
+                for nombre, formulario in (('anterior', DemandaEspontaneaAnterior), ('remoto', DemandaEspontanea)):
+                    self._renderizar(formulario, persona)  # calienta caches (catálogos, plantillas)
+                    tiempos, consultas, tamanio = self._medir(formulario, persona, options['repeticiones'])
+                    self.stdout.write(
+                        f"{nombre:<9} p50 {statistics.median(tiempos):9.2f} ms   "
+                        f"max {max(tiempos):9.2f} ms   {consultas} consultas   {tamanio / 1024:9.1f} KiB"
+                    )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _crear_personas(self, cantidad):
+        tipo, _ = Tipo_Documento.objects.get_or_create(tipo_documento='DNI')
+        lote = []
+        for i in range(cantidad):
+            lote.append(Persona(
+                tipo_documento=tipo,
+                numero_documento=f'BENCH{10000000 + i}',
+                nombre=f'Nombre{i}',
+                apellido=f'Apellido{i}',
+            ))
+            if len(lote) == 5000:
+                Persona.objects.bulk_create(lote)
+                lote = []
+        Persona.objects.bulk_create(lote)
+        self.stdout.write(f"{cantidad} personas creadas.")
+        return Persona.objects.filter(numero_documento__startswith='BENCH').order_by('-id').first()
+
+    @staticmethod
+    def _renderizar(formulario, persona):
+        # Como lo muestra la vista al volver de elegir la persona
+        return str(formulario(initial={'persona': persona}))
+
+    def _medir(self, formulario, persona, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                html = self._renderizar(formulario, persona)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos, len(consultas), len(html)
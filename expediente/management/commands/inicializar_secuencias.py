@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from expediente.models import Expediente, ExpedienteSecuencia
+
+class Command(BaseCommand):
+    help = "Carga ExpedienteSecuencia con el mayor número de expediente existente por sede y año"
+
+    def handle(self, *args, **kwargs):
+        maximos = (
+            Expediente.objects
+            .values('sede_id', 'anio')
+            .annotate(maximo=Max('numero'))
+            .order_by('sede_id', 'anio')
+        )
+
+        creadas = actualizadas = 0
+        with transaction.atomic():
+            for fila in maximos:
+                secuencia, creada = ExpedienteSecuencia.objects.select_for_update().get_or_create(
+                    sede_id=fila['sede_id'],
+                    anio=fila['anio'],
+                    defaults={'ultimo_numero': fila['maximo']},
+                )
+                if creada:
+                    creadas += 1
+                elif secuencia.ultimo_numero < fila['maximo']:
+                    # Nunca se retrocede una secuencia: sólo se adelanta si quedó atrás
+                    secuencia.ultimo_numero = fila['maximo']
+                    secuencia.save(update_fields=['ultimo_numero'])
+                    actualizadas += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Secuencias creadas: {creadas}, actualizadas: {actualizadas}."
+        ))
@@ -1,43 +1,138 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 from django.core.management.base import BaseCommand
-from django.conf import settings
+
+from core.almacenamiento import CARPETA_TEMPORAL, bloqueo, sha256_de_ruta
 from expediente.models import ExpedienteDocumento
+from expediente.signals import archivo_en_uso
+
+CARPETA_CUARENTENA = '.cuarentena'
+
+
+def _lotes(iterable, tamanio):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamanio)):
+        yield lote
+
 
 class Command(BaseCommand):
-    help = "Elimina archivos huérfanos en la carpeta media/documentos/expedientes"
+    help = (
+        "Compara media/documentos/expedientes con ExpedienteDocumento: informa los archivos "
+        "huérfanos (en disco y no en la BD), los faltantes (en la BD y no en disco) y los que no "
+        "coinciden con su sha256, y elimina o pone en cuarentena los huérfanos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa, no mueve ni borra nada")
+        parser.add_argument('--quarantine', action='store_true',
+                            help=f"Mueve los huérfanos a MEDIA_ROOT/{CARPETA_CUARENTENA}/ en lugar de borrarlos")
+        parser.add_argument('--workers', type=int, default=4, help="Hilos para verificar los sha256")
+        parser.add_argument('--lote', type=int, default=1000, help="Archivos / filas por consulta")
+        parser.add_argument('--antiguedad', type=int, default=60,
+                            help="Minutos: los archivos más nuevos no se tratan como huérfanos (pueden estar subiéndose)")
 
-    def handle(self, *args, **kwargs):
-        documentos_path = os.path.join(settings.MEDIA_ROOT, "documentos", "expedientes")
+    def handle(self, *args, **options):
+        campo = ExpedienteDocumento._meta.get_field('archivo')
+        self.storage = campo.storage
+        self.options = options
+        carpeta = self.storage.path(campo.upload_to)
 
-        if not os.path.exists(documentos_path):
-            self.stdout.write(self.style.WARNING("La carpeta 'media/documentos/expedientes' no existe."))
+        if not os.path.exists(carpeta):
+            self.stdout.write(self.style.WARNING(f"La carpeta '{carpeta}' no existe."))
             return
 
-        # Archivos que están en la BD (ruta relativa al MEDIA_ROOT)
-        archivos_en_bd = set(
-            ExpedienteDocumento.objects.exclude(archivo="").values_list("archivo", flat=True)
-        )
+        # Todo se procesa por lotes: la memoria no depende de cuántos archivos ni filas haya
+        huerfanos = self._huerfanos(carpeta)
+        faltantes, distintos = self._verificar_bd()
 
-        # Normalizar: quedarnos solo con el nombre del archivo
-        archivos_en_bd = {os.path.basename(str(path)) for path in archivos_en_bd}
+        accion = "a revisar" if options['dry_run'] else ("en cuarentena" if options['quarantine'] else "eliminados")
+        self.stdout.write(self.style.SUCCESS(
+            f"Huérfanos {accion}: {huerfanos}. Faltantes en disco: {faltantes}. "
+            f"Con sha256 distinto: {distintos}."
+        ))
 
-        # Archivos realmente presentes en la carpeta
-        archivos_en_fs = set(os.listdir(documentos_path))
+    # -- Disco -> BD --------------------------------------------------------
 
-        # Detectar huérfanos
-        huerfanos = archivos_en_fs - archivos_en_bd
+    def _archivos(self, carpeta):
+        """Archivos de `carpeta` y sus subcarpetas con os.scandir, sin armar la lista completa."""
+        pendientes = [carpeta]
+        while pendientes:
+            with os.scandir(pendientes.pop()) as entradas:
+                for entrada in entradas:
+                    if entrada.is_dir(follow_symlinks=False):
+                        if entrada.name not in (CARPETA_TEMPORAL, CARPETA_CUARENTENA):
+                            pendientes.append(entrada.path)
+                    elif entrada.is_file(follow_symlinks=False):
+                        yield entrada
 
-        if not huerfanos:
-            self.stdout.write(self.style.SUCCESS("No se encontraron archivos huérfanos."))
-            return
+    def _nombre(self, ruta):
+        # Nombre como se guarda en el FileField: relativo a MEDIA_ROOT y con '/'
+        return os.path.relpath(ruta, self.storage.location).replace(os.sep, '/')
+
+    def _huerfanos(self, carpeta):
+        limite = time.time() - self.options['antiguedad'] * 60
+        total = 0
+        for lote in _lotes(self._archivos(carpeta), self.options['lote']):
+            nombres = {self._nombre(entrada.path): entrada for entrada in lote}
+            en_bd = set(
+                ExpedienteDocumento.objects.filter(archivo__in=list(nombres)).values_list('archivo', flat=True)
+            )
+            for nombre, entrada in nombres.items():
+                if nombre in en_bd or entrada.stat(follow_symlinks=False).st_mtime > limite:
+                    continue
+                total += 1
+                self.stdout.write(self.style.WARNING(f"Huérfano: {nombre}"))
+                if not self.options['dry_run']:
+                    self._descartar(nombre)
+        return total
 
-        # Borrar huérfanos
-        for archivo in huerfanos:
-            ruta = os.path.join(documentos_path, archivo)
+    def _descartar(self, nombre):
+        # Con el mismo bloqueo que usa el storage: si alguien lo acaba de volver a usar, se deja
+        with bloqueo(nombre):
+            if archivo_en_uso(nombre):
+                return
+            origen = self.storage.path(nombre)
             try:
-                os.remove(ruta)
-                self.stdout.write(self.style.WARNING(f"Archivo eliminado: {archivo}"))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"No se pudo eliminar {archivo}: {e}"))
+                if self.options['quarantine']:
+                    destino = self.storage.path(os.path.join(CARPETA_CUARENTENA, nombre))
+                    os.makedirs(os.path.dirname(destino), exist_ok=True)
+                    os.replace(origen, destino)
+                else:
+                    os.remove(origen)
+            except OSError as e:
+                self.stdout.write(self.style.ERROR(f"No se pudo procesar {nombre}: {e}"))
 
-        self.stdout.write(self.style.SUCCESS("Limpieza de archivos huérfanos completada."))
+    # -- BD -> disco --------------------------------------------------------
+
+    def _verificar(self, fila):
+        nombre, sha256 = fila
+        ruta = self.storage.path(nombre)
+        if not os.path.isfile(ruta):
+            return nombre, 'faltante'
+        if sha256 and sha256_de_ruta(ruta) != sha256:
+            return nombre, 'distinto'
+        return nombre, None
+
+    def _verificar_bd(self):
+        filas = (
+            ExpedienteDocumento.objects.exclude(archivo='')
+            .order_by('archivo', 'sha256')
+            .values_list('archivo', 'sha256')
+            .distinct()
+            .iterator(chunk_size=self.options['lote'])
+        )
+        faltantes = distintos = 0
+        with ThreadPoolExecutor(max_workers=self.options['workers']) as pool:
+            # map() por lote: nunca hay más de `lote` verificaciones pendientes
+            for lote in _lotes(filas, self.options['lote']):
+                for nombre, problema in pool.map(self._verificar, lote):
+                    if problema == 'faltante':
+                        faltantes += 1
+                        self.stdout.write(self.style.ERROR(f"Falta en disco: {nombre}"))
+                    elif problema == 'distinto':
+                        distintos += 1
+                        self.stdout.write(self.style.ERROR(f"El contenido no coincide con su sha256: {nombre}"))
+        return faltantes, distintos
@@ -0,0 +1,59 @@
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expediente.models import SubidaDocumento
+from expediente.subidas import CARPETA_SUBIDAS, carpeta_temporal
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las subidas por partes sin actividad (expediente.subidas) con sus temporales, "
+        "y los temporales que ya no tienen subida"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=settings.SUBIDAS_VENCIMIENTO_HORAS,
+                            help="Horas sin recibir partes para considerar vencida una subida")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa, no borra nada")
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(hours=options['horas'])
+        vencidas = SubidaDocumento.objects.filter(actualizada__lt=limite)
+        for subida in vencidas.only('pk', 'nombre_archivo', 'recibido', 'tamanio').iterator():
+            self.stdout.write(self.style.WARNING(f"Vencida: {subida.pk} {subida}"))
+        if options['dry_run']:
+            total = vencidas.count()
+        else:
+            # La señal post_delete borra el temporal de cada una
+            total = vencidas.delete()[1].get(SubidaDocumento._meta.label, 0)
+
+        huerfanos = self._temporales_huerfanos(time.time() - options['horas'] * 3600, options['dry_run'])
+        accion = "a borrar" if options['dry_run'] else "borradas"
+        self.stdout.write(self.style.SUCCESS(
+            f"Subidas vencidas {accion}: {total}. Temporales sin subida: {huerfanos}."
+        ))
+
+    def _temporales_huerfanos(self, limite, dry_run):
+        """Temporales viejos de subidas que ya no existen (por ejemplo, si se cortó un borrado)."""
+        total = 0
+        with os.scandir(carpeta_temporal()) as entradas:
+            for entrada in entradas:
+                nombre, extension = os.path.splitext(entrada.name)
+                if extension != '.part' or entrada.stat().st_mtime > limite:
+                    continue
+                try:
+                    if SubidaDocumento.objects.filter(pk=uuid.UUID(nombre)).exists():
+                        continue
+                except ValueError:
+                    pass
+                total += 1
+                self.stdout.write(self.style.WARNING(f"Temporal sin subida: {CARPETA_SUBIDAS}/{entrada.name}"))
+                if not dry_run:
+                    os.remove(entrada.path)
+        return total
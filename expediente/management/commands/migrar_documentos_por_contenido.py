@@ -0,0 +1,66 @@
+import mimetypes
+import posixpath
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.almacenamiento import TIPO_MIME_POR_DEFECTO, liberar
+from expediente.models import ExpedienteDocumento
+from expediente.signals import archivo_en_uso
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve los archivos de ExpedienteDocumento cargados antes del almacenamiento por contenido "
+        "a documentos/expedientes/ab/cd/<sha256> y completa sha256, tamaño y tipo MIME, por lotes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help="Documentos por transacción")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa cuántos documentos faltan migrar")
+
+    def handle(self, *args, **options):
+        pendientes = ExpedienteDocumento.objects.filter(sha256='').exclude(archivo='')
+        if options['dry_run']:
+            self.stdout.write(f"{pendientes.count()} documentos por migrar.")
+            return
+
+        storage = ExpedienteDocumento._meta.get_field('archivo').storage
+        migrados = faltantes = 0
+        ultimo = 0
+        while True:
+            # Por pk y no por OFFSET: los ya migrados dejan de cumplir el filtro
+            lote = list(pendientes.filter(pk__gt=ultimo).order_by('pk').only('pk', 'archivo')[:options['lote']])
+            if not lote:
+                break
+            ultimo = lote[-1].pk
+
+            movidos, anteriores = [], set()
+            for documento in lote:
+                anterior = documento.archivo.name
+                if not storage.exists(anterior):
+                    faltantes += 1
+                    self.stdout.write(self.style.WARNING(f"Documento {documento.pk}: no existe {anterior}"))
+                    continue
+                with storage.open(anterior, 'rb') as contenido:
+                    nombre = storage.save(anterior, contenido)
+                documento.archivo = nombre
+                documento.sha256 = posixpath.splitext(posixpath.basename(nombre))[0]
+                documento.tamanio = storage.size(nombre)
+                documento.tipo_mime = mimetypes.guess_type(anterior)[0] or TIPO_MIME_POR_DEFECTO
+                movidos.append(documento)
+                if nombre != anterior:
+                    anteriores.add(anterior)
+
+            with transaction.atomic():
+                ExpedienteDocumento.objects.bulk_update(movidos, ['archivo', 'sha256', 'tamanio', 'tipo_mime'])
+                # El archivo viejo se borra al confirmar el lote, si ningún otro documento lo sigue usando
+                for anterior in anteriores:
+                    liberar(storage, anterior, archivo_en_uso)
+
+            migrados += len(movidos)
+            self.stdout.write(f"{migrados} documentos migrados...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Migración terminada: {migrados} documentos migrados, {faltantes} sin archivo en disco."
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_auto_20250820_2030'),
+        ('expediente', '0019_expedienteinstitucion_unique_expediente_institucion_rol_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpedienteSecuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField(verbose_name='Año')),
+                ('ultimo_numero', models.PositiveIntegerField(default=0, verbose_name='Último número asignado')),
+                ('sede', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expediente_secuencias', to='core.sede', verbose_name='Sede')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de expedientes',
+                'verbose_name_plural': 'Secuencias de expedientes',
+                'constraints': [models.UniqueConstraint(fields=('sede', 'anio'), name='unique_secuencia_sede_anio')],
+            },
+        ),
+    ]
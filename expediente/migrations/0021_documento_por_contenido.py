@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:43
+
+import core.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expediente', '0020_expedientesecuencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expedientedocumento',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='expedientedocumento',
+            name='tamanio',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Tamaño en bytes'),
+        ),
+        migrations.AddField(
+            model_name='expedientedocumento',
+            name='tipo_mime',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Tipo MIME'),
+        ),
+        migrations.AlterField(
+            model_name='expedientedocumento',
+            name='archivo',
+            field=models.FileField(max_length=255, storage=core.almacenamiento.almacenamiento_documentos, upload_to='documentos/expedientes/', verbose_name='Archivo'),
+        ),
+    ]
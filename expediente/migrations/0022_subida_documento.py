@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:55
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expediente', '0021_documento_por_contenido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaDocumento',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre', models.CharField(blank=True, max_length=255, verbose_name='Nombre del documento')),
+                ('nombre_archivo', models.CharField(max_length=255, verbose_name='Nombre del archivo')),
+                ('tipo_mime', models.CharField(blank=True, max_length=100, verbose_name='Tipo MIME')),
+                ('tamanio', models.PositiveBigIntegerField(verbose_name='Tamaño en bytes')),
+                ('tamanio_parte', models.PositiveIntegerField(verbose_name='Tamaño de cada parte')),
+                ('recibido', models.PositiveBigIntegerField(default=0, verbose_name='Bytes recibidos')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 esperado')),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('actualizada', models.DateTimeField(auto_now=True, db_index=True)),
+                ('expediente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas', to='expediente.expediente')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_documentos', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Max
 from django.utils import timezone
+from core.almacenamiento import almacenamiento_documentos
+from core.miniaturas import es_imagen
 from core.models import Sede, Rol
 from persona.models import Persona
 from institucion.models import Institucion
@@ -124,14 +130,14 @@ class Expediente(models.Model):
             # Tomar la abreviatura desde la sede si no está cargada
             if not self.abreviatura and self.sede:
                 self.abreviatura = self.sede.abreviatura.upper()
-            # Obtener el último número para esa sede y año
-            ultimo = Expediente.objects.filter(
-                sede=self.sede,
-                anio=self.anio
-            ).order_by('-numero').first()
-            self.numero = (ultimo.numero + 1) if ultimo else 1
-            # Crear identificador
-            self.identificador = f"{self.abreviatura}-{str(self.numero).zfill(5)}-{self.anio}"
+            # El número se toma de la secuencia de la sede/año dentro de la misma
+            # transacción que el INSERT: si el guardado falla, el número no se consume.
+            with transaction.atomic():
+                self.numero = ExpedienteSecuencia.siguiente_numero(self.sede, self.anio)
+                # Crear identificador
+                self.identificador = f"{self.abreviatura}-{str(self.numero).zfill(5)}-{self.anio}"
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -139,6 +145,50 @@ class Expediente(models.Model):
 
 
 
+class ExpedienteSecuencia(models.Model):
+    """
+    Último número de expediente asignado por sede y año.
+    Reemplaza el "buscar el mayor número y sumar 1", que no es seguro con varios
+    workers creando expedientes a la vez y recorre el índice en cada alta.
+    """
+    sede = models.ForeignKey(Sede, on_delete=models.CASCADE, related_name='expediente_secuencias', verbose_name='Sede')
+    anio = models.PositiveIntegerField("Año")
+    ultimo_numero = models.PositiveIntegerField("Último número asignado", default=0)
+
+    class Meta:
+        verbose_name = 'Secuencia de expedientes'
+        verbose_name_plural = 'Secuencias de expedientes'
+        constraints = [
+            models.UniqueConstraint(fields=['sede', 'anio'], name='unique_secuencia_sede_anio'),
+        ]
+
+    def __str__(self):
+        return f"{self.sede} {self.anio}: {self.ultimo_numero}"
+
+    @staticmethod
+    def _maximo_existente(sede, anio):
+        return Expediente.objects.filter(sede=sede, anio=anio).aggregate(maximo=Max('numero'))['maximo'] or 0
+
+    @classmethod
+    def siguiente_numero(cls, sede, anio):
+        """
+        Reserva y devuelve el próximo número para la sede y año.
+        Debe llamarse dentro de transaction.atomic(): la fila de la secuencia queda
+        bloqueada (SELECT ... FOR UPDATE) hasta que termina la transacción, así dos
+        altas simultáneas nunca obtienen el mismo número.
+        Si la secuencia todavía no existe arranca desde el mayor número ya cargado.
+        """
+        secuencia, _ = cls.objects.select_for_update().get_or_create(
+            sede=sede,
+            anio=anio,
+            defaults={'ultimo_numero': lambda: cls._maximo_existente(sede, anio)},
+        )
+        secuencia.ultimo_numero += 1
+        secuencia.save(update_fields=['ultimo_numero'])
+        return secuencia.ultimo_numero
+
+
+
 class ExpedienteDocumento(models.Model):
     expediente = models.ForeignKey(
         'Expediente',
@@ -146,12 +196,66 @@ class ExpedienteDocumento(models.Model):
         on_delete=models.CASCADE
     )
     nombre = models.CharField("Nombre del documento", max_length=255, blank=True, null=True)
-    archivo = models.FileField("Archivo", upload_to="documentos/expedientes/")
+    # Se guarda por contenido (core.almacenamiento): documentos/expedientes/ab/cd/<sha256>.<ext>
+    archivo = models.FileField(
+        "Archivo", upload_to="documentos/expedientes/", storage=almacenamiento_documentos, max_length=255,
+    )
+    sha256 = models.CharField("SHA-256", max_length=64, blank=True, db_index=True)
+    tamanio = models.PositiveBigIntegerField("Tamaño en bytes", blank=True, null=True)
+    tipo_mime = models.CharField("Tipo MIME", max_length=100, blank=True)
     fecha_subida = models.DateField(auto_now_add=True)
 
+    # Carpeta de las miniaturas (core.miniaturas); queda dentro de documentos/, que nginx no sirve directo
+    CARPETA_MINIATURAS = 'documentos/miniaturas'
+
     def __str__(self):
         return f"{self.nombre or 'Documento'}"
 
+    def save(self, *args, **kwargs):
+        # El storage guarda el archivo bajo core.almacenamiento.bloqueo(): en una sola
+        # transacción el bloqueo dura hasta después del INSERT/UPDATE, así un liberar()
+        # simultáneo del mismo contenido ve la fila y no borra el archivo.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @property
+    def es_imagen(self):
+        return es_imagen(self.tipo_mime)
+
+
+class SubidaDocumento(models.Model):
+    """
+    Subida por partes de un documento (expediente.subidas) que todavía no se completó.
+    Las partes se escriben en orden en un temporal; la fila se borra al completar,
+    al cancelar o cuando vence (comando limpiar_subidas_vencidas).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    expediente = models.ForeignKey(Expediente, on_delete=models.CASCADE, related_name='subidas')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='subidas_documentos')
+    nombre = models.CharField("Nombre del documento", max_length=255, blank=True)
+    nombre_archivo = models.CharField("Nombre del archivo", max_length=255)
+    tipo_mime = models.CharField("Tipo MIME", max_length=100, blank=True)
+    tamanio = models.PositiveBigIntegerField("Tamaño en bytes")
+    tamanio_parte = models.PositiveIntegerField("Tamaño de cada parte")
+    recibido = models.PositiveBigIntegerField("Bytes recibidos", default=0)
+    sha256 = models.CharField("SHA-256 esperado", max_length=64, blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.recibido}/{self.tamanio})"
+
+    @property
+    def partes(self):
+        return -(-self.tamanio // self.tamanio_parte)
+
+    @property
+    def siguiente_parte(self):
+        return self.recibido // self.tamanio_parte
+
+    def largo_parte(self, numero):
+        return min(self.tamanio_parte, self.tamanio - numero * self.tamanio_parte)
+
 
 
 class ExpedientePersona(models.Model):
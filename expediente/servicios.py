@@ -0,0 +1,146 @@
+"""
+Alta de expedientes en una sola transacción.
+
+crear_expediente() guarda el expediente, sus vínculos con personas /
+instituciones y sus documentos dentro de un transaction.atomic(): si algo
+falla no queda un expediente a medias. Los vínculos y los documentos se
+insertan con bulk_create (una consulta por tabla sin importar cuántos sean).
+
+Los archivos subidos se escriben en el storage recién después del commit
+(transaction.on_commit): si la transacción se revierte no quedan archivos
+huérfanos en MEDIA_ROOT. Hasta entonces la fila ya tiene el nombre definitivo
+(el hash del contenido, que se calcula antes del INSERT). Si un archivo no se
+puede escribir, su fila se borra y el documento queda en ResultadoAlta.fallidos
+para avisarle al usuario.
+"""
+import logging
+import posixpath
+import time
+
+from django.db import transaction
+
+from core.almacenamiento import nombre_por_contenido
+from .models import Expediente, ExpedienteDocumento, ExpedienteInstitucion, ExpedientePersona
+from .signals import completar_datos_archivo, programar_miniaturas
+
+logger = logging.getLogger(__name__)
+
+
+class ResultadoAlta:
+    """
+    expediente y documentos creados; metricas: milisegundos de cada etapa
+    ('expediente', 'vinculos', 'documentos', 'total') y, una vez escritos
+    los archivos después del commit, 'archivos'; fallidos: documentos cuyo
+    archivo no se pudo guardar (ya sin fila en la base).
+    """
+
+    def __init__(self, expediente, documentos, metricas):
+        self.expediente = expediente
+        self.documentos = documentos
+        self.metricas = metricas
+        self.fallidos = []
+
+
+def _ms(inicio):
+    return round((time.perf_counter() - inicio) * 1000, 2)
+
+
+def campos_expediente(cleaned_data):
+    """Los valores de cleaned_data que son campos editables de Expediente."""
+    campos = {campo.name for campo in Expediente._meta.concrete_fields if campo.editable and not campo.primary_key}
+    return {nombre: valor for nombre, valor in cleaned_data.items() if nombre in campos}
+
+
+def documentos_del_formset(formset):
+    """Documentos sin guardar de un ExpedienteDocumentoFormSet ya validado (solo los que traen archivo)."""
+    documentos = []
+    for documento_form in formset:
+        if documento_form.cleaned_data.get('archivo') and not documento_form.cleaned_data.get('DELETE'):
+            documentos.append(documento_form.save(commit=False))
+    return documentos
+
+
+def _reservar_archivo(documento):
+    """
+    Completa sha256 / tamaño / tipo mime y pone en el documento el nombre con el
+    que se va a guardar el archivo (el de su contenido, ver core.almacenamiento),
+    sin escribirlo. Devuelve (nombre, contenido) para escribirlo después del commit.
+    """
+    campo = documento._meta.get_field('archivo')
+    contenido = documento.archivo.file
+    completar_datos_archivo(documento)
+    nombre = campo.generate_filename(documento, documento.archivo.name)
+    nombre = nombre_por_contenido(posixpath.dirname(nombre), documento.sha256, nombre)
+    # Con un str el FieldFile queda "committed": bulk_create no escribe el archivo
+    documento.archivo = nombre
+    return nombre, contenido
+
+
+def _escribir_archivos(pendientes, resultado):
+    campo = ExpedienteDocumento._meta.get_field('archivo')
+    inicio = time.perf_counter()
+    for documento, nombre, contenido in pendientes:
+        try:
+            guardado = campo.storage.save(nombre, contenido, max_length=campo.max_length)
+        except Exception:
+            logger.exception("No se pudo guardar el archivo %s del documento %s", nombre, documento.pk)
+            # Sin archivo la fila apuntaría a la nada: se borra y se informa
+            ExpedienteDocumento.objects.filter(pk=documento.pk).delete()
+            resultado.fallidos.append(documento)
+            continue
+        if guardado != nombre:
+            # El contenido cambió entre la reserva y la escritura
+            ExpedienteDocumento.objects.filter(pk=documento.pk).update(archivo=guardado)
+            documento.archivo = guardado
+        # bulk_create no dispara post_save
+        programar_miniaturas(documento)
+    if resultado.fallidos:
+        resultado.documentos = [documento for documento in resultado.documentos if documento not in resultado.fallidos]
+    resultado.metricas['archivos'] = _ms(inicio)
+
+
+def crear_expediente(datos, personas=(), instituciones=(), documentos=()):
+    """
+    Crea un expediente con sus vínculos y documentos.
+
+    datos: campos del Expediente (ver campos_expediente()).
+    personas / instituciones: pares (persona, rol) / (institucion, rol).
+    documentos: ExpedienteDocumento sin guardar con el archivo subido.
+    """
+    metricas = {}
+    inicio = time.perf_counter()
+    pendientes = []
+
+    with transaction.atomic():
+        etapa = time.perf_counter()
+        expediente = Expediente(**datos)
+        expediente.save()
+        metricas['expediente'] = _ms(etapa)
+
+        etapa = time.perf_counter()
+        ExpedientePersona.objects.bulk_create([
+            ExpedientePersona(expediente=expediente, persona=persona, rol=rol)
+            for persona, rol in personas
+        ])
+        ExpedienteInstitucion.objects.bulk_create([
+            ExpedienteInstitucion(expediente=expediente, institucion=institucion, rol=rol)
+            for institucion, rol in instituciones
+        ])
+        metricas['vinculos'] = _ms(etapa)
+
+        etapa = time.perf_counter()
+        documentos = list(documentos)
+        for documento in documentos:
+            documento.expediente = expediente
+            nombre, contenido = _reservar_archivo(documento)
+            pendientes.append((documento, nombre, contenido))
+        ExpedienteDocumento.objects.bulk_create(documentos)
+        metricas['documentos'] = _ms(etapa)
+
+        resultado = ResultadoAlta(expediente, documentos, metricas)
+        if pendientes:
+            transaction.on_commit(lambda: _escribir_archivos(pendientes, resultado))
+
+    metricas['total'] = _ms(inicio)
+    logger.info("Alta del expediente %s: %s", expediente.pk, metricas)
+    return resultado
@@ -1,34 +1,93 @@
 import os
-from django.db.models.signals import post_delete, pre_save
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import ExpedienteDocumento
+from core import miniaturas
+from core.almacenamiento import datos_archivo, liberar
+from .models import ExpedienteDocumento, SubidaDocumento
+
+
+def archivo_en_uso(nombre):
+    """Cantidad de referencias > 0: el mismo archivo puede estar en varios documentos."""
+    return ExpedienteDocumento.objects.filter(archivo=nombre).exists()
+
+
+def programar_miniaturas(documento):
+    if documento.es_imagen:
+        miniaturas.programar(
+            documento.archivo.storage, documento.archivo.name, documento.sha256, ExpedienteDocumento.CARPETA_MINIATURAS,
+        )
+
+
+def completar_datos_archivo(documento):
+    """Guarda en el documento el sha256, tamaño y tipo mime del archivo recién subido."""
+    documento.sha256, documento.tamanio, documento.tipo_mime = datos_archivo(
+        documento.archivo.file, documento.archivo.name,
+    )
 
 
 @receiver(post_delete, sender=ExpedienteDocumento)
 def eliminar_archivo_documento(sender, instance, **kwargs):
     """
-    Elimina el archivo físico cuando se borra el objeto.
+    Elimina el archivo físico cuando se borra el objeto, si ningún otro documento lo usa.
     """
-    if instance.archivo and instance.archivo.path:
-        if os.path.isfile(instance.archivo.path):
-            os.remove(instance.archivo.path)
+    if instance.archivo:
+        liberar(instance.archivo.storage, instance.archivo.name, archivo_en_uso)
+    if instance.sha256:
+        # Las miniaturas de ese contenido también, cuando ya ningún documento lo tiene
+        def en_uso(nombre):
+            return ExpedienteDocumento.objects.filter(sha256=instance.sha256).exists()
+
+        for tamanio in miniaturas.TAMANIOS:
+            nombre = miniaturas.nombre_miniatura(ExpedienteDocumento.CARPETA_MINIATURAS, instance.sha256, tamanio)
+            liberar(instance.archivo.storage, nombre, en_uso)
 
 
 @receiver(pre_save, sender=ExpedienteDocumento)
-def reemplazar_archivo_documento(sender, instance, **kwargs):
+def reemplazar_archivo_documento(sender, instance, raw=False, **kwargs):
     """
-    Si se sube un nuevo archivo en lugar de otro, elimina el anterior.
+    Si se sube un nuevo archivo en lugar de otro, elimina el anterior (si ningún otro documento lo usa).
     """
+    if raw:  # loaddata
+        return
+
+    if instance.archivo and not instance.archivo._committed:
+        completar_datos_archivo(instance)
+
     if not instance.pk:
         # Si es un objeto nuevo, no hay nada que eliminar
         return
 
-    try:
-        documento_anterior = ExpedienteDocumento.objects.get(pk=instance.pk)
-    except ExpedienteDocumento.DoesNotExist:
-        return
+    anterior = ExpedienteDocumento.objects.filter(pk=instance.pk).values_list('archivo', flat=True).first()
 
     # Si el archivo cambió
-    if documento_anterior.archivo and documento_anterior.archivo != instance.archivo:
-        if os.path.isfile(documento_anterior.archivo.path):
-            os.remove(documento_anterior.archivo.path)
+    if anterior and anterior != instance.archivo.name:
+        liberar(instance.archivo.storage, anterior, archivo_en_uso)
+
+
+@receiver(post_save, sender=ExpedienteDocumento)
+def generar_miniaturas_documento(sender, instance, raw=False, **kwargs):
+    """
+    Encola las miniaturas de las imágenes (si ya existen para ese contenido no se vuelven a generar).
+    """
+    if not raw:
+        programar_miniaturas(instance)
+
+
+@receiver(post_delete, sender=SubidaDocumento)
+def eliminar_temporal_subida(sender, instance, **kwargs):
+    """
+    Borra el temporal de una subida por partes completada, cancelada o vencida.
+    """
+    from .subidas import ruta_temporal
+
+    ruta = ruta_temporal(instance.pk)
+
+    def borrar():
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+    transaction.on_commit(borrar)
@@ -0,0 +1,182 @@
+"""
+Subida por partes (reanudable) de documentos de expedientes.
+
+Un escaneo grande no viaja en un solo POST multipart que puede vencer el
+timeout del worker: el navegador lo manda en partes de
+settings.SUBIDAS_TAMANIO_PARTE bytes.
+
+1. iniciar(): crea la SubidaDocumento y un temporal vacío en
+   MEDIA_ROOT/.tmp/subidas/<id>.part.
+2. recibir_parte(): escribe la parte N a continuación de lo recibido, en
+   bloques, mientras calcula su sha256. Las partes van en orden: una parte ya
+   recibida se acepta sin volver a escribirla (reintento) y una posterior a la
+   siguiente se rechaza. Si se corta la conexión, el cliente consulta
+   `recibido` / `siguiente_parte` y sigue desde ahí.
+3. completar(): con todo recibido, mueve el temporal al storage por contenido
+   con os.replace (atómico, sin copiar) y crea el ExpedienteDocumento.
+
+El sha256 del archivo completo se va calculando con cada parte mientras las
+partes llegan al mismo proceso; si no (otro worker, reinicio) se calcula al
+completar, leyendo el temporal una sola vez.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from core.almacenamiento import TAMANIO_BLOQUE, TIPO_MIME_POR_DEFECTO, sha256_de_ruta
+from .models import ExpedienteDocumento, SubidaDocumento
+
+logger = logging.getLogger(__name__)
+
+CARPETA_SUBIDAS = 'subidas'
+
+# id de subida -> (bytes ya sumados, hashlib.sha256) de este proceso
+_sumas = {}
+_lock = threading.Lock()
+
+
+class ErrorSubida(Exception):
+    """Pedido que no se puede aplicar a la subida; `estado` es el código HTTP para responder."""
+
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _storage():
+    return ExpedienteDocumento._meta.get_field('archivo').storage
+
+
+def carpeta_temporal():
+    return _storage().carpeta_temporal(CARPETA_SUBIDAS)
+
+
+def ruta_temporal(subida_id):
+    return os.path.join(carpeta_temporal(), f'{subida_id}.part')
+
+
+def _tomar_suma(subida):
+    """El sha256 acumulado hasta subida.recibido, si este proceso lo tiene."""
+    with _lock:
+        sumado, suma = _sumas.pop(subida.pk, (None, None))
+    if sumado == subida.recibido:
+        return suma
+    return hashlib.sha256() if subida.recibido == 0 else None
+
+
+def _guardar_suma(subida, suma):
+    if suma is None:
+        return
+    with _lock:
+        if len(_sumas) >= 256:
+            # Subidas abandonadas: no se acumulan indefinidamente
+            _sumas.clear()
+        _sumas[subida.pk] = (subida.recibido, suma)
+
+
+def iniciar(expediente, usuario, nombre_archivo, tamanio, nombre='', tipo_mime='', sha256=''):
+    if tamanio <= 0:
+        raise ErrorSubida("El archivo está vacío.")
+    if tamanio > settings.SUBIDAS_TAMANIO_MAXIMO:
+        raise ErrorSubida(f"El archivo supera el máximo de {settings.SUBIDAS_TAMANIO_MAXIMO} bytes.", 413)
+    subida = SubidaDocumento.objects.create(
+        expediente=expediente,
+        usuario=usuario,
+        nombre=nombre,
+        nombre_archivo=os.path.basename(nombre_archivo),
+        tipo_mime=mimetypes.guess_type(nombre_archivo)[0] or tipo_mime or TIPO_MIME_POR_DEFECTO,
+        tamanio=tamanio,
+        tamanio_parte=settings.SUBIDAS_TAMANIO_PARTE,
+        sha256=sha256.lower(),
+    )
+    open(ruta_temporal(subida.pk), 'wb').close()
+    return subida
+
+
+def recibir_parte(subida, numero, origen, sha256=''):
+    """
+    Escribe la parte `numero` leyéndola de `origen` (el request, o cualquier objeto
+    con read()). sha256: el que informó el cliente para la parte, si lo mandó.
+    Devuelve (subida actualizada, sha256 de la parte).
+    """
+    with transaction.atomic():
+        # Dos pedidos para la misma subida se ejecutan de a uno
+        subida = SubidaDocumento.objects.select_for_update().get(pk=subida.pk)
+        if numero >= subida.partes:
+            raise ErrorSubida(f"La subida tiene {subida.partes} partes (de 0 a {subida.partes - 1}).")
+        if numero < subida.siguiente_parte:
+            return subida, None
+        if numero > subida.siguiente_parte:
+            raise ErrorSubida(f"Se esperaba la parte {subida.siguiente_parte}.", 409)
+
+        esperado = subida.largo_parte(numero)
+        suma = _tomar_suma(subida)
+        parte = hashlib.sha256()
+        leido = 0
+        with open(ruta_temporal(subida.pk), 'r+b') as destino:
+            try:
+                # Descarta lo que haya quedado de un intento anterior que se cortó
+                destino.seek(subida.recibido)
+                destino.truncate()
+                # Lee como mucho un byte de más, para detectar una parte demasiado larga
+                while bloque := origen.read(min(TAMANIO_BLOQUE, esperado + 1 - leido)):
+                    leido += len(bloque)
+                    if leido > esperado:
+                        break
+                    destino.write(bloque)
+                    parte.update(bloque)
+                    if suma is not None:
+                        suma.update(bloque)
+                if leido != esperado:
+                    raise ErrorSubida(f"La parte {numero} debe tener {esperado} bytes.")
+                if sha256 and sha256.lower() != parte.hexdigest():
+                    raise ErrorSubida(f"La parte {numero} llegó dañada (el sha256 no coincide).")
+            except BaseException:
+                destino.truncate(subida.recibido)
+                raise
+
+        subida.recibido += esperado
+        subida.save(update_fields=['recibido', 'actualizada'])
+        _guardar_suma(subida, suma)
+    return subida, parte.hexdigest()
+
+
+def completar(subida):
+    """Mueve el archivo al storage y crea el documento. Devuelve el ExpedienteDocumento."""
+    with transaction.atomic():
+        subida = SubidaDocumento.objects.select_for_update().get(pk=subida.pk)
+        if subida.recibido != subida.tamanio:
+            raise ErrorSubida(f"Faltan partes: se recibieron {subida.recibido} de {subida.tamanio} bytes.", 409)
+
+        ruta = ruta_temporal(subida.pk)
+        suma = _tomar_suma(subida)
+        sha256 = suma.hexdigest() if suma is not None else sha256_de_ruta(ruta)
+        if subida.sha256 and subida.sha256 != sha256:
+            raise ErrorSubida("El archivo recibido no coincide con el sha256 informado al iniciar.", 422)
+
+        campo = ExpedienteDocumento._meta.get_field('archivo')
+        nombre = _storage().mover(ruta, campo.generate_filename(None, subida.nombre_archivo), sha256)
+        documento = ExpedienteDocumento.objects.create(
+            expediente_id=subida.expediente_id,
+            nombre=subida.nombre or os.path.splitext(subida.nombre_archivo)[0],
+            archivo=nombre,
+            sha256=sha256,
+            tamanio=subida.tamanio,
+            tipo_mime=subida.tipo_mime,
+        )
+        subida_id = subida.pk
+        subida.delete()
+    logger.info("Subida %s completada: documento %s (%s bytes)", subida_id, documento.pk, documento.tamanio)
+    return documento
+
+
+def cancelar(subida):
+    with _lock:
+        _sumas.pop(subida.pk, None)
+    # El temporal lo borra la señal post_delete
+    subida.delete()
@@ -1,3 +1,1047 @@
-from django.test import TestCase
+import csv
+import datetime
+import hashlib
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from PIL import Image
+
+from core import duplicados, miniaturas
+from core.models import Sede, Rol, Tipo_Documento
+from core.tests import ConsultasConstantesMixin, crear_usuario_admin
+from institucion.models import Institucion
+from internacion.models import Internacion
+from intervencion.models import Intervencion, TipoIntervencion
+from persona.models import Persona
+from profesional.models import Profesional
+from usuario.models import CustomUser
+from . import detalle, servicios, subidas
+from .models import (Expediente, ExpedienteDocumento, ExpedienteInstitucion, ExpedientePersona, ExpedienteSecuencia,
+                     EstadoExpediente, GrupoEtario, MedioIngreso, ResumenIntervencion, SubidaDocumento, TipoSolicitud)
+
+
+_documentos = itertools.count(1)
+
+
+def crear_sede(sede='Santa Fe', abreviatura='SF'):
+    sede_obj, _ = Sede.objects.get_or_create(sede=sede, abreviatura=abreviatura)
+    return sede_obj
+
+
+def crear_expediente(sede=None, medio='DEMANDA ESPONTANEA', **kwargs):
+    """Crea un expediente con los catálogos mínimos obligatorios."""
+    datos = {
+        'sede': sede or crear_sede(),
+        'fecha_creacion': datetime.date.today(),
+        'estado_expediente': EstadoExpediente.objects.get_or_create(estado_expediente='ABIERTO')[0],
+        'tipo_solicitud': TipoSolicitud.objects.get_or_create(tipo_solicitud='ASESORAMIENTO')[0],
+        'grupo_etario': GrupoEtario.objects.get_or_create(grupo_etario='ADULTO')[0],
+        'medio_ingreso': MedioIngreso.objects.get_or_create(medio_ingreso=medio)[0],
+    }
+    datos.update(kwargs)
+    return Expediente.objects.create(**datos)
+
+
+def crear_persona(**kwargs):
+    numero = next(_documentos)
+    datos = {
+        'tipo_documento': Tipo_Documento.objects.get_or_create(tipo_documento='DNI')[0],
+        'numero_documento': str(20000000 + numero),
+        'nombre': f'NOMBRE{numero}',
+        'apellido': f'APELLIDO{numero}',
+    }
+    datos.update(kwargs)
+    return Persona.objects.create(**datos)
+
+
+def crear_institucion(**kwargs):
+    datos = {'institucion': f'INSTITUCION {next(_documentos)}'}
+    datos.update(kwargs)
+    return Institucion.objects.create(**datos)
+
+
+class ExpedienteListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.sede = crear_sede()
+        self.client.force_login(crear_usuario_admin(sede=self.sede))
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            crear_expediente(sede=self.sede)
+
+    def test_pagina_de_datos_consultas_constantes(self):
+        url = reverse('expediente:expediente_list_json') + '?draw=1&start=0&length=50'
+        respuesta = self.assertConsultasConstantes(url)
+        self.assertEqual(len(respuesta.json()['data']), 7)
+
+
+class ExpedienteListJsonTest(TestCase):
+
+    def setUp(self):
+        self.sede = crear_sede()
+        self.client.force_login(crear_usuario_admin(sede=self.sede))
+        self.url = reverse('expediente:expediente_list_json')
+
+    def pedir(self, **params):
+        datos = {'draw': 3, 'start': 0, 'length': 2, 'order[0][column]': 0, 'order[0][dir]': 'asc'}
+        datos.update(params)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(self.url, datos)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json(), [consulta['sql'] for consulta in consultas]
+
+    def test_sin_expedientes_muestra_aviso(self):
+        respuesta = self.client.get(reverse('expediente:expediente_list'))
+        self.assertContains(respuesta, 'No hay expedientes registrados.')
+        crear_expediente(sede=self.sede)
+        respuesta = self.client.get(reverse('expediente:expediente_list'))
+        self.assertNotContains(respuesta, 'No hay expedientes registrados.')
+        self.assertContains(respuesta, 'id_tabla_exp')
+
+    def test_cursor_pagina_sin_offset(self):
+        expedientes = [crear_expediente(sede=self.sede) for _ in range(5)]
+        primera, _ = self.pedir()
+        self.assertEqual(primera['draw'], 3)
+        self.assertEqual(primera['recordsTotal'], 5)
+        self.assertEqual([fila['id'] for fila in primera['data']], [e.pk for e in expedientes[:2]])
+        self.assertEqual(primera['cursor'], f'{expedientes[1].anio}:{expedientes[1].numero}:{expedientes[1].pk}')
+
+        segunda, sql = self.pedir(start=2, cursor=primera['cursor'])
+        self.assertEqual([fila['id'] for fila in segunda['data']], [e.pk for e in expedientes[2:4]])
+        self.assertFalse(any('OFFSET' in consulta for consulta in sql))
+
+        # Descendente con el cursor de la última fila: las anteriores
+        anterior, _ = self.pedir(start=2, cursor=segunda['cursor'], **{'order[0][dir]': 'desc'})
+        self.assertEqual([fila['id'] for fila in anterior['data']], [expedientes[2].pk, expedientes[1].pk])
+
+    def test_cursor_invalido_usa_offset(self):
+        expedientes = [crear_expediente(sede=self.sede) for _ in range(3)]
+        pagina, sql = self.pedir(start=2, cursor='basura')
+        self.assertEqual([fila['id'] for fila in pagina['data']], [expedientes[2].pk])
+        self.assertTrue(any('OFFSET' in consulta for consulta in sql))
+
+    def test_orden_por_otra_columna(self):
+        otra = crear_sede('Rosario', 'RO')
+        en_rosario = crear_expediente(sede=otra)
+        en_santa_fe = crear_expediente(sede=self.sede)
+        pagina, _ = self.pedir(**{'order[0][column]': 1, 'order[0][dir]': 'desc', 'cursor': '2025:1:1'})
+        self.assertEqual([fila['id'] for fila in pagina['data']], [en_santa_fe.pk, en_rosario.pk])
+        # El cursor sólo vale para el orden por identificador
+        self.assertIsNone(pagina['cursor'])
+
+    def test_busqueda(self):
+        crear_expediente(sede=self.sede, cuij='CUIJ-1')
+        buscado = crear_expediente(sede=self.sede, cuij='CUIJ-2')
+        crear_expediente(sede=self.sede, cuij='OTRO')
+        pagina, _ = self.pedir(**{'search[value]': 'cuij-2'})
+        self.assertEqual(pagina['recordsTotal'], 3)
+        self.assertEqual(pagina['recordsFiltered'], 1)
+        self.assertEqual([fila['id'] for fila in pagina['data']], [buscado.pk])
+
+
+class ExpedientePersonaListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.sede = crear_sede()
+        self.rol = Rol.objects.create(rol='TITULAR')
+        self.client.force_login(crear_usuario_admin(sede=self.sede))
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            ExpedientePersona.objects.create(
+                expediente=crear_expediente(sede=self.sede), persona=crear_persona(), rol=self.rol,
+            )
+
+    def test_listado_consultas_constantes(self):
+        self.assertConsultasConstantes(reverse('expediente:expediente_persona_list'))
+
+
+class ExpedienteInstitucionListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.sede = crear_sede()
+        self.rol = Rol.objects.create(rol='DERIVANTE')
+        self.client.force_login(crear_usuario_admin(sede=self.sede))
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            ExpedienteInstitucion.objects.create(
+                expediente=crear_expediente(sede=self.sede), institucion=crear_institucion(), rol=self.rol,
+            )
+
+    def test_listado_consultas_constantes(self):
+        self.assertConsultasConstantes(reverse('expediente:expediente_institucion_list'))
+
+
+class BuscarInstitucionesPaginadoTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(crear_usuario_admin())
+        for i in range(5):
+            crear_institucion(institucion=f'CENTRO {i}')
+
+    def pagina(self, page, por_pagina):
+        respuesta = self.client.get(reverse('expediente:buscar_instituciones'),
+                                    {'q': 'centro', 'page': page, 'por_pagina': por_pagina})
+        datos = respuesta.json()
+        return [fila['text'][-1] for fila in datos['results']], datos['pagination']['more']
+
+    def test_more_en_los_limites(self):
+        self.assertEqual(self.pagina(1, 5), (['0', '1', '2', '3', '4'], False))
+        self.assertEqual(self.pagina(1, 4), (['0', '1', '2', '3'], True))
+        self.assertEqual(self.pagina(2, 4), (['4'], False))
+        self.assertEqual(self.pagina(3, 2), (['4'], False))
+
+
+class ExpedienteDispatcherTest(TestCase):
+
+    def setUp(self):
+        usuario = crear_usuario_admin()
+        usuario.sede = crear_sede()  # los formularios de edición filtran por la sede del usuario
+        usuario.save()
+        self.client.force_login(usuario)
+
+    def test_detalle_sin_redireccion(self):
+        casos = (
+            ('DEMANDA ESPONTANEA', 'expediente/demanda_espontanea_detalle.html'),
+            ('OFICIO PAPEL', 'expediente/oficio_detalle.html'),
+            ('SOLICITUD SECRETARIA EJECUTIVA (DE OFICIO)', 'expediente/secretaria_detalle.html'),
+        )
+        for medio, template in casos:
+            with self.subTest(medio=medio):
+                expediente = crear_expediente(medio=medio)
+                respuesta = self.client.get(reverse('expediente:expediente_detail', args=[expediente.pk]))
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertTemplateUsed(respuesta, template)
+                self.assertEqual(respuesta.context['expediente'], expediente)
+
+    def test_editar_sin_redireccion(self):
+        expediente = crear_expediente(medio='OFICIO POR MAIL')
+        respuesta = self.client.get(reverse('expediente:expediente_update', args=[expediente.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTemplateUsed(respuesta, 'expediente/oficio_form.html')
+
+    def test_medio_desconocido_vuelve_al_listado(self):
+        expediente = crear_expediente(medio='OTRO')
+        respuesta = self.client.get(reverse('expediente:expediente_detail', args=[expediente.pk]))
+        self.assertRedirects(respuesta, reverse('expediente:expediente_list'), fetch_redirect_response=False)
+
+    def test_listado_apunta_a_la_vista_del_tipo(self):
+        expediente = crear_expediente(medio='OFICIO PAPEL')
+        respuesta = self.client.get(reverse('expediente:expediente_list_json'), {'draw': 1, 'start': 0, 'length': 10})
+        fila = respuesta.json()['data'][0]
+        self.assertEqual(fila['url_detalle'], reverse('expediente:oficio_detail', args=[expediente.pk]))
+        self.assertEqual(fila['url_editar'], reverse('expediente:oficio_update', args=[expediente.pk]))
+
+
+class ExpedienteDetalleTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        usuario = crear_usuario_admin(sede=crear_sede())
+        self.client.force_login(usuario)
+        self.profesional = Profesional.objects.create(user=usuario)
+        self.tipo_intervencion = TipoIntervencion.objects.create(tipo_intervencion='ENTREVISTA')
+        self.rol = Rol.objects.get_or_create(rol='EFECTOR')[0]
+        self.expediente = crear_expediente()
+        self.url = reverse('expediente:expediente_detail', args=[self.expediente.pk])
+        self.agregar_relaciones(1)
+        self.client.get(self.url)  # crea las filas de UserAgent / UrlPath que usa ClienteLog
+
+    def agregar_relaciones(self, cantidad):
+        for i in range(cantidad):
+            ExpedienteDocumento.objects.create(
+                expediente=self.expediente, nombre=f'DOC {i}', archivo=f'documentos/expedientes/doc{i}.pdf',
+            )
+            ExpedientePersona.objects.create(expediente=self.expediente, persona=crear_persona(), rol=self.rol)
+            relacion = ExpedienteInstitucion.objects.create(
+                expediente=self.expediente, institucion=crear_institucion(), rol=self.rol,
+            )
+            Internacion.objects.create(expediente_institucion=relacion, fecha_internacion=datetime.date.today())
+            Intervencion.objects.create(
+                expediente=self.expediente, profesional=self.profesional,
+                tipo_intervencion=self.tipo_intervencion, fecha_intervencion=datetime.date.today(),
+            )
+
+    def consultas(self, invalidar=False):
+        if invalidar:
+            detalle.invalidar(self.expediente.pk)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta
+
+    def test_consultas_fijas_sin_importar_las_relaciones(self):
+        sin_cache, _ = self.consultas(invalidar=True)
+        self.agregar_relaciones(4)
+        # Las señales cambiaron la versión: se vuelve a armar el detalle completo
+        with self.assertNumQueries(sin_cache):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(len(respuesta.context['personas']), 5)
+        self.assertEqual(len(respuesta.context['internaciones']), 5)
+        self.assertEqual(len(respuesta.context['intervenciones']), 5)
+
+    def test_fragmento_cacheado(self):
+        sin_cache, _ = self.consultas(invalidar=True)
+        con_cache, respuesta = self.consultas()
+        # Sólo el expediente y sus documentos (fuera del fragmento por el csrf_token)
+        self.assertLess(con_cache, sin_cache)
+        self.assertNotIn('personas', respuesta.context)
+        self.assertEqual(len(respuesta.context['documentos']), 1)
+
+    def test_cambio_relacionado_invalida_el_fragmento(self):
+        self.consultas()
+        persona = self.expediente.expedientepersona_expediente.get().persona
+        persona.apellido = 'RENOMBRADO'
+        persona.save()
+        _, respuesta = self.consultas()
+        self.assertContains(respuesta, 'RENOMBRADO')
+
+    def test_principales_por_rol(self):
+        titular = Rol.objects.update_or_create(pk=detalle.ROL_PERSONA_PRINCIPAL, defaults={'rol': 'TITULAR'})[0]
+        derivante = Rol.objects.update_or_create(pk=detalle.ROL_INSTITUCION_PRINCIPAL, defaults={'rol': 'DERIVANTE'})[0]
+        otro = Rol.objects.update_or_create(pk=9001, defaults={'rol': 'REFERENTE'})[0]
+        expediente = crear_expediente()
+        # Vinculadas antes, pero con otro rol
+        ExpedientePersona.objects.create(expediente=expediente, persona=crear_persona(), rol=otro)
+        ExpedienteInstitucion.objects.create(expediente=expediente, institucion=crear_institucion(), rol=otro)
+        persona = crear_persona()
+        institucion = crear_institucion()
+        ExpedientePersona.objects.create(expediente=expediente, persona=persona, rol=titular)
+        ExpedienteInstitucion.objects.create(expediente=expediente, institucion=institucion, rol=derivante)
+
+        respuesta = self.client.get(reverse('expediente:expediente_detail', args=[expediente.pk]))
+        self.assertEqual(respuesta.context['persona'], persona)
+        self.assertEqual(respuesta.context['institucion'], institucion)
+        self.assertEqual(respuesta.context['rol'], titular)
+        self.assertEqual(len(respuesta.context['personas']), 2)
+
+    def test_cambio_de_catalogo_invalida_el_fragmento(self):
+        self.consultas()
+        estado = self.expediente.estado_expediente
+        estado.estado_expediente = 'EN SEGUIMIENTO'
+        estado.save()
+        _, respuesta = self.consultas()
+        self.assertContains(respuesta, 'EN SEGUIMIENTO')
+
+
+class ExpedienteExportarTest(TestCase):
+
+    def test_misma_busqueda_y_orden_que_la_tabla(self):
+        self.client.force_login(crear_usuario_admin())
+        for cuij in ('CUIJ-1', 'CUIJ-2', 'OTRO'):
+            crear_expediente(cuij=cuij)
+        respuesta = self.client.get(reverse('expediente:expediente_exportar', args=['csv']), {
+            'search[value]': 'cuij', 'order[0][column]': '0', 'order[0][dir]': 'asc',
+        })
+        filas = list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(filas[0][:4], ['Identificador', 'Sede', 'Medio de ingreso', 'Fecha de creación'])
+        self.assertEqual([fila[4] for fila in filas[1:]], ['CUIJ-1', 'CUIJ-2'])
+        self.assertEqual(filas[1][3], datetime.date.today().isoformat())
+
+
+class MediaTemporalMixin:
+    """MEDIA_ROOT en una carpeta temporal que se borra al terminar cada test."""
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def archivos_en_disco(self):
+        return sorted(
+            os.path.relpath(os.path.join(carpeta, nombre), self.media)
+            for carpeta, carpetas, nombres in os.walk(self.media)
+            if '.tmp' not in carpeta.split(os.sep)
+            for nombre in nombres
+        )
+
+
+class ExpedienteAltaTest(MediaTemporalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sede = crear_sede()
+        self.rol = Rol.objects.get_or_create(rol='EFECTOR')[0]
+        # Los catálogos obligatorios salen de un expediente cualquiera
+        base = crear_expediente(sede=self.sede)
+        self.datos = {
+            'sede': self.sede,
+            'fecha_creacion': datetime.date.today(),
+            'estado_expediente': base.estado_expediente,
+            'tipo_solicitud': base.tipo_solicitud,
+            'grupo_etario': base.grupo_etario,
+            'medio_ingreso': base.medio_ingreso,
+        }
+
+    def documento(self, nombre):
+        return ExpedienteDocumento(nombre=nombre, archivo=SimpleUploadedFile(f'{nombre}.pdf', b'%PDF contenido'))
+
+    def test_archivos_se_escriben_despues_del_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = servicios.crear_expediente(
+                self.datos,
+                personas=[(crear_persona(), self.rol), (crear_persona(), self.rol)],
+                documentos=[self.documento('dictamen'), self.documento('oficio')],
+            )
+            nombres = [documento.archivo.name for documento in resultado.documentos]
+            self.assertFalse(any(os.path.exists(os.path.join(self.media, nombre)) for nombre in nombres))
+
+        expediente = resultado.expediente
+        self.assertEqual(expediente.expedientepersona_expediente.count(), 2)
+        self.assertEqual(sorted(expediente.documentos.values_list('archivo', flat=True)), sorted(nombres))
+        for nombre in nombres:
+            with open(os.path.join(self.media, nombre), 'rb') as archivo:
+                self.assertEqual(archivo.read(), b'%PDF contenido')
+        self.assertEqual(set(resultado.metricas), {'expediente', 'vinculos', 'documentos', 'archivos', 'total'})
+
+    def test_error_no_deja_expediente_ni_archivos(self):
+        expedientes = Expediente.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError):
+                servicios.crear_expediente(
+                    self.datos,
+                    personas=[(crear_persona(), None)],  # el rol es obligatorio
+                    documentos=[self.documento('dictamen')],
+                )
+        self.assertEqual(Expediente.objects.count(), expedientes)
+        self.assertEqual(ExpedienteDocumento.objects.count(), 0)
+        self.assertEqual(self.archivos_en_disco(), [])
+
+    def test_archivo_que_no_se_puede_escribir_borra_su_fila(self):
+        fallido = ExpedienteDocumento(nombre='dictamen', archivo=SimpleUploadedFile('dictamen.pdf', b'%PDF otro'))
+        with self.assertLogs('expediente.servicios', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                resultado = servicios.crear_expediente(
+                    self.datos, documentos=[fallido, self.documento('oficio')],
+                )
+                # Un archivo común donde va la carpeta del primero hace fallar el save del storage
+                carpeta = os.path.join(self.media, os.path.dirname(fallido.archivo.name))
+                os.makedirs(os.path.dirname(carpeta), exist_ok=True)
+                with open(carpeta, 'wb'):
+                    pass
+
+        self.assertEqual(resultado.fallidos, [fallido])
+        self.assertEqual([documento.nombre for documento in resultado.documentos], ['oficio'])
+        self.assertEqual(list(resultado.expediente.documentos.values_list('nombre', flat=True)), ['oficio'])
+        self.assertIn('archivos', resultado.metricas)
+
+
+class ExpedienteAltaVistaTest(MediaTemporalMixin, TransactionTestCase):
+    """Con commits reales: los archivos se escriben antes de que termine el request."""
+
+    def setUp(self):
+        super().setUp()
+        self.sede = crear_sede()
+        self.rol = Rol.objects.get_or_create(rol='EFECTOR')[0]
+        base = crear_expediente(sede=self.sede)
+        self.datos = {
+            'estado_expediente': base.estado_expediente,
+            'tipo_solicitud': base.tipo_solicitud,
+            'grupo_etario': base.grupo_etario,
+            'medio_ingreso': base.medio_ingreso,
+        }
+
+    def test_vista_demanda_espontanea(self):
+        self.client.force_login(crear_usuario_admin(sede=self.sede))
+        persona = crear_persona()
+        url = reverse('expediente:expediente_create_with_medio', args=[self.datos['medio_ingreso'].pk])
+        respuesta = self.client.post(url, {
+            'fecha_creacion': datetime.date.today().isoformat(),
+            'persona': persona.pk,
+            'rol': self.rol.pk,
+            'tipo_solicitud': self.datos['tipo_solicitud'].pk,
+            'estado_expediente': self.datos['estado_expediente'].pk,
+            'grupo_etario': self.datos['grupo_etario'].pk,
+            'edad_persona': 30,
+            'resumen_intervencion': ResumenIntervencion.objects.create(resumen_intervencion='ORIENTACION').pk,
+            'form-TOTAL_FORMS': '2',
+            'form-INITIAL_FORMS': '0',
+            'form-0-nombre': 'Dictamen',
+            'form-0-archivo': SimpleUploadedFile('dictamen.pdf', b'%PDF contenido'),
+        })
+        self.assertRedirects(respuesta, reverse('expediente:expediente_list'), fetch_redirect_response=False)
+        expediente = ExpedientePersona.objects.get(persona=persona).expediente
+        documento = expediente.documentos.get()
+        self.assertEqual(documento.nombre, 'Dictamen')
+        self.assertTrue(os.path.exists(os.path.join(self.media, documento.archivo.name)))
+
+
+class AlmacenamientoPorContenidoTest(MediaTemporalMixin, TestCase):
+    contenido = b'%PDF oficio del juzgado'
+
+    def setUp(self):
+        super().setUp()
+        self.expediente = crear_expediente()
+
+    def subir(self, nombre='oficio.pdf'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ExpedienteDocumento.objects.create(
+                expediente=self.expediente, nombre=nombre, archivo=SimpleUploadedFile(nombre, self.contenido),
+            )
+
+    def test_mismo_contenido_se_guarda_una_vez(self):
+        primero = self.subir('oficio.pdf')
+        segundo = self.subir('copia del oficio.PDF')
+        sha256 = hashlib.sha256(self.contenido).hexdigest()
+        esperado = f'documentos/expedientes/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf'
+        self.assertEqual(primero.archivo.name, esperado)
+        self.assertEqual(segundo.archivo.name, esperado)
+        self.assertEqual(self.archivos_en_disco(), [esperado])
+        self.assertEqual((primero.sha256, primero.tamanio, primero.tipo_mime), (sha256, len(self.contenido), 'application/pdf'))
+
+    def test_archivo_se_borra_con_la_ultima_referencia(self):
+        primero = self.subir()
+        segundo = self.subir()
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.delete()
+        self.assertEqual(self.archivos_en_disco(), [segundo.archivo.name])
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.delete()
+        self.assertEqual(self.archivos_en_disco(), [])
+
+    def test_comando_migra_archivos_existentes(self):
+        anterior = os.path.join(self.media, 'documentos', 'expedientes', 'oficio.pdf')
+        os.makedirs(os.path.dirname(anterior))
+        with open(anterior, 'wb') as archivo:
+            archivo.write(self.contenido)
+        documentos = [
+            ExpedienteDocumento.objects.create(expediente=self.expediente, archivo='documentos/expedientes/oficio.pdf')
+            for _ in range(2)
+        ]
+        faltante = ExpedienteDocumento.objects.create(expediente=self.expediente, archivo='documentos/expedientes/no.pdf')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('migrar_documentos_por_contenido', lote=1, stdout=io.StringIO())
+
+        sha256 = hashlib.sha256(self.contenido).hexdigest()
+        for documento in documentos:
+            documento.refresh_from_db()
+            self.assertEqual(documento.sha256, sha256)
+            self.assertEqual(documento.tamanio, len(self.contenido))
+        self.assertEqual(self.archivos_en_disco(), [documentos[0].archivo.name])
+        faltante.refresh_from_db()
+        self.assertEqual(faltante.sha256, '')
+
+
+class AlmacenamientoConcurrenciaTest(MediaTemporalMixin, TransactionTestCase):
+    contenido = b'%PDF oficio del juzgado'
+
+    @skipUnless(connection.vendor == 'postgresql', "usa pg_advisory_xact_lock")
+    def test_borrar_y_volver_a_subir_el_mismo_contenido(self):
+        expediente = crear_expediente()
+        anterior = ExpedienteDocumento.objects.create(
+            expediente=expediente, archivo=SimpleUploadedFile('oficio.pdf', self.contenido),
+        )
+        hilos = []
+
+        def borrar_anterior():
+            try:
+                ExpedienteDocumento.objects.filter(pk=anterior.pk).delete()
+            finally:
+                connection.close()
+
+        def antes_del_insert(execute, sql, params, many, context):
+            # Otro proceso borra el documento anterior mientras se guarda el nuevo
+            if not hilos and sql.startswith('INSERT INTO "expediente_expedientedocumento"'):
+                hilos.append(threading.Thread(target=borrar_anterior))
+                hilos[0].start()
+                hilos[0].join(0.5)  # el borrado del archivo espera el bloqueo
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(antes_del_insert):
+            nuevo = ExpedienteDocumento.objects.create(
+                expediente=expediente, archivo=SimpleUploadedFile('copia.pdf', self.contenido),
+            )
+        hilos[0].join()
+
+        self.assertFalse(ExpedienteDocumento.objects.filter(pk=anterior.pk).exists())
+        self.assertEqual(nuevo.archivo.name, anterior.archivo.name)
+        self.assertEqual(self.archivos_en_disco(), [nuevo.archivo.name])
+
+
+class LimpiarArchivosHuerfanosTest(MediaTemporalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        expediente = crear_expediente()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.documento = ExpedienteDocumento.objects.create(
+                expediente=expediente, archivo=SimpleUploadedFile('oficio.pdf', b'%PDF oficio'),
+            )
+        # Mismo nombre que un documento cargado, pero en otra carpeta
+        self.escribir('documentos/expedientes/oficio.pdf', b'legacy')
+        ExpedienteDocumento.objects.create(expediente=expediente, archivo='documentos/expedientes/oficio.pdf')
+        self.huerfano = self.escribir('documentos/expedientes/viejos/oficio.pdf', b'huerfano')
+        self.reciente = self.escribir('documentos/expedientes/subiendo.pdf', b'nuevo', antiguo=False)
+        ExpedienteDocumento.objects.create(expediente=expediente, archivo='documentos/expedientes/no_existe.pdf')
+        alterado = self.documento.archivo.name
+        with open(os.path.join(self.media, alterado), 'wb') as archivo:
+            archivo.write(b'otro contenido')
+
+    def escribir(self, nombre, contenido, antiguo=True):
+        ruta = os.path.join(self.media, nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        if antiguo:
+            hace_un_dia = datetime.datetime.now().timestamp() - 24 * 60 * 60
+            os.utime(ruta, (hace_un_dia, hace_un_dia))
+        return nombre
+
+    def limpiar(self, *args):
+        salida = io.StringIO()
+        call_command('limpiar_archivos_huerfanos', *args, '--workers=2', '--lote=2', stdout=salida)
+        return salida.getvalue()
+
+    def test_dry_run_solo_informa(self):
+        salida = self.limpiar('--dry-run')
+        self.assertIn(f'Huérfano: {self.huerfano}', salida)
+        self.assertNotIn(self.reciente, salida)
+        self.assertIn('Falta en disco: documentos/expedientes/no_existe.pdf', salida)
+        self.assertIn(f'El contenido no coincide con su sha256: {self.documento.archivo.name}', salida)
+        self.assertIn(self.huerfano, self.archivos_en_disco())
+
+    def test_elimina_solo_huerfanos(self):
+        antes = self.archivos_en_disco()
+        self.limpiar()
+        self.assertEqual(self.archivos_en_disco(), [nombre for nombre in antes if nombre != self.huerfano])
+
+    def test_cuarentena(self):
+        self.limpiar('--quarantine')
+        self.assertNotIn(self.huerfano, self.archivos_en_disco())
+        self.assertTrue(os.path.exists(os.path.join(self.media, '.cuarentena', self.huerfano)))
+
+
+class DescargaDocumentoTest(MediaTemporalMixin, TestCase):
+    contenido = b'%PDF-1.4 dictamen del equipo tratante'
+
+    def setUp(self):
+        super().setUp()
+        self.sede = crear_sede()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.documento = ExpedienteDocumento.objects.create(
+                expediente=crear_expediente(sede=self.sede), nombre='Dictamen',
+                archivo=SimpleUploadedFile('dictamen.pdf', self.contenido),
+            )
+        self.url = reverse('expediente:documento_descargar', args=[self.documento.pk])
+
+    def usuario(self, sede, permiso=True):
+        usuario = CustomUser.objects.create_user(username=f'usuario{next(_documentos)}', password='x', sede=sede)
+        if permiso:
+            usuario.user_permissions.add(Permission.objects.get(codename='view_expedientedocumento'))
+        return usuario
+
+    def test_controla_permiso_y_sede(self):
+        self.client.force_login(self.usuario(self.sede, permiso=False))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.usuario(crear_sede('Rosario', 'RO')))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.usuario(self.sede))
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertIn('Dictamen.pdf', respuesta['Content-Disposition'])
+
+    def test_etag_y_rangos(self):
+        self.client.force_login(self.usuario(self.sede))
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(etag, f'"{self.documento.sha256}"')
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+
+        parcial = self.client.get(self.url, headers={'Range': 'bytes=5-7'})
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(b''.join(parcial.streaming_content), self.contenido[5:8])
+        self.assertEqual(parcial['Content-Range'], f'bytes 5-7/{len(self.contenido)}')
+        final = self.client.get(self.url, headers={'Range': 'bytes=-4'})
+        self.assertEqual(b''.join(final.streaming_content), self.contenido[-4:])
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=999-'}).status_code, 416)
+        distinto = self.client.get(self.url, headers={'Range': 'bytes=5-7', 'If-Range': '"otro"'})
+        self.assertEqual(distinto.status_code, 200)
+
+    def test_solo_pdf_e_imagenes_se_abren_en_el_navegador(self):
+        self.client.force_login(self.usuario(self.sede))
+        self.assertTrue(self.client.get(self.url)['Content-Disposition'].startswith('inline'))
+        self.assertTrue(self.client.get(self.url, {'descargar': 1})['Content-Disposition'].startswith('attachment'))
+        for nombre, contenido in [('pagina.html', b'<script>alert(1)</script>'), ('dibujo.svg', b'<svg onload="alert(1)"/>')]:
+            with self.captureOnCommitCallbacks(execute=True):
+                documento = ExpedienteDocumento.objects.create(
+                    expediente=self.documento.expediente, archivo=SimpleUploadedFile(nombre, contenido),
+                )
+            respuesta = self.client.get(reverse('expediente:documento_descargar', args=[documento.pk]))
+            self.assertTrue(respuesta['Content-Disposition'].startswith('attachment'), nombre)
+            self.assertEqual(respuesta['X-Content-Type-Options'], 'nosniff')
+
+    @override_settings(DESCARGAS_MODO='nginx', DESCARGAS_URL_INTERNA='/media/')
+    def test_x_accel_redirect(self):
+        self.client.force_login(self.usuario(self.sede))
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['X-Accel-Redirect'], '/media/' + self.documento.archivo.name)
+        self.assertEqual(respuesta.content, b'')
+
+
+class DescargaZipDocumentosTest(MediaTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sede = crear_sede()
+        self.expediente = crear_expediente(sede=self.sede)
+        with self.captureOnCommitCallbacks(execute=True):
+            for nombre, archivo, contenido in [
+                ('Informe', 'informe.txt', b'informe ' * 1000),
+                ('Informe', 'otro.txt', b'segundo informe'),
+                ('Dictamen', 'dictamen.pdf', b'%PDF-1.4 dictamen'),
+            ]:
+                ExpedienteDocumento.objects.create(
+                    expediente=self.expediente, nombre=nombre, archivo=SimpleUploadedFile(archivo, contenido),
+                )
+        self.url = reverse('expediente:expediente_documentos_zip', args=[self.expediente.pk])
+
+    def usuario(self, sede):
+        usuario = CustomUser.objects.create_user(username=f'usuario{next(_documentos)}', password='x', sede=sede)
+        usuario.user_permissions.add(Permission.objects.get(codename='view_expedientedocumento'))
+        return usuario
+
+    def test_zip_con_manifiesto(self):
+        self.client.force_login(self.usuario(crear_sede('Rosario', 'RO')))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.force_login(self.usuario(self.sede))
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        self.assertTrue(respuesta.streaming)
+        archivo = zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertIsNone(archivo.testzip())
+        self.assertEqual(
+            archivo.namelist(), ['Informe.txt', 'Informe (2).txt', 'Dictamen.pdf', 'manifiesto.csv'],
+        )
+        self.assertEqual(archivo.read('Informe (2).txt'), b'segundo informe')
+        # El texto se comprime; el PDF se guarda tal cual
+        self.assertEqual(archivo.getinfo('Informe.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archivo.getinfo('Dictamen.pdf').compress_type, zipfile.ZIP_STORED)
+
+        manifiesto = list(csv.DictReader(io.StringIO(archivo.read('manifiesto.csv').decode())))
+        documentos = {d.sha256: d for d in self.expediente.documentos.all()}
+        self.assertEqual(len(manifiesto), 3)
+        for fila in manifiesto:
+            self.assertEqual(fila['estado'], 'ok')
+            self.assertIn(fila['sha256'], documentos)
+            self.assertEqual(fila['fecha'], documentos[fila['sha256']].fecha_subida.isoformat())
+
+    def test_archivo_faltante_en_manifiesto(self):
+        documento = self.expediente.documentos.get(nombre='Dictamen')
+        os.remove(documento.archivo.path)
+        self.client.force_login(self.usuario(self.sede))
+        archivo = zipfile.ZipFile(io.BytesIO(b''.join(self.client.get(self.url).streaming_content)))
+        self.assertNotIn('Dictamen.pdf', archivo.namelist())
+        manifiesto = archivo.read('manifiesto.csv').decode()
+        self.assertIn('Dictamen.pdf', manifiesto)
+        self.assertIn('faltante', manifiesto)
+
+
+@override_settings(SUBIDAS_TAMANIO_PARTE=4)
+class SubidaPorPartesTest(MediaTemporalMixin, TestCase):
+    contenido = b'oficio escaneado'  # 16 bytes: 4 partes de 4
+
+    def setUp(self):
+        super().setUp()
+        self.sede = crear_sede()
+        self.expediente = crear_expediente(sede=self.sede)
+        self.usuario = CustomUser.objects.create_user(username=f'usuario{next(_documentos)}', password='x', sede=self.sede)
+        self.usuario.user_permissions.add(Permission.objects.get(codename='add_expedientedocumento'))
+        self.client.force_login(self.usuario)
+
+    def iniciar(self, **datos):
+        datos = {'nombre': 'Oficio', 'nombre_archivo': 'oficio.pdf', 'tamanio': len(self.contenido), **datos}
+        respuesta = self.client.post(reverse('expediente:subida_iniciar', args=[self.expediente.pk]), datos)
+        self.assertEqual(respuesta.status_code, 201)
+        return respuesta.json()
+
+    def parte(self, subida, numero, datos=None, **encabezados):
+        datos = self.contenido[numero * 4:numero * 4 + 4] if datos is None else datos
+        return self.client.put(
+            f"{subida['url']}partes/{numero}/", datos, content_type='application/octet-stream', headers=encabezados,
+        )
+
+    def test_subida_completa(self):
+        subida = self.iniciar(sha256=hashlib.sha256(self.contenido).hexdigest())
+        self.assertEqual((subida['partes'], subida['siguiente_parte']), (4, 0))
+
+        respuesta = self.parte(subida, 0, **{'X-Content-SHA256': hashlib.sha256(b'ofic').hexdigest()})
+        self.assertEqual(respuesta.json()['siguiente_parte'], 1)
+        # Reintento de una parte ya recibida: no se vuelve a escribir
+        self.assertEqual(self.parte(subida, 0).json()['recibido'], 4)
+        # Fuera de orden: el servidor indica desde dónde seguir
+        respuesta = self.parte(subida, 2)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()['siguiente_parte'], 1)
+        # Incompleta, dañada o con bytes de más: se rechaza sin avanzar
+        self.assertEqual(self.parte(subida, 1, b'io').status_code, 400)
+        self.assertEqual(self.parte(subida, 1, b'io es').status_code, 400)
+        self.assertEqual(self.parte(subida, 1, **{'X-Content-SHA256': '0' * 64}).status_code, 400)
+        self.assertEqual(self.client.post(f"{subida['url']}completar/").status_code, 409)
+
+        for numero in (1, 2, 3):
+            self.assertEqual(self.parte(subida, numero).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(f"{subida['url']}completar/")
+        self.assertEqual(respuesta.status_code, 201)
+
+        documento = ExpedienteDocumento.objects.get(pk=respuesta.json()['documento'])
+        self.assertEqual(documento.expediente, self.expediente)
+        self.assertEqual(documento.nombre, 'Oficio')
+        self.assertEqual(documento.sha256, hashlib.sha256(self.contenido).hexdigest())
+        self.assertEqual((documento.tamanio, documento.tipo_mime), (16, 'application/pdf'))
+        with documento.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.contenido)
+        self.assertFalse(SubidaDocumento.objects.exists())
+        self.assertEqual(os.listdir(subidas.carpeta_temporal()), [])
+
+    def test_reanuda_en_otro_proceso(self):
+        subida = self.iniciar()
+        self.parte(subida, 0)
+        self.parte(subida, 1)
+        # Otro worker (o un reinicio) no tiene el sha256 parcial: se calcula al completar
+        subidas._sumas.clear()
+        estado = self.client.get(subida['url']).json()
+        self.assertEqual((estado['recibido'], estado['siguiente_parte']), (8, 2))
+        self.parte(subida, 2)
+        self.parte(subida, 3)
+        respuesta = self.client.post(f"{subida['url']}completar/")
+        self.assertEqual(respuesta.json()['sha256'], hashlib.sha256(self.contenido).hexdigest())
+
+    def test_sha256_distinto_al_informado(self):
+        subida = self.iniciar(sha256='a' * 64)
+        for numero in range(4):
+            self.parte(subida, numero)
+        self.assertEqual(self.client.post(f"{subida['url']}completar/").status_code, 422)
+        self.assertFalse(ExpedienteDocumento.objects.exists())
+
+    def test_solo_el_usuario_de_la_subida_y_su_sede(self):
+        subida = self.iniciar()
+        otro = CustomUser.objects.create_user(username=f'usuario{next(_documentos)}', password='x', sede=self.sede)
+        otro.user_permissions.add(Permission.objects.get(codename='add_expedientedocumento'))
+        self.client.force_login(otro)
+        self.assertEqual(self.parte(subida, 0).status_code, 404)
+
+        otro.sede = crear_sede('Rosario', 'RO')
+        otro.save()
+        respuesta = self.client.post(
+            reverse('expediente:subida_iniciar', args=[self.expediente.pk]), {'nombre_archivo': 'a.pdf', 'tamanio': 1},
+        )
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_cancelar_y_limpiar_vencidas(self):
+        cancelada = self.iniciar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(cancelada['url']).status_code, 204)
+        self.assertFalse(os.path.exists(subidas.ruta_temporal(cancelada['id'])))
+
+        vencida = self.iniciar()
+        self.parte(vencida, 0)
+        activa = self.iniciar()
+        SubidaDocumento.objects.filter(pk=vencida['id']).update(
+            actualizada=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('limpiar_subidas_vencidas', stdout=io.StringIO())
+        self.assertEqual(list(SubidaDocumento.objects.values_list('pk', flat=True)), [uuid.UUID(activa['id'])])
+        self.assertEqual(os.listdir(subidas.carpeta_temporal()), [f"{activa['id']}.part"])
+
+
+def imagen_png(ancho=1200, alto=900):
+    contenido = io.BytesIO()
+    Image.new('RGB', (ancho, alto), (200, 30, 30)).save(contenido, 'PNG')
+    return contenido.getvalue()
+
+
+class MiniaturasDocumentoTest(MediaTemporalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sede = crear_sede()
+        self.client.force_login(crear_usuario_admin(sede=self.sede))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.documento = ExpedienteDocumento.objects.create(
+                expediente=crear_expediente(sede=self.sede), nombre='Foto del oficio',
+                archivo=SimpleUploadedFile('oficio.png', imagen_png()),
+            )
+        miniaturas.esperar()
+
+    def ruta(self, tamanio):
+        nombre = miniaturas.nombre_miniatura(ExpedienteDocumento.CARPETA_MINIATURAS, self.documento.sha256, tamanio)
+        return os.path.join(self.media, nombre)
+
+    def test_se_generan_despues_del_upload(self):
+        with Image.open(self.ruta('chica')) as chica:
+            self.assertEqual(chica.size, (160, 160))
+        with Image.open(self.ruta('vista')) as vista:
+            self.assertEqual(vista.size, (800, 600))
+
+    def test_vista_y_plantilla(self):
+        os.remove(self.ruta('chica'))  # si todavía no está, la vista la genera
+        respuesta = self.client.get(reverse('expediente:documento_miniatura', args=[self.documento.pk, 'chica']))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], miniaturas.TIPO_MIME)
+        self.assertEqual(self.client.get(
+            reverse('expediente:documento_miniatura', args=[self.documento.pk, 'enorme'])
+        ).status_code, 404)
+        detalle = self.client.get(reverse('expediente:expediente_detail', args=[self.documento.expediente_id]))
+        self.assertContains(detalle, 'loading="lazy"')
+
+    def test_svg_sin_miniatura(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            documento = ExpedienteDocumento.objects.create(
+                expediente=self.documento.expediente, archivo=SimpleUploadedFile('dibujo.svg', b'<svg/>'),
+            )
+        self.assertEqual(documento.tipo_mime, 'image/svg+xml')
+        self.assertFalse(documento.es_imagen)
+        self.assertEqual(self.client.get(
+            reverse('expediente:documento_miniatura', args=[documento.pk, 'chica'])
+        ).status_code, 404)
+
+    def test_comando_genera_las_que_faltan(self):
+        os.remove(self.ruta('chica'))
+        salida = io.StringIO()
+        call_command('generar_miniaturas', workers=2, stdout=salida)
+        self.assertIn('Documentos: 1 miniaturas generadas.', salida.getvalue())
+        self.assertTrue(os.path.exists(self.ruta('chica')))
+
+    def test_se_borran_con_el_ultimo_documento(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.documento.delete()
+        self.assertFalse(os.path.exists(self.ruta('chica')))
+        self.assertFalse(os.path.exists(self.ruta('vista')))
+
+
+class ExpedienteSecuenciaTest(TestCase):
+
+    def test_numeracion_por_sede(self):
+        santa_fe = crear_sede()
+        rosario = crear_sede('Rosario', 'RO')
+        numeros = [crear_expediente(sede=santa_fe).numero for _ in range(3)]
+        self.assertEqual(numeros, [1, 2, 3])
+        self.assertEqual(crear_expediente(sede=rosario).numero, 1)
+        self.assertEqual(ExpedienteSecuencia.objects.get(sede=santa_fe).ultimo_numero, 3)
+
+    def test_continua_desde_expedientes_existentes(self):
+        sede = crear_sede()
+        expediente = crear_expediente(sede=sede)
+        Expediente.objects.filter(pk=expediente.pk).update(numero=41)
+        ExpedienteSecuencia.objects.all().delete()
+        self.assertEqual(crear_expediente(sede=sede).numero, 42)
+
+    def test_comando_inicializar_secuencias(self):
+        sede = crear_sede()
+        expediente = crear_expediente(sede=sede)
+        Expediente.objects.filter(pk=expediente.pk).update(numero=10)
+        ExpedienteSecuencia.objects.update(ultimo_numero=0)
+        call_command('inicializar_secuencias', stdout=io.StringIO())
+        self.assertEqual(ExpedienteSecuencia.objects.get(sede=sede).ultimo_numero, 10)
+
+
+class ExpedienteSecuenciaConcurrenciaTest(TransactionTestCase):
+    hilos = 8
+    expedientes_por_hilo = 5
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_altas_simultaneas_sin_huecos_ni_colisiones(self):
+        sede = crear_sede()
+        crear_expediente(sede=sede)  # crea los catálogos antes de lanzar los hilos
+        errores = []
+        barrera = threading.Barrier(self.hilos)
+
+        def crear_varios():
+            try:
+                barrera.wait()
+                for _ in range(self.expedientes_por_hilo):
+                    crear_expediente(sede=sede)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=crear_varios) for _ in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        total = 1 + self.hilos * self.expedientes_por_hilo
+        numeros = sorted(Expediente.objects.filter(sede=sede).values_list('numero', flat=True))
+        self.assertEqual(numeros, list(range(1, total + 1)))
+
+
+class BorrarDuplicadosTest(TestCase):
+
+    # SQLite no deja usar el schema_editor dentro de la transacción del test
+    @skipUnless(connection.vendor == 'postgresql', "saca la restricción dentro de la transacción")
+    def test_borra_repetidos_y_reasigna_referencias(self):
+        # Sin la restricción, como en las bases anteriores a ella
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(ExpedienteInstitucion, ExpedienteInstitucion._meta.constraints[0])
+        expediente, institucion = crear_expediente(), crear_institucion()
+        efector, derivante = Rol.objects.create(rol='EFECTOR'), Rol.objects.create(rol='DERIVANTE')
+        vinculos = [
+            ExpedienteInstitucion.objects.create(expediente=expediente, institucion=institucion, rol=rol)
+            for rol in (efector, efector, derivante, efector)
+        ]
+        internacion = Internacion.objects.create(expediente_institucion=vinculos[3], fecha_internacion=datetime.date.today())
+        campos = ['expediente', 'institucion', 'rol']
+
+        salida = io.StringIO()
+        call_command('borrar_duplicados', 'expediente.ExpedienteInstitucion', dry_run=True, stdout=salida)
+        self.assertIn('1 grupos, 2 filas duplicadas', salida.getvalue())
+        self.assertIn('internacion.Internacion: 1 filas apuntan a duplicados', salida.getvalue())
+        self.assertEqual(ExpedienteInstitucion.objects.count(), 4)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(duplicados.reasignar(ExpedienteInstitucion, campos), {'internacion.Internacion': 1})
+            self.assertEqual(duplicados.borrar(ExpedienteInstitucion, campos), 2)
+        self.assertEqual(
+            sorted(ExpedienteInstitucion.objects.values_list('pk', flat=True)),
+            [vinculos[0].pk, vinculos[2].pk],
+        )
+        internacion.refresh_from_db()
+        self.assertEqual(internacion.expediente_institucion_id, vinculos[0].pk)
+
+    @skipUnless(connection.vendor == 'postgresql', "saca la restricción dentro de la transacción")
+    def test_comando_invalida_el_detalle_de_los_expedientes(self):
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(ExpedienteInstitucion, ExpedienteInstitucion._meta.constraints[0])
+        expediente, ajeno, institucion = crear_expediente(), crear_expediente(), crear_institucion()
+        rol = Rol.objects.create(rol='EFECTOR')
+        for destino in (expediente, expediente, ajeno):
+            ExpedienteInstitucion.objects.create(expediente=destino, institucion=institucion, rol=rol)
+        versiones = {pk: detalle.version(pk) for pk in (expediente.pk, ajeno.pk)}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('borrar_duplicados', 'expediente.ExpedienteInstitucion', stdout=io.StringIO())
+        self.assertEqual(ExpedienteInstitucion.objects.count(), 2)
+        self.assertNotEqual(detalle.version(expediente.pk), versiones[expediente.pk])
+        self.assertEqual(detalle.version(ajeno.pk), versiones[ajeno.pk])
+
+    def test_modelo_sin_restricciones(self):
+        with self.assertRaisesMessage(CommandError, 'no tiene restricciones de unicidad'):
+            call_command('borrar_duplicados', 'persona.Persona')
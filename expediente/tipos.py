@@ -0,0 +1,54 @@
+"""
+Tipo de expediente (demanda espontánea, oficio o secretaría) según su medio de
+ingreso. Cada tipo tiene sus propias vistas de detalle y edición.
+
+El mapeo medio -> tipo se arma con la lista de MedioIngreso cacheada en
+core.catalogos, así que resolver el tipo de un expediente no consulta la base.
+"""
+from django.urls import reverse
+
+from core import catalogos
+from .models import MedioIngreso
+
+DEMANDA_ESPONTANEA = 'demanda_espontanea'
+OFICIO = 'oficio'
+SECRETARIA = 'secretaria'
+
+# Nombre del medio de ingreso -> tipo de expediente
+TIPOS_POR_MEDIO = {
+    "DEMANDA ESPONTANEA": DEMANDA_ESPONTANEA,
+    "OFICIO POR MAIL": OFICIO,
+    "OFICIO PAPEL": OFICIO,
+    "DERIVACION": OFICIO,
+    "MAIL EFECTOR": OFICIO,
+    "COMUNICACION TELEFONICA EQUIPO TRATANTE": OFICIO,
+    "SOLICITUD SECRETARIA EJECUTIVA (DE OFICIO)": SECRETARIA,
+}
+
+# Tipo -> (url de detalle, url de edición)
+URLS = {
+    DEMANDA_ESPONTANEA: ('expediente:demanda_espontanea_detail', 'expediente:demanda_espontanea_update'),
+    OFICIO: ('expediente:oficio_detail', 'expediente:oficio_update'),
+    SECRETARIA: ('expediente:secretaria_detail', 'expediente:secretaria_update'),
+}
+
+
+def tipos_por_medio():
+    """{medio_ingreso_id: tipo} de todos los medios de ingreso (desde la cache)."""
+    return {
+        medio.pk: TIPOS_POR_MEDIO.get(medio.medio_ingreso.strip())
+        for medio in catalogos.objetos(MedioIngreso.objects.all())
+    }
+
+
+def tipo_de_medio(medio_ingreso_id):
+    """Tipo de expediente para un medio de ingreso, o None si no se reconoce."""
+    return tipos_por_medio().get(medio_ingreso_id)
+
+
+def urls_expediente(pk, tipo):
+    """(url de detalle, url de edición) de un expediente, o (None, None) si el tipo no se reconoce."""
+    if tipo not in URLS:
+        return None, None
+    detalle, editar = URLS[tipo]
+    return reverse(detalle, args=[pk]), reverse(editar, args=[pk])
@@ -2,6 +2,8 @@ from django.urls import path, re_path
 from .views import (
     DemandaEspontaneaCreateView, 
     ExpedienteListView, 
+    expediente_list_json,
+    expediente_exportar,
     MedioIngresoSelectView, 
     OficioCreateView, 
     SecretariaCreateView, 
@@ -22,7 +24,14 @@ from .views import (
     ExpedientePersonaCreateView,
     expediente_institucion_add_view,
     buscar_instituciones,
-    buscar_personas
+    buscar_personas,
+    descargar_documento,
+    miniatura_documento,
+    descargar_documentos_zip,
+    subida_iniciar,
+    subida_detalle,
+    subida_parte,
+    subida_completar
 )
 
 app_name = 'expediente'
@@ -30,6 +39,8 @@ app_name = 'expediente'
 urlpatterns = [
     # Rutas existentes
     path('expediente/', ExpedienteListView.as_view(), name='expediente_list'),
+    path('expediente/datos/', expediente_list_json, name='expediente_list_json'),
+    path('expediente/exportar/<str:formato>/', expediente_exportar, name='expediente_exportar'),
     path('expediente/seleccionar-medio/', MedioIngresoSelectView.as_view(), name='medio_ingreso_select'),
     path('expediente/crear/<int:medio_id>/', DemandaEspontaneaCreateView.as_view(), name='expediente_create_with_medio'),
     path('expediente/crear_oficio/<int:medio_id>/', OficioCreateView.as_view(), name='expediente_create_oficio'),
@@ -41,6 +52,13 @@ urlpatterns = [
     path('expediente/detalle/<int:pk>/', ExpedienteDetailDispatcherView.as_view(), name='expediente_detail'),
     path('expediente/buscar/', expediente_list, name='expediente_buscar'),
     path('expediente/<int:expediente_id>/agregar-documento/', ExpedienteDocumentoCreateView.as_view(), name='expediente_agregar_documento'),
+    path('expediente/<int:pk>/documentos/zip/', descargar_documentos_zip, name='expediente_documentos_zip'),
+    path('expediente/<int:expediente_id>/subidas/', subida_iniciar, name='subida_iniciar'),
+    path('subidas/<uuid:pk>/', subida_detalle, name='subida_detalle'),
+    path('subidas/<uuid:pk>/partes/<int:numero>/', subida_parte, name='subida_parte'),
+    path('subidas/<uuid:pk>/completar/', subida_completar, name='subida_completar'),
+    path('documento/<int:pk>/descargar/', descargar_documento, name='documento_descargar'),
+    path('documento/<int:pk>/miniatura/<str:tamanio>/', miniatura_documento, name='documento_miniatura'),
     path('documento/<int:pk>/eliminar/', ExpedienteDocumentoDeleteView.as_view(), name='expediente_documento_delete'),
     path('demanda-espontanea/<int:pk>/', DemandaEspontaneaDetailView.as_view(), name='demanda_espontanea_detail'),
     path('oficio/<int:pk>/detalle/', OficioDetailView.as_view(), name='oficio_detail'),
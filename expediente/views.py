@@ -1,20 +1,23 @@
 # Importamos algunas librerías necesarias para trabajar con fechas y vistas en Django
 import datetime
 from django.views.generic import FormView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
+from django.utils.http import content_disposition_header
 from django.db.models import Q
 
 
 import logging
+import os
 
 # Mezclas para controlar permisos y autenticación de usuarios
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.decorators import login_required, permission_required
 
 # Vistas genéricas para mostrar listas y editar objetos
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 
 # Funciones para redirigir usuarios y obtener objetos de la base de datos
 from django.shortcuts import redirect
@@ -23,7 +26,7 @@ from django.shortcuts import redirect
 from .forms import DemandaEspontanea, MedioIngresoForm, OficioForm, SecretariaForm, ExpedienteInstitucionForm, ExpedientePersonaForm
 
 # Importamos los modelos (tablas) que usaremos para guardar y consultar información
-from .models import Expediente, ExpedientePersona, Rol, ExpedienteInstitucion, ExpedienteDocumento, MedioIngreso
+from .models import Expediente, ExpedientePersona, Rol, ExpedienteInstitucion, ExpedienteDocumento, MedioIngreso, SubidaDocumento
 from persona.models import Persona
 from institucion.models import Institucion
 
@@ -31,24 +34,192 @@ from institucion.models import Institucion
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 
-from .forms import ExpedienteDocumentoFormSet, ExpedienteDocumentoForm
+from .forms import ExpedienteDocumentoFormSet, ExpedienteDocumentoForm, SubidaDocumentoForm
 from django.views import View
+from core.mixins import ListadoOptimizadoMixin
+from . import detalle, servicios, subidas, tipos
+from core import miniaturas
+from core.descargas import respuesta_archivo, zip_en_streaming
+from core.exportar import exportar_queryset
+from core.utils import pagina_sin_contar, parametros_pagina
 
 
 logger = logging.getLogger(__name__)
 
 # Vista para listar todos los expedientes (casos)
-class ExpedienteListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
-    model = Expediente  # Usamos el modelo Expediente
+# La tabla se completa desde expediente_list_json (DataTables en modo servidor),
+# por lo que la página ya no trae las filas: cada petición AJAX trae una sola página.
+class ExpedienteListView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
     template_name = 'expediente/expediente_list.html'  # HTML que se usará para mostrar la lista
-    context_object_name = 'expedientes'  # Nombre de la variable que contiene los expedientes en el HTML
     login_url = 'core:login'  # Si el usuario no está logueado, lo enviamos a esta página
     permission_required = 'expediente.view_expediente' # Permiso necesario para ver expedientes
     raise_exception = False  # Si no tiene permiso, muestra error 403
 
-    def get_queryset(self):
-        # Retorna todos los expedientes ordenados por identificador
-        return Expediente.objects.all().order_by('-identificador')
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Las filas llegan por expediente_list_json; acá sólo hace falta saber si hay alguna
+        context['hay_expedientes'] = Expediente.objects.exists()
+        return context
+
+
+# Columnas de la tabla de expedientes (en el mismo orden que el <thead>) y los campos
+# por los que se ordena cada una. La columna 0 ordena por (anio, numero, id), que es
+# la clave usada para la paginación por cursor.
+EXPEDIENTE_COLUMNAS_ORDEN = {
+    0: ('anio', 'numero', 'id'),
+    1: ('sede__sede', 'id'),
+    2: ('medio_ingreso__medio_ingreso', 'id'),
+    3: ('fecha_creacion', 'id'),
+}
+EXPEDIENTE_LARGO_MAXIMO = 100
+
+
+def _avisar_documentos_fallidos(request, resultado):
+    # Los archivos se escriben después del commit; los que fallaron ya no tienen fila
+    if resultado.fallidos:
+        nombres = ', '.join(str(documento) for documento in resultado.fallidos)
+        messages.warning(request, f"No se pudieron guardar los archivos de: {nombres}. Vuelva a subirlos.")
+
+
+def _entero(valor, defecto):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def filtrar_expedientes(queryset, busqueda):
+    """Aplica el texto del buscador de la tabla sobre las columnas visibles."""
+    busqueda = (busqueda or '').strip()
+    if not busqueda:
+        return queryset
+    return queryset.filter(
+        Q(identificador__icontains=busqueda) |
+        Q(sede__sede__icontains=busqueda) |
+        Q(medio_ingreso__medio_ingreso__icontains=busqueda) |
+        Q(cuij__icontains=busqueda) |
+        Q(clave_sisfe__icontains=busqueda)
+    )
+
+
+def _orden_expedientes(request):
+    """(columna, descendente, campos para order_by) según order[0][column] / order[0][dir] de DataTables."""
+    columna = _entero(request.GET.get('order[0][column]'), 0)
+    if columna not in EXPEDIENTE_COLUMNAS_ORDEN:
+        columna = 0
+    descendente = request.GET.get('order[0][dir]', 'desc') != 'asc'
+    prefijo = '-' if descendente else ''
+    return columna, descendente, [prefijo + campo for campo in EXPEDIENTE_COLUMNAS_ORDEN[columna]]
+
+
+def _cursor_expediente(expediente):
+    return f"{expediente.anio}:{expediente.numero}:{expediente.id}"
+
+
+def _filtro_cursor(cursor, descendente):
+    """
+    Convierte el cursor "anio:numero:id" de la última fila de la página anterior
+    en un filtro por rango sobre (anio, numero, id). Devuelve None si es inválido.
+    """
+    try:
+        anio, numero, pk = (int(v) for v in cursor.split(':'))
+    except (AttributeError, ValueError):
+        return None
+    op = 'lt' if descendente else 'gt'
+    return (
+        Q(**{f'anio__{op}': anio}) |
+        Q(anio=anio, **{f'numero__{op}': numero}) |
+        Q(anio=anio, numero=numero, **{f'id__{op}': pk})
+    )
+
+
+@login_required(login_url='core:login')
+@permission_required('expediente.view_expediente', login_url='core:login', raise_exception=True)
+def expediente_list_json(request):
+    """
+    Endpoint compatible con DataTables (serverSide): recibe draw/start/length,
+    order[0][column]/order[0][dir] y search[value], y devuelve una sola página.
+
+    Cuando se ordena por identificador y el cliente envía el cursor de la página
+    anterior se pagina por clave (keyset) en lugar de usar OFFSET, así avanzar
+    páginas no obliga a la base a recorrer todas las filas previas.
+    """
+    draw = _entero(request.GET.get('draw'), 0)
+    start = max(_entero(request.GET.get('start'), 0), 0)
+    length = _entero(request.GET.get('length'), 10)
+    if length <= 0 or length > EXPEDIENTE_LARGO_MAXIMO:
+        length = EXPEDIENTE_LARGO_MAXIMO
+
+    columna, descendente, orden = _orden_expedientes(request)
+
+    base = Expediente.objects.all()
+    filtrados = filtrar_expedientes(base, request.GET.get('search[value]'))
+
+    pagina = (
+        filtrados
+        .select_related('sede', 'medio_ingreso')
+        .only('id', 'identificador', 'anio', 'numero', 'fecha_creacion',
+              'sede__sede', 'medio_ingreso__medio_ingreso')
+        .order_by(*orden)
+    )
+
+    filtro_cursor = _filtro_cursor(request.GET.get('cursor'), descendente) if columna == 0 else None
+    if filtro_cursor is not None:
+        pagina = pagina.filter(filtro_cursor)[:length]
+    else:
+        pagina = pagina[start:start + length]
+
+    data = []
+    ultimo = None
+    tipos_medio = tipos.tipos_por_medio()
+    for expediente in pagina:
+        ultimo = expediente
+        url_detalle, url_editar = tipos.urls_expediente(expediente.pk, tipos_medio.get(expediente.medio_ingreso_id))
+        data.append({
+            'id': expediente.id,
+            'identificador': expediente.identificador,
+            'sede': str(expediente.sede),
+            'medio_ingreso': str(expediente.medio_ingreso) if expediente.medio_ingreso else '',
+            'fecha_creacion': expediente.fecha_creacion.strftime('%d/%m/%Y') if expediente.fecha_creacion else '',
+            # Directo a la vista del tipo; sin tipo reconocido, el front usa las urls genéricas
+            'url_detalle': url_detalle,
+            'url_editar': url_editar,
+        })
+
+    total = base.count()
+    # Sin texto de búsqueda el total filtrado es el mismo: evitamos un segundo COUNT
+    total_filtrado = filtrados.count() if filtrados is not base else total
+
+    return JsonResponse({
+        'draw': draw,
+        'recordsTotal': total,
+        'recordsFiltered': total_filtrado,
+        'data': data,
+        # Cursor de la última fila para pedir la página siguiente sin OFFSET
+        'cursor': _cursor_expediente(ultimo) if ultimo and columna == 0 else None,
+    })
+
+# Columnas de la exportación (core.exportar): las de la tabla más CUIJ y clave SISFE
+EXPEDIENTE_EXPORTAR = (
+    ('Identificador', 'identificador'),
+    ('Sede', 'sede__sede'),
+    ('Medio de ingreso', 'medio_ingreso__medio_ingreso'),
+    ('Fecha de creación', 'fecha_creacion'),
+    ('CUIJ', 'cuij'),
+    ('Clave SISFE', 'clave_sisfe'),
+)
+
+
+@login_required(login_url='core:login')
+@permission_required('expediente.view_expediente', login_url='core:login', raise_exception=True)
+def expediente_exportar(request, formato):
+    """
+    Descarga en CSV o XLSX todos los expedientes que muestra la tabla, con la misma
+    búsqueda (search[value]) y el mismo orden que expediente_list_json.
+    """
+    orden = _orden_expedientes(request)[2]
+    expedientes = filtrar_expedientes(Expediente.objects.all(), request.GET.get('search[value]')).order_by(*orden)
+    return exportar_queryset(formato, 'expedientes', expedientes, EXPEDIENTE_EXPORTAR)
 
 # Vista para seleccionar el medio de ingreso, primer paso para crear un expediente
 class MedioIngresoSelectView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
@@ -84,71 +255,100 @@ class MedioIngresoSelectView(LoginRequiredMixin, PermissionRequiredMixin, FormVi
             # Si no coincide, vuelve a la selección
             return redirect('expediente:medio_ingreso_select')
 
-# Vista que decide qué formulario mostrar para editar según el tipo de expediente
-class ExpedienteUpdateDispatcherView(LoginRequiredMixin, PermissionRequiredMixin, View):
-    login_url = 'core:login'
-    permission_required = 'expediente.change_expediente'
-    raise_exception = False
+class ExpedienteDelTipoMixin:
+    """
+    get_object() de las vistas de detalle y edición de cada tipo de expediente:
+    lo carga una sola vez por request, o usa el que ya cargó el dispatcher.
+    """
+    expediente = None
 
-    def get(self, request, pk):
-        expediente = get_object_or_404(Expediente, pk=pk)
-        medio = expediente.medio_ingreso.medio_ingreso if expediente.medio_ingreso else ""
-
-        # Según el medio de ingreso, redirige al formulario correcto
-        # Para editar cada tipo de expediente usamos las vistas ya definidas y registradas en urls.py
-        # Cada tipo de expediente tiene su propia vista de edición
-
-        medios_oficio = [
-            "OFICIO POR MAIL",
-            "OFICIO PAPEL",
-            "DERIVACION",
-            "MAIL EFECTOR",
-            "COMUNICACION TELEFONICA EQUIPO TRATANTE",
-        ]
-
-        if medio == "DEMANDA ESPONTANEA":
-            return redirect('expediente:demanda_espontanea_update', pk=pk)
-        elif medio in medios_oficio:
-            return redirect('expediente:oficio_update', pk=pk)
-        elif medio == "SOLICITUD SECRETARIA EJECUTIVA (DE OFICIO)":
-            return redirect('expediente:secretaria_update', pk=pk)
+    def get_object(self, queryset=None):
+        if self.expediente is None:
+            self.expediente = get_object_or_404(self.get_expedientes(), pk=self.kwargs['pk'])
+        return self.expediente
+
+    def get_expedientes(self):
+        return Expediente.objects.all()
+
+
+class ExpedienteDetalleMixin(ExpedienteDelTipoMixin):
+    """
+    Detalle de un expediente con un plan de consultas fijo (expediente/detalle.py).
+    El cuerpo de la plantilla va en {% cache %} con la versión del expediente en
+    la clave: si ya está cacheado no se cargan las relaciones, sólo los documentos
+    (su lista lleva formularios con csrf_token y queda fuera del fragmento).
+    """
+    fragmento = None  # nombre del {% cache %} de la plantilla
+
+    def get_expedientes(self):
+        return detalle.expedientes()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        version_detalle = detalle.version(self.object.pk)
+        context['version_detalle'] = version_detalle
+        context['timeout_detalle'] = detalle.TIMEOUT
+        if detalle.fragmento_cacheado(self.fragmento, self.object.pk, version_detalle):
+            context['documentos'] = self.object.documentos.order_by('-fecha_subida', '-id')
         else:
-            # Si no reconoce el medio, muestra error
-            messages.error(request, "No se pudo determinar el tipo de expediente.")
-            return redirect('expediente:expediente_list')
+            context.update(detalle.contexto(detalle.cargar_relaciones(self.object)))
+        return context
 
 
-class ExpedienteDetailDispatcherView(LoginRequiredMixin, PermissionRequiredMixin, View):
+class ExpedienteTipoDispatcherView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Atiende la url genérica de un expediente con la vista de su tipo (ver
+    expediente/tipos.py) en el mismo request, sin redirigir: el tipo sale del
+    mapeo cacheado medio de ingreso -> tipo y el expediente se carga una sola vez.
+    """
     login_url = 'core:login'
-    permission_required = 'expediente.view_expediente'
     raise_exception = False
-    
+
+    def vistas(self):
+        # {tipo: vista}; las vistas se definen más abajo en este módulo
+        raise NotImplementedError
+
+    def get_expedientes(self):
+        return Expediente.objects.all()
+
     def get(self, request, pk):
-        expediente = get_object_or_404(Expediente, pk=pk)
-        medio = expediente.medio_ingreso.medio_ingreso if expediente.medio_ingreso else ""
-        print(medio)
-        # Según el medio de ingreso, redirige al formulario correcto
-        # Para editar cada tipo de expediente usamos las vistas ya definidas y registradas en urls.py
-        # Cada tipo de expediente tiene su propia vista de edición
-
-        medios_oficio = [
-            "OFICIO POR MAIL",
-            "OFICIO PAPEL",
-            "DERIVACION",
-            "MAIL EFECTOR",
-            "COMUNICACION TELEFONICA EQUIPO TRATANTE",
-        ]
-
-        if medio == "DEMANDA ESPONTANEA":
-            return redirect('expediente:demanda_espontanea_detail', pk=pk)
-        elif medio in medios_oficio:
-            return redirect('expediente:oficio_detail', pk=pk)
-        elif medio == "SOLICITUD SECRETARIA EJECUTIVA (DE OFICIO)":
-            return redirect('expediente:secretaria_detail', pk=pk)
-        else:
+        expediente = get_object_or_404(self.get_expedientes(), pk=pk)
+        vista = self.vistas().get(tipos.tipo_de_medio(expediente.medio_ingreso_id))
+        if vista is None:
             # Si no reconoce el medio, muestra error
             messages.error(request, "No se pudo determinar el tipo de expediente.")
             return redirect('expediente:expediente_list')
+        return vista.as_view(expediente=expediente)(request, pk=pk)
+
+    # Los formularios de edición se envían a la misma url
+    post = get
+
+
+# Vista que decide qué formulario mostrar para editar según el tipo de expediente
+class ExpedienteUpdateDispatcherView(ExpedienteTipoDispatcherView):
+    permission_required = 'expediente.change_expediente'
+
+    def vistas(self):
+        return {
+            tipos.DEMANDA_ESPONTANEA: DemandaEspontaneaUpdateView,
+            tipos.OFICIO: OficioUpdateView,
+            tipos.SECRETARIA: SecretariaUpdateView,
+        }
+
+
+class ExpedienteDetailDispatcherView(ExpedienteTipoDispatcherView):
+    permission_required = 'expediente.view_expediente'
+
+    def get_expedientes(self):
+        # El mismo JOIN que usa la vista de detalle, que recibe el objeto ya cargado
+        return detalle.expedientes()
+
+    def vistas(self):
+        return {
+            tipos.DEMANDA_ESPONTANEA: DemandaEspontaneaDetailView,
+            tipos.OFICIO: OficioDetailView,
+            tipos.SECRETARIA: SecretariaDetailView,
+        }
 
 # Vista para crear expedientes del tipo "Demanda Espontanea"
 # Es el expediente más común y tiene a la persona como actor principal
@@ -216,9 +416,9 @@ class DemandaEspontaneaCreateView(LoginRequiredMixin, PermissionRequiredMixin, F
         context = self.get_context_data()
         documento_formset = context['documento_formset']
 
-        #if not documento_formset.is_valid():
-        #    messages.error(self.request, "Hay errores en los documentos. Corrígelos antes de continuar.")
-        #    return self.form_invalid(form)
+        if not documento_formset.is_valid():
+            messages.error(self.request, "Hay errores en los documentos. Corrígelos antes de continuar.")
+            return self.form_invalid(form)
 
         persona = form.cleaned_data.get('persona')
         if not persona:
@@ -227,54 +427,15 @@ class DemandaEspontaneaCreateView(LoginRequiredMixin, PermissionRequiredMixin, F
             return self.form_invalid(form)
         
 
-        # Extrae datos del formulario
-        sede = form.cleaned_data['sede']
-        fecha_creacion = form.cleaned_data['fecha_creacion']
-        medio_ingreso = form.cleaned_data['medio_ingreso']
-        rol = form.cleaned_data['rol']
-        tipo_solicitud = form.cleaned_data['tipo_solicitud']
-        estado_expediente = form.cleaned_data['estado_expediente']
-        grupo_etario = form.cleaned_data['grupo_etario']
-        edad_persona = form.cleaned_data['edad_persona']
-        situacion_habitacional_hist = form.cleaned_data['situacion_habitacional_hist']
-        resumen_intervencion = form.cleaned_data['resumen_intervencion']
-        observaciones = form.cleaned_data['observaciones']
-
-
-        # Crea el expediente
-        expediente = Expediente.objects.create(
-            sede=sede,
-            fecha_creacion=fecha_creacion,
-            medio_ingreso=medio_ingreso,
-            tipo_solicitud=tipo_solicitud,
-            estado_expediente=estado_expediente,
-            grupo_etario=grupo_etario,
-            edad_persona=edad_persona,
-            situacion_habitacional_hist=situacion_habitacional_hist,
-            resumen_intervencion=resumen_intervencion,
-            observaciones=observaciones,
+        # Crea el expediente, la relación con la persona y los documentos en una sola transacción
+        resultado = servicios.crear_expediente(
+            servicios.campos_expediente(form.cleaned_data),
+            personas=[(persona, form.cleaned_data['rol'])],
+            documentos=servicios.documentos_del_formset(documento_formset),
         )
 
-        # Relaciona la persona con el expediente
-        if persona:
-            try:
-                ExpedientePersona.objects.create(
-                    expediente=expediente,
-                    persona=persona,
-                    rol=rol
-                )
-            except Exception as e:
-                messages.error(self.request, f"No se pudo registrar la persona: {e}")
-                return self.form_invalid(form)
-
-        # Guarda los documentos vinculados al expediente
-        for documento_form in documento_formset:
-            if documento_form.cleaned_data.get('archivo'):
-                documento = documento_form.save(commit=False)
-                documento.expediente = expediente
-                documento.save()
-
         messages.success(self.request, "El expediente fue creado correctamente.")
+        _avisar_documentos_fallidos(self.request, resultado)
         return super().form_valid(form)
     
     def form_invalid(self, form):
@@ -284,7 +445,7 @@ class DemandaEspontaneaCreateView(LoginRequiredMixin, PermissionRequiredMixin, F
 
 
 # (Las siguientes vistas siguen la misma lógica: muestran formularios, validan datos, crean o actualizan objetos en la base de datos, y preparan datos para mostrar en el HTML. Cada clase tiene comentarios en las partes principales del flujo.)
-class DemandaEspontaneaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
+class DemandaEspontaneaUpdateView(ExpedienteDelTipoMixin, LoginRequiredMixin, PermissionRequiredMixin, FormView):
     template_name = 'expediente/demanda_espontanea_form.html'
     form_class = DemandaEspontanea
     success_url = reverse_lazy('expediente:expediente_list')
@@ -292,9 +453,6 @@ class DemandaEspontaneaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, F
     permission_required = 'expediente.change_expediente'
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
 
-    def get_object(self):
-        return get_object_or_404(Expediente, pk=self.kwargs['pk'])
-
     def get_initial(self):
         expediente = self.get_object()
         initial = super().get_initial()
@@ -421,19 +579,14 @@ class DemandaEspontaneaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, F
 
 
 
-class DemandaEspontaneaDetailView(DetailView):
+class DemandaEspontaneaDetailView(ExpedienteDetalleMixin, LoginRequiredMixin, PermissionRequiredMixin, DetailView):
     model = Expediente
     template_name = "expediente/demanda_espontanea_detalle.html"
     context_object_name = "expediente"
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # Documentos asociados al expediente
-        context["documentos"] = ExpedienteDocumento.objects.filter(expediente=self.object)
-        # Persona principal (rol=1) asociada al expediente
-        persona_rel = ExpedientePersona.objects.filter(expediente=self.object, rol__pk=1).first()
-        context["persona"] = persona_rel.persona if persona_rel else None
-        return context
+    login_url = 'core:login'
+    permission_required = 'expediente.view_expediente'
+    raise_exception = False
+    fragmento = 'expediente_detalle_demanda'
 
 
 
@@ -499,9 +652,9 @@ class OficioCreateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
         context = self.get_context_data()
         documento_formset = context['documento_formset']
 
-        #if not documento_formset.is_valid():
-        #    messages.error(self.request, "Hay errores en los documentos. Corrígelos antes de continuar.")
-        #    return self.form_invalid(form)
+        if not documento_formset.is_valid():
+            messages.error(self.request, "Hay errores en los documentos. Corrígelos antes de continuar.")
+            return self.form_invalid(form)
 
         institucion = form.cleaned_data.get('institucion')
         if not institucion:
@@ -513,70 +666,18 @@ class OficioCreateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
         medio_id = self.get_medio_id()
         medio_ingreso = get_object_or_404(MedioIngreso, pk=medio_id)
 
-        # Obtiene el resto normalmente
-        sede = form.cleaned_data.get('sede')
-        fecha_creacion = form.cleaned_data.get('fecha_creacion')
-        fecha_de_juzgado = form.cleaned_data.get('fecha_de_juzgado')
-        fecha_de_recepcion = form.cleaned_data.get('fecha_de_recepcion')
-        expediente_fisico = form.cleaned_data.get('expediente_fisico')
-        cuij = form.cleaned_data.get('cuij')
-        clave_sisfe = form.cleaned_data.get('clave_sisfe')
-        tipo_solicitud = form.cleaned_data.get('tipo_solicitud')
-        estado_expediente = form.cleaned_data.get('estado_expediente')
-        grupo_etario = form.cleaned_data.get('grupo_etario')
-        edad_persona = form.cleaned_data.get('edad_persona')
-        situacion_habitacional_hist = form.cleaned_data.get('situacion_habitacional_hist')
-        rol = form.cleaned_data['rol']
-        tipo_patrocinio = form.cleaned_data.get('tipo_patrocinio')
-        resumen_intervencion = form.cleaned_data.get('resumen_intervencion')
-        observaciones = form.cleaned_data.get('observaciones')
-
-        #try:
-        #    rol = Rol.objects.get(pk=2)
-        #except Rol.DoesNotExist:
-        #    form.add_error(None, 'El rol predeterminado no existe.')
-        #    return self.form_invalid(form)
+        datos = servicios.campos_expediente(form.cleaned_data)
+        datos['medio_ingreso'] = medio_ingreso  # <-- SIEMPRE desde URL o GET
 
-        # Crea el expediente con el medio_ingreso correcto
-        expediente = Expediente.objects.create(
-            sede=sede,
-            fecha_creacion=fecha_creacion,
-            medio_ingreso=medio_ingreso,  # <-- SIEMPRE desde URL o GET
-            fecha_de_juzgado=fecha_de_juzgado,
-            fecha_de_recepcion=fecha_de_recepcion,
-            expediente_fisico=expediente_fisico,
-            cuij=cuij,
-            clave_sisfe=clave_sisfe,
-            tipo_solicitud=tipo_solicitud,
-            estado_expediente=estado_expediente,
-            grupo_etario=grupo_etario,
-            edad_persona=edad_persona,
-            situacion_habitacional_hist=situacion_habitacional_hist,
-            tipo_patrocinio=tipo_patrocinio,
-            resumen_intervencion=resumen_intervencion,
-            observaciones=observaciones
+        # Crea el expediente, la relación con la institución y los documentos en una sola transacción
+        resultado = servicios.crear_expediente(
+            datos,
+            instituciones=[(institucion, form.cleaned_data['rol'])],
+            documentos=servicios.documentos_del_formset(documento_formset),
         )
 
-        # Relación con institución
-        if institucion:
-            try:
-                ExpedienteInstitucion.objects.create(
-                    expediente=expediente,
-                    institucion=institucion,
-                    rol=rol
-                )
-            except Exception as e:
-                messages.error(self.request, f"No se pudo registrar la institución: {e}")
-                return self.form_invalid(form)
-
-        #Vincula documentos
-        for documento_form in documento_formset:
-            if documento_form.cleaned_data.get('archivo'):
-                documento = documento_form.save(commit=False)
-                documento.expediente = expediente
-                documento.save()
-
         messages.success(self.request, "El expediente fue creado correctamente.")
+        _avisar_documentos_fallidos(self.request, resultado)
         return super().form_valid(form)
 
     def form_invalid(self, form):
@@ -585,7 +686,7 @@ class OficioCreateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
     
     
 
-class OficioUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
+class OficioUpdateView(ExpedienteDelTipoMixin, LoginRequiredMixin, PermissionRequiredMixin, FormView):
     template_name = 'expediente/oficio_form.html'
     form_class = OficioForm
     success_url = reverse_lazy('expediente:expediente_list')
@@ -593,10 +694,6 @@ class OficioUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
     permission_required = 'expediente.change_expediente'
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
 
-    def get_object(self):
-        # Obtiene el expediente por la pk de la URL
-        return get_object_or_404(Expediente, pk=self.kwargs['pk'])
-
     def get_initial(self):
         # Carga los datos existentes del expediente en el formulario
         expediente = self.get_object()
@@ -752,19 +849,14 @@ class OficioUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
 
 
 
-class OficioDetailView(DetailView):
+class OficioDetailView(ExpedienteDetalleMixin, LoginRequiredMixin, PermissionRequiredMixin, DetailView):
     model = Expediente
     template_name = "expediente/oficio_detalle.html"
     context_object_name = "expediente"
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # Documentos asociados al expediente
-        context["documentos"] = ExpedienteDocumento.objects.filter(expediente=self.object)
-        # Institución principal (rol=2) asociada al expediente
-        institucion_rel = ExpedienteInstitucion.objects.filter(expediente=self.object, rol__pk=2).first()
-        context["institucion"] = institucion_rel.institucion if institucion_rel else None
-        return context
+    login_url = 'core:login'
+    permission_required = 'expediente.view_expediente'
+    raise_exception = False
+    fragmento = 'expediente_detalle_oficio'
 
 
 
@@ -823,54 +915,18 @@ class SecretariaCreateView(LoginRequiredMixin, PermissionRequiredMixin, FormView
         context = self.get_context_data()
         documento_formset = context['documento_formset']
 
-        #if not documento_formset.is_valid():
-        #    messages.error(self.request, "Hay errores en los documentos. Corrígelos antes de continuar.")
-        #    return self.form_invalid(form)
-
-        fecha_de_juzgado = form.cleaned_data['fecha_de_juzgado']
-        fecha_de_recepcion = form.cleaned_data['fecha_de_recepcion']
-        sede = form.cleaned_data['sede']
-        fecha_creacion = form.cleaned_data['fecha_creacion']
-        medio_ingreso = form.cleaned_data['medio_ingreso']
-        tipo_solicitud = form.cleaned_data['tipo_solicitud']
-        estado_expediente = form.cleaned_data['estado_expediente']
-        grupo_etario = form.cleaned_data['grupo_etario']
-        edad_persona = form.cleaned_data['edad_persona']
-        situacion_habitacional_hist = form.cleaned_data['situacion_habitacional_hist']
-        resumen_intervencion = form.cleaned_data['resumen_intervencion']
-        tipo_patrocinio = form.cleaned_data.get('tipo_patrocinio')
-        expediente_fisico = form.cleaned_data['expediente_fisico']
-        clave_sisfe = form.cleaned_data['clave_sisfe']
-        cuij = form.cleaned_data['cuij']
-        observaciones = form.cleaned_data['observaciones']
-        
-        
-        expediente = Expediente.objects.create(
-            fecha_de_juzgado=fecha_de_juzgado,
-            fecha_de_recepcion=fecha_de_recepcion,
-            sede=sede,
-            fecha_creacion=fecha_creacion,
-            medio_ingreso=medio_ingreso,
-            tipo_solicitud = tipo_solicitud,
-            estado_expediente = estado_expediente,
-            grupo_etario = grupo_etario,
-            edad_persona = edad_persona,
-            situacion_habitacional_hist = situacion_habitacional_hist,
-            resumen_intervencion = resumen_intervencion,
-            tipo_patrocinio = tipo_patrocinio,
-            expediente_fisico = expediente_fisico,
-            clave_sisfe = clave_sisfe,
-            cuij = cuij,
-            observaciones = observaciones,
+        if not documento_formset.is_valid():
+            messages.error(self.request, "Hay errores en los documentos. Corrígelos antes de continuar.")
+            return self.form_invalid(form)
 
+        # Crea el expediente y sus documentos en una sola transacción
+        resultado = servicios.crear_expediente(
+            servicios.campos_expediente(form.cleaned_data),
+            documentos=servicios.documentos_del_formset(documento_formset),
         )
-        for documento_form in documento_formset:
-            if documento_form.cleaned_data.get('archivo'):
-                documento = documento_form.save(commit=False)
-                documento.expediente = expediente
-                documento.save()
 
         messages.success(self.request, "El expediente fue creado correctamente.")
+        _avisar_documentos_fallidos(self.request, resultado)
         return super().form_valid(form)
         
 
@@ -884,7 +940,7 @@ class SecretariaCreateView(LoginRequiredMixin, PermissionRequiredMixin, FormView
 
 
 
-class SecretariaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
+class SecretariaUpdateView(ExpedienteDelTipoMixin, LoginRequiredMixin, PermissionRequiredMixin, FormView):
     template_name = 'expediente/secretaria_form.html'
     form_class = SecretariaForm
     success_url = reverse_lazy('expediente:expediente_list')
@@ -892,10 +948,6 @@ class SecretariaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormView
     permission_required = 'expediente.change_expediente'
     raise_exception = False
 
-    def get_object(self):
-        # Obtiene el expediente por la pk de la URL
-        return get_object_or_404(Expediente, pk=self.kwargs['pk'])
-
     def get_initial(self):
         # Carga los datos existentes del expediente en el formulario
         expediente = self.get_object()
@@ -999,19 +1051,14 @@ class SecretariaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FormView
 
 
 
-class SecretariaDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
+class SecretariaDetailView(ExpedienteDetalleMixin, LoginRequiredMixin, PermissionRequiredMixin, DetailView):
     model = Expediente
     template_name = "expediente/secretaria_detalle.html"
     context_object_name = "expediente"
     login_url = 'core:login'
     permission_required = 'expediente.view_expediente'
     raise_exception = False
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # Documentos asociados al expediente
-        context["documentos"] = ExpedienteDocumento.objects.filter(expediente=self.object)
-        return context
+    fragmento = 'expediente_detalle_secretaria'
 
 
     
@@ -1037,6 +1084,180 @@ class ExpedienteDocumentoCreateView(FormView):
 
 
 
+def _expedientes_visibles(request):
+    """Expedientes de la sede del usuario (todos para el superusuario)."""
+    expedientes = Expediente.objects.all()
+    if not request.user.is_superuser:
+        expedientes = expedientes.filter(sede_id=getattr(request.user, 'sede_id', None))
+    return expedientes
+
+
+def _documento_visible(request, pk):
+    """El documento, si es de la sede del usuario (404 si no)."""
+    documentos = ExpedienteDocumento.objects.all()
+    if not request.user.is_superuser:
+        documentos = documentos.filter(expediente__sede_id=getattr(request.user, 'sede_id', None))
+    return get_object_or_404(documentos, pk=pk)
+
+
+# Descarga de un documento: controla el permiso y la sede y deja el envío del archivo
+# al servidor web (X-Accel-Redirect / X-Sendfile) o, en desarrollo, a Django con Range y ETag
+@login_required(login_url='core:login')
+@permission_required('expediente.view_expedientedocumento', login_url='core:login', raise_exception=True)
+def descargar_documento(request, pk):
+    documento = _documento_visible(request, pk)
+    if not documento.archivo:
+        raise Http404("El documento no tiene archivo.")
+
+    # El archivo se guarda con el hash como nombre: se descarga con el nombre del documento
+    extension = os.path.splitext(documento.archivo.name)[1]
+    nombre_descarga = f"{documento.nombre}{extension}" if documento.nombre else os.path.basename(documento.archivo.name)
+    try:
+        return respuesta_archivo(
+            request,
+            documento.archivo.storage,
+            documento.archivo.name,
+            nombre_descarga,
+            tipo_mime=documento.tipo_mime,
+            sha256=documento.sha256,
+            adjunto='descargar' in request.GET,
+        )
+    except FileNotFoundError:
+        logger.error("Falta en disco el archivo %s del documento %s", documento.archivo.name, documento.pk)
+        raise Http404("No se encontró el archivo del documento.")
+
+
+# Miniatura de un documento de imagen (core.miniaturas), con los mismos controles que la descarga
+@login_required(login_url='core:login')
+@permission_required('expediente.view_expedientedocumento', login_url='core:login', raise_exception=True)
+def miniatura_documento(request, pk, tamanio):
+    documento = _documento_visible(request, pk)
+    if not documento.es_imagen or not documento.sha256 or tamanio not in miniaturas.TAMANIOS:
+        raise Http404("El documento no tiene miniatura.")
+
+    storage = documento.archivo.storage
+    nombre = miniaturas.nombre_miniatura(ExpedienteDocumento.CARPETA_MINIATURAS, documento.sha256, tamanio)
+    if not storage.exists(nombre):
+        # Todavía no la generó el pool (o es un documento anterior): se genera ahora
+        try:
+            miniaturas.generar(storage, documento.archivo.name, documento.sha256, ExpedienteDocumento.CARPETA_MINIATURAS)
+        except Exception:
+            logger.exception("No se pudo generar la miniatura del documento %s", documento.pk)
+            raise Http404("No se pudo generar la miniatura.")
+    return respuesta_archivo(
+        request, storage, nombre, f"{documento.nombre or 'miniatura'}{miniaturas.EXTENSION}",
+        tipo_mime=miniaturas.TIPO_MIME,
+    )
+
+
+# Todos los documentos de un expediente en un ZIP que se arma mientras se envía
+# (core.descargas.zip_en_streaming), con un manifiesto de nombres, fechas y sha256
+@login_required(login_url='core:login')
+@permission_required('expediente.view_expedientedocumento', login_url='core:login', raise_exception=True)
+def descargar_documentos_zip(request, pk):
+    expediente = get_object_or_404(_expedientes_visibles(request).only('pk', 'identificador'), pk=pk)
+    documentos = (
+        expediente.documentos.exclude(archivo='')
+        .order_by('fecha_subida', 'pk')
+        .only('nombre', 'archivo', 'fecha_subida', 'sha256', 'tipo_mime')
+    )
+
+    def entradas():
+        for documento in documentos.iterator(chunk_size=200):
+            extension = os.path.splitext(documento.archivo.name)[1]
+            yield {
+                'ruta': documento.archivo.path,
+                'nombre': f"{documento.nombre or 'documento'}{extension}",
+                'fecha': documento.fecha_subida,
+                'tipo_mime': documento.tipo_mime,
+                'sha256': documento.sha256,
+            }
+
+    respuesta = StreamingHttpResponse(zip_en_streaming(entradas()), content_type='application/zip')
+    respuesta['Content-Disposition'] = content_disposition_header(True, f"{expediente.identificador or expediente.pk}.zip")
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+# Subida por partes de documentos grandes (expediente.subidas), para static/js/subida_por_partes.js:
+#   POST   expediente/<id>/subidas/             -> inicia (nombre, nombre_archivo, tamanio, [tipo_mime, sha256])
+#   GET    subidas/<id>/                        -> estado, para reanudar desde siguiente_parte
+#   PUT    subidas/<id>/partes/<n>/             -> parte n (cuerpo binario; X-Content-SHA256 opcional)
+#   POST   subidas/<id>/completar/              -> crea el documento
+#   DELETE subidas/<id>/                        -> cancela
+def _estado_subida(subida):
+    return {
+        'id': str(subida.pk),
+        'url': reverse('expediente:subida_detalle', args=[subida.pk]),
+        'tamanio': subida.tamanio,
+        'tamanio_parte': subida.tamanio_parte,
+        'partes': subida.partes,
+        'recibido': subida.recibido,
+        'siguiente_parte': subida.siguiente_parte,
+    }
+
+
+def _subida_del_usuario(request, pk):
+    return get_object_or_404(SubidaDocumento, pk=pk, usuario=request.user)
+
+
+@login_required(login_url='core:login')
+@permission_required('expediente.add_expedientedocumento', login_url='core:login', raise_exception=True)
+@require_POST
+def subida_iniciar(request, expediente_id):
+    expediente = get_object_or_404(_expedientes_visibles(request), pk=expediente_id)
+    form = SubidaDocumentoForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errores': form.errors}, status=400)
+    try:
+        subida = subidas.iniciar(expediente, request.user, **form.cleaned_data)
+    except subidas.ErrorSubida as error:
+        return JsonResponse({'error': str(error)}, status=error.estado)
+    return JsonResponse(_estado_subida(subida), status=201)
+
+
+@login_required(login_url='core:login')
+@permission_required('expediente.add_expedientedocumento', login_url='core:login', raise_exception=True)
+@require_http_methods(['GET', 'DELETE'])
+def subida_detalle(request, pk):
+    subida = _subida_del_usuario(request, pk)
+    if request.method == 'DELETE':
+        subidas.cancelar(subida)
+        return HttpResponse(status=204)
+    return JsonResponse(_estado_subida(subida))
+
+
+@login_required(login_url='core:login')
+@permission_required('expediente.add_expedientedocumento', login_url='core:login', raise_exception=True)
+@require_http_methods(['PUT'])
+def subida_parte(request, pk, numero):
+    subida = _subida_del_usuario(request, pk)
+    try:
+        # El cuerpo se lee del request en bloques: la parte nunca está entera en memoria
+        subida, sha256 = subidas.recibir_parte(subida, numero, request, request.headers.get('X-Content-SHA256', ''))
+    except subidas.ErrorSubida as error:
+        subida.refresh_from_db()
+        return JsonResponse({'error': str(error), **_estado_subida(subida)}, status=error.estado)
+    return JsonResponse({**_estado_subida(subida), 'sha256_parte': sha256})
+
+
+@login_required(login_url='core:login')
+@permission_required('expediente.add_expedientedocumento', login_url='core:login', raise_exception=True)
+@require_POST
+def subida_completar(request, pk):
+    subida = _subida_del_usuario(request, pk)
+    try:
+        documento = subidas.completar(subida)
+    except subidas.ErrorSubida as error:
+        return JsonResponse({'error': str(error)}, status=error.estado)
+    return JsonResponse({
+        'documento': documento.pk,
+        'nombre': documento.nombre,
+        'sha256': documento.sha256,
+        'url': reverse('expediente:documento_descargar', args=[documento.pk]),
+    }, status=201)
+
+
 class ExpedienteDocumentoDeleteView(View):
     def post(self, request, pk, *args, **kwargs):
         documento = get_object_or_404(ExpedienteDocumento, pk=pk)
@@ -1079,11 +1300,10 @@ def expediente_documentos_view(request, expediente_id):
 @login_required(login_url='core:login')
 @permission_required('expediente.view_expediente', login_url='core:login', raise_exception=True)
 def expediente_list(request):
-    expedientes = Expediente.objects.all()
+    # Los expedientes se cargan desde la plantilla con core:buscar (tipo=expediente)
     next_url = request.GET.get("next")       # para redirigir después
 
     return render(request, "expediente/expediente_buscar.html", {
-        "expedientes": expedientes,
         "next_url": next_url,   # lo mandamos al template
     })
 
@@ -1133,8 +1353,6 @@ class ExpedienteInstitucionCreateView(LoginRequiredMixin, PermissionRequiredMixi
             except Expediente.DoesNotExist:
                 numero_expediente = None
         context['numero_expediente'] = numero_expediente
-        context['instituciones'] = Institucion.objects.all()
-        context['roles'] = Rol.objects.all()
         return context
 
 
@@ -1166,23 +1384,22 @@ class ExpedientePersonaCreateView(LoginRequiredMixin, PermissionRequiredMixin, C
             except Expediente.DoesNotExist:
                 numero_expediente = None
         context['numero_expediente'] = numero_expediente
-        context['personas'] = Persona.objects.all()
-        context['roles'] = Rol.objects.all()
         return context
 
 
 
-class ExpedienteInstitucionListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class ExpedienteInstitucionListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
     model = ExpedienteInstitucion
     template_name = 'expediente/expediente_institucion_list.html'
     context_object_name = 'expediente_instituciones'
     permission_required = 'expediente.view_expedienteinstitucion'
     raise_exception = False  # Lanza 403 si no tiene permiso
+    list_select_related = ('expediente', 'institucion', 'rol')
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated and hasattr(user, 'sede'):
-            return ExpedienteInstitucion.objects.filter(expediente__sede=user.sede).select_related('expediente', 'institucion', 'rol')
+            return super().get_queryset().filter(expediente__sede=user.sede)
         else:
             return ExpedienteInstitucion.objects.none()  # Si no hay usuario o sede, no mostrar nada
 
@@ -1193,17 +1410,18 @@ class ExpedienteInstitucionListView(LoginRequiredMixin, PermissionRequiredMixin,
 
 
 
-class ExpedientePersonaListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class ExpedientePersonaListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
     model = ExpedientePersona
     template_name = 'expediente/expediente_persona_list.html'
     context_object_name = 'expediente_personas'
     permission_required = 'expediente.view_expedientepersona'
     raise_exception = False  # Lanza 403 si no tiene permiso
+    list_select_related = ('expediente', 'persona', 'rol')
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated and hasattr(user, 'sede'):
-            return ExpedientePersona.objects.filter(expediente__sede=user.sede).select_related('expediente', 'persona', 'rol')
+            return super().get_queryset().filter(expediente__sede=user.sede)
         else:
             return ExpedientePersona.objects.none()  # Si no hay usuario o sede, no mostrar nada
 
@@ -1223,30 +1441,32 @@ def expediente_institucion_add_view(request):
             form.save()
             messages.success(request, "La institución fue vinculada correctamente al expediente.")
             return redirect('expediente:expediente_institucion_list')
-        
-    context = {
-        "expedientes": Expediente.objects.all(),
-        "instituciones": Institucion.objects.filter(estado=True),
-        "roles": Rol.objects.all(),
-    }
-    return render(request, "expediente/expediente_institucion_form.html", context)
+    else:
+        form = ExpedienteInstitucionForm(initial={'expediente': request.GET.get('expediente_id')})
+
+    # Las instituciones se buscan por AJAX (buscar_instituciones): no se cargan tablas enteras
+    return render(request, "expediente/expediente_institucion_form.html", {"form": form})
 
 
 @login_required(login_url='core:login')
 @permission_required('expediente.add_expedientepersona', login_url='core:login', raise_exception=True)
 def buscar_instituciones(request):
+    # Formato de Select2 con paginación: {results: [...], pagination: {more: bool}}
     q = request.GET.get('q', '')
-    instituciones = Institucion.objects.filter(institucion__icontains=q)[:20]
+    pagina, por_pagina = parametros_pagina(request)
+    instituciones, hay_mas = pagina_sin_contar(
+        Institucion.objects.filter(institucion__icontains=q).order_by('institucion', 'id').only('id', 'institucion'),
+        pagina, por_pagina,
+    )
     results = [{'id': i.id, 'text': i.institucion} for i in instituciones]
-    return JsonResponse({'results': results})
+    return JsonResponse({'results': results, 'pagination': {'more': hay_mas}})
 
 
 @login_required(login_url='core:login')
 @permission_required('expediente.add_expedientepersona', login_url='core:login', raise_exception=True)
 def buscar_personas(request):
     q = request.GET.get('q', '')
-    personas = Persona.objects.filter(
-        Q(nombre__icontains=q) | Q(apellido__icontains=q)
-    )[:20]
+    pagina, por_pagina = parametros_pagina(request)
+    personas, hay_mas = pagina_sin_contar(Persona.objects.buscar_persona(q), pagina, por_pagina)
     results = [{'id': i.id, 'text': f"{i.nombre} {i.apellido}"} for i in personas]
-    return JsonResponse({'results': results})
\ No newline at end of file
+    return JsonResponse({'results': results, 'pagination': {'more': hay_mas}})
@@ -1,7 +1,14 @@
 from django.contrib import admin
 
+from core.admin import ImportacionAdminMixin
+from .importacion import InstitucionImportacion
 from .models import TipoInstitucion, Institucion
 # Register your models here.
 
 admin.site.register(TipoInstitucion)
-admin.site.register(Institucion)
\ No newline at end of file
+
+
+@admin.register(Institucion)
+class InstitucionAdmin(ImportacionAdminMixin, admin.ModelAdmin):
+    importacion = InstitucionImportacion
+    comando = 'importar_instituciones'
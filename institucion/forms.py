@@ -47,20 +47,6 @@ class InstitucionForm(forms.ModelForm):
             'estado': 'Activo',
         }
 
-    def clean_institucion(self):
-        institucion = self.cleaned_data.get('institucion')
-        if not institucion:
-            raise forms.ValidationError('Este campo es obligatorio.')
-        if len(institucion) < 3:
-            raise forms.ValidationError('El nombre de la institución debe tener al menos 3 caracteres.')
-        return institucion
-
-    def clean_telefono(self):
-        telefono = self.cleaned_data.get('telefono')
-        if telefono and not telefono.isdigit():
-            raise forms.ValidationError('El teléfono debe contener solo números.')
-        return telefono
-
     # def clean_cuit(self):
     #     cuit = self.cleaned_data.get('cuit')
     #     if not cuit:
@@ -73,18 +59,53 @@ class InstitucionForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Filtra solo localidades activas
         #self.fields['localidad'].queryset = Localidad.objects.filter(estado=True)
-        self.fields['tipo_institucion'].queryset = TipoInstitucion.objects.filter(estado=True)
+        if 'tipo_institucion' in self.fields:
+            self.fields['tipo_institucion'].queryset = TipoInstitucion.objects.filter(estado=True)
 
 
     def clean(self):
         cleaned_data = super().clean()
+        for campo, mensaje in limpiar_institucion(cleaned_data):
+            self.add_error(campo, mensaje)
+        return cleaned_data
+
+
+def limpiar_institucion(cleaned_data):
+    """
+    Reglas de InstitucionForm sobre los datos ya limpios: pasa los textos a
+    mayúsculas en el mismo diccionario y devuelve los errores como
+    [(campo, mensaje)]. Las usa también la importación (institucion.importacion),
+    que no arma un formulario por fila.
+    """
+    errores = []
+
+    # Solo si el campo no tuvo ya su propio error
+    if 'institucion' in cleaned_data:
+        institucion = cleaned_data['institucion']
+        if not institucion:
+            errores.append(('institucion', 'Este campo es obligatorio.'))
+        elif len(institucion) < 3:
+            errores.append(('institucion', 'El nombre de la institución debe tener al menos 3 caracteres.'))
+
+    telefono = cleaned_data.get('telefono')
+    if telefono and not telefono.isdigit():
+        errores.append(('telefono', 'El teléfono debe contener solo números.'))
+
+    # Transformación de valores de texto
+    for field_name, value in cleaned_data.items():
+        if isinstance(value, str):
+            if field_name == 'email':
+                cleaned_data[field_name] = value.lower()  # Email en minúsculas
+            else:
+                cleaned_data[field_name] = value.upper()  # Todo lo demás en mayúsculas
+
+    return errores
 
-        # Transformación de valores de texto
-        for field_name, value in cleaned_data.items():
-            if isinstance(value, str):
-                if field_name == 'email':
-                    cleaned_data[field_name] = value.lower()  # Email en minúsculas
-                else:
-                    cleaned_data[field_name] = value.upper()  # Todo lo demás en mayúsculas
 
-        return cleaned_data
\ No newline at end of file
+class InstitucionImportacionForm(InstitucionForm):
+    """
+    InstitucionForm para institucion.importacion: sin los FK, que se resuelven con
+    diccionarios. La importación usa sus campos y limpiar_institucion().
+    """
+    class Meta(InstitucionForm.Meta):
+        fields = [campo for campo in InstitucionForm.Meta.fields if campo not in ('tipo_institucion', 'localidad')]
@@ -0,0 +1,72 @@
+"""
+Importación masiva de instituciones (core.importar).
+
+Institucion no tiene un campo único con el que usar INSERT ... ON CONFLICT:
+una fila corresponde a una institución existente si coincide el CUIT (solo
+los dígitos) o, si no, el nombre y la localidad. Las existentes se leen una
+vez al empezar; por lote, las nuevas van con bulk_create y las existentes
+con bulk_update.
+"""
+from django.db import transaction
+
+from core.busqueda import indexar_lote
+from core.importar import Importacion, catalogo, catalogo_localidades
+from core.models import DocumentoBusqueda
+from core.utils import normalizar_texto
+from expediente import detalle
+from expediente.models import ExpedienteInstitucion
+from .forms import InstitucionImportacionForm, limpiar_institucion
+from .models import Institucion, TipoInstitucion
+
+
+def _cuit(texto):
+    return ''.join(c for c in texto or '' if c.isdigit())
+
+
+def _claves(cuit, institucion, localidad_id):
+    claves = [('cuit', _cuit(cuit))] if _cuit(cuit) else []
+    return claves + [('nombre', normalizar_texto(institucion), localidad_id)]
+
+
+class InstitucionImportacion(Importacion):
+    form_class = InstitucionImportacionForm
+    columnas_obligatorias = ('institucion',)
+
+    def reglas(self, datos):
+        return limpiar_institucion(datos)
+
+    def catalogos(self):
+        # Como en InstitucionForm, solo los tipos activos
+        tipos = TipoInstitucion.objects.filter(estado=True).values_list('tipo_institucion', 'pk')
+        return {'tipo_institucion': catalogo(tipos), 'localidad': catalogo_localidades()}
+
+    def importar(self, filas):
+        self._existentes = {}
+        for pk, cuit, institucion, localidad_id in Institucion.objects.values_list('pk', 'cuit', 'institucion', 'localidad_id').iterator():
+            for clave in _claves(cuit, institucion, localidad_id):
+                self._existentes.setdefault(clave, pk)
+        return super().importar(filas)
+
+    def clave(self, institucion):
+        return _claves(institucion.cuit, institucion.institucion, institucion.localidad_id)[0]
+
+    def guardar(self, instituciones, campos):
+        nuevas, existentes = [], []
+        for institucion in instituciones:
+            claves = _claves(institucion.cuit, institucion.institucion, institucion.localidad_id)
+            institucion.pk = next((self._existentes[c] for c in claves if c in self._existentes), None)
+            (existentes if institucion.pk else nuevas).append(institucion)
+        Institucion.objects.bulk_create(nuevas)
+        Institucion.objects.bulk_update(existentes, campos)
+        for institucion in nuevas:
+            for clave in _claves(institucion.cuit, institucion.institucion, institucion.localidad_id):
+                self._existentes.setdefault(clave, institucion.pk)
+        # bulk_create / bulk_update no emiten post_save: el índice de búsqueda y el
+        # detalle cacheado de los expedientes donde figuran las existentes se actualizan acá
+        indexar_lote(DocumentoBusqueda.INSTITUCION, [institucion.pk for institucion in instituciones])
+        expedientes = set(ExpedienteInstitucion.objects.filter(
+            institucion_id__in=[institucion.pk for institucion in existentes],
+        ).values_list('expediente_id', flat=True))
+        if expedientes:
+            transaction.on_commit(lambda: detalle.invalidar(*expedientes))
+        return len(nuevas), len(existentes)
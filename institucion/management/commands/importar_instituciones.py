@@ -0,0 +1,10 @@
+from core.importar import ComandoImportacion
+from institucion.importacion import InstitucionImportacion
+
+
+class Command(ComandoImportacion):
+    help = (
+        "Importa instituciones desde un CSV o XLSX: crea las nuevas y actualiza las existentes "
+        "(mismo CUIT, o mismo nombre y localidad). Las filas rechazadas quedan en un CSV de errores"
+    )
+    importacion = InstitucionImportacion
@@ -1,3 +1,78 @@
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Rol
+from core.tests import ConsultasConstantesMixin, crear_localidad, crear_usuario_admin
+from expediente.models import ExpedienteInstitucion
+from expediente.tests import crear_expediente, crear_institucion
+from .models import Institucion, TipoInstitucion
+
+
+class InstitucionListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(crear_usuario_admin())
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            crear_institucion(localidad=crear_localidad())
+
+    def test_listado_consultas_constantes(self):
+        self.assertConsultasConstantes(reverse('institucion:institucion_list'))
+
+
+class InstitucionImportacionTest(TestCase):
+
+    def test_comando_actualiza_por_cuit_o_nombre(self):
+        localidad = crear_localidad('ESPERANZA')
+        TipoInstitucion.objects.create(tipo_institucion='HOSPITAL')
+        TipoInstitucion.objects.create(tipo_institucion='ESCUELA', estado=False)
+        por_nombre = crear_institucion(institucion='Hospital Central', localidad=localidad)
+        por_cuit = crear_institucion(institucion='CLINICA', cuit='30-12345678-9')
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, 'instituciones.csv')
+            with open(ruta, 'w', encoding='cp1252') as archivo:
+                archivo.write(
+                    'institucion,tipo_institucion,localidad,telefono,cuit\n'
+                    'HOSPITAL CENTRAL,hospital,Esperanza,3496111,\n'
+                    'Clínica del Sol,,,,30123456789\n'
+                    'Escuela 12,escuela,,,\n'
+                    'Centro de Día,,,34-96,\n'
+                    'Nuevo Hogar,HOSPITAL,,,\n'
+                )
+            call_command('importar_instituciones', ruta, encoding='cp1252', stdout=open(os.devnull, 'w'))
+            with open(f'{ruta}.errores.csv', encoding='utf-8-sig') as informe:
+                errores = informe.read()
+
+        self.assertIn('Tipo de Institución: «escuela» no existe.', errores)
+        self.assertIn('Teléfono: El teléfono debe contener solo números.', errores)
+        self.assertEqual(Institucion.objects.count(), 3)
+        por_nombre.refresh_from_db()
+        por_cuit.refresh_from_db()
+        self.assertEqual((por_nombre.telefono, por_nombre.tipo_institucion.tipo_institucion), ('3496111', 'HOSPITAL'))
+        self.assertEqual((por_cuit.institucion, por_cuit.cuit), ('CLÍNICA DEL SOL', '30123456789'))
+        self.assertTrue(Institucion.objects.filter(institucion='NUEVO HOGAR', estado=True).exists())
+
+    def test_actualizar_invalida_el_detalle_de_los_expedientes(self):
+        cache.clear()
+        self.client.force_login(crear_usuario_admin())
+        institucion = crear_institucion(institucion='CLINICA', cuit='30-12345678-9')
+        expediente = crear_expediente()
+        ExpedienteInstitucion.objects.create(
+            expediente=expediente, institucion=institucion, rol=Rol.objects.create(rol='DERIVANTE'),
+        )
+        url = reverse('expediente:expediente_detail', args=[expediente.pk])
+        self.assertContains(self.client.get(url), 'CLINICA')
 
-# Create your tests here.
+        with tempfile.TemporaryDirectory() as carpeta, self.captureOnCommitCallbacks(execute=True):
+            ruta = os.path.join(carpeta, 'instituciones.csv')
+            with open(ruta, 'w') as archivo:
+                archivo.write('institucion,cuit\nClínica del Sol,30123456789\n')
+            call_command('importar_instituciones', ruta, stdout=open(os.devnull, 'w'))
+        self.assertContains(self.client.get(url), 'CLÍNICA DEL SOL')
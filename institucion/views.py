@@ -15,6 +15,7 @@ from django.http import HttpResponseRedirect
 from urllib.parse import urlencode
 
 from .forms import InstitucionForm
+from core.mixins import ListadoOptimizadoMixin
 
 
 
@@ -39,16 +40,15 @@ class InstitucionCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateV
         return response
 
 
-class InstitucionListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class InstitucionListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
     model = Institucion
     template_name = 'institucion/institucion_list.html'
     context_object_name = 'instituciones'
     login_url = 'core:login'
     permission_required = 'institucion.view_institucion'
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
-
-    def get_queryset(self):
-        return Institucion.objects.all().order_by('-estado', 'institucion')   
+    queryset = Institucion.objects.all().order_by('-estado', 'institucion')
+    list_select_related = ('localidad',)
     
 
 class InstitucionUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
@@ -1,4 +1,5 @@
 from django import forms
+from core.fields import CachedModelChoiceField, RemoteModelChoiceField, RemoteSelect
 from .models import Internacion
 
 
@@ -18,9 +19,22 @@ class InternacionForm(forms.ModelForm):
                   'tipo_adiccion', 
                   'fecha_cumplimiento',
                   'observaciones']
+        # Catálogos: las opciones salen de la cache (core.catalogos)
+        field_classes = {
+            'motivo_internacion': CachedModelChoiceField,
+            'motivo_alta': CachedModelChoiceField,
+            'tipo_internacion': CachedModelChoiceField,
+            'modalidad_suicidio': CachedModelChoiceField,
+            'tipo_adiccion': CachedModelChoiceField,
+            # Tabla grande: sólo la opción elegida, el resto por AJAX
+            'expediente_institucion': RemoteModelChoiceField,
+        }
         
         widgets = {
-            'expediente_institucion': forms.Select(attrs={'class': 'form-control form-control-sm'}),
+            'expediente_institucion': RemoteSelect(
+                attrs={'class': 'form-control form-control-sm'},
+                url='internacion:buscar_expediente_instituciones',
+            ),
             'fecha_internacion': forms.DateInput(attrs={'type': 'date'}),
             'fecha_alta': forms.DateInput(attrs={'type': 'date'}),
             'motivo_internacion': forms.Select(attrs={'class': 'form-control form-control-sm'}),
@@ -61,6 +75,12 @@ class InternacionForm(forms.ModelForm):
             'observaciones': 'Observaciones',
         }
         
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # El texto de la opción elegida es el expediente (ExpedienteInstitucion.__str__)
+        campo = self.fields['expediente_institucion']
+        campo.queryset = campo.queryset.select_related('expediente')
+
     def clean_fecha_alta(self):
         fecha_internacion = self.cleaned_data.get('fecha_internacion')
         fecha_alta = self.cleaned_data.get('fecha_alta')
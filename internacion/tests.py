@@ -1,3 +1,138 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from core import catalogos
+from core.fields import CachedModelChoiceField
+from core.models import Rol
+from core.tests import ConsultasConstantesMixin, crear_usuario_admin, dar_permisos
+from expediente.forms import MedioIngresoForm
+from expediente.models import ExpedienteInstitucion, MedioIngreso
+from expediente.tests import crear_expediente, crear_institucion, crear_sede
+from institucion.models import Institucion
+from usuario.models import CustomUser
+from .forms import InternacionForm
+from .models import Internacion, MotivoAlta, MotivoInternacion
+
+
+class InternacionListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.rol = Rol.objects.create(rol='EFECTOR')
+        self.motivo = MotivoInternacion.objects.create(motivo_internacion='CRISIS')
+        self.client.force_login(crear_usuario_admin())
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            expediente_institucion = ExpedienteInstitucion.objects.create(
+                expediente=crear_expediente(), institucion=crear_institucion(), rol=self.rol,
+            )
+            Internacion.objects.create(expediente_institucion=expediente_institucion, motivo_internacion=self.motivo)
+
+    def test_listado_consultas_constantes(self):
+        self.assertConsultasConstantes(reverse('internacion:internacion_list'))
+
+
+class InternacionFormCatalogosTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.motivo = MotivoInternacion.objects.create(motivo_internacion='CRISIS')
+        self.alta = MotivoAlta.objects.create(motivo_alta='MEJORÍA')
+
+    def test_render_sin_consultas_con_la_cache_llena(self):
+        # En frío: una consulta por catálogo
+        with self.assertNumQueries(5):
+            str(InternacionForm())
+        with self.assertNumQueries(0):
+            html = str(InternacionForm())
+        self.assertIn('CRISIS', html)
+        self.assertIn('MEJORÍA', html)
+
+    def test_validar_sin_consultas_de_catalogo(self):
+        # Formulario simple: en un ModelForm, Model.full_clean() verifica además cada FK
+        medio = MedioIngreso.objects.create(medio_ingreso='OFICIO PAPEL')
+        str(MedioIngresoForm())
+        formulario = MedioIngresoForm(data={'medio_ingreso': medio.pk})
+        with self.assertNumQueries(0):
+            self.assertTrue(formulario.is_valid(), formulario.errors)
+        self.assertEqual(formulario.cleaned_data['medio_ingreso'], medio)
+        # Un valor que no está en el catálogo: se consulta y se rechaza
+        formulario = MedioIngresoForm(data={'medio_ingreso': 999999})
+        with self.assertNumQueries(1):
+            self.assertFalse(formulario.is_valid())
+
+    def test_guardar_el_catalogo_cambia_la_version(self):
+        str(InternacionForm())
+        version = catalogos.version(MotivoInternacion)
+        MotivoInternacion.objects.create(motivo_internacion='CONSUMO')
+        self.assertNotEqual(catalogos.version(MotivoInternacion), version)
+        # Sólo se vuelve a leer el catálogo que cambió
+        with self.assertNumQueries(1):
+            html = str(InternacionForm())
+        self.assertIn('CONSUMO', html)
+
+        self.motivo.delete()
+        self.assertNotIn('CRISIS', str(InternacionForm()))
+
+    def test_solo_catalogos(self):
+        with self.assertRaises(ValueError):
+            CachedModelChoiceField(queryset=Institucion.objects.all())
+
+
+class ExpedienteInstitucionRemotaTest(TestCase):
+
+    def setUp(self):
+        self.rol = Rol.objects.create(rol='EFECTOR')
+        self.santa_fe, self.rosario = crear_sede(), crear_sede('Rosario', 'RO')
+        self.propia = ExpedienteInstitucion.objects.create(
+            expediente=crear_expediente(sede=self.santa_fe), institucion=crear_institucion(institucion='HOSPITAL CENTRAL'),
+            rol=self.rol,
+        )
+        self.ajena = ExpedienteInstitucion.objects.create(
+            expediente=crear_expediente(sede=self.rosario), institucion=crear_institucion(institucion='HOSPITAL CENTENARIO'),
+            rol=self.rol,
+        )
+        usuario = CustomUser.objects.create_user(username='operador', password='x', sede=self.santa_fe)
+        self.usuario = dar_permisos(usuario, 'internacion.add_internacion')
+        self.client.force_login(self.usuario)
+
+    def test_busqueda_solo_de_la_sede(self):
+        respuesta = self.client.get(reverse('internacion:buscar_expediente_instituciones'), {'q': 'hospital'})
+        self.assertEqual([fila['id'] for fila in respuesta.json()['results']], [self.propia.pk])
+        self.assertEqual(respuesta.json()['pagination'], {'more': False})
+
+        self.client.force_login(crear_usuario_admin())
+        respuesta = self.client.get(reverse('internacion:buscar_expediente_instituciones'), {'q': 'hospital'})
+        self.assertEqual({fila['id'] for fila in respuesta.json()['results']}, {self.propia.pk, self.ajena.pk})
+
+    def test_alta_rechaza_vinculos_de_otra_sede(self):
+        respuesta = self.client.post(reverse('internacion:internacion_create'), {'expediente_institucion': self.ajena.pk})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('expediente_institucion', respuesta.context['form'].errors)
+
+    def test_select_renderiza_solo_la_opcion_elegida(self):
+        formulario = InternacionForm(instance=Internacion(expediente_institucion=self.propia))
+        # Sólo la opción elegida, con su expediente
+        with self.assertNumQueries(1):
+            html = str(formulario['expediente_institucion'])
+        self.assertIn(f'data-url="{reverse("internacion:buscar_expediente_instituciones")}"', html)
+        self.assertEqual(html.count('<option'), 2)  # la vacía y la elegida
+        self.assertIn(f'<option value="{self.propia.pk}" selected>{self.propia.expediente.identificador}</option>', html)
+        self.assertNotIn(self.ajena.expediente.identificador, html)
+
+    def test_valor_recibido_una_consulta(self):
+        formulario = InternacionForm(data={'expediente_institucion': self.propia.pk})
+        with self.assertNumQueries(1):
+            valor = formulario.fields['expediente_institucion'].clean(self.propia.pk)
+        self.assertEqual(valor, self.propia)
+        self.assertTrue(formulario.is_valid(), formulario.errors)
+        # El widget reutiliza el objeto ya validado
+        with self.assertNumQueries(0):
+            self.assertIn(self.propia.expediente.identificador, str(formulario['expediente_institucion']))
+
+    def test_valor_invalido(self):
+        formulario = InternacionForm(data={'expediente_institucion': 'abc'})
+        self.assertFalse(formulario.is_valid())
+        self.assertIn('expediente_institucion', formulario.errors)
+        self.assertEqual(str(formulario['expediente_institucion']).count('<option'), 1)
@@ -5,5 +5,7 @@ app_name = 'internacion'
 
 urlpatterns = [
     path('internacion/listar/', views.InternacionListView.as_view(), name='internacion_list'),
+    path('internacion/exportar/<str:formato>/', views.internacion_exportar, name='internacion_exportar'),
     path('internacion/crear/', views.InternacionCreateView.as_view(), name='internacion_create'),
+    path('api/expediente-instituciones/', views.buscar_expediente_instituciones, name='buscar_expediente_instituciones'),
 ]
\ No newline at end of file
@@ -1,8 +1,15 @@
 from django.shortcuts import render
+from django.http import JsonResponse
+from django.db.models import Q
 from django.views.generic import CreateView, ListView
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.auth.decorators import login_required, permission_required
 
+from core.exportar import exportar_queryset
+from core.mixins import ListadoOptimizadoMixin
+from core.utils import pagina_sin_contar, parametros_pagina
+from expediente.models import ExpedienteInstitucion
 from .models import Internacion
 from .forms import InternacionForm
 # Create your views here.
@@ -18,19 +25,81 @@ class InternacionCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateV
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
 
     login_url = 'core:login'
-    
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # Sólo vínculos de la sede del usuario, como buscar_expediente_instituciones
+        campo = form.fields['expediente_institucion']
+        campo.queryset = expediente_instituciones_visibles(self.request.user, campo.queryset)
+        return form
+
     def form_valid(self, form):
         form.instance.usuario = self.request.user
         return super().form_valid(form)
 
 
-class InternacionListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class InternacionListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
     model = Internacion
-    template_name = 'internacion/internacion_listar.html'
+    template_name = 'internacion/internacion_list.html'
     context_object_name = 'internaciones'
     login_url = 'core:login'
     permission_required = 'internacion.view_internacion'
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
-    
-    def get_queryset(self):
-        return Internacion.objects.all().order_by('-fecha_internacion')
\ No newline at end of file
+    queryset = Internacion.objects.order_by('-fecha_internacion')
+    # La plantilla muestra expediente_institucion, cuyo __str__ usa el expediente
+    list_select_related = ('expediente_institucion__expediente',)
+
+
+def filtrar_internaciones(queryset, busqueda):
+    """Aplica el texto del buscador de la tabla sobre el expediente y la institución."""
+    busqueda = (busqueda or '').strip()
+    if not busqueda:
+        return queryset
+    return queryset.filter(
+        Q(expediente_institucion__expediente__identificador__icontains=busqueda) |
+        Q(expediente_institucion__institucion__institucion__icontains=busqueda)
+    )
+
+
+# Columnas de la exportación (core.exportar): las de la tabla, con la institución aparte
+INTERNACION_EXPORTAR = (
+    ('Expediente', 'expediente_institucion__expediente__identificador'),
+    ('Institución', 'expediente_institucion__institucion__institucion'),
+    ('Fecha internación', 'fecha_internacion'),
+    ('Fecha alta', 'fecha_alta'),
+    ('Estado', 'estado', lambda activa: 'Activo' if activa else 'Inactivo'),
+)
+
+
+@login_required(login_url='core:login')
+@permission_required('internacion.view_internacion', login_url='core:login', raise_exception=True)
+def internacion_exportar(request, formato):
+    internaciones = filtrar_internaciones(InternacionListView.queryset, request.GET.get('q'))
+    return exportar_queryset(formato, 'internaciones', internaciones.order_by('-fecha_internacion', 'id'), INTERNACION_EXPORTAR)
+
+
+def expediente_instituciones_visibles(usuario, queryset=None):
+    """Vínculos expediente-institución de la sede del usuario (todos para el superusuario)."""
+    queryset = ExpedienteInstitucion.objects.all() if queryset is None else queryset
+    if usuario.is_superuser:
+        return queryset
+    return queryset.filter(expediente__sede_id=getattr(usuario, 'sede_id', None))
+
+
+@login_required(login_url='core:login')
+@permission_required('internacion.add_internacion', login_url='core:login', raise_exception=True)
+def buscar_expediente_instituciones(request):
+    # Opciones del campo expediente_institucion (select2 por AJAX)
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return JsonResponse({'results': [], 'pagination': {'more': False}})
+    pagina, por_pagina = parametros_pagina(request)
+    relaciones, hay_mas = pagina_sin_contar(
+        expediente_instituciones_visibles(request.user)
+        .filter(Q(expediente__identificador__icontains=q) | Q(institucion__institucion__icontains=q))
+        .select_related('expediente', 'institucion')
+        .order_by('-expediente__fecha_creacion', 'id'),
+        pagina, por_pagina,
+    )
+    results = [{'id': r.id, 'text': f"{r.expediente} - {r.institucion.institucion}"} for r in relaciones]
+    return JsonResponse({'results': results, 'pagination': {'more': hay_mas}})
@@ -3,20 +3,21 @@ from django import forms
 from .models import Intervencion, TipoIntervencion
 from expediente.models import Expediente
 from profesional.models import Profesional
+from core.fields import CachedModelChoiceField, RemoteModelChoiceField, RemoteSelect
 
 class IntervencionForm(forms.Form):
-    expediente = forms.ModelChoiceField(
+    expediente = RemoteModelChoiceField(
         queryset=Expediente.objects.all(), 
-        widget=forms.Select(attrs={'class': "form-select d-none"}),  # oculto en UI
+        widget=RemoteSelect(attrs={'class': "form-select d-none"}),  # oculto en UI
         required=True,
         label="Expediente"
     )
     profesional = forms.ModelChoiceField(
-        queryset=Profesional.objects.all(),
+        queryset=Profesional.objects.select_related('user', 'profesion'),  # __str__ usa ambos
         widget=forms.Select(attrs={'class': 'form-control'}),
         label="Profesional"
     )
-    tipo_intervencion = forms.ModelChoiceField(
+    tipo_intervencion = CachedModelChoiceField(
         queryset=TipoIntervencion.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'}),
         label="Tipo de intervención"
@@ -1,3 +1,34 @@
+import datetime
+
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Profesion
+from core.tests import ConsultasConstantesMixin, crear_usuario_admin
+from expediente.tests import crear_expediente
+from profesional.models import Profesional
+from usuario.models import CustomUser
+from .models import Intervencion, TipoIntervencion
+
+
+class IntervencionListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.tipo = TipoIntervencion.objects.create(tipo_intervencion='ENTREVISTA')
+        self.profesion = Profesion.objects.create(profesion='PSICOLOGÍA')
+        self.client.force_login(crear_usuario_admin())
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            usuario = CustomUser.objects.create_user(username=f'prof{CustomUser.objects.count()}', first_name='ANA')
+            profesional = Profesional.objects.create(user=usuario, profesion=self.profesion)
+            Intervencion.objects.create(
+                expediente=crear_expediente(), profesional=profesional, tipo_intervencion=self.tipo,
+                fecha_intervencion=datetime.date.today(),
+            )
+
+    def test_listado_consultas_constantes(self):
+        self.assertConsultasConstantes(reverse('intervencion:intervencion_list'))
 
-# Create your tests here.
+    def test_listado_funcion_consultas_constantes(self):
+        self.assertConsultasConstantes('/intervenciones/')
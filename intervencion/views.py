@@ -3,12 +3,18 @@ from django.shortcuts import render
 
 # Create your views here.
 
-from django.views.generic import FormView
+from django.views.generic import FormView, ListView
 from .forms import IntervencionForm
 from .models import Intervencion
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.decorators import login_required, permission_required
+from core.mixins import ListadoOptimizadoMixin, optimizar_queryset
+
+
+# Relaciones que muestran los listados de intervenciones (expediente, profesional
+# con su usuario y profesión para el __str__, y tipo de intervención)
+INTERVENCION_LISTADO_RELACIONES = ('expediente', 'profesional__user', 'profesional__profesion', 'tipo_intervencion')
 
 
 
@@ -53,27 +59,23 @@ class IntervencionFormView(LoginRequiredMixin, PermissionRequiredMixin, FormView
 
 
 
-class IntevencionListView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
+class IntevencionListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
+    model = Intervencion
     template_name = 'intervencion/intervencion_listar.html'
-    form_class = IntervencionForm
+    context_object_name = 'intervenciones'
     login_url = 'core:login'
     permission_required = 'intervencion.view_intervencion'
     raise_exception = False
-    success_url = reverse_lazy('intervencion:intervencion_list')
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['intervenciones'] = Intervencion.objects.all()
-        return context
+    list_select_related = INTERVENCION_LISTADO_RELACIONES
 
 
 @login_required(login_url='core:login')
 @permission_required('intervencion.view_intervencion', login_url='core:login', raise_exception=True)
 def listar_intervenciones(request):
-    intervenciones = Intervencion.objects.all()
+    intervenciones = optimizar_queryset(Intervencion.objects.all(), INTERVENCION_LISTADO_RELACIONES)
     next_url = request.GET.get("next")       # para redirigir después
 
-    return render(request, "intervencion/intervencion_list.html", {
+    return render(request, "intervencion/intervencion_listar.html", {
         "intervenciones": intervenciones,
         "next_url": next_url,   # lo mandamos al template
     })
\ No newline at end of file
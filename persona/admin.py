@@ -1,9 +1,15 @@
 # persona/admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.postgres.search import TrigramSimilarity
-from .models import Persona
 
-class PersonaAdmin(admin.ModelAdmin):
+from core.admin import ImportacionAdminMixin
+from . import duplicados
+from .importacion import PersonaImportacion
+from .models import DuplicadoPersona, Persona
+
+class PersonaAdmin(ImportacionAdminMixin, admin.ModelAdmin):
+    importacion = PersonaImportacion
+    comando = 'importar_personas'
     search_fields = ['apellido']  # Esto solo activa búsqueda exacta
 
     def get_search_results(self, request, queryset, search_term):
@@ -16,3 +22,58 @@ class PersonaAdmin(admin.ModelAdmin):
         return super().get_search_results(request, queryset, search_term)
 
 admin.site.register(Persona, PersonaAdmin)
+
+
+@admin.register(DuplicadoPersona)
+class DuplicadoPersonaAdmin(admin.ModelAdmin):
+    list_display = ('persona_a', 'documento_a', 'persona_b', 'documento_b', 'puntaje', 'motivos', 'estado')
+    list_filter = ('estado',)
+    list_select_related = ('persona_a', 'persona_b')
+    search_fields = ('persona_a__numero_documento', 'persona_b__numero_documento', 'persona_a__apellido', 'persona_b__apellido')
+    ordering = ['-puntaje']
+    readonly_fields = ('persona_a', 'persona_b', 'puntaje', 'motivos', 'estado', 'creado', 'revisado', 'revisado_por')
+    actions = ['fusionar_en_a', 'fusionar_en_b', 'descartar']
+
+    # Los pares los genera buscar_personas_duplicadas
+
+    @admin.display(description='Documento A', ordering='persona_a__numero_documento')
+    def documento_a(self, obj):
+        return obj.persona_a.numero_documento
+
+    @admin.display(description='Documento B', ordering='persona_b__numero_documento')
+    def documento_b(self, obj):
+        return obj.persona_b.numero_documento
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_fusionar_permission(self, request):
+        return request.user.has_perms(['persona.change_persona', 'persona.delete_persona'])
+
+    def _fusionar(self, request, queryset, conservar_a):
+        fusionados = reasignadas = 0
+        for pk in queryset.filter(estado=DuplicadoPersona.PENDIENTE).values_list('pk', flat=True):
+            # Se lee de nuevo: una fusión anterior de la misma selección pudo borrar el par o cambiar las personas
+            par = DuplicadoPersona.objects.select_related('persona_a', 'persona_b').filter(pk=pk).first()
+            if par is None:
+                continue
+            conservada, duplicada = (par.persona_a, par.persona_b) if conservar_a else (par.persona_b, par.persona_a)
+            reasignadas += duplicados.fusionar(conservada, duplicada)
+            fusionados += 1
+        self.message_user(
+            request, f"Personas fusionadas: {fusionados}. Vínculos con expedientes reasignados: {reasignadas}.",
+            messages.SUCCESS,
+        )
+
+    @admin.action(description='Fusionar: conservar la persona A', permissions=['fusionar'])
+    def fusionar_en_a(self, request, queryset):
+        self._fusionar(request, queryset, conservar_a=True)
+
+    @admin.action(description='Fusionar: conservar la persona B', permissions=['fusionar'])
+    def fusionar_en_b(self, request, queryset):
+        self._fusionar(request, queryset, conservar_a=False)
+
+    @admin.action(description='Marcar como personas distintas', permissions=['change'])
+    def descartar(self, request, queryset):
+        cantidad = duplicados.descartar(queryset, request.user)
+        self.message_user(request, f"Pares descartados: {cantidad}.", messages.SUCCESS)
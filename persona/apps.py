@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PersonaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'persona'
+
+    def ready(self):
+        # Señales que mantienen el índice de búsqueda en memoria (bases sin pg_trgm)
+        import persona.busqueda
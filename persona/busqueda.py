@@ -0,0 +1,226 @@
+"""
+Búsqueda de personas por nombre, apellido o número de documento, sin distinguir
+mayúsculas ni tildes y tolerando errores de tipeo.
+
+- PostgreSQL: filtra y ordena sobre f_unaccent(lower(campo)) con pg_trgm, usando
+  los índices GIN de la migración 0005_persona_indices_trigram.
+- Otras bases (SQLite en desarrollo): índice de tokens normalizados en memoria,
+  se arma en el primer uso y se mantiene con las señales de Persona.
+
+El índice en memoria lleva la versión de Persona en la cache (core.catalogos.version):
+cada cambio la incrementa y un índice con otra versión se vuelve a armar en la
+próxima búsqueda, así los otros procesos se enteran siempre que compartan la
+cache (en LocMem cada proceso tiene la suya). Lo que no emite señales
+(bulk_create, update, SQL directo) tiene que llamar a indice_personas.invalidar().
+"""
+import bisect
+import threading
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, CharField, F, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Concat, Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import catalogos
+from core.utils import normalizar_texto
+from .models import Persona
+
+
+class FUnaccent(Func):
+    # Función IMMUTABLE creada en la migración: la expresión tiene que coincidir
+    # con la de los índices para que PostgreSQL los use
+    function = 'f_unaccent'
+    output_field = CharField()
+
+
+def _normalizado(campo):
+    return FUnaccent(Lower(campo))
+
+
+def buscar_personas(termino, queryset=None, limite=None):
+    """
+    Devuelve las personas de `queryset` (por defecto todas) que coinciden con
+    `termino`, de la más parecida a la menos. Cada palabra del término tiene que
+    aparecer (o parecerse) en el nombre, el apellido o el documento.
+    """
+    if queryset is None:
+        queryset = Persona.objects.all()
+    palabras = normalizar_texto(termino).split()
+    if not palabras:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        resultado = _buscar_postgres(queryset, palabras)
+        return resultado[:limite] if limite else resultado
+    return indice_personas.buscar(queryset, palabras, limite)
+
+
+def _buscar_postgres(queryset, palabras):
+    queryset = queryset.annotate(
+        apellido_normalizado=_normalizado('apellido'),
+        nombre_normalizado=_normalizado('nombre'),
+        documento_normalizado=Lower('numero_documento'),
+    )
+    for palabra in palabras:
+        condicion = (
+            Q(apellido_normalizado__contains=palabra)
+            | Q(nombre_normalizado__contains=palabra)
+            | Q(documento_normalizado__contains=palabra)
+        )
+        if len(palabra) >= 3 and not palabra.isdigit():
+            # Errores de tipeo: 'gonzales' encuentra 'gonzalez'
+            condicion |= (
+                Q(apellido_normalizado__trigram_word_similar=palabra)
+                | Q(nombre_normalizado__trigram_word_similar=palabra)
+            )
+        queryset = queryset.filter(condicion)
+
+    return queryset.annotate(
+        similitud=TrigramSimilarity(
+            Concat(F('apellido_normalizado'), Value(' '), F('nombre_normalizado'), output_field=CharField()),
+            ' '.join(palabras),
+        ),
+    ).order_by('-similitud', 'apellido', 'nombre', 'id')
+
+
+class IndiceTokensPersona:
+    """
+    Índice en memoria {palabra normalizada: ids de Persona} para bases sin pg_trgm.
+    Es por proceso (pensado para el servidor de desarrollo con SQLite) y se arma
+    de nuevo cuando cambia la versión compartida.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids_por_token = None
+        self._tokens = []
+        self._tokens_por_id = {}
+        self._version = None
+
+    @staticmethod
+    def _tokens_de(nombre, apellido, numero_documento):
+        return set(normalizar_texto(f"{nombre} {apellido}").split()) | {numero_documento.strip().lower()}
+
+    def _asegurar(self):
+        version = catalogos.version(Persona)
+        if self._ids_por_token is not None and self._version == version:
+            return
+        ids_por_token, tokens_por_id = {}, {}
+        for pk, nombre, apellido, documento in Persona.objects.values_list('id', 'nombre', 'apellido', 'numero_documento').iterator():
+            tokens = self._tokens_de(nombre, apellido, documento)
+            tokens_por_id[pk] = tokens
+            for token in tokens:
+                ids_por_token.setdefault(token, set()).add(pk)
+        self._ids_por_token = ids_por_token
+        self._tokens_por_id = tokens_por_id
+        self._tokens = sorted(ids_por_token)
+        self._version = version
+
+    def _nueva_version(self):
+        """
+        Incrementa la versión compartida. Devuelve True si el índice de este proceso
+        estaba al día (nadie más la cambió): alcanza con aplicarle el cambio.
+        """
+        anterior = self._version
+        catalogos.invalidar(Persona)
+        self._version = catalogos.version(Persona)
+        if self._ids_por_token is None or anterior is None or self._version != anterior + 1:
+            self._ids_por_token = None
+            return False
+        return True
+
+    def actualizar(self, persona):
+        with self._lock:
+            if not self._nueva_version():
+                return
+            self._quitar(persona.pk)
+            tokens = self._tokens_de(persona.nombre, persona.apellido, persona.numero_documento)
+            self._tokens_por_id[persona.pk] = tokens
+            for token in tokens:
+                if token not in self._ids_por_token:
+                    bisect.insort(self._tokens, token)
+                self._ids_por_token.setdefault(token, set()).add(persona.pk)
+
+    def invalidar(self):
+        """Después de cambios sin señales (bulk_create): se vuelve a armar en la próxima búsqueda, en todos los procesos."""
+        with self._lock:
+            catalogos.invalidar(Persona)
+            self._ids_por_token = None
+            self._tokens = []
+            self._tokens_por_id = {}
+
+    def quitar(self, pk):
+        with self._lock:
+            if self._nueva_version():
+                self._quitar(pk)
+
+    def confirmar(self):
+        """
+        Otra vez después del commit (como en core.catalogos): mientras la transacción
+        está abierta otro proceso puede armar el índice con los datos viejos y la
+        versión nueva. El índice de este proceso ya tiene el cambio y se conserva.
+        """
+        with self._lock:
+            self._nueva_version()
+
+    def _quitar(self, pk):
+        for token in self._tokens_por_id.pop(pk, ()):
+            ids = self._ids_por_token.get(token)
+            if ids is None:
+                continue
+            ids.discard(pk)
+            if not ids:
+                del self._ids_por_token[token]
+                self._tokens.pop(bisect.bisect_left(self._tokens, token))
+
+    def _ids_con_prefijo(self, prefijo):
+        ids = set()
+        inicio = bisect.bisect_left(self._tokens, prefijo)
+        for token in self._tokens[inicio:]:
+            if not token.startswith(prefijo):
+                break
+            ids |= self._ids_por_token[token]
+        return ids
+
+    def buscar(self, queryset, palabras, limite=None):
+        with self._lock:
+            self._asegurar()
+            candidatos = None
+            puntaje = {}
+            for palabra in palabras:
+                ids = self._ids_con_prefijo(palabra)
+                # Las coincidencias exactas de palabra ordenan primero
+                for pk in self._ids_por_token.get(palabra, ()):
+                    puntaje[pk] = puntaje.get(pk, 0) + 1
+                candidatos = ids if candidatos is None else candidatos & ids
+                if not candidatos:
+                    return queryset.none()
+
+        queryset = queryset.filter(pk__in=candidatos)
+        if not limite:
+            return queryset.order_by('apellido', 'nombre', 'id')
+        # Las coincidencias exactas de palabra primero, después alfabético
+        filas = sorted(
+            queryset.values_list('pk', 'apellido', 'nombre'),
+            key=lambda fila: (-puntaje.get(fila[0], 0), fila[1], fila[2], fila[0]),
+        )
+        orden = [fila[0] for fila in filas[:limite]]
+        return queryset.filter(pk__in=orden).order_by(
+            Case(*[When(pk=pk, then=Value(posicion)) for posicion, pk in enumerate(orden)], output_field=IntegerField())
+        )
+
+
+indice_personas = IndiceTokensPersona()
+
+
+@receiver(post_save, sender=Persona)
+def _actualizar_indice(sender, instance, **kwargs):
+    indice_personas.actualizar(instance)
+    transaction.on_commit(indice_personas.confirmar)
+
+
+@receiver(post_delete, sender=Persona)
+def _quitar_del_indice(sender, instance, **kwargs):
+    indice_personas.quitar(instance.pk)
+    transaction.on_commit(indice_personas.confirmar)
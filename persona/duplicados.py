@@ -0,0 +1,224 @@
+"""
+Búsqueda de personas cargadas dos veces (DuplicadoPersona) y fusión.
+
+Comparar cada persona con todas es O(n²). En cambio, cada persona se pone en
+unos pocos bloques y solo se comparan los pares de un mismo bloque:
+
+- el documento normalizado (solo letras y dígitos, sin ceros adelante):
+  '12.345.678' y '012345678' caen juntos;
+- la clave fonética del apellido con el año de nacimiento;
+- la clave fonética del apellido con la del primer nombre.
+
+La clave fonética es propia del castellano (v/b, z/s/c, ll/y, h muda, ...):
+'GONZÁLEZ', 'GONZALES' y 'GONSALEZ' dan la misma. Los bloques de más de
+TAMANIO_MAXIMO_BLOQUE personas no se comparan (un apellido muy común sin
+otro dato) y se informan. Cada par se puntúa de 0 a 1 según PESOS y los que
+llegan al umbral se guardan en DuplicadoPersona para revisarlos.
+
+Las personas se leen una vez y quedan en memoria normalizadas (unos cientos
+de bytes por persona).
+"""
+import itertools
+import logging
+import re
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.duplicados import campos_unicos
+from core.utils import normalizar_texto
+from expediente import detalle
+from .models import DuplicadoPersona, Persona
+
+logger = logging.getLogger(__name__)
+
+UMBRAL = 0.75
+TAMANIO_MAXIMO_BLOQUE = 200
+TAMANIO_LOTE = 1000
+PESOS = {'documento': 0.4, 'apellido': 0.3, 'nombre': 0.2, 'nacimiento': 0.1}
+
+Ficha = namedtuple('Ficha', 'id documento apellido nombre nacimiento')
+
+_PARTICULAS = {'de', 'del', 'la', 'las', 'los', 'y'}
+# En orden: las primeras dejan la g y la c listas para las siguientes
+_FONETICA = [
+    (re.compile(r'[^a-z]'), ''),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'gu(?=[ei])'), 'g'),
+    (re.compile(r'qu(?=[ei])'), 'k'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'ch'), 'x'),
+    (re.compile(r'[cq]'), 'k'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'v'), 'b'),
+    (re.compile(r'w'), 'u'),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'(.)\1+'), r'\1'),
+]
+
+
+def normalizar_documento(numero):
+    """'12.345.678' -> '12345678'; 'AB-01' -> 'ab01'."""
+    texto = ''.join(c for c in normalizar_texto(numero) if c.isalnum())
+    return texto.lstrip('0') or texto
+
+
+def clave_fonetica(texto):
+    """Clave fonética de la primera palabra (sin partículas): 'de la Vega' -> 'bega'."""
+    palabras = [palabra for palabra in normalizar_texto(texto).split() if palabra not in _PARTICULAS]
+    clave = palabras[0] if palabras else ''
+    for patron, reemplazo in _FONETICA:
+        clave = patron.sub(reemplazo, clave)
+    return clave
+
+
+def _parecido(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    palabras_a, palabras_b = set(a.split()), set(b.split())
+    if palabras_a <= palabras_b or palabras_b <= palabras_a:
+        # 'perez' y 'perez garcia'
+        return 0.9
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def puntuar(a, b):
+    """(puntaje de 0 a 1, coincidencias) de dos fichas."""
+    documento = _parecido(a.documento, b.documento)
+    partes = {
+        # Un documento distinto no suma nada; uno con un dígito cambiado, casi todo
+        'documento': documento if documento >= 0.8 else 0.0,
+        'apellido': _parecido(a.apellido, b.apellido),
+        'nombre': _parecido(a.nombre, b.nombre),
+        'nacimiento': 0.0,
+    }
+    if a.nacimiento and b.nacimiento:
+        partes['nacimiento'] = 1.0 if a.nacimiento == b.nacimiento else 0.5 if a.nacimiento.year == b.nacimiento.year else 0.0
+    puntaje = sum(PESOS[parte] * valor for parte, valor in partes.items())
+    return round(puntaje, 4), ', '.join(parte for parte, valor in partes.items() if valor >= 0.8)
+
+
+def claves_de_bloque(ficha):
+    claves = []
+    if ficha.documento:
+        claves.append(('documento', ficha.documento))
+    apellido = clave_fonetica(ficha.apellido)
+    if apellido:
+        if ficha.nacimiento:
+            claves.append(('apellido_anio', apellido, ficha.nacimiento.year))
+        nombre = clave_fonetica(ficha.nombre)
+        if nombre:
+            claves.append(('apellido_nombre', apellido, nombre))
+    return claves
+
+
+def fichas(queryset=None):
+    queryset = Persona.objects.all() if queryset is None else queryset
+    filas = queryset.values_list('id', 'numero_documento', 'apellido', 'nombre', 'fecha_nacimiento')
+    for pk, documento, apellido, nombre, nacimiento in filas.iterator(chunk_size=5000):
+        yield Ficha(pk, normalizar_documento(documento), normalizar_texto(apellido), normalizar_texto(nombre), nacimiento)
+
+
+def buscar_pares(umbral=UMBRAL, tamanio_maximo=TAMANIO_MAXIMO_BLOQUE, queryset=None):
+    """
+    Pares (id menor, id mayor, puntaje, coincidencias) que llegan al umbral, y
+    un resumen con cuántas personas, bloques y comparaciones hubo.
+    """
+    por_id, bloques = {}, defaultdict(list)
+    for ficha in fichas(queryset):
+        por_id[ficha.id] = ficha
+        for clave in claves_de_bloque(ficha):
+            bloques[clave].append(ficha.id)
+
+    comparados, pares = set(), []
+    resumen = {'personas': len(por_id), 'bloques': 0, 'bloques_grandes': 0}
+    for ids in bloques.values():
+        if len(ids) < 2:
+            continue
+        if len(ids) > tamanio_maximo:
+            resumen['bloques_grandes'] += 1
+            continue
+        resumen['bloques'] += 1
+        for a, b in itertools.combinations(sorted(ids), 2):
+            if (a, b) in comparados:
+                continue
+            comparados.add((a, b))
+            puntaje, motivos = puntuar(por_id[a], por_id[b])
+            if puntaje >= umbral:
+                pares.append((a, b, puntaje, motivos))
+    resumen['comparaciones'] = len(comparados)
+    return pares, resumen
+
+
+@transaction.atomic
+def guardar_pares(pares):
+    """
+    Reemplaza los pares pendientes por `pares`. Los descartados se conservan
+    (solo se les actualiza el puntaje) para que no vuelvan a aparecer.
+    """
+    DuplicadoPersona.objects.filter(estado=DuplicadoPersona.PENDIENTE).delete()
+    DuplicadoPersona.objects.bulk_create(
+        [DuplicadoPersona(persona_a_id=a, persona_b_id=b, puntaje=puntaje, motivos=motivos)
+         for a, b, puntaje, motivos in pares],
+        batch_size=TAMANIO_LOTE,
+        update_conflicts=True,
+        unique_fields=['persona_a', 'persona_b'],
+        update_fields=['puntaje', 'motivos'],
+    )
+    return DuplicadoPersona.objects.filter(estado=DuplicadoPersona.PENDIENTE).count()
+
+
+@transaction.atomic
+def fusionar(conservada, duplicada):
+    """
+    Pasa a `conservada` todo lo que apunta a `duplicada` (los ExpedientePersona,
+    con un UPDATE), completa los datos que le falten con los de `duplicada` y
+    borra `duplicada`. Devuelve la cantidad de filas reasignadas.
+
+    El UPDATE no emite señales: el detalle cacheado de los expedientes afectados
+    (expediente.detalle) se invalida acá, después del commit.
+    """
+    if conservada.pk == duplicada.pk:
+        raise ValueError("No se puede fusionar una persona consigo misma.")
+    reasignadas, expedientes = 0, set()
+    for relacion in Persona._meta.related_objects:
+        modelo, campo = relacion.related_model, relacion.field.name
+        if modelo is DuplicadoPersona or relacion.many_to_many:
+            continue
+        filas = modelo._base_manager.filter(**{campo: duplicada})
+        if any(field.name == 'expediente' for field in modelo._meta.concrete_fields):
+            expedientes.update(filas.values_list('expediente_id', flat=True))
+        # Los vínculos que conservada ya tiene (mismo expediente y rol) quedarían repetidos
+        for campos in campos_unicos(modelo):
+            if campo in campos:
+                repetidas = modelo._base_manager.filter(
+                    **{campo: conservada}, **{otro: OuterRef(otro) for otro in campos if otro != campo}
+                )
+                filas.filter(Exists(repetidas)).delete()
+        reasignadas += filas.update(**{campo: conservada})
+
+    completados = []
+    for field in Persona._meta.concrete_fields:
+        if field.primary_key or field.unique:
+            continue
+        if getattr(conservada, field.attname) in (None, '') and getattr(duplicada, field.attname) not in (None, ''):
+            setattr(conservada, field.attname, getattr(duplicada, field.attname))
+            completados.append(field.name)
+    if expedientes:
+        transaction.on_commit(lambda: detalle.invalidar(*expedientes))
+    duplicada_pk = duplicada.pk
+    duplicada.delete()
+    if completados:
+        conservada.save(update_fields=completados)
+    logger.info("Persona %s fusionada en %s: %s filas reasignadas", duplicada_pk, conservada.pk, reasignadas)
+    return reasignadas
+
+
+def descartar(pares, usuario):
+    return pares.update(estado=DuplicadoPersona.DESCARTADO, revisado=timezone.now(), revisado_por=usuario)
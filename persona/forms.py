@@ -116,22 +116,48 @@ class PersonaForm(forms.ModelForm):
 
     def clean(self):
         cleaned_data = super().clean()
+        for campo, mensaje in limpiar_persona(cleaned_data):
+            self.add_error(campo, mensaje)
+        return cleaned_data
 
-        # Validación relacionada a campos booleanos
-        if cleaned_data.get("posee_cobertura_salud") and not cleaned_data.get("cobertura_salud"):
-            self.add_error("cobertura_salud", "Debe indicar la cobertura de salud si posee una.")
 
-        if cleaned_data.get("posee_grupo_apoyo") and not cleaned_data.get("grupo_apoyo"):
-            self.add_error("grupo_apoyo", "Debe indicar el grupo de apoyo si posee uno.")
+def limpiar_persona(cleaned_data):
+    """
+    Reglas de PersonaForm.clean() sobre los datos ya limpios: pasa los textos a
+    mayúsculas en el mismo diccionario y devuelve los errores como
+    [(campo, mensaje)]. Las usa también la importación (persona.importacion),
+    que no arma un formulario por fila.
+    """
+    errores = []
 
-        # Transformación de valores de texto
-        for field_name, value in cleaned_data.items():
-            if isinstance(value, str):
-                if field_name == 'email':
-                    cleaned_data[field_name] = value.lower()  # Email en minúsculas
-                elif field_name == 'observaciones':
-                    cleaned_data[field_name] = value  # Observaciones sin alterar
-                else:
-                    cleaned_data[field_name] = value.upper()  # Todo lo demás en mayúsculas
+    # Validación relacionada a campos booleanos
+    if cleaned_data.get("posee_cobertura_salud") and not cleaned_data.get("cobertura_salud"):
+        errores.append(("cobertura_salud", "Debe indicar la cobertura de salud si posee una."))
 
-        return cleaned_data
\ No newline at end of file
+    if cleaned_data.get("posee_grupo_apoyo") and not cleaned_data.get("grupo_apoyo"):
+        errores.append(("grupo_apoyo", "Debe indicar el grupo de apoyo si posee uno."))
+
+    # Transformación de valores de texto
+    for field_name, value in cleaned_data.items():
+        if isinstance(value, str):
+            if field_name == 'email':
+                cleaned_data[field_name] = value.lower()  # Email en minúsculas
+            elif field_name == 'observaciones':
+                cleaned_data[field_name] = value  # Observaciones sin alterar
+            else:
+                cleaned_data[field_name] = value.upper()  # Todo lo demás en mayúsculas
+
+    return errores
+
+
+class PersonaImportacionForm(PersonaForm):
+    """
+    PersonaForm para persona.importacion: sin los FK, que se resuelven con
+    diccionarios. La importación usa sus campos y limpiar_persona(); el documento
+    no se consulta (un documento existente se actualiza).
+    """
+    class Meta(PersonaForm.Meta):
+        fields = [
+            campo for campo in PersonaForm.Meta.fields
+            if campo not in ('tipo_documento', 'genero', 'localidad', 'nivel_educativo')
+        ]
@@ -0,0 +1,53 @@
+"""
+Importación masiva de personas (core.importar): las nuevas se crean y las que
+ya existen, identificadas por el número de documento, se actualizan con un
+solo INSERT ... ON CONFLICT por lote.
+"""
+from django.db import transaction
+
+from core.busqueda import indexar_lote
+from core.importar import Importacion, catalogo, catalogo_localidades
+from core.models import DocumentoBusqueda, Genero, Nivel_Educativo, Tipo_Documento
+from expediente import detalle
+from expediente.models import ExpedientePersona
+from .busqueda import indice_personas
+from .forms import PersonaImportacionForm, limpiar_persona
+from .models import Persona
+
+
+class PersonaImportacion(Importacion):
+    form_class = PersonaImportacionForm
+    columnas_obligatorias = ('tipo_documento', 'numero_documento', 'nombre', 'apellido')
+
+    def reglas(self, datos):
+        return limpiar_persona(datos)
+
+    def catalogos(self):
+        return {
+            'tipo_documento': catalogo(Tipo_Documento.objects.values_list('tipo_documento', 'pk')),
+            'genero': catalogo(Genero.objects.values_list('genero', 'pk')),
+            'localidad': catalogo_localidades(),
+            'nivel_educativo': catalogo(Nivel_Educativo.objects.values_list('nivel_educativo', 'pk')),
+        }
+
+    def clave(self, persona):
+        return persona.numero_documento
+
+    def guardar(self, personas, campos):
+        documentos = [persona.numero_documento for persona in personas]
+        existentes = Persona.objects.filter(numero_documento__in=documentos).count()
+        Persona.objects.bulk_create(
+            personas,
+            update_conflicts=True,
+            unique_fields=['numero_documento'],
+            update_fields=[campo for campo in campos if campo != 'numero_documento'],
+        )
+        # bulk_create no emite post_save: los índices de búsqueda y el detalle
+        # cacheado de los expedientes donde figuran se actualizan acá
+        pks = [persona.pk for persona in personas]
+        indexar_lote(DocumentoBusqueda.PERSONA, pks)
+        indice_personas.invalidar()
+        expedientes = set(ExpedientePersona.objects.filter(persona_id__in=pks).values_list('expediente_id', flat=True))
+        if expedientes:
+            transaction.on_commit(lambda: detalle.invalidar(*expedientes))
+        return len(personas) - existentes, existentes
@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.models import Tipo_Documento
+from persona.models import Persona
+
+NOMBRES = [
+    'Juan', 'María', 'José', 'Ana', 'Luis', 'Lucía', 'Martín', 'Sofía', 'Matías', 'Valentina',
+    'Agustín', 'Camila', 'Nicolás', 'Julieta', 'Tomás', 'Florencia', 'Joaquín', 'Milagros',
+]
+APELLIDOS = [
+    'González', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez',
+    'García', 'Sánchez', 'Romero', 'Sosa', 'Álvarez', 'Torres', 'Ruiz', 'Ramírez', 'Flores',
+    'Benítez', 'Acosta', 'Medina', 'Herrera', 'Suárez', 'Aguirre', 'Giménez', 'Gutiérrez',
+]
+# Apellidos y nombres inventados (raíz + unión + final) para que, como en los datos
+# reales, haya miles de valores distintos y no sólo los más comunes
+RAICES = [
+    'Alar', 'Bel', 'Cab', 'Cor', 'Dom', 'Esc', 'Fig', 'Gal', 'Iba', 'Lar', 'Mal', 'Mor', 'Nav', 'Ola', 'Pac',
+    'Quir', 'Riv', 'Sal', 'Tab', 'Urq', 'Val', 'Zap', 'Ber', 'Car', 'Mon', 'Ort', 'Pin', 'Ved', 'Lun', 'Fab',
+]
+UNIONES = ['', 'r', 'l', 't', 'nd', 's', 'v', 'g']
+FINALES = ['ado', 'ena', 'illo', 'ez', 'uela', 'ero', 'aza', 'ino', 'ares', 'ones', 'edo', 'anda', 'usti', 'ía', 'ón']
+
+# Lo que tipea un usuario: sin tildes, en minúsculas, incompleto o con errores
+TERMINOS = [
+    'gonzalez', 'GOMEZ', 'perez juan', 'sofia alvarez', 'benit', 'rodrigez', 'gutierres',
+    'maria lopez', '1234567', 'galvino', 'escuela', 'riv ortez', 'pacarez', 'zapsaza lunita',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la búsqueda de personas anterior (icontains) con persona.busqueda "
+        "sobre personas sintéticas; los datos se descartan al terminar"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=500000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._crear_personas(options['cantidad'])
+                for nombre, buscar in (('icontains', self._buscar_anterior), ('busqueda', self._buscar_nueva)):
+                    buscar(TERMINOS[0])  # calienta caches / índice en memoria
+                    tiempos = self._medir(buscar, options['repeticiones'])
+                    self.stdout.write(
+                        f"{nombre:<10} p50 {statistics.median(tiempos):8.2f} ms   "
+                        f"p95 {self._p95(tiempos):8.2f} ms"
+                    )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _crear_personas(self, cantidad):
+        tipo, _ = Tipo_Documento.objects.get_or_create(tipo_documento='DNI')
+        azar = random.Random(1)
+        apellidos = [r + u + f for r in RAICES for u in UNIONES for f in FINALES]
+        nombres = [r + f for r in RAICES for f in ('a', 'o', 'ina', 'ito')]
+
+        def elegir(comunes, inventados):
+            # 30% de las personas tienen uno de los valores más comunes
+            return azar.choice(comunes) if azar.random() < 0.3 else azar.choice(inventados)
+
+        lote = []
+        for i in range(cantidad):
+            apellido = elegir(APELLIDOS, apellidos)
+            if i % 4 == 0:
+                apellido = f'{apellido} {elegir(APELLIDOS, apellidos)}'
+            lote.append(Persona(
+                tipo_documento=tipo,
+                numero_documento=f'BENCH{10000000 + i}',
+                nombre=elegir(NOMBRES, nombres),
+                apellido=apellido,
+            ))
+            if len(lote) == 5000:
+                Persona.objects.bulk_create(lote)
+                lote = []
+        Persona.objects.bulk_create(lote)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE persona_persona')
+        self.stdout.write(f"{cantidad} personas creadas.")
+
+    @staticmethod
+    def _buscar_anterior(termino):
+        return list(Persona.objects.filter(
+            Q(apellido__icontains=termino) |
+            Q(nombre__icontains=termino) |
+            Q(numero_documento__icontains=termino)
+        )[:20])
+
+    @staticmethod
+    def _buscar_nueva(termino):
+        return list(Persona.objects.buscar_persona(termino, limite=20))
+
+    @staticmethod
+    def _medir(buscar, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            for termino in TERMINOS:
+                inicio = time.perf_counter()
+                buscar(termino)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
+
+    @staticmethod
+    def _p95(tiempos):
+        ordenados = sorted(tiempos)
+        return ordenados[int(len(ordenados) * 0.95) - 1]
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from persona.duplicados import TAMANIO_MAXIMO_BLOQUE, UMBRAL, buscar_pares, guardar_pares
+from persona.models import Persona
+
+
+class Command(BaseCommand):
+    help = (
+        "Busca personas cargadas dos veces comparando solo dentro de bloques (persona.duplicados) "
+        "y deja los pares para revisar en DuplicadoPersona (admin)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--umbral', type=float, default=UMBRAL, help="Puntaje mínimo de 0 a 1")
+        parser.add_argument('--tamanio-bloque', type=int, default=TAMANIO_MAXIMO_BLOQUE,
+                            help="Bloques con más personas que esto no se comparan")
+        parser.add_argument('--dry-run', action='store_true', help="Muestra los mejores pares sin guardarlos")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        pares, resumen = buscar_pares(options['umbral'], options['tamanio_bloque'])
+        self.stdout.write(
+            f"Personas: {resumen['personas']}. Bloques comparados: {resumen['bloques']}, "
+            f"comparaciones: {resumen['comparaciones']}, pares sobre el umbral: {len(pares)} "
+            f"({time.perf_counter() - inicio:.1f} s)."
+        )
+        if resumen['bloques_grandes']:
+            self.stdout.write(self.style.WARNING(
+                f"{resumen['bloques_grandes']} bloques de más de {options['tamanio_bloque']} personas sin comparar."
+            ))
+        if options['dry_run']:
+            mejores = sorted(pares, key=lambda par: -par[2])[:20]
+            personas = Persona.objects.in_bulk({pk for par in mejores for pk in par[:2]})
+            for a, b, puntaje, motivos in mejores:
+                self.stdout.write(
+                    f"  {puntaje:.2f}  {personas[a].numero_documento} {personas[a]}  /  "
+                    f"{personas[b].numero_documento} {personas[b]}  ({motivos})"
+                )
+            return
+        pendientes = guardar_pares(pares)
+        self.stdout.write(self.style.SUCCESS(f"Pares pendientes de revisión: {pendientes}."))
@@ -0,0 +1,10 @@
+from core.importar import ComandoImportacion
+from persona.importacion import PersonaImportacion
+
+
+class Command(ComandoImportacion):
+    help = (
+        "Importa personas desde un CSV o XLSX: crea las nuevas y actualiza las existentes "
+        "por número de documento. Las filas rechazadas quedan en un CSV de errores"
+    )
+    importacion = PersonaImportacion
@@ -1,13 +1,9 @@
 from django.db import models
-from django.db.models import Q
 
 class PersonaManagers(models.Manager):
     
-    def buscar_persona(self, buscar_persona):
-        if not buscar_persona:  # Si viene vacío o None
-            return self.none()  # devuelve queryset vacío
-        return self.filter(
-            Q(apellido__icontains=buscar_persona) |
-            Q(nombre__icontains=buscar_persona) |
-            Q(numero_documento__icontains=buscar_persona)
-        )
+    def buscar_persona(self, buscar_persona, limite=None):
+        # Nombre, apellido o documento sin distinguir mayúsculas ni tildes,
+        # ordenado por parecido (ver persona/busqueda.py)
+        from .busqueda import buscar_personas
+        return buscar_personas(buscar_persona, self.get_queryset(), limite)
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Índices GIN de pg_trgm para buscar personas por nombre, apellido y documento
+# sin distinguir mayúsculas ni tildes (ver persona/busqueda.py).
+# unaccent() no es IMMUTABLE y no se puede indexar: f_unaccent lo envuelve fijando
+# el diccionario, y las consultas usan la misma expresión f_unaccent(lower(campo)).
+SQL_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+    "CREATE EXTENSION IF NOT EXISTS unaccent;",
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+    """,
+    "CREATE INDEX IF NOT EXISTS persona_apellido_trgm_idx ON persona_persona USING gin (f_unaccent(lower(apellido)) gin_trgm_ops);",
+    "CREATE INDEX IF NOT EXISTS persona_nombre_trgm_idx ON persona_persona USING gin (f_unaccent(lower(nombre)) gin_trgm_ops);",
+    "CREATE INDEX IF NOT EXISTS persona_documento_trgm_idx ON persona_persona USING gin (lower(numero_documento) gin_trgm_ops);",
+]
+
+SQL_BORRAR = [
+    "DROP INDEX IF EXISTS persona_documento_trgm_idx;",
+    "DROP INDEX IF EXISTS persona_nombre_trgm_idx;",
+    "DROP INDEX IF EXISTS persona_apellido_trgm_idx;",
+    "DROP FUNCTION IF EXISTS f_unaccent(text);",
+]
+
+
+def _ejecutar(schema_editor, sentencias):
+    # En SQLite (desarrollo) no hay índices: persona/busqueda.py usa un índice en memoria
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def crear_indices(apps, schema_editor):
+    _ejecutar(schema_editor, SQL_CREAR)
+
+
+def borrar_indices(apps, schema_editor):
+    _ejecutar(schema_editor, SQL_BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('persona', '0004_alter_persona_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
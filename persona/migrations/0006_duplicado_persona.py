@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('persona', '0005_persona_indices_trigram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicadoPersona',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntaje', models.FloatField(db_index=True, verbose_name='Puntaje')),
+                ('motivos', models.CharField(max_length=100, verbose_name='Coincidencias')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('descartado', 'No son la misma persona')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('revisado', models.DateTimeField(blank=True, null=True)),
+                ('persona_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicados_a', to='persona.persona')),
+                ('persona_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicados_b', to='persona.persona')),
+                ('revisado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicados_persona_revisados', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Posible duplicado de persona',
+                'verbose_name_plural': 'Posibles duplicados de personas',
+                'constraints': [models.UniqueConstraint(fields=('persona_a', 'persona_b'), name='unique_duplicado_persona')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('persona', '0006_duplicado_persona'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='persona',
+            options={'permissions': [('puede_crear_persona', 'Puede crear una persona'), ('puede_ver_persona', 'Puede ver personas')]},
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 from core.models import Tipo_Documento, Genero,Nivel_Educativo, Localidad
@@ -42,8 +43,40 @@ class Persona(models.Model):
     class Meta:
         permissions = [
             ("puede_crear_persona", "Puede crear una persona"),
+            ("puede_ver_persona", "Puede ver personas"),
         ]
 
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
     
+
+
+class DuplicadoPersona(models.Model):
+    """Par de personas que persona.duplicados encontró parecidas, para revisar."""
+    PENDIENTE = 'pendiente'
+    DESCARTADO = 'descartado'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (DESCARTADO, 'No son la misma persona'),
+    ]
+
+    # persona_a es siempre la de menor id
+    persona_a = models.ForeignKey(Persona, on_delete=models.CASCADE, related_name='duplicados_a')
+    persona_b = models.ForeignKey(Persona, on_delete=models.CASCADE, related_name='duplicados_b')
+    puntaje = models.FloatField('Puntaje', db_index=True)
+    motivos = models.CharField('Coincidencias', max_length=100)
+    estado = models.CharField('Estado', max_length=20, choices=ESTADOS, default=PENDIENTE)
+    creado = models.DateTimeField(auto_now_add=True)
+    revisado = models.DateTimeField(blank=True, null=True)
+    revisado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True,
+                                     related_name='duplicados_persona_revisados')
+
+    class Meta:
+        verbose_name = 'Posible duplicado de persona'
+        verbose_name_plural = 'Posibles duplicados de personas'
+        constraints = [
+            models.UniqueConstraint(fields=['persona_a', 'persona_b'], name='unique_duplicado_persona'),
+        ]
+
+    def __str__(self):
+        return f"{self.persona_a} / {self.persona_b} ({self.puntaje:.2f})"
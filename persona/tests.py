@@ -1,3 +1,368 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import os
+import tempfile
+import time
+import zipfile
+from unittest import skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from core import importar
+from core.exportar import filas_xlsx
+from core.importar import importar_archivo
+from core.models import DocumentoBusqueda, Genero, Rol, Tipo_Documento
+from core.tests import ConsultasConstantesMixin, crear_localidad, crear_usuario_admin
+from core.utils import normalizar_texto
+from expediente import detalle
+from expediente.models import ExpedientePersona
+from expediente.tests import MediaTemporalMixin, crear_expediente, crear_persona
+from . import duplicados
+from .busqueda import IndiceTokensPersona, buscar_personas, indice_personas
+from .importacion import PersonaImportacion
+from .models import DuplicadoPersona, Persona
+
+
+class PersonaListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(crear_usuario_admin())
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            crear_persona()
+
+    def test_listado_consultas_constantes(self):
+        self.assertConsultasConstantes(reverse('persona:persona_list'))
+
+
+class PersonaExportarTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(crear_usuario_admin())
+        crear_persona(apellido='ALVÁREZ', nombre='Lucía', email='lucia@ejemplo.com')
+        crear_persona(apellido='BENÍTEZ', nombre='José', estado=False)
+
+    def test_csv_con_busqueda(self):
+        respuesta = self.client.get(reverse('persona:persona_exportar', args=['csv']))
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment; filename="personas_', respuesta['Content-Disposition'])
+        filas = list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(filas[0], ['DNI', 'Apellido', 'Nombre', 'Correo', 'Teléfono', 'Estado'])
+        self.assertEqual([fila[1:4] for fila in filas[1:]], [['ALVÁREZ', 'Lucía', 'lucia@ejemplo.com'], ['BENÍTEZ', 'José', '']])
+        self.assertEqual([fila[5] for fila in filas[1:]], ['Activo', 'Inactivo'])
+
+        respuesta = self.client.get(reverse('persona:persona_exportar', args=['csv']), {'q': 'BENÍTEZ'})
+        filas = list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual([fila[1] for fila in filas[1:]], ['BENÍTEZ'])
+
+    def apellidos(self, q):
+        respuesta = self.client.get(reverse('persona:persona_exportar', args=['csv']), {'q': q})
+        filas = list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode('utf-8-sig'))))
+        return [fila[1] for fila in filas[1:]]
+
+    def test_busqueda_igual_que_la_tabla(self):
+        # Las mismas filas que deja ver el buscador de DataTables: cada palabra en alguna columna visible
+        self.assertEqual(self.apellidos('lucia@ejemplo'), ['ALVÁREZ'])
+        self.assertEqual(self.apellidos('josé inactivo'), ['BENÍTEZ'])
+        self.assertEqual(self.apellidos('activo'), ['ALVÁREZ', 'BENÍTEZ'])
+        self.assertEqual(self.apellidos('"lucía alv"'), [])
+        self.assertEqual(self.apellidos('  '), ['ALVÁREZ', 'BENÍTEZ'])
+
+    def test_csv_sin_formulas(self):
+        crear_persona(apellido='=HYPERLINK("http://ejemplo.com")', nombre='+54', telefono='-1')
+        respuesta = self.client.get(reverse('persona:persona_exportar', args=['csv']), {'q': 'hyperlink'})
+        filas = list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(filas[1][1:3], ["'=HYPERLINK(\"http://ejemplo.com\")", "'+54"])
+        self.assertEqual(filas[1][4], "'-1")
+
+    def test_xlsx(self):
+        respuesta = self.client.get(reverse('persona:persona_exportar', args=['xlsx']))
+        archivo = zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertIsNone(archivo.testzip())
+        espacio = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        hoja = ElementTree.fromstring(archivo.read('xl/worksheets/sheet1.xml'))
+        filas = [
+            [''.join(celda.itertext()) for celda in fila.findall('x:c', espacio)]
+            for fila in hoja.iterfind('x:sheetData/x:row', espacio)
+        ]
+        self.assertEqual(filas[0][:3], ['DNI', 'Apellido', 'Nombre'])
+        self.assertEqual(filas[1][1:4], ['ALVÁREZ', 'Lucía', 'lucia@ejemplo.com'])
+        self.assertEqual(len(filas), 3)
+        ElementTree.fromstring(archivo.read('xl/workbook.xml'))
+        ElementTree.fromstring(archivo.read('xl/styles.xml'))
+
+    def test_formato_desconocido(self):
+        self.assertEqual(self.client.get(reverse('persona:persona_exportar', args=['pdf'])).status_code, 404)
+
+
+class PersonaImportacionTest(MediaTemporalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        Tipo_Documento.objects.create(tipo_documento='DNI')
+
+    def test_xlsx_con_numeros_y_fechas(self):
+        contenido = b''.join(filas_xlsx(
+            ['numero_documento', 'tipo_documento', 'apellido', 'nombre', 'fecha_nacimiento'],
+            [[30999888, 'DNI', 'Paz', 'Ana', datetime.date(1990, 1, 2)]],
+        ))
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, 'errores.csv')
+            resumen = importar_archivo(PersonaImportacion, io.BytesIO(contenido), 'personas.xlsx', ruta)
+            self.assertFalse(os.path.exists(ruta))
+        self.assertEqual((resumen['creadas'], resumen['rechazadas'], resumen['informe']), (1, 0, None))
+        persona = Persona.objects.get(numero_documento='30999888')
+        self.assertEqual((persona.apellido, persona.fecha_nacimiento), ('PAZ', datetime.date(1990, 1, 2)))
+        self.assertTrue(persona.estado)
+
+    def test_reglas_del_formulario(self):
+        contenido = (
+            'tipo_documento,numero_documento,apellido,nombre,email,posee_cobertura_salud,cobertura_salud\n'
+            'DNI,30111222,Paz,Ana,ANA@EJEMPLO.COM,si,iapos\n'
+            'DNI,30111223,Paz,Eva,no es un email,si,\n'
+        ).encode()
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, 'errores.csv')
+            resumen = importar_archivo(PersonaImportacion, io.BytesIO(contenido), 'personas.csv', ruta)
+            with open(ruta, encoding='utf-8-sig') as informe:
+                errores = list(csv.reader(informe))[1][1]
+        self.assertEqual((resumen['creadas'], resumen['rechazadas']), (1, 1))
+        self.assertIn('Correo electrónico:', errores)
+        self.assertIn('Debe indicar la cobertura de salud si posee una.', errores)
+        persona = Persona.objects.get(numero_documento='30111222')
+        self.assertEqual((persona.nombre, persona.email, persona.cobertura_salud), ('ANA', 'ana@ejemplo.com', 'IAPOS'))
+
+    def test_actualizar_invalida_el_detalle_de_los_expedientes(self):
+        cache.clear()
+        self.client.force_login(crear_usuario_admin())
+        persona = crear_persona(numero_documento='30555666', apellido='PAZ')
+        expediente = crear_expediente()
+        ExpedientePersona.objects.create(expediente=expediente, persona=persona, rol=Rol.objects.create(rol='TITULAR'))
+        url = reverse('expediente:expediente_detail', args=[expediente.pk])
+        self.assertContains(self.client.get(url), 'PAZ')
+
+        contenido = 'tipo_documento,numero_documento,apellido,nombre\nDNI,30555666,Sosa,Ana\n'.encode()
+        with tempfile.TemporaryDirectory() as carpeta, self.captureOnCommitCallbacks(execute=True):
+            resumen = importar_archivo(
+                PersonaImportacion, io.BytesIO(contenido), 'personas.csv', os.path.join(carpeta, 'errores.csv'),
+            )
+        self.assertEqual(resumen['actualizadas'], 1)
+        self.assertContains(self.client.get(url), 'SOSA')
+
+    def test_limpieza_respeta_importaciones_en_curso(self):
+        carpeta = importar.carpeta_informes()
+        importar._guardar_estado('encurso', {'estado': 'en curso'})
+        importar._guardar_estado('terminada', {'estado': 'terminada', 'resumen': {}})
+        vencido = time.time() - (importar.INFORMES_VENCIMIENTO_HORAS + 1) * 3600
+        for nombre in ('encurso.subida', 'encurso.json', 'terminada.subida', 'terminada.json', 'terminada.csv'):
+            ruta = os.path.join(carpeta, nombre)
+            if not os.path.exists(ruta):
+                open(ruta, 'wb').close()
+            os.utime(ruta, (vencido, vencido))
+
+        nombre, _ = importar.nuevo_informe()
+        self.assertEqual(sorted(os.listdir(carpeta)), ['encurso.json', 'encurso.subida'])
+        self.assertTrue(nombre.endswith('.csv'))
+
+
+class PersonaImportacionAdminTest(MediaTemporalMixin, TransactionTestCase):
+    """La importación corre en un hilo aparte, con su propia conexión: hacen falta commits reales."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(crear_usuario_admin())
+        Tipo_Documento.objects.create(tipo_documento='DNI')
+        self.genero = Genero.objects.create(genero='FEMENINO')
+        self.localidad = crear_localidad('RAFAELA')
+
+    def importar(self, archivo):
+        respuesta = self.client.post(reverse('admin:persona_persona_importar'), {'archivo': archivo, 'encoding': 'utf-8-sig'})
+        self.assertEqual(respuesta.status_code, 302)
+        importar.esperar()
+        return self.client.get(respuesta['Location'])
+
+    def test_admin_crea_actualiza_y_rechaza(self):
+        existente = crear_persona(numero_documento='30111222', telefono='111')
+        contenido = (
+            'Tipo de documento;Número de documento;Apellido;Nombre;genero;localidad;fecha_nacimiento;estado\n'
+            'DNI;30111222;Pérez;Ana;femenino;Rafaela, Santa Fe;15/03/1980;si\n'
+            'DNI;40111222;Gómez;Luis;;;;\n'
+            'DNI;50111222;Ruiz;Eva;OTRO;;;\n'
+            'PASAPORTE;;Sosa;Juan;;;;\n'
+            ';;;;;;;\n'
+            'DNI;40111222;Gómez;Luis Alberto;;;;no\n'
+        ).encode('utf-8-sig')
+        respuesta = self.importar(SimpleUploadedFile('personas.csv', contenido, content_type='text/csv'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.context['en_curso'])
+        resumen = respuesta.context['resumen']
+        self.assertEqual(
+            {clave: resumen[clave] for clave in ('filas', 'creadas', 'actualizadas', 'rechazadas', 'repetidas')},
+            {'filas': 5, 'creadas': 1, 'actualizadas': 1, 'rechazadas': 2, 'repetidas': 1},
+        )
+
+        existente.refresh_from_db()
+        self.assertEqual((existente.apellido, existente.nombre), ('PÉREZ', 'ANA'))
+        self.assertEqual((existente.genero, existente.localidad), (self.genero, self.localidad))
+        self.assertEqual(existente.fecha_nacimiento, datetime.date(1980, 3, 15))
+        # La columna no venía en el archivo: no se toca
+        self.assertEqual(existente.telefono, '111')
+        nueva = Persona.objects.get(numero_documento='40111222')
+        self.assertEqual((nueva.nombre, nueva.estado), ('LUIS ALBERTO', False))
+        self.assertTrue(DocumentoBusqueda.objects.filter(tipo=DocumentoBusqueda.PERSONA, objeto_id=nueva.pk).exists())
+
+        informe = self.client.get(reverse('admin:persona_persona_importar_errores', args=[respuesta.context['informe']]))
+        filas = list(csv.reader(io.StringIO(b''.join(informe.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(filas[0][:3], ['fila', 'errores', 'Tipo de documento'])
+        self.assertEqual([fila[0] for fila in filas[1:]], ['4', '5'])
+        self.assertIn('Género: «OTRO» no existe.', filas[1][1])
+        self.assertIn('Tipo de documento: «PASAPORTE» no existe.', filas[2][1])
+        self.assertIn('Número de documento:', filas[2][1])
+
+    def test_faltan_columnas(self):
+        respuesta = self.importar(SimpleUploadedFile('personas.csv', b'apellido,nombre\nPAZ,ANA\n'))
+        self.assertIn('Faltan columnas obligatorias', respuesta.context['error'])
+        self.assertFalse(Persona.objects.exists())
+        # El archivo subido no queda en disco; solo el estado
+        self.assertEqual([nombre for nombre in os.listdir(importar.carpeta_informes()) if not nombre.endswith('.json')], [])
+        self.assertEqual(self.client.get(reverse('admin:persona_persona_importar_estado', args=['otra'])).status_code, 404)
+
+
+class DuplicadosPersonaTest(TestCase):
+
+    def test_normalizacion(self):
+        self.assertEqual(duplicados.normalizar_documento(' 12.345.678 '), '12345678')
+        self.assertEqual(duplicados.normalizar_documento('012-345678'), '12345678')
+        self.assertEqual(
+            {duplicados.clave_fonetica(apellido) for apellido in ('GONZÁLEZ', 'Gonzales', 'GONSALEZ')},
+            {'gonsales'},
+        )
+        self.assertEqual(duplicados.clave_fonetica('de la Vega'), duplicados.clave_fonetica('BEGA'))
+
+    def test_busca_en_bloques_y_conserva_descartados(self):
+        perez = crear_persona(numero_documento='12.345.678', apellido='PÉREZ', nombre='JUAN')
+        perez_bis = crear_persona(numero_documento='12345678', apellido='PEREZ', nombre='JUAN')
+        gonzalez = crear_persona(numero_documento='30111222', apellido='GONZÁLEZ', nombre='MARÍA',
+                                 fecha_nacimiento=datetime.date(1980, 5, 1))
+        gonzales = crear_persona(numero_documento='30111223', apellido='GONZALES', nombre='MARIA',
+                                 fecha_nacimiento=datetime.date(1980, 5, 1))
+        crear_persona(numero_documento='40111222', apellido='GONZALES', nombre='ANA')
+
+        call_command('buscar_personas_duplicadas', stdout=io.StringIO())
+        pares = {(par.persona_a_id, par.persona_b_id): par for par in DuplicadoPersona.objects.all()}
+        self.assertEqual(set(pares), {(perez.pk, perez_bis.pk), (gonzalez.pk, gonzales.pk)})
+        self.assertEqual(pares[(perez.pk, perez_bis.pk)].puntaje, 0.9)
+        self.assertIn('documento', pares[(gonzalez.pk, gonzales.pk)].motivos)
+
+        duplicados.descartar(DuplicadoPersona.objects.filter(persona_a=gonzalez), None)
+        call_command('buscar_personas_duplicadas', stdout=io.StringIO())
+        self.assertEqual(
+            DuplicadoPersona.objects.get(persona_a=gonzalez).estado, DuplicadoPersona.DESCARTADO,
+        )
+        self.assertEqual(DuplicadoPersona.objects.count(), 2)
+
+    def test_fusionar_reasigna_expedientes(self):
+        conservada = crear_persona(numero_documento='12345678', apellido='PEREZ', nombre='JUAN')
+        duplicada = crear_persona(numero_documento='12.345.678', apellido='PÉREZ', nombre='JUAN', email='juan@ejemplo.com')
+        titular, derivante = Rol.objects.create(rol='TITULAR'), Rol.objects.create(rol='DERIVANTE')
+        expediente, otro = crear_expediente(), crear_expediente()
+        ExpedientePersona.objects.create(expediente=expediente, persona=conservada, rol=titular)
+        for exp, rol in ((expediente, titular), (expediente, derivante), (otro, titular)):
+            ExpedientePersona.objects.create(expediente=exp, persona=duplicada, rol=rol)
+        duplicados.guardar_pares([(conservada.pk, duplicada.pk, 0.9, 'nombre')])
+
+        self.assertEqual(duplicados.fusionar(conservada, duplicada), 2)
+        self.assertFalse(Persona.objects.filter(pk=duplicada.pk).exists())
+        self.assertFalse(DuplicadoPersona.objects.exists())
+        self.assertEqual(
+            sorted(ExpedientePersona.objects.filter(persona=conservada).values_list('expediente_id', 'rol__rol')),
+            sorted([(expediente.pk, 'TITULAR'), (expediente.pk, 'DERIVANTE'), (otro.pk, 'TITULAR')]),
+        )
+        conservada.refresh_from_db()
+        self.assertEqual(conservada.email, 'juan@ejemplo.com')
+
+    def test_fusionar_invalida_el_detalle_de_los_expedientes(self):
+        # Sin datos que completar: conservada no se guarda y ninguna señal invalida nada
+        conservada = crear_persona(numero_documento='12345678', apellido='PEREZ', nombre='JUAN')
+        duplicada = crear_persona(numero_documento='12.345.678', apellido='PÉREZ', nombre='JUAN')
+        rol = Rol.objects.create(rol='TITULAR')
+        expediente, ajeno = crear_expediente(), crear_expediente()
+        ExpedientePersona.objects.create(expediente=expediente, persona=duplicada, rol=rol)
+        versiones = {pk: detalle.version(pk) for pk in (expediente.pk, ajeno.pk)}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            duplicados.fusionar(conservada, duplicada)
+        self.assertNotEqual(detalle.version(expediente.pk), versiones[expediente.pk])
+        self.assertEqual(detalle.version(ajeno.pk), versiones[ajeno.pk])
+
+    def test_accion_admin_fusionar(self):
+        self.client.force_login(crear_usuario_admin())
+        conservada, duplicada = crear_persona(apellido='PAZ'), crear_persona(apellido='PAZ')
+        duplicados.guardar_pares([(conservada.pk, duplicada.pk, 0.8, 'apellido')])
+        respuesta = self.client.post(reverse('admin:persona_duplicadopersona_changelist'), {
+            'action': 'fusionar_en_b',
+            '_selected_action': [DuplicadoPersona.objects.get().pk],
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(list(Persona.objects.values_list('pk', flat=True)), [duplicada.pk])
+
+
+class BusquedaPersonasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.gonzalez = crear_persona(apellido='GONZÁLEZ', nombre='María José', numero_documento='30111222')
+        self.perez = crear_persona(apellido='Pérez', nombre='Juan', numero_documento='28999000')
+        self.lopez = crear_persona(apellido='López', nombre='Ana', numero_documento='40123456')
+
+    def ids(self, resultado):
+        return [persona.pk for persona in resultado]
+
+    @skipUnless(connection.vendor == 'postgresql', "usa pg_trgm")
+    def test_postgres_sin_tildes_ni_mayusculas(self):
+        self.assertEqual(self.ids(buscar_personas('gonzalez maria')), [self.gonzalez.pk])
+        self.assertEqual(self.ids(buscar_personas('PEREZ')), [self.perez.pk])
+        self.assertEqual(self.ids(buscar_personas('30111')), [self.gonzalez.pk])
+        # Error de tipeo
+        self.assertEqual(self.ids(buscar_personas('gonzales')), [self.gonzalez.pk])
+        self.assertEqual(self.ids(buscar_personas('   ')), [])
+
+    def test_indice_en_memoria(self):
+        indice = IndiceTokensPersona()
+        buscar = lambda termino: self.ids(indice.buscar(Persona.objects.all(), normalizar_texto(termino).split()))
+        self.assertEqual(buscar('gonzalez mar'), [self.gonzalez.pk])
+        self.assertEqual(buscar('perez'), [self.perez.pk])
+        self.assertEqual(buscar('30111222'), [self.gonzalez.pk])
+        self.assertEqual(buscar('inexistente'), [])
+
+    def test_indice_se_actualiza_con_las_senales(self):
+        # El índice del proceso (el de las señales), ya armado
+        buscar = lambda termino: self.ids(indice_personas.buscar(Persona.objects.all(), [termino]))
+        self.assertEqual(buscar('perez'), [self.perez.pk])
+        self.perez.apellido = 'Pereyra'
+        self.perez.save()
+        self.assertEqual(buscar('perez'), [])
+        self.assertEqual(buscar('pereyra'), [self.perez.pk])
+        self.perez.delete()
+        self.assertEqual(buscar('pereyra'), [])
+
+    def test_otro_proceso_invalida_por_version(self):
+        # Dos índices con la misma cache: como dos workers
+        este, otro = IndiceTokensPersona(), IndiceTokensPersona()
+        buscar = lambda termino: self.ids(este.buscar(Persona.objects.all(), [termino]))
+        self.assertEqual(buscar('lopez'), [self.lopez.pk])
+        # bulk_create no emite señales: quien lo usa invalida, y el aviso llega a todos
+        nueva = Persona.objects.bulk_create([Persona(
+            tipo_documento=self.perez.tipo_documento, numero_documento='50111222', apellido='López', nombre='Eva',
+        )])[0]
+        self.assertEqual(buscar('lopez'), [self.lopez.pk])
+        otro.invalidar()
+        self.assertEqual(sorted(buscar('lopez')), [self.lopez.pk, nueva.pk])
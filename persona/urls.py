@@ -8,6 +8,7 @@ app_name = 'persona'
 
 urlpatterns = [
     path('persona/', PersonaListView.as_view(), name='persona_list'),
+    path('persona/exportar/<str:formato>/', views.persona_exportar, name='persona_exportar'),
     path('persona/nueva/', PersonaCreateView.as_view(), name='persona_create'),
     path('persona/editar/<int:pk>/', PersonaUpdateView.as_view(), name='persona_edit'),
     path('persona/detalle/<int:pk>/', PersonaDetailView.as_view(), name='persona_detail'),
@@ -1,12 +1,20 @@
 
 
+import re
+
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib import messages
+from django.db.models import Q
 from django.http import HttpResponseRedirect, HttpResponseForbidden
 from urllib.parse import urlencode
 from django.views.generic import CreateView, ListView, UpdateView, TemplateView
 from .models import Persona
+from .busqueda import buscar_personas
 from .forms import PersonaForm
+from core.exportar import exportar_queryset
+from core.mixins import ListadoOptimizadoMixin
+from core.utils import pagina_sin_contar, parametros_pagina
+from expediente.forms import ExpedientePersonaForm
 from django.urls import reverse_lazy
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
@@ -39,21 +47,64 @@ class PersonaCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView)
 
 
 
-class PersonaListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class PersonaListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
     model = Persona
     template_name = "persona/persona_list.html"
     context_object_name = 'personas'
     login_url = 'core:login'
     permission_required = 'persona.puede_ver_persona'  # reemplaza 'persona' por tu app_label
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
-
-    
-    def get_queryset(self):
-        # Solo personas activas
-        return Persona.objects.filter().order_by('apellido', 'nombre')
+    queryset = Persona.objects.order_by('apellido', 'nombre')
+    # La plantilla sólo muestra columnas propias de Persona: no hay relaciones que traer
+    list_select_related = ()
     
 
 
+# Columnas de la exportación (core.exportar), las mismas que la tabla de PersonaListView
+PERSONA_EXPORTAR = (
+    ('DNI', 'numero_documento'),
+    ('Apellido', 'apellido'),
+    ('Nombre', 'nombre'),
+    ('Correo', 'email'),
+    ('Teléfono', 'telefono'),
+    ('Estado', 'estado', lambda activa: 'Activo' if activa else 'Inactivo'),
+)
+
+
+# Palabras del buscador de DataTables: las frases entre comillas van juntas
+_PALABRAS_BUSCADOR = re.compile(r'"[^"]+"|[^ ]+')
+
+
+def filtrar_personas(queryset, busqueda):
+    """
+    Aplica el texto del buscador de la tabla como lo hace DataTables en el
+    navegador: cada palabra tiene que aparecer (sin distinguir mayúsculas) en
+    alguna de las columnas visibles, así se exportan las mismas filas que se ven.
+    """
+    for palabra in _PALABRAS_BUSCADOR.findall(busqueda or ''):
+        palabra = palabra.strip('"')
+        condicion = (
+            Q(numero_documento__icontains=palabra) |
+            Q(apellido__icontains=palabra) |
+            Q(nombre__icontains=palabra) |
+            Q(email__icontains=palabra) |
+            Q(telefono__icontains=palabra)
+        )
+        estados = [valor for valor, etiqueta in ((True, 'activo'), (False, 'inactivo')) if palabra.lower() in etiqueta]
+        if estados:
+            condicion |= Q(estado__in=estados)
+        queryset = queryset.filter(condicion)
+    return queryset
+
+
+@login_required(login_url='core:login')
+@permission_required('persona.puede_ver_persona', login_url='core:login', raise_exception=True)
+def persona_exportar(request, formato):
+    # Las personas del listado que coinciden con el buscador de la tabla (?q=)
+    personas = filtrar_personas(PersonaListView.queryset, request.GET.get('q', ''))
+    return exportar_queryset(formato, 'personas', personas, PERSONA_EXPORTAR)
+
+
 class PersonaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
     model = Persona
     template_name = 'persona/persona_form.html'
@@ -87,11 +138,19 @@ class PersonaDetailView(LoginRequiredMixin, PermissionRequiredMixin, TemplateVie
 @login_required(login_url='core:login')
 @permission_required('persona.puede_ver_persona', login_url='core:login', raise_exception=True)
 def persona_list(request):
-    personas = Persona.objects.filter(estado=True).order_by('apellido', 'nombre')
+    # Búsqueda y paginación en el servidor: nunca se renderizan todas las personas
+    q = request.GET.get("q", "").strip()
+    activas = Persona.objects.filter(estado=True)
+    personas = buscar_personas(q, activas) if q else activas.order_by('apellido', 'nombre', 'id')
+    pagina, por_pagina = parametros_pagina(request)
+    personas, hay_mas = pagina_sin_contar(personas, pagina, por_pagina)
     medio_id = request.GET.get("medio_id")   # <-- aquí el fix
     next_url = request.GET.get("next")       # para redirigir después
     return render(request, "persona/persona_agregar_expediente.html", {
         "personas": personas,
+        "q": q,
+        "pagina": pagina,
+        "hay_mas": hay_mas,
         "medio_id": medio_id,
         "next_url": next_url,   # lo mandamos al template
     })
@@ -100,11 +159,12 @@ def persona_list(request):
 @login_required(login_url='core:login')
 @permission_required('persona.puede_ver_persona', login_url='core:login', raise_exception=True)
 def agregar_persona_expediente(request):
-    personas = Persona.objects.filter(estado=True).order_by('apellido', 'nombre')
+    # La persona se elige con select2 contra expediente:buscar_personas
+    form = ExpedientePersonaForm(initial={'expediente': request.GET.get('expediente_id')})
     next_url = request.GET.get("next")       # para redirigir después
 
     return render(request, "expediente/expediente_persona_form.html", {
-        "personas": personas,
+        "form": form,
         "next_url": next_url,
     
     })
@@ -1,3 +1,23 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from core.models import AreaProfesional, Profesion
+from core.tests import ConsultasConstantesMixin, crear_usuario_admin
+from usuario.models import CustomUser
+from .models import Profesional
+
+
+class ProfesionalListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.profesion = Profesion.objects.create(profesion='PSIQUIATRÍA')
+        self.area = AreaProfesional.objects.create(area_profesional='SALUD MENTAL')
+        self.client.force_login(crear_usuario_admin())
+
+    def crear_filas(self, cantidad):
+        for _ in range(cantidad):
+            usuario = CustomUser.objects.create_user(username=f'prof{CustomUser.objects.count()}')
+            Profesional.objects.create(user=usuario, profesion=self.profesion, area_profesional=self.area)
+
+    def test_listado_consultas_constantes(self):
+        self.assertConsultasConstantes(reverse('profesional:profesional_list'))
@@ -4,6 +4,7 @@ from django.contrib.auth.decorators import login_required, permission_required
 from django.views.generic import CreateView, ListView, UpdateView, DeleteView
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
+from core.mixins import ListadoOptimizadoMixin
 from .models import Profesional
 from .forms import ProfesionalForm
 
@@ -18,11 +19,12 @@ class ProfesionalCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateV
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
 
 
-class ProfesionalListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class ProfesionalListView(LoginRequiredMixin, PermissionRequiredMixin, ListadoOptimizadoMixin, ListView):
     model = Profesional
     template_name = "profesional/profesional_list.html"
     context_object_name = "profesionales"
     queryset = Profesional.objects.all().order_by('user__first_name', 'user__last_name')
+    list_select_related = ('user', 'profesion', 'area_profesional')
     login_url = 'core:login'
     permission_required = 'profesional.view_profesional'
     raise_exception = False  # devuelve 403 Forbidden si no tiene permiso
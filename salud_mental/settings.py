@@ -73,6 +73,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # lookups trigram_similar / trigram_word_similar (búsqueda de personas)
+    'django.contrib.postgres',
 
     'widget_tweaks',
 
@@ -135,6 +137,30 @@ IP_BLOCK_TIME = int(get_env('IP_BLOCK_TIME', default=60 * 15))
 raw_whitelist = get_env('IP_WHITELIST', default='127.0.0.1')
 IP_WHITELIST = [ip.strip() for ip in raw_whitelist.split(',') if ip.strip()]
 
+# Registro de accesos (core.middleware.RegistrarClienteMiddleware):
+# - 'buffer': cola en memoria que un hilo de fondo guarda con bulk_create cada
+#   CLIENTE_LOG_LOTE registros o CLIENTE_LOG_INTERVALO segundos.
+# - 'archivo': cada acceso se agrega como línea JSON a CLIENTE_LOG_ARCHIVO y se
+#   importa en bloque con `manage.py importar_cliente_log` (por ejemplo desde cron).
+# - 'sincronico': un INSERT por petición (útil en desarrollo y tests).
+CLIENTE_LOG_MODO = get_env('CLIENTE_LOG_MODO', default='sincronico' if DEBUG else 'buffer')
+CLIENTE_LOG_LOTE = int(get_env('CLIENTE_LOG_LOTE', default=200))
+CLIENTE_LOG_INTERVALO = int(get_env('CLIENTE_LOG_INTERVALO', default=5))
+CLIENTE_LOG_CAPACIDAD = int(get_env('CLIENTE_LOG_CAPACIDAD', default=10000))
+CLIENTE_LOG_ARCHIVO = get_env('CLIENTE_LOG_ARCHIVO', default=str(BASE_DIR / 'logs' / 'cliente_log.jsonl'))
+
+# Cache LRU de user agents parseados (core.utils.cache_user_agent).
+# USER_AGENT_CACHE_COMPARTIDA agrega un segundo nivel en CACHES['default'] (Redis)
+# compartido entre los workers de gunicorn.
+USER_AGENT_CACHE_CAPACIDAD = int(get_env('USER_AGENT_CACHE_CAPACIDAD', default=1000))
+USER_AGENT_CACHE_COMPARTIDA = get_env('USER_AGENT_CACHE_COMPARTIDA', default='False', cast=lambda v: str(v).strip().lower() in ('1', 'true', 'yes'))
+
+# Retención de ClienteLog (manage.py depurar_cliente_log): los registros con más de
+# CLIENTE_LOG_RETENCION_DIAS días se resumen en ClienteLogDiario y se archivan
+# comprimidos (JSONL .gz, uno por día) en CLIENTE_LOG_ARCHIVO_DIR antes de borrarlos.
+CLIENTE_LOG_RETENCION_DIAS = int(get_env('CLIENTE_LOG_RETENCION_DIAS', default=90))
+CLIENTE_LOG_ARCHIVO_DIR = get_env('CLIENTE_LOG_ARCHIVO_DIR', default=str(BASE_DIR / 'logs' / 'cliente_log'))
+
 
 
 ROOT_URLCONF = 'salud_mental.urls'
@@ -199,6 +225,24 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Descarga de documentos de expedientes (core.descargas), siempre a través de una vista con permisos:
+# - 'nginx': X-Accel-Redirect a DESCARGAS_URL_INTERNA + nombre (location `internal` en nginx,
+#   ver scripts/server_availables.txt).
+# - 'apache': X-Sendfile con la ruta absoluta (mod_xsendfile).
+# - 'django': Django envía el archivo (con ETag y Range); para desarrollo.
+DESCARGAS_MODO = get_env('DESCARGAS_MODO', default='django' if DEBUG else 'nginx')
+DESCARGAS_URL_INTERNA = get_env('DESCARGAS_URL_INTERNA', default=MEDIA_URL)
+
+# Hilos del pool que genera las miniaturas de las imágenes subidas (core.miniaturas)
+MINIATURAS_HILOS = int(get_env('MINIATURAS_HILOS', default=2))
+
+# Subida por partes de documentos (expediente.subidas). La parte tiene que entrar
+# en client_max_body_size de nginx; las subidas sin actividad por más de
+# SUBIDAS_VENCIMIENTO_HORAS las borra el comando limpiar_subidas_vencidas.
+SUBIDAS_TAMANIO_PARTE = int(get_env('SUBIDAS_TAMANIO_PARTE', default=8 * 1024 * 1024))
+SUBIDAS_TAMANIO_MAXIMO = int(get_env('SUBIDAS_TAMANIO_MAXIMO', default=2 * 1024 * 1024 * 1024))
+SUBIDAS_VENCIMIENTO_HORAS = int(get_env('SUBIDAS_VENCIMIENTO_HORAS', default=24))
+
 LOGIN_URL = 'core:login'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
@@ -0,0 +1,132 @@
+/*
+ * Subida por partes de documentos (expediente.subidas).
+ *
+ * Se aplica a los formularios con data-subida-por-partes="<url para iniciar>"
+ * que tengan un campo "nombre" y un input file "archivo". El archivo se manda
+ * en partes con PUT; si se corta la conexión se reintenta y, si se recarga la
+ * página, al volver a elegir el mismo archivo se sigue desde la última parte
+ * recibida. Sin JavaScript el formulario se envía como siempre.
+ */
+(function () {
+  'use strict';
+
+  var REINTENTOS = 5;
+
+  function esperar(ms) {
+    return new Promise(function (resolver) { setTimeout(resolver, ms); });
+  }
+
+  function clave(url, archivo) {
+    return 'subida:' + url + ':' + archivo.name + ':' + archivo.size + ':' + archivo.lastModified;
+  }
+
+  function pedir(url, opciones, csrf) {
+    opciones.headers = Object.assign({'X-CSRFToken': csrf}, opciones.headers || {});
+    opciones.credentials = 'same-origin';
+    return fetch(url, opciones).then(function (respuesta) {
+      return respuesta.json().catch(function () { return {}; }).then(function (datos) {
+        datos.status = respuesta.status;
+        return datos;
+      });
+    });
+  }
+
+  function sha256(datos) {
+    if (!window.crypto || !window.crypto.subtle) {
+      return Promise.resolve('');  // fuera de HTTPS no hay crypto.subtle: la parte va sin verificar
+    }
+    return window.crypto.subtle.digest('SHA-256', datos).then(function (hash) {
+      return Array.from(new Uint8Array(hash)).map(function (b) { return b.toString(16).padStart(2, '0'); }).join('');
+    });
+  }
+
+  function iniciar(form, archivo, csrf) {
+    var guardada = localStorage.getItem(clave(form.dataset.subidaPorPartes, archivo));
+    var existente = guardada ? pedir(guardada, {method: 'GET'}, csrf) : Promise.resolve({status: 404});
+    return existente.then(function (estado) {
+      if (estado.status === 200 && estado.id) {
+        return estado;
+      }
+      var datos = new FormData();
+      datos.append('nombre', form.elements.nombre ? form.elements.nombre.value : '');
+      datos.append('nombre_archivo', archivo.name);
+      datos.append('tamanio', archivo.size);
+      datos.append('tipo_mime', archivo.type);
+      return pedir(form.dataset.subidaPorPartes, {method: 'POST', body: datos}, csrf).then(function (nueva) {
+        if (nueva.status !== 201) {
+          throw new Error(nueva.error || 'No se pudo iniciar la subida.');
+        }
+        localStorage.setItem(clave(form.dataset.subidaPorPartes, archivo), nueva.url);
+        return nueva;
+      });
+    });
+  }
+
+  function enviarParte(subida, archivo, numero, csrf, intento) {
+    var inicio = numero * subida.tamanio_parte;
+    var parte = archivo.slice(inicio, Math.min(inicio + subida.tamanio_parte, archivo.size));
+    return parte.arrayBuffer().then(function (datos) {
+      return sha256(datos).then(function (hash) {
+        var encabezados = {'Content-Type': 'application/octet-stream'};
+        if (hash) {
+          encabezados['X-Content-SHA256'] = hash;
+        }
+        return pedir(subida.url + 'partes/' + numero + '/', {method: 'PUT', body: datos, headers: encabezados}, csrf);
+      });
+    }).then(function (estado) {
+      if (estado.status === 200 || estado.status === 409) {
+        return estado;  // 409: el servidor indica desde qué parte seguir
+      }
+      throw new Error(estado.error || 'Error al enviar la parte ' + numero + '.');
+    }).catch(function (error) {
+      if (intento >= REINTENTOS) {
+        throw error;
+      }
+      return esperar(1000 * Math.pow(2, intento)).then(function () {
+        return enviarParte(subida, archivo, numero, csrf, intento + 1);
+      });
+    });
+  }
+
+  function subir(form, archivo, csrf, progreso) {
+    return iniciar(form, archivo, csrf).then(function (subida) {
+      function siguiente(estado) {
+        progreso(estado.recibido / estado.tamanio);
+        if (estado.siguiente_parte >= estado.partes) {
+          return pedir(subida.url + 'completar/', {method: 'POST'}, csrf);
+        }
+        return enviarParte(subida, archivo, estado.siguiente_parte, csrf, 0).then(siguiente);
+      }
+      return siguiente(subida);
+    }).then(function (resultado) {
+      if (resultado.status !== 201) {
+        throw new Error(resultado.error || 'No se pudo completar la subida.');
+      }
+      localStorage.removeItem(clave(form.dataset.subidaPorPartes, archivo));
+      return resultado;
+    });
+  }
+
+  document.querySelectorAll('form[data-subida-por-partes]').forEach(function (form) {
+    form.addEventListener('submit', function (evento) {
+      var archivo = form.elements.archivo && form.elements.archivo.files[0];
+      if (!archivo || !window.fetch) {
+        return;
+      }
+      evento.preventDefault();
+      var boton = form.querySelector('[type=submit]');
+      var texto = boton.innerHTML;
+      boton.disabled = true;
+      var csrf = form.elements.csrfmiddlewaretoken.value;
+      subir(form, archivo, csrf, function (fraccion) {
+        boton.textContent = Math.floor(fraccion * 100) + ' %';
+      }).then(function () {
+        window.location.reload();
+      }).catch(function (error) {
+        boton.disabled = false;
+        boton.innerHTML = texto;
+        alert(error.message + ' Volvé a elegir el archivo para continuar la subida.');
+      });
+    });
+  });
+})();
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuario', '0004_alter_customuser_dni'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='foto_perfil_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -2,6 +2,7 @@
 from django.contrib.auth.models import AbstractUser
 #from django.core.exceptions import ValidationError
 from django.db import models
+from core.miniaturas import nombre_miniatura
 from core.models import Localidad, Sede
 
 class CustomUser(AbstractUser):
@@ -11,6 +12,10 @@ class CustomUser(AbstractUser):
     localidad = models.ForeignKey(Localidad, verbose_name = 'Localidad' ,on_delete=models.SET_NULL, null=True, blank=True)
     sede = models.ForeignKey(Sede, verbose_name = 'Sede', on_delete=models.SET_NULL, null=True, blank=True)
     foto_perfil = models.ImageField(verbose_name = 'Foto de Perfil', upload_to='perfiles/', blank=True, null=True)
+    # SHA-256 de la foto: nombre de sus miniaturas (core.miniaturas)
+    foto_perfil_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+
+    CARPETA_MINIATURAS = 'perfiles/miniaturas'
 
     #def clean(self):
     #    super().clean()
@@ -22,3 +27,14 @@ class CustomUser(AbstractUser):
     
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
+
+    @property
+    def foto_perfil_miniatura_url(self):
+        """Miniatura cuadrada de la foto; la original mientras la miniatura no exista."""
+        if not self.foto_perfil:
+            return None
+        if self.foto_perfil_sha256:
+            nombre = nombre_miniatura(self.CARPETA_MINIATURAS, self.foto_perfil_sha256, 'chica')
+            if self.foto_perfil.storage.exists(nombre):
+                return self.foto_perfil.storage.url(nombre)
+        return self.foto_perfil.url
@@ -2,8 +2,13 @@
 from django.contrib.auth.signals import user_login_failed
 from django.core.cache import cache
 from django.conf import settings
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
 import logging
 
+from core import miniaturas
+from core.almacenamiento import datos_archivo
+
 logger = logging.getLogger(__name__)
 
 # Configurables en settings.py (usa los tuyos si ya existen)
@@ -66,3 +71,27 @@ def login_failed(sender, credentials, request, **kwargs):
 
 # conectar la señal (se importará desde apps.py)
 user_login_failed.connect(login_failed)
+
+
+# Con el nombre del modelo: este módulo se importa desde usuario/__init__.py, antes que los modelos
+@receiver(pre_save, sender='usuario.CustomUser')
+def hash_foto_perfil(sender, instance, raw=False, **kwargs):
+    """Al subir una foto nueva guarda su sha256 (nombre de las miniaturas)."""
+    if raw:
+        return
+    if not instance.foto_perfil:
+        instance.foto_perfil_sha256 = ''
+    elif not instance.foto_perfil._committed:
+        instance.foto_perfil_sha256 = datos_archivo(instance.foto_perfil.file, instance.foto_perfil.name)[0]
+        instance._foto_perfil_nueva = True
+
+
+@receiver(post_save, sender='usuario.CustomUser')
+def miniaturas_foto_perfil(sender, instance, raw=False, **kwargs):
+    """Solo cuando cambió la foto: el usuario se guarda en cada login."""
+    if not raw and getattr(instance, '_foto_perfil_nueva', False):
+        instance._foto_perfil_nueva = False
+        miniaturas.programar(
+            instance.foto_perfil.storage, instance.foto_perfil.name, instance.foto_perfil_sha256,
+            instance.CARPETA_MINIATURAS,
+        )
@@ -1,3 +1,40 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from core import miniaturas
+from .models import CustomUser
+
+
+class MiniaturaFotoPerfilTest(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_miniatura_de_la_foto(self):
+        contenido = io.BytesIO()
+        Image.new('RGB', (2000, 1500), (10, 120, 200)).save(contenido, 'JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario = CustomUser.objects.create_user(
+                username='perfil', password='x', foto_perfil=SimpleUploadedFile('yo.jpg', contenido.getvalue()),
+            )
+        miniaturas.esperar()
+        self.assertEqual(len(usuario.foto_perfil_sha256), 64)
+        nombre = miniaturas.nombre_miniatura(CustomUser.CARPETA_MINIATURAS, usuario.foto_perfil_sha256, 'chica')
+        self.assertEqual(usuario.foto_perfil_miniatura_url, '/media/' + nombre)
+        with Image.open(os.path.join(self.media, nombre)) as miniatura:
+            self.assertEqual(miniatura.size, (160, 160))
+
+        # Un login (o cualquier otro guardado) no vuelve a encolar nada
+        with self.captureOnCommitCallbacks() as callbacks:
+            usuario.save()
+        self.assertEqual(callbacks, [])